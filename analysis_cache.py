@@ -0,0 +1,154 @@
+"""
+Analysis Cache
+
+Read-through cache of parsed LLM analysis JSON shared by every endpoint that
+reads analyses (call listing and details, dashboard summary, reindexing and the
+transcription revision service). Entries are keyed by blob path and remember the
+blob ETag they were parsed from: a repeat read inside the revalidation window
+costs nothing, after it one HEAD request confirms the ETag, and only a changed
+blob is downloaded and parsed again. Values derived from a parsed analysis (such
+as the structured insight fields) are memoized on the same entry.
+
+Cached objects are shared between callers and must be treated as read-only.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+from services import azure_storage
+
+
+def parse_json_maybe(text: str) -> Any:
+    """Parse JSON, falling back to the outermost {...} block, then to {"raw": text}."""
+    try:
+        return json.loads(text)
+    except Exception:
+        try:
+            start = text.find("{")
+            end = text.rfind("}") + 1
+            if start != -1 and end != -1:
+                return json.loads(text[start:end])
+        except Exception:
+            pass
+    return {"raw": text}
+
+
+class AnalysisCache:
+    def __init__(
+        self,
+        max_entries: int | None = None,
+        revalidate_seconds: float | None = None,
+        read_timeout_seconds: float | None = None,
+    ):
+        """Create an empty cache holding at most max_entries parsed analyses."""
+        if max_entries is None:
+            max_entries = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "5000"))
+        if revalidate_seconds is None:
+            # Window in which a cached entry is served without a HEAD request
+            revalidate_seconds = float(os.getenv("ANALYSIS_CACHE_REVALIDATE_SECONDS", "30"))
+        if read_timeout_seconds is None:
+            # Client-side bound on each blob request, so a stalled read frees its fetch thread
+            read_timeout_seconds = float(os.getenv("ANALYSIS_CACHE_READ_TIMEOUT_SECONDS", "10"))
+        self.max_entries = max_entries
+        self.read_timeout_seconds = read_timeout_seconds
+        self.revalidate_seconds = revalidate_seconds
+        self._lock = threading.Lock()
+        # blob path -> {"etag", "parsed", "derived", "validated_at"}; order is LRU -> MRU
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.revalidations = 0
+        self.downloads = 0
+
+    def get(self, blob_path: str, etag: str | None = None) -> Any | None:
+        """Return the parsed analysis at blob_path (full path under the container).
+
+        etag is the blob's current ETag when the caller already knows it (e.g. it just
+        issued a HEAD); otherwise entries older than the revalidation window are
+        confirmed with a HEAD request. Returns None when the blob does not exist.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(blob_path)
+        if entry is not None:
+            fresh = False
+            if etag is not None:
+                fresh = etag == entry["etag"]
+            elif (now - entry["validated_at"]) < self.revalidate_seconds:
+                fresh = True
+            else:
+                self.revalidations += 1
+                current = azure_storage.get_blob_etag(blob_path, timeout=self.read_timeout_seconds)
+                if current is None:
+                    self.invalidate(blob_path)
+                    return None
+                fresh = current == entry["etag"]
+            if fresh:
+                with self._lock:
+                    entry["validated_at"] = now
+                    if blob_path in self._entries:
+                        self._entries.move_to_end(blob_path)
+                self.hits += 1
+                return entry["parsed"]
+
+        text, current = azure_storage.read_blob_with_etag(blob_path, timeout=self.read_timeout_seconds)
+        self.downloads += 1
+        if text is None:
+            self.invalidate(blob_path)
+            return None
+        parsed = parse_json_maybe(text)
+        with self._lock:
+            self._entries[blob_path] = {
+                "etag": current,
+                "parsed": parsed,
+                "derived": {},
+                "validated_at": time.time(),
+            }
+            self._entries.move_to_end(blob_path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return parsed
+
+    def derived(self, blob_path: str, name: str, parsed: Any, fn: Callable[[Any], Any]) -> Any:
+        """Return fn(parsed), memoized on the cache entry when parsed is its current value."""
+        with self._lock:
+            entry = self._entries.get(blob_path)
+            if entry is None or entry["parsed"] is not parsed:
+                entry = None
+            elif name in entry["derived"]:
+                return entry["derived"][name]
+        value = fn(parsed)
+        if entry is not None:
+            with self._lock:
+                entry["derived"][name] = value
+        return value
+
+    def read_llm_analysis(self, prompt_name: str, file_name: str) -> dict:
+        """Cached equivalent of azure_storage.read_llm_analysis ({} when missing or invalid)."""
+        prompt_no_ext = prompt_name.split('.')[0]
+        parsed = self.get(f"{azure_storage.LLM_ANALYSIS_FOLDER}/{prompt_no_ext}/{file_name}")
+        return parsed if isinstance(parsed, dict) and "raw" not in parsed else {}
+
+    def invalidate(self, blob_path: str) -> None:
+        """Forget blob_path (call after writing or deleting the blob)."""
+        with self._lock:
+            self._entries.pop(blob_path, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.downloads
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "revalidate_seconds": self.revalidate_seconds,
+            "hits": self.hits,
+            "revalidations": self.revalidations,
+            "downloads": self.downloads,
+            "hit_rate": (self.hits / lookups) if lookups else None,
+        }
+
+
+# Global instance
+analysis_cache = AnalysisCache()
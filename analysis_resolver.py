@@ -0,0 +1,187 @@
+"""
+Analysis Resolver
+
+This module maps call IDs to their LLM analysis blob paths. Instead of listing
+`llmanalysis/**` for every call, it lists the analysis folder once, builds a
+normalized call_id -> blob path map per sub-folder (persona, default, ...) and
+keeps it current from write events: analysis paths recorded in the call manifest
+(by this or any other process) and deleted calls. A miss is answered from the
+map; the full listing only runs once at startup and then periodically on a
+background thread, applying changes newer than a last-modified watermark.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from services import azure_storage
+
+PREFERRED_FOLDER = "persona"
+
+
+def normalize_call_id(call_id: str) -> str:
+    """Collapse the space/underscore/hyphen/case variants a call ID may be stored under."""
+    return (call_id or "").strip().lower().replace(" ", "_").replace("-", "_")
+
+
+class AnalysisResolver:
+    def __init__(self, min_refresh_seconds: float | None = None, reconcile_seconds: float | None = None):
+        """Initialize an empty resolver; the blob listing happens on first use."""
+        if min_refresh_seconds is None:
+            min_refresh_seconds = float(os.getenv("ANALYSIS_RESOLVER_REFRESH_SECONDS", "30"))
+        if reconcile_seconds is None:
+            # 0 disables the periodic background listing
+            reconcile_seconds = float(os.getenv("ANALYSIS_RESOLVER_RECONCILE_SECONDS", "900"))
+        self.min_refresh_seconds = min_refresh_seconds
+        self.reconcile_seconds = reconcile_seconds
+        self._lock = threading.RLock()
+        # Serializes listings; the map lock is only held while applying a listing's result
+        self._refresh_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        # folder -> normalized call_id -> blob path
+        self._by_folder: Dict[str, Dict[str, str]] = {}
+        # blob path -> last_modified timestamp
+        self._last_modified: Dict[str, float] = {}
+        self._watermark: float = 0.0
+        self._last_refresh: float = 0.0
+        self._loaded = False
+
+    # ------------------------------------------------------------------
+    # Map maintenance
+    # ------------------------------------------------------------------
+
+    def refresh(self, force: bool = False) -> int:
+        """List the analysis folder once and apply changes newer than the watermark.
+
+        Returns the number of entries that were added or updated. Calls made within
+        min_refresh_seconds of the previous refresh are no-ops unless force is set.
+        """
+        now = time.time()
+        if not force and self._loaded and (now - self._last_refresh) < self.min_refresh_seconds:
+            return 0
+        with self._refresh_lock:
+            if not force and self._loaded and (time.time() - self._last_refresh) < self.min_refresh_seconds:
+                return 0
+            started = time.time()
+            container = azure_storage.blob_service_client.get_container_client(azure_storage.DEFAULT_CONTAINER)
+            root = f"{azure_storage.LLM_ANALYSIS_FOLDER}/"
+            listed: Dict[str, float] = {}
+            for blob in container.list_blobs(name_starts_with=root):
+                if not blob.name.endswith(".json"):
+                    continue
+                lm = getattr(blob, "last_modified", None)
+                listed[blob.name] = lm.timestamp() if isinstance(lm, datetime) else 0.0
+            with self._lock:
+                changed = 0
+                watermark = self._watermark
+                for path, lm_ts in listed.items():
+                    if path in self._last_modified and lm_ts <= self._watermark:
+                        continue
+                    self._add_path(path, lm_ts)
+                    watermark = max(watermark, lm_ts)
+                    changed += 1
+                # Drop blobs that disappeared since the previous listing (paths registered while
+                # this listing ran may simply not be in it yet)
+                for path in [p for p, ts in self._last_modified.items() if p not in listed and ts < started]:
+                    self._drop_path(path)
+                    changed += 1
+                self._watermark = watermark
+                self._last_refresh = time.time()
+                self._loaded = True
+            if changed:
+                print(f"Analysis resolver refreshed: {changed} change(s), {len(self._last_modified)} analysis blobs")
+            return changed
+
+    def start(self) -> None:
+        """Start the periodic background listing (idempotent; no-op when reconcile_seconds is 0)."""
+        with self._lock:
+            if self._thread is not None or self.reconcile_seconds <= 0:
+                return
+            self._thread = threading.Thread(target=self._reconcile_loop, name="analysis-resolver", daemon=True)
+            self._thread.start()
+
+    def _reconcile_loop(self) -> None:
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Analysis resolver refresh failed: {e}")
+            time.sleep(self.reconcile_seconds)
+
+    @staticmethod
+    def _split_path(path: str) -> tuple[str, str]:
+        """Return (folder, normalized call_id) for an llmanalysis/<folder>/<call_id>.json path."""
+        parts = path.split("/")
+        folder = parts[1] if len(parts) > 2 else ""
+        return folder, normalize_call_id(parts[-1].rsplit(".", 1)[0])
+
+    def _add_path(self, path: str, last_modified: float = 0.0) -> None:
+        folder, key = self._split_path(path)
+        self._by_folder.setdefault(folder, {})[key] = path
+        self._last_modified[path] = last_modified
+
+    def _drop_path(self, path: str) -> None:
+        self._last_modified.pop(path, None)
+        folder, key = self._split_path(path)
+        mapping = self._by_folder.get(folder, {})
+        if mapping.get(key) == path:
+            mapping.pop(key, None)
+
+    def register(self, blob_path: str) -> None:
+        """Record a freshly written analysis blob (full path under the container)."""
+        with self._lock:
+            self._add_path(blob_path, time.time())
+
+    def on_manifest_change(self, call_id: str | None, entry: Dict[str, Any] | None) -> None:
+        """Manifest listener: record analysis paths written by any process, forget deleted calls."""
+        if call_id is None:
+            return
+        if entry is None:
+            self.forget(call_id)
+            return
+        path = entry.get("analysis_path")
+        if path and entry.get("has_analysis"):
+            with self._lock:
+                if path not in self._last_modified:
+                    self._add_path(path, time.time())
+
+    def forget(self, call_id: str) -> None:
+        """Remove every analysis path known for call_id."""
+        key = normalize_call_id(call_id)
+        with self._lock:
+            for mapping in self._by_folder.values():
+                path = mapping.pop(key, None)
+                if path:
+                    self._last_modified.pop(path, None)
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def _lookup(self, key: str, folder: str | None) -> Optional[str]:
+        if folder is not None:
+            return self._by_folder.get(folder, {}).get(key)
+        path = self._by_folder.get(PREFERRED_FOLDER, {}).get(key)
+        if path:
+            return path
+        for name in sorted(self._by_folder):
+            path = self._by_folder[name].get(key)
+            if path:
+                return path
+        return None
+
+    def resolve(self, call_id: str, folder: str | None = None) -> Optional[str]:
+        """Return the analysis blob path for call_id (persona first unless folder is given).
+
+        Only the very first lookup waits for a listing; a miss after that is answered from
+        the map, which write events and the background listing keep current.
+        """
+        if not self._loaded:
+            self.refresh()
+        return self._lookup(normalize_call_id(call_id), folder)
+
+
+# Global instance
+analysis_resolver = AnalysisResolver()
@@ -1,9 +1,65 @@
 from typing import List, Dict, Any
+import hashlib
 import json
 import os
-from datetime import datetime
-from services import azure_storage, azure_transcription, azure_oai, azure_search
+import threading
+import time
+from datetime import datetime, timezone
+from services import azure_storage, azure_transcription, azure_oai, azure_search, azure_speech_batch
 from transcription_revision_service import revision_service
+from call_manifest import call_manifest
+from call_store import CallStore, pipeline_status
+from health_monitor import health_monitor
+from change_detector import ChangeDetector
+from dashboard_rollups import DIMENSIONS as ROLLUP_DIMENSIONS
+from upload_jobs import new_job_id
+from audio_registry import AudioRegistry
+from analysis_resolver import analysis_resolver
+from analysis_cache import analysis_cache
+from call_index import (
+    CATEGORICAL_FIELDS,
+    call_index,
+    parse_query_args,
+    is_default_query,
+    query_signature,
+    encode_cursor,
+    decode_cursor,
+)
+# Wiring shared with upload_worker.py processes (neither module starts threads on import)
+from app_services import (
+    _CACHE,
+    _INSIGHT_FIELDS,
+    _OFFSET_PAGES_TAG,
+    _SUMMARY_ID,
+    _all_calls_with_analysis,
+    _cache_get,
+    _cache_set,
+    _call_statistics,
+    _derive_category_and_attitude,
+    _fallback_dashboard_summary,
+    _fetch_analyses_bulk,
+    _fetch_analyses_concurrently,
+    _get_cache_version,
+    _get_dashboard_collection,
+    _get_last_change_timestamp,
+    _get_mongo_client,
+    _index_fields,
+    _invalidate_cache,
+    _invalidate_call_cache,
+    _record_call_contribution,
+    _remember_dashboard_summary,
+    _structured_fields,
+    dashboard_aggregates,
+    dashboard_recompute,
+    dashboard_rollups,
+    insights_engine,
+    insights_job,
+    mongo_gateway,
+    mongo_get_dashboard_history,
+    mongo_get_dashboard_summary,
+    mongo_get_dashboard_updated_at,
+)
+from upload_pipeline import upload_job_store, upload_worker
 from flask import Flask, request, jsonify
 import json
 import requests
@@ -12,9 +68,7 @@ from openai import AzureOpenAI
 from flasgger import Swagger, swag_from
 from flask_swagger_ui import get_swaggerui_blueprint
 from flask_cors import CORS  # Import CORS
-from pymongo import MongoClient
 from pymongo.collection import Collection
-from pymongo.errors import PyMongoError
 
 app = Flask(__name__)
 
@@ -37,7 +91,7 @@ CORS(
         "Accept-Language",
     ],
     supports_credentials=True,
-    expose_headers=["Content-Disposition"],
+    expose_headers=["Content-Disposition", "ETag", "X-Total-Count", "X-Next-Cursor", "X-Snapshot-Version"],
 )
 # Fallback: ensure CORS headers are always present for allowed origins (incl. on errors)
 @app.after_request
@@ -63,7 +117,7 @@ def add_cors_headers(response):
                     "Content-Type, Authorization, Accept, Cache-Control, X-Requested-With, Origin, Accept-Language"
             # Expose headers used by downloads
             response.headers["Access-Control-Expose-Headers"] = ", ".join(
-                sorted(set([*(response.headers.get("Access-Control-Expose-Headers", "").split(",") or []), "Content-Disposition"]))
+                sorted(set([*(response.headers.get("Access-Control-Expose-Headers", "").split(",") or []), "Content-Disposition", "ETag", "X-Total-Count", "X-Next-Cursor", "X-Snapshot-Version"]))
             ).strip(", ")
     except Exception:
         pass
@@ -71,554 +125,97 @@ def add_cors_headers(response):
 # Health check endpoint
 @app.route('/', methods=['GET'])
 def read_root():
-    # Health check without forcing cache invalidation
+    # Served from memory only: probes must never trigger a dashboard computation or backend calls
     try:
-        # Prefer Mongo for dashboard info; compute and upsert if missing
-        mongo_doc = mongo_get_dashboard_summary()
-        if mongo_doc is None:
-            dashboard_data = calculate_dashboard_summary()
-            try:
-                mongo_upsert_dashboard_summary(dashboard_data)
-            except Exception:
-                pass
-            mongo_doc = dashboard_data
+        readiness = health_monitor.readiness()
         return {
             "status": "healthy", 
             "message": "API is running",
-            "dashboard_summary_cached": True,
-            "total_calls": mongo_doc.get("total_calls", 0),
-            "calls_with_analysis": mongo_doc.get("calls_with_analysis", 0),
+            "readiness": readiness["status"],
             "cache_version": _get_cache_version(),
-            "last_change": datetime.fromtimestamp(_LAST_CHANGE_TIMESTAMP).isoformat() if _LAST_CHANGE_TIMESTAMP > 0 else "Never"
+            "last_change": datetime.fromtimestamp(_get_last_change_timestamp()).isoformat() if _get_last_change_timestamp() > 0 else "Never",
+            "change_detection": change_detector.status(),
         }
     except Exception as e:
-        print(f"Error calculating dashboard summary in health check: {e}")
+        print(f"Error in health check: {e}")
         return {
             "status": "healthy", 
             "message": "API is running",
-            "dashboard_summary_cached": False,
             "error": str(e)
         }
 
 
 
-SYSTEM_PROMPT_DEFAULT = (
-    """You are a data analysis assistant. You will be provided with a transcript of a call-center conversation between a Customer and an Agent (the transcript may include timestamps in `HH:MM:SS`, `MM:SS`, or plain seconds). Your job is to analyze the call and **return one single valid JSON object only** (no surrounding text, no explanation, no extra JSON objects, no comments).
-
-**Output schema (MUST be returned exactly — do not add, remove, rename, or omit any top-level keys or any nested keys shown below):**
-
-```json
-{
-  "customer_name": "<customer full name in English string not in Arabic or null if not present>",
-  "Agent_name":"<Agent full name in English string not in Arabic or null if not present>",
-  "summary": "<one paragraph consisting of exactly four sentences>",
-  "sentiment": {
-    "score": <integer 1-5>,
-    "explanation": "<why this score was chosen>"
-  },
-  "main_issues": ["<issue1>", "<issue2>", "..."],
-  "resolution": "<what the agent did or promised>",
-  "additional_notes": "<optional extra notes>",
-  "Average Handling Time (AHT)": {
-    "score": <integer seconds>,
-    "explanation": "<how you computed it; list components>"
-  },
-  "resolved": {
-    "score": <true|false>,
-    "explanation": "<why resolved is true/false>"
-  },
-  "disposition": {
-    "score": "<one of: Resolved, Escalated, Pending, Wrong Number, Other>",
-    "explanation": "<short explanation>"
-  },
-  "agent_professionalism": "<one of: Highly Professional, Professional, Needs Improvement>",
-  "Call Generated Insights": {
-    "Customer Sentiment": "<Positive|Neutral|Negative>",
-    "Call Categorization": "<Inquiry|Product/Service|Complaint|Other>",
-    "Resolution Status": "<resolved|escalated|pending|other>",
-    "Main Subject": "<short subject>",
-    "Main Topic": "<Installation and Setup Issues|Repair and Maintenance Concerns|Warranty and Replacement Queries|Product Availability and Purchase Inquiries|Customer Service and Communication Issues>",
-    "Services": "<service(s) involved>",
-    "Call Outcome": "<short outcome in one sentence>",
-    "Agent Attitude": "<1–3 concise adjectives (dynamic per call) describing the agent's demeanor, e.g. Empathetic; Efficient and Professional; Rushed and Curt>",
-    "summary": "<one paragraph consisting of exactly four sentences>",
-  },
-  "Customer Service Metrics": {
-    "FCR": {
-      "score": <true|false>,
-      "explanation": "<did this call resolve the case on first contact?>"
-    },
-    "Talk time": <integer seconds (never being 0 seconds)>,
-    "Hold time": <integer seconds (never being 0 seconds)>
-  }
-}
-````
-
-**Mandatory parsing & calculation rules (follow exactly):**
-Don't change any key names or structure. You must return all keys shown above.
-
-1. **Timestamps:** Parse timestamps in `HH:MM:SS`, `MM:SS`, or plain seconds; convert all to integer seconds before calculations. If timestamps are relative offsets, assume they are measured from call start — state this in any explanation that relies on it.
-
-2. **Talk time (`Customer Service Metrics -> "Talk time"`):**
-
-   * If utterances include start and end timestamps, compute each utterance duration as `end - start` and sum durations for Agent + Customer utterances.
-   * If only start timestamps or offsets are available, infer utterance duration conservatively (document assumptions in the relevant `"explanation"` field).
-   * Output MUST be an integer number of seconds (never 0).
-
-3. **Hold time (`Customer Service Metrics -> "Hold time"`):**
-  Never being 0 and should being calculated as:
-   * Primary detection method (preferred): Detect explicit agent "please wait" utterances in the transcript text (Arabic and English). For Arabic transcripts, detect common agent waiting phrases or words and variants such as (but not limited to):
-     "لحظة", "لحظات", "انتظر", "استنى", "استنّي", "خلي حضرتك", "هنرجع لك بعد شوي", "اسيبك على الانتظار", "معايا لحظة", "خلي حضرتك معايا لحظة", "معاك لحظة", "من فضلك انتظر", "هاخد منك لحظة", and obvious morphological variants or common colloquial spellings.
-     When an agent utterance contains such a phrase or one word and indicates an intended hold, treat the hold start as that utterance's timestamp. Treat the hold end as the timestamp when the agent next resumes speaking (i.e., next agent utterance start time) or explicitly announces the end of hold. Compute hold duration as hold_end_timestamp - hold_start_timestamp in integer seconds.
-     If the agent issues a "please wait" phrase and there is no later agent timestamp in the transcript to mark resumption, you must not output 0 for Hold time. Instead:
-
-     * If a later customer utterance exists, conservatively treat the earlier of (a) the next customer utterance start time or (b) a minimum conservative default hold duration of 5 seconds after the "please wait" timestamp — whichever yields the larger hold duration — and document this choice in the "explanation" field.
-     * If the transcript has no subsequent timestamps at all, estimate a conservative default hold duration of 5 seconds, and explain the assumption.
-* When the Agent says words such as "لحظات", "طيب لحظات", or "لحظة", you must detect and calculate the hold time until the Agent returns and resumes the conversation with the Customer. (Make sure to search across all Agent speech segments for these keywords.) so the hold time shouldn't never calculated as 0 
-   * If explicit markers are absent, infer hold from silence gaps between consecutive utterances where `gap >= 3 seconds` (gap = next_utterance_start − previous_utterance_end). Sum these inferred hold durations.
-   * Output MUST be an integer number of seconds (never 0).
- * if you detects one second or more time hold you should write it in the json in the Hold time field that number of seconds and if you detect speaking time less than the total audio time so we have a hold time that was not calculated 
-   * Prefer Arabic "please wait" detection and explicit markers over inferred silence. Always compute hold durations from timestamps and output as integer seconds (never 0). If exact timestamps are insufficient, estimate conservatively and explain assumptions concisely.
-   * Important: Prefer Arabic "please wait" detection and explicit markers over silence inference. Always compute hold durations from timestamps and output integer seconds. Never output 0 for hold time if a "please wait" utterance is present — if timestamps are missing or incomplete for the hold, estimate conservatively and explain assumptions in the relevant "explanation" fields.
-Output MUST be an integer number of seconds (never 0).
-   Example application: For the agent utterance Agent: طبعا من خلالها لحظات معايا بعد اذنك واكد مع حضرتك الطلب. — if that utterance has timestamp 00:02:10, and the agent's next utterance resumes at 00:02:45, treat hold start=130s and hold end=165s and add 35 seconds to Hold time.
-
-4. **AHT (Average Handling Time):**
-
-   * `AHT (score)` must be an integer seconds equal to `Talk time + Hold time`.
-   * Include component breakdown (e.g., `"talk_time: Xs, hold_time: Ys"`).
-
-5. **Estimations & Transparency:**
-
-   * **Never output 0** for any time metric. If exact computation is impossible, provide your best estimate and include the estimation method and assumptions inside the corresponding `"explanation"` field (one or two concise sentences).
-   * Keep explanations short and precise.
-
-6. **FCR / resolved / disposition:**
-
-   * `resolved.score` is boolean; `FCR.score` is boolean. Explain reasoning briefly in their `"explanation"` fields.
-   * `disposition.score` must be one of the allowed strings listed in the schema.
-7.Name extraction:
-
-* Detect and extract the customer’s full name in English if it appears in the transcript (introductions, agent confirmations, account details, voicemail tags, or other explicit mentions). Fill the top-level "name" field with the extracted full name string. If no clear customer name is present, set "name" to null.
-8. Summary & Call Summary:
-The "summary" field must be exactly one paragraph containing four sentences. Each sentence should be complete and concise; do not include lists, line breaks, or extra JSON objects inside this string.
-9. Agent professionalism assessment:
-
-Set "agent_professionalism" to one of exactly: "Highly Professional", "Professional", or "Needs Improvement". Base this on agent behavior (tone, helpfulness, adherence to procedure, politeness, clarity). Include brief justification where appropriate in related explanation fields (e.g., "Average Handling Time (AHT)" explanation or "additional_notes").
-
-10. Agent attitude (dynamic):
-
-For "Call Generated Insights" -> "Agent Attitude" select 1 to 3 concise adjectives or short phrases that best describe the agent's demeanor in this specific call (e.g., "Empathetic", "Efficient and Professional", "Rushed and Curt"). Do not use a fixed small set of static categories — choose descriptors dynamically based on the transcript evidence.
-
-**Formatting & behavior rules:**
-
-* Return **one and only one** valid JSON object and nothing else.
-* Do not include any non-JSON text, logs, or metadata.
-* All durations must be integers (seconds). All explanation strings should be concise (1–2 sentences).
-* If the transcript lacks timestamps entirely, produce best-effort estimates for Talk time, Hold time, and AHT, explain assumptions in the relevant `"explanation"` fields, and still return non-zero integers for time fields.
-* Do not change the schema: the JSON returned must include exactly the keys and nested keys listed above (you may change values, but not keys or structure).
-* Don't change any key names or structure. You must return all keys shown in the required Json.
-
-**Example behavior (do not output this example in your response):**
-
-* If the transcript includes explicit utterance start/end times, compute talk and hold precisely.
-* If the transcript contains `[hold] 00:01:23 - 00:01:41`, add 18 seconds to Hold time.
-* If gaps of 5–12 seconds exist and no hold markers are present, treat gaps ≥ 3 seconds as inferred hold.
-
-You are responsible for correctly calculating and returning Talk time and Hold time (in seconds) and for producing the exact JSON structure above every time. If any part of the transcript is ambiguous, estimate conservatively, document the assumption in the appropriate `"explanation"` fields, and continue — but do not modify the JSON schema.
-Don't change any key names or structure. You must return all keys shown above.
-
-
-
-"""
-)
-
-
-
-
-# Global Mongo client for connection reuse
-_mongo_client = None
-
-def _get_mongo_client() -> MongoClient | None:
-    """Create or reuse a Mongo client with optimized connection settings.
-    Uses env var MONGO_URI; falls back to provided Cosmos Mongo connection string.
-    """
-    global _mongo_client
-    
-    if _mongo_client is not None:
-        try:
-            # Test if connection is still alive
-            _mongo_client.admin.command('ping')
-            return _mongo_client
-        except Exception:
-            # Connection is dead, recreate
-            _mongo_client = None
-    
-    try:
-        uri = os.getenv("MONGO_URI") or (
-            "mongodb://elaraby:Nobq634p5m7vWAHj7OdMozizEilPLCmQbUhC9ZSiCyO7R8utvS3YuLOQp53eddGa3chb9Mrc8W9XACDbANN8og==@"
-            "elaraby.mongo.cosmos.azure.com:10255/?ssl=true&retrywrites=false&replicaSet=globaldb&maxIdleTimeMS=120000&appName=@elaraby@"
-        )
-        
-        # Optimized connection settings for better performance
-        _mongo_client = MongoClient(
-            uri,
-            maxPoolSize=10,  # Maximum number of connections in the pool
-            minPoolSize=2,   # Minimum number of connections in the pool
-            maxIdleTimeMS=30000,  # Close connections after 30 seconds of inactivity
-            connectTimeoutMS=10000,  # 10 second connection timeout
-            serverSelectionTimeoutMS=5000,  # 5 second server selection timeout
-            socketTimeoutMS=20000,  # 20 second socket timeout
-            retryWrites=False,  # Disable retry writes for Cosmos DB
-            retryReads=False,   # Disable retry reads for Cosmos DB
-        )
-        
-        # Test the connection
-        _mongo_client.admin.command('ping')
-        print("MongoDB connection established successfully")
-        return _mongo_client
-        
-    except Exception as e:
-        print(f"Mongo client init failed: {e}")
-        _mongo_client = None
-        return None
 
 
-def _get_dashboard_collection(client: MongoClient | None) -> Collection | None:
-    """Return the collection used to store dashboard summaries."""
+def _get_calls_collection() -> Collection | None:
+    """Return the collection holding one metadata document per call."""
+    client = _get_mongo_client()
     if client is None:
         return None
-    try:
-        db_name = os.getenv("MONGO_DB", "elaraby")
-        coll_name = os.getenv("MONGO_DASHBOARD_COLLECTION", "dashboard_summaries")
-        return client[db_name][coll_name]
-    except Exception as e:
-        print(f"Mongo get collection failed: {e}")
-        return None
-
-
-def mongo_upsert_dashboard_summary(summary: Dict[str, Any]) -> bool:
-    """Upsert the latest dashboard summary into Mongo for instant reads."""
-    try:
-        client = _get_mongo_client()
-        coll = _get_dashboard_collection(client)
-        if coll is None:
-            return False
-        doc = dict(summary or {})
-        doc["_id"] = "dashboard_summary_latest"
-        doc["updated_at"] = datetime.utcnow()
-        coll.replace_one({"_id": doc["_id"]}, doc, upsert=True)
-        return True
-    except PyMongoError as e:
-        print(f"Mongo upsert error: {e}")
-        return False
-    except Exception as e:
-        print(f"Mongo upsert unexpected error: {e}")
-        return False
+    db_name = os.getenv("MONGO_DB", "elaraby")
+    return client[db_name][os.getenv("MONGO_CALLS_COLLECTION", "calls")]
+
+
+# Mongo mirror of the manifest serving filtered /calls pages and facet counts
+call_store = CallStore(_get_calls_collection, call_manifest)
+call_manifest.add_listener(call_store.on_manifest_change)
+# In-memory index answering filtered queries while Mongo is unavailable, kept current per call
+call_manifest.add_listener(call_index.on_manifest_change)
+# The resolver's full listing of llmanalysis/ runs in the background only
+analysis_resolver.start()
+
+# Throttled change detection: cache hits cost a timestamp check; storage is polled at most
+# once per CHANGE_DETECTION_MIN_POLL_SECONDS and write paths invalidate explicitly. The container
+# reconcile runs in the background, once per interval across workers (lease next to the
+# dashboard recompute lease); calls it discovers get their index fields backfilled.
+change_detector = ChangeDetector(
+    call_manifest,
+    on_change=_invalidate_cache,
+    on_reconcile=lambda: _schedule_index_backfill(),
+    lease_collection_getter=lambda: _get_dashboard_collection(_get_mongo_client()),
+)
 
 
-def mongo_get_dashboard_summary() -> Dict[str, Any] | None:
-    """Fetch the latest dashboard summary from Mongo if present."""
-    try:
-        client = _get_mongo_client()
-        coll = _get_dashboard_collection(client)
-        if coll is None:
-            return None
-        doc = coll.find_one({"_id": "dashboard_summary_latest"})
-        if not doc:
-            return None
-        # Remove internal fields
-        doc.pop("_id", None)
-        return doc
-    except PyMongoError as e:
-        print(f"Mongo get error: {e}")
-        return None
-    except Exception as e:
-        print(f"Mongo get unexpected error: {e}")
-        return None
-
-def _parse_json_maybe(text: str) -> Any:
-    try:
-        return json.loads(text)
-    except Exception:
-        try:
-            start = text.find("{")
-            end = text.rfind("}") + 1
-            if start != -1 and end != -1:
-                return json.loads(text[start:end])
-        except Exception:
-            pass
-    return {"raw": text}
 # --------------------------
-# Smart event-driven cache system
+# Conditional GET (ETag / If-None-Match)
 # --------------------------
-_CACHE: Dict[str, Dict[str, Any]] = {}
-_CACHE_VERSION: str = "1.0"  # Global cache version
-_LAST_CHANGE_TIMESTAMP: float = 0  # Track when data last changed
-
-def _get_cache_version() -> str:
-    """Get current cache version based on last change timestamp."""
-    return f"{_CACHE_VERSION}_{_LAST_CHANGE_TIMESTAMP}"
-
-def _invalidate_cache() -> None:
-    """Invalidate all caches by updating the change timestamp."""
-    global _LAST_CHANGE_TIMESTAMP
-    _LAST_CHANGE_TIMESTAMP = datetime.utcnow().timestamp()
-    print(f"Cache invalidated at {datetime.utcnow().isoformat()}")
-
-def _cache_get(key: str, ttl_seconds: int = 86400) -> Any | None:  # Default 24 hours
-    """Get cached data, but check if cache version is still valid."""
-    entry = _CACHE.get(key)
-    if not entry:
-        return None
-    
-    # Check if cache version is still current
-    cached_version = entry.get("version")
-    current_version = _get_cache_version()
-    
-    if cached_version != current_version:
-        print(f"Cache version mismatch for {key}: cached={cached_version}, current={current_version}")
-        _CACHE.pop(key, None)
+# Audio SAS URLs live 60 minutes; rotating call ETags every 30 minutes means a client
+# revalidating with a 304 always keeps a URL with at least 30 minutes left.
+_SAS_ETAG_WINDOW_SECONDS = 1800
+
+def _make_etag(*parts: Any) -> str:
+    """Strong ETag derived from the version components a response depends on."""
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:32] + '"'
+
+def _not_modified(etag: str | None, cache_control: str = "no-cache"):
+    """Return a 304 response if the request's If-None-Match matches etag, else None."""
+    header = request.headers.get("If-None-Match")
+    if not etag or not header:
         return None
-    
-    # Check TTL (but with very long default)
-    ts = entry.get("ts")
-    if not isinstance(ts, float):
-        return None
-    if (datetime.utcnow().timestamp() - ts) > ttl_seconds:
-        _CACHE.pop(key, None)
+    candidates = [c.strip() for c in header.split(",")]
+    # If-None-Match uses weak comparison, so a W/ prefix added by a proxy still matches
+    if "*" not in candidates and etag not in [c[2:] if c.startswith("W/") else c for c in candidates]:
         return None
-    
-    return entry.get("data")
-
-
-def _check_blob_changes() -> bool:
-    """Check if blob storage has changed by comparing file counts and timestamps."""
-    try:
-        container = azure_storage.blob_service_client.get_container_client(azure_storage.DEFAULT_CONTAINER)
-        
-        # Get current audio files
-        audio_exts = (".mp3", ".wav", ".m4a", ".mp4")
-        audio_blobs = list(container.list_blobs(name_starts_with=f"{azure_storage.AUDIO_FOLDER}/"))
-        if not audio_blobs:
-            audio_blobs = [b for b in container.list_blobs() if any(b.name.lower().endswith(ext) for ext in audio_exts)]
-        
-        # Create a signature of current state
-        current_signature = {
-            "count": len(audio_blobs),
-            "files": sorted([b.name for b in audio_blobs]),
-            "last_modified": max([b.last_modified.timestamp() for b in audio_blobs]) if audio_blobs else 0
-        }
-        
-        # Check against cached signature
-        cached_signature = _CACHE.get("_blob_signature")
-        if cached_signature is None:
-            # First time, cache the signature
-            _CACHE["_blob_signature"] = {"data": current_signature, "ts": datetime.utcnow().timestamp(), "version": _get_cache_version()}
-            return False
-        
-        # Compare signatures
-        if cached_signature.get("data") != current_signature:
-            print(f"Blob storage changed: {cached_signature.get('data')} -> {current_signature}")
-            _invalidate_cache()
-            _CACHE["_blob_signature"] = {"data": current_signature, "ts": datetime.utcnow().timestamp(), "version": _get_cache_version()}
-            return True
-        
-        return False
-        
-    except Exception as e:
-        print(f"Error checking blob changes: {e}")
-        return False
-
-def _cache_set(key: str, value: Any) -> None:
-    """Set cached data with current version."""
-    _CACHE[key] = {
-        "data": value, 
-        "ts": datetime.utcnow().timestamp(),
-        "version": _get_cache_version()
-    }
-
-
-def save_dashboard_summary_to_blob(dashboard_data: Dict[str, Any]) -> bool:
-    """Save dashboard summary data to blob storage as JSON file."""
-    try:
-        # Add timestamp to the data
-        dashboard_data_with_timestamp = {
-            **dashboard_data,
-            "cached_at": datetime.utcnow().isoformat(),
-            "cache_version": "1.0"
-        }
-        
-        # Convert to JSON string
-        json_data = json.dumps(dashboard_data_with_timestamp, indent=2)
-        
-        # Upload to blob storage
-        azure_storage.upload_blob(
-            json_data.encode('utf-8'),
-            "dashboard_summary.json",
-            prefix="cache",
-        )
-        
-        print("Dashboard summary saved to blob storage successfully")
-        return True
-    except Exception as e:
-        print(f"Error saving dashboard summary to blob storage: {e}")
-        return False
-
-
-def load_dashboard_summary_from_blob() -> Dict[str, Any] | None:
-    """Load dashboard summary data from blob storage."""
-    try:
-        # Try to read from blob storage
-        json_content = azure_storage.read_blob(
-            "dashboard_summary.json",
-            prefix="cache",
-        )
-        
-        if json_content:
-            dashboard_data = json.loads(json_content)
-            print("Dashboard summary loaded from blob storage successfully")
-            return dashboard_data
-        else:
-            print("No dashboard summary found in blob storage")
-            return None
-            
-    except Exception as e:
-        print(f"Error loading dashboard summary from blob storage: {e}")
-        return None
-
-
-def calculate_dashboard_summary() -> Dict[str, Any]:
-    """Calculate dashboard summary data without caching."""
-    calls = list_calls()
-    summaries: List[str] = []
-    sentiment_scores: List[float] = []
-    sentiment_labels: Dict[str, int] = {}
-    dispositions: Dict[str, int] = {}
-    categories: Dict[str, int] = {}
-    resolution_status: Dict[str, int] = {}
-    subjects: Dict[str, int] = {}
-    topics: Dict[str, int] = {}
-    services: Dict[str, int] = {}
-    agent_professionalism: Dict[str, int] = {}
-    resolved_count = 0
-    aht_values: List[float] = []
-    talk_values: List[float] = []
-    hold_values: List[float] = []
-    calls_with_analysis = 0
-
-    for c in calls:
-        a = c.get("analysis") or {}
-        if isinstance(a, dict) and a.get("summary"):
-            summaries.append(a["summary"]) 
-            calls_with_analysis += 1
-            
-        # sentiment numeric (1-5)
-        s = a.get("sentiment", {})
-        if isinstance(s, dict):
-            score = s.get("score")
-            try:
-                sentiment_scores.append(float(score))
-            except Exception:
-                pass
-        # disposition counts
-        disp = a.get("disposition") or a.get("Disposition")
-        if isinstance(disp, dict):
-            dscore = disp.get("score")
-            if dscore:
-                dispositions[str(dscore)] = dispositions.get(str(dscore), 0) + 1
-        # resolved
-        resolved = a.get("resolved")
-        if isinstance(resolved, dict) and resolved.get("score") is True:
-            resolved_count += 1
-
-        # structured insights
-        structured = _extract_structured_fields(a)
-        if structured.get("customer_sentiment"):
-            lbl = str(structured["customer_sentiment"]).strip()
-            sentiment_labels[lbl] = sentiment_labels.get(lbl, 0) + 1
-        if structured.get("call_categorization"):
-            cat = str(structured["call_categorization"]).strip()
-            categories[cat] = categories.get(cat, 0) + 1
-        if structured.get("resolution_status"):
-            rs = str(structured["resolution_status"]).strip()
-            resolution_status[rs] = resolution_status.get(rs, 0) + 1
-        if structured.get("main_subject"):
-            subjects[str(structured["main_subject"]).strip()] = subjects.get(str(structured["main_subject"]).strip(), 0) + 1
-        if structured.get("main_topic"):
-            topic = str(structured["main_topic"]).strip()
-            topics[topic] = topics.get(topic, 0) + 1
-        if structured.get("services"):
-            # split on comma or semicolon into multiple services
-            sv = structured["services"]
-            if isinstance(sv, str):
-                parts = [p.strip() for p in sv.replace(";", ",").split(",") if p.strip()]
-                for p in parts:
-                    services[p] = services.get(p, 0) + 1
-            elif isinstance(sv, list):
-                for p in sv:
-                    services[str(p).strip()] = services.get(str(p).strip(), 0) + 1
-        # Agent professionalism/attitude histogram
-        if structured.get("agent_professionalism"):
-            att = str(structured.get("agent_professionalism")).strip()
-            if att:
-                agent_professionalism[att] = agent_professionalism.get(att, 0) + 1
-        # AHT and times
-        aht = structured.get("aht")
-        if isinstance(aht, dict):
-            try:
-                aht_values.append(float(aht.get("score")))
-            except Exception:
-                pass
-        if structured.get("talk_time_seconds") is not None:
-            try:
-                talk_values.append(float(structured.get("talk_time_seconds")))
-            except Exception:
-                pass
-        if structured.get("hold_time_seconds") is not None:
-            try:
-                hold_values.append(float(structured.get("hold_time_seconds")))
-            except Exception:
-                pass
+    response = app.response_class(status=304)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    return response
 
-    overall_insights = None
-    if summaries:
-        try:
-            overall_insights = azure_oai.get_insights(summaries)
-        except Exception:
-            overall_insights = None
-
-    total = len(calls)
-    avg_sentiment = sum(sentiment_scores) / len(sentiment_scores) if sentiment_scores else None
-    avg_aht = sum(aht_values) / len(aht_values) if aht_values else None
-    avg_talk = sum(talk_values) / len(talk_values) if talk_values else None
-    avg_hold = sum(hold_values) / len(hold_values) if hold_values else None
-    result = {
-        "total_calls": total,
-        "calls_with_analysis": calls_with_analysis,
-        "avg_sentiment": avg_sentiment,
-        "sentiment_labels": sentiment_labels,
-        "dispositions": dispositions,
-        "categories": categories,
-        "resolution_status": resolution_status,
-        "subjects": subjects,
-        "topics": topics,
-        "services": services,
-        "agent_professionalism": agent_professionalism,
-        "resolved_rate": (resolved_count / total) if total else None,
-        "avg_aht_seconds": avg_aht,
-        "avg_talk_seconds": avg_talk,
-        "avg_hold_seconds": avg_hold,
-        "overall_insights": overall_insights,
-    }
-    return result
+def _with_etag(response, etag: str | None, cache_control: str = "no-cache"):
+    """Attach the validator; no-cache lets clients store the body but revalidate every time."""
+    if etag:
+        response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    return response
 
 
 def clear_calls_cache() -> None:
     """Clear all calls-related cache entries using smart invalidation."""
     try:
         # Use smart invalidation instead of manual clearing
-        _invalidate_cache()
+        change_detector.notify_change("calls cache cleared")
         print("Calls cache invalidated using smart versioning")
     except Exception as e:
         print(f"Error clearing calls cache: {e}")
@@ -632,15 +229,8 @@ def refresh_calls_and_dashboard() -> Dict[str, Any]:
         # Clear calls cache to force fresh scan
         clear_calls_cache()
         
-        # Calculate fresh dashboard summary
-        dashboard_data = calculate_dashboard_summary()
-        
-        # Save updated dashboard to Mongo and Blob storage
-        try:
-            mongo_upsert_dashboard_summary(dashboard_data)
-        except Exception:
-            pass
-        save_dashboard_summary_to_blob(dashboard_data)
+        # Recalculate and publish the dashboard summary (joins a recompute already in flight)
+        dashboard_data = dashboard_recompute.run(full=True)
         
         return {
             "status": "success",
@@ -657,257 +247,101 @@ def refresh_calls_and_dashboard() -> Dict[str, Any]:
 
 
 
-def _first_analysis_for_call(call_id: str) -> tuple[Any | None, str | None]:
-    """Return (analysis_obj, blob_path) for the first analysis JSON matching call_id under llmanalysis/**."""
-    container = azure_storage.blob_service_client.get_container_client(azure_storage.DEFAULT_CONTAINER)
-    prefix = f"{azure_storage.LLM_ANALYSIS_FOLDER}/"
-    for blob in container.list_blobs(name_starts_with=prefix):
-        if not blob.name.endswith(".json"):
-            continue
-        filename = blob.name.split("/")[-1]
-        if filename.rsplit(".", 1)[0] == call_id:
-            # strip folder prefix for read_blob
-            rel = blob.name.split("/", 1)[1]
-            txt = azure_storage.read_blob(rel, prefix=azure_storage.LLM_ANALYSIS_FOLDER)
-            return (_parse_json_maybe(txt) if txt else None, blob.name)
-    return (None, None)
-
-
-def _persona_analysis_for_call(call_id: str) -> tuple[Any | None, str | None]:
-    """Return (analysis_obj, blob_path) for persona folder specifically.
-    Tries exact match, then normalized (spaces/underscores), then case-insensitive scan of persona dir.
+def _ensure_index_fields() -> int:
+    """Backfill manifest index fields for calls analysed before the fields were recorded, and
+    re-derive them for calls a listing found out of date with their analysis.
+    Calls found without an analysis get empty fields as a marker, so each call is fetched once;
+    calls whose fetch failed are left unmarked and retried by the next backfill.
     """
-    container = azure_storage.blob_service_client.get_container_client(azure_storage.DEFAULT_CONTAINER)
-    base_prefix = f"{azure_storage.LLM_ANALYSIS_FOLDER}/persona/"
-    # 1) direct read
-    for candidate in [call_id, call_id.replace(" ", "_"), call_id.replace("_", "-")]:
-        rel = f"persona/{candidate}.json"
-        txt = azure_storage.read_blob(rel, prefix=azure_storage.LLM_ANALYSIS_FOLDER)
-        if txt:
-            return (_parse_json_maybe(txt), f"{base_prefix}{candidate}.json")
-    # 2) scan persona folder
-    target_norm = call_id.lower().replace(" ", "_")
-    for blob in container.list_blobs(name_starts_with=base_prefix):
-        if not blob.name.endswith(".json"):
+    with _stale_index_lock:
+        stale = set(_stale_index_calls)
+        _stale_index_calls.clear()
+    missing = [e["call_id"] for e in call_manifest.all_entries() if "fields" not in e or e["call_id"] in stale]
+    if not missing:
+        return 0
+    filled = 0
+    for call_id, (parsed, path, err) in zip(missing, _fetch_analyses_bulk(missing)):
+        if err:
+            continue
+        if not parsed:
+            call_manifest.upsert(call_id, persist=False, fields={})
             continue
-        fname = blob.name.split("/")[-1]
-        fid = fname.rsplit(".", 1)[0]
-        if fid.lower() == target_norm or fid.lower().replace("-", "_") == target_norm:
-            rel = blob.name.split("/", 1)[1]
-            txt = azure_storage.read_blob(rel, prefix=azure_storage.LLM_ANALYSIS_FOLDER)
-            return (_parse_json_maybe(txt) if txt else None, blob.name)
-    return (None, None)
+        category, attitude = _derive_category_and_attitude(parsed)
+        call_manifest.upsert(
+            call_id,
+            persist=False,
+            has_analysis=True,
+            analysis_path=path,
+            call_category=category,
+            agent_attitude=attitude,
+            fields=_index_fields(parsed, path),
+        )
+        filled += 1
+    call_manifest.flush()
+    if filled:
+        print(f"Backfilled index fields for {filled} call(s)")
+    return filled
 
 
-def _get_ci(d: dict, keys: list[str]) -> Any:
-    if not isinstance(d, dict):
-        return None
-    lower_map = {k.lower(): k for k in d.keys()}
-    for k in keys:
-        real = lower_map.get(k.lower())
-        if real is None:
-            continue
-        val = d.get(real)
-        # unwrap dict with score if present
-        if isinstance(val, dict) and "score" in {x.lower() for x in val.keys()}:
-            # case-insensitive access to score
-            score_key = next((rk for rk in val.keys() if rk.lower() == "score"), None)
-            if score_key:
-                return val.get(score_key)
-        return val
-    return None
-
-
-def _derive_category_and_attitude(analysis: Any) -> tuple[str | None, str | None]:
-    if not isinstance(analysis, dict):
-        return None, None
-    # Prefer nested insights block if present
-    insights: dict | None = None
-    lower_map = {k.lower(): k for k in analysis.keys()}
-    for k in ["Call Generated Insights", "call_generated_insights", "generated_insights", "insights"]:
-        real = lower_map.get(k.lower())
-        if real is not None and isinstance(analysis.get(real), dict):
-            insights = analysis.get(real)  # type: ignore
-            break
-    if isinstance(insights, dict):
-        cat_from_insights = _get_ci(
-            insights,
-            [
-                "Call Categorization",
-                "call_categorization",
-                "Call Category",
-                "call_category",
-                "Main Subject",
-                "subject",
-                "Call Type",
-            ],
-        )  # type: ignore
-        att_from_insights = _get_ci(
-            insights,
-            [
-                "Agent Attitude",
-                "agent_attitude",
-                "Agent Behavior",
-                "agent_behavior",
-                "Agent Tone",
-                "agent_tone",
-                "Agents Professionalism",
-                "professionalism",
-            ],
-        )  # type: ignore
-        if cat_from_insights is not None or att_from_insights is not None:
-            return (
-                str(cat_from_insights) if cat_from_insights is not None else None,
-                str(att_from_insights) if att_from_insights is not None else None,
-            )
-    # candidates for category
-    category = _get_ci(
-        analysis,
-        [
-            "Call Categorization",
-            "call_categorization",
-            "category",
-            "call_category",
-            "Main Subject",
-            "subject",
-            "Call Type",
-        ],
-    )
-    # candidates for attitude
-    attitude = _get_ci(
-        analysis,
-        [
-            "Agent Attitude",
-            "agent_attitude",
-            "Agents Professionalism",
-            "professionalism",
-            "Agent Behavior",
-            "agent_behavior",
-            "Agent Tone",
-            "agent_tone",
-        ],
-    )
-    # fallbacks
-    if category is None:
-        # sometimes stored in disposition.score but that's really outcome; use if empty
-        category = _get_ci(analysis.get("disposition", {}) if isinstance(analysis, dict) else {}, ["score"]) or None
-    return (str(category) if category is not None else None, str(attitude) if attitude is not None else None)
+_index_backfill_lock = threading.Lock()
+# Calls whose recorded fields a listing found out of date, refreshed by the next backfill
+_stale_index_calls: set = set()
+_stale_index_lock = threading.Lock()
 
 
-def _lower_key_map(d: dict) -> dict:
-    return {k.lower(): k for k in d.keys()} if isinstance(d, dict) else {}
+def _schedule_index_backfill(stale_call_ids: List[str] | None = None) -> None:
+    """Run _ensure_index_fields in a background thread (no-op while one is already running;
+    stale_call_ids are then picked up by a later run)."""
+    if stale_call_ids:
+        with _stale_index_lock:
+            _stale_index_calls.update(stale_call_ids)
+    if not _index_backfill_lock.acquire(blocking=False):
+        return
+
+    def _run() -> None:
+        try:
+            _ensure_index_fields()
+        except Exception as e:
+            print(f"Index field backfill failed: {e}")
+        finally:
+            _index_backfill_lock.release()
 
+    threading.Thread(target=_run, name="index-backfill", daemon=True).start()
 
-def _get_nested_block(analysis: dict, candidates: list[str]) -> dict | None:
-    if not isinstance(analysis, dict):
+def _get_audio_hash_collection() -> Collection | None:
+    """Return the collection mapping audio SHA-256 hashes to call ids."""
+    client = _get_mongo_client()
+    if client is None:
         return None
-    lower_map = _lower_key_map(analysis)
-    for k in candidates:
-        real = lower_map.get(k.lower())
-        if real is not None and isinstance(analysis.get(real), dict):
-            return analysis.get(real)  # type: ignore
-    return None
+    db_name = os.getenv("MONGO_DB", "elaraby")
+    return client[db_name][os.getenv("MONGO_AUDIO_HASH_COLLECTION", "audio_hashes")]
 
 
-def _extract_structured_fields(analysis: Any) -> Dict[str, Any]:
-    """Extract fields for details view from the analysis JSON.
-    Returns a flat dict with normalized keys.
-    """
-    out: Dict[str, Any] = {
-        "customer_sentiment": None,
-        "call_categorization": None,
-        "resolution_status": None,
-        "main_subject": None,
-        "main_topic": None,
-        "services": None,
-        "call_outcome": None,
-        "agent_attitude": None,
-        "agent_professionalism": None,
-        "call_summary": None,
-        "fcr": None,
-        "aht": None,
-        "talk_time_seconds": None,
-        "hold_time_seconds": None,
-        "after_call_work_seconds": None,
-    }
-    if not isinstance(analysis, dict):
-        return out
-
-    # Insights block
-    insights = _get_nested_block(analysis, [
-        "Call Generated Insights", "call_generated_insights", "generated_insights", "insights",
-    ])
-    if isinstance(insights, dict):
-        out["customer_sentiment"] = _get_ci(insights, ["Customer Sentiment"])  # Positive/Neutral/Negative
-        out["call_categorization"] = _get_ci(insights, ["Call Categorization", "Call Category", "category"])  # Inquiry/Issue/etc
-        out["resolution_status"] = _get_ci(insights, ["Resolution Status"])  # resolved/escalated/pending
-        out["main_subject"] = _get_ci(insights, ["Main Subject", "subject"])  # text
-        out["main_topic"] = _get_ci(insights, ["Main Topic", "main_topic"])  # Installation and Setup Issues|Repair and Maintenance Concerns|etc
-        out["services"] = _get_ci(insights, ["Services"])  # text/list
-        out["call_outcome"] = _get_ci(insights, ["Call Outcome"])  # text
-        out["agent_attitude"] = _get_ci(insights, ["Agent Attitude"])  # text
-        out["agent_professionalism"] = _get_ci(insights, ["Agents Professionalism", "Agent Professionalism", "agent_professionalism", "professionalism"])  # text
-        out["call_summary"] = _get_ci(insights, ["Call Summary"]) or analysis.get("summary")
-
-    # Metrics block
-    metrics = _get_nested_block(analysis, [
-        "Customer Service Metrics", "customer_service_metrics", "metrics",
-    ])
-
-    # FCR
-    if isinstance(metrics, dict):
-        fcr = metrics.get(_lower_key_map(metrics).get("fcr"))
-        if fcr is None and "FCR" in analysis:
-            fcr = analysis.get("FCR")
-        out["fcr"] = fcr
-    else:
-        out["fcr"] = analysis.get("FCR")
-
-    # AHT
-    aht = None
-    if isinstance(metrics, dict):
-        aht = metrics.get(_lower_key_map(metrics).get("aht"))
-    if aht is None:
-        # Prefer top-level Average Handling Time (AHT)
-        aht = analysis.get("Average Handling Time (AHT)") or analysis.get("AHT")
-    out["aht"] = aht
-
-    # Talk/Hold/After-call seconds
-    # Try in metrics then top-level using common variants
-    def find_time(obj: dict, keys: list[str]):
-        if not isinstance(obj, dict):
-            return None
-        lm = _lower_key_map(obj)
-        for k in keys:
-            real = lm.get(k.lower())
-            if real is not None:
-                return obj.get(real)
-        return None
+# Stages run in this process unless UPLOAD_WORKER_THREADS=0 (upload_worker.py processes then)
+upload_worker.start()
 
-    for src in [metrics, analysis]:
-        if out["talk_time_seconds"] is None:
-            out["talk_time_seconds"] = find_time(src or {}, ["talk_time_seconds", "Talk time", "talk time", "talk_time"])  # type: ignore
-        if out["hold_time_seconds"] is None:
-            out["hold_time_seconds"] = find_time(src or {}, ["hold_time_seconds", "Hold time", "hold time", "hold_time"])  # type: ignore
-        if out["after_call_work_seconds"] is None:
-            out["after_call_work_seconds"] = find_time(src or {}, ["after_call_work_seconds", "After call work", "after_call_work"])  # type: ignore
-
-    # Fallback: derive professionalism from attitude keywords if not present
-    if not out.get("agent_professionalism"):
-        att = str(out.get("agent_attitude") or "").lower()
-        if att:
-            if any(k in att for k in ["empathetic", "helpful", "attentive", "outstanding", "excellent", "very good", "highly"]):
-                out["agent_professionalism"] = "Highly Professional"
-            elif any(k in att for k in ["defensive", "rude", "angry", "poor", "unprofessional", "needs improvement", "improve"]):
-                out["agent_professionalism"] = "Needs Improvement"
-            else:
-                out["agent_professionalism"] = "Professional"
+# Content-hash dedup: a recording already processed (or in progress) under any name is linked
+audio_registry = AudioRegistry(_get_audio_hash_collection, call_manifest)
+
+
+# A job in progress counts as a dedup target only while its record keeps being updated
+# (running jobs are touched by the lease renewer); a job left behind by a restart is not
+DEDUP_JOB_STALE_SECONDS = int(os.getenv("DEDUP_JOB_STALE_SECONDS", "600"))
+
+
+def _dedup_match(sha256: str) -> Dict[str, Any] | None:
+    """Existing call for this audio whose results exist or are being produced, else None."""
+    return audio_registry.live_match(sha256, upload_job_store.get, DEDUP_JOB_STALE_SECONDS)
 
-    return out
 
 @app.route('/upload-complete', methods=['POST', 'OPTIONS'])
 def upload_complete_pipeline() -> Dict[str, Any]:
-    """Complete pipeline: Upload → Transcribe → Analyze → Index for search"""
+    """Store the uploaded audio and enqueue one pipeline job per file (Transcribe → Diarize → Analyze → Index → Revise).
+
+    Returns 202 with the job ids; progress is reported by /jobs/<job_id>. A file whose
+    content (SHA-256) matches an existing call is linked to that call instead of being
+    reprocessed (reported with "dedup": true); ?dedup=false forces processing.
+    """
     
     # Handle OPTIONS preflight request
     if request.method == 'OPTIONS':
@@ -920,170 +354,91 @@ def upload_complete_pipeline() -> Dict[str, Any]:
         return {"status": "error", "message": "No files provided", "processed": []}
     
     files = request.files.getlist('files')
+    dedup = request.args.get("dedup", "true").strip().lower() not in ("false", "0", "no")
+    jobs: List[tuple] = []
     
     for uf in files:
         try:
             filename = uf.filename.replace(" ", "_")
-            content = uf.read()
             
-            # Step 1: Upload audio to blob storage
-            print(f"Processing {filename}: Step 1 - Uploading to blob storage...")
-            azure_storage.upload_blob(content, filename, prefix=azure_storage.AUDIO_FOLDER)
+            # Store the audio in blob storage before the job is queued; the upload is streamed
+            # as staged blocks (hashed and format-sniffed on the way), never read whole. The
+            # blocks are only committed once the file is known not to be a duplicate, so an
+            # existing blob under this name is never touched by a dedup hit.
+            print(f"Processing {filename}: Uploading to blob storage...")
+            started_at = datetime.now(timezone.utc).isoformat()
+            started = time.time()
+            stored = azure_storage.upload_stream_to_blob(uf.stream, filename, prefix=azure_storage.AUDIO_FOLDER, commit=False)
             name_no_ext = filename.rsplit(".", 1)[0]
 
-            # Provisional: immediately upsert a fresh dashboard summary so UI can read updated counts without waiting
-            try:
-                provisional_summary = calculate_dashboard_summary()
-                mongo_upsert_dashboard_summary(provisional_summary)
-            except Exception as e:
-                print(f"Warning: provisional dashboard upsert failed: {e}")
-            
-            # Step 2: Transcribe audio using Azure Speech services
-            print(f"Processing {filename}: Step 2 - Transcribing with Azure Speech...")
-            transcript = azure_transcription.transcribe_audio(filename)
-            
-            # Check if transcription failed
-            if transcript.startswith("Error:") or transcript.startswith("Audio validation failed:"):
-                print(f"Transcription failed for {filename}: {transcript}")
+            match = _dedup_match(stored["sha256"]) if dedup else None
+            if match is not None:
+                existing = match["entry"]
+                print(f"Processing {filename}: duplicate of {match['call_id']}, linked to existing results")
                 results.append({
                     "file": filename,
-                    "error": f"Transcription failed: {transcript}",
-                    "search_indexed": False,
+                    "call_id": match["call_id"],
+                    "job_id": match.get("job_id"),
+                    "status": pipeline_status(existing),
+                    "dedup": True,
+                    "duplicate_of": match["call_id"],
+                    "audio_blob": existing.get("audio_path"),
+                    "transcription_blob": f"{azure_storage.TRANSCRIPTION_FOLDER}/{match['call_id']}.txt",
+                    "revised_arabic_blob": f"{azure_storage.REVISED_ARABIC_FOLDER}/{match['call_id']}.txt",
+                    "revised_english_blob": f"{azure_storage.REVISED_ENGLISH_FOLDER}/{match['call_id']}.txt",
+                    "analysis_blob": existing.get("analysis_path"),
+                    "size_bytes": stored["size"],
+                    "sha256": stored["sha256"],
                 })
                 continue
-                
-            # Save successful transcription
-            azure_storage.upload_transcription_to_blob(name_no_ext, transcript)
-            print(f"Processing {filename}: Step 2 - Transcription completed successfully")
-            
-            # Step 2.5: Generate revised transcriptions (Arabic and English) in background
-            print(f"Processing {filename}: Step 2.5 - Generating revised transcriptions...")
-            try:
-                # This will be done after analysis to have context
-                pass  # We'll do this after step 3 to have analysis context
-            except Exception as e:
-                print(f"Note: Revised transcription generation will be done after analysis: {e}")
-            
-            # Step 3: Analyze transcript with GenAI using static system prompt
-            print(f"Processing {filename}: Step 3 - Analyzing with GenAI...")
-            analysis_raw = azure_oai.call_llm(SYSTEM_PROMPT_DEFAULT, transcript)
-            analysis_json = _parse_json_maybe(analysis_raw)
-            
-            # Save analysis to both default and persona folders for compatibility
-            azure_storage.upload_blob(
-                json.dumps(analysis_json),
-                f"default/{name_no_ext}.json",
-                prefix=azure_storage.LLM_ANALYSIS_FOLDER,
-            )
-            azure_storage.upload_blob(
-                json.dumps(analysis_json),
-                f"persona/{name_no_ext}.json",
-                prefix=azure_storage.LLM_ANALYSIS_FOLDER,
+
+            azure_storage.commit_staged_blob(stored)
+            job_id = new_job_id()
+            call_manifest.upsert(
+                name_no_ext,
+                persist=False,
+                audio_name=filename,
+                audio_path=stored["path"],
+                uploaded_at=started_at,
+                audio_sha256=stored["sha256"],
+                audio_size=stored["size"],
+                audio_format=stored["format"],
+                job_id=job_id,
             )
-            print(f"Processing {filename}: Step 3 - Analysis completed successfully")
-            
-            # Step 3.5: Generate revised transcriptions with analysis context
-            print(f"Processing {filename}: Step 3.5 - Generating revised transcriptions...")
+            audio_registry.register(stored["sha256"], name_no_ext, job_id)
+            store_stage = {
+                "started_at": started_at,
+                "finished_at": datetime.now(timezone.utc).isoformat(),
+                "duration_ms": round((time.time() - started) * 1000.0),
+                "bytes": stored["size"],
+            }
+            extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+            format_warning = None
+            if stored["format"] is None:
+                format_warning = "Unrecognized audio header"
+            elif extension and stored["format"] != extension and {stored["format"], extension} != {"mp4", "m4a"}:
+                format_warning = f"Audio header looks like {stored['format']}, not {extension}"
+
+            # Provisional: count the call right away; the burst is published once (debounced)
             try:
-                # Generate both Arabic and English revised transcriptions
-                arabic_success, english_success, revision_message = revision_service.process_single_transcription(
-                    name_no_ext, force_regenerate=False
-                )
-                
-                if arabic_success and english_success:
-                    print(f"✅ Both revised transcriptions created successfully for {filename}")
-                elif arabic_success:
-                    print(f"✅ Arabic revision created, English revision failed for {filename}")
-                elif english_success:
-                    print(f"✅ English revision created, Arabic revision failed for {filename}")
-                else:
-                    print(f"⚠️ Both revised transcriptions failed for {filename}: {revision_message}")
-                    
+                _record_call_contribution(name_no_ext)
+                dashboard_recompute.schedule()
             except Exception as e:
-                print(f"Warning: Error generating revised transcriptions for {filename}: {e}")
-                # Continue processing even if revision generation fails
-            
-            # Step 4: Update Azure AI Search index for chat functionality
-            print(f"Processing {filename}: Step 4 - Indexing for search...")
-            try:
-                # Ensure index exists and is properly configured
-                index_name = "marketing_sentiment_details"
-                
-                # Check if index exists, create if needed
-                if not azure_search.index_exists(index_name):
-                    print(f"Index '{index_name}' doesn't exist. Creating with sample document...")
-                    create_message, create_success = azure_search.create_or_update_index(index_name, analysis_json)
-                    if not create_success:
-                        print(f"Failed to create index: {create_message}")
-                        search_indexed = False
-                        # Skip to the next step since index creation failed
-                        raise Exception(f"Index creation failed: {create_message}")
-                    print(f"Index created successfully: {create_message}")
-                
-                # Get current document count before indexing
-                current_count = azure_search.get_index_document_count(index_name)
-                print(f"Current index document count: {current_count}")
-                
-                # Prepare the analysis JSON for indexing
-                analysis_payload = dict(analysis_json) if isinstance(analysis_json, dict) else {"raw": analysis_json}
-                analysis_payload.setdefault("call_id", name_no_ext)
-                analysis_payload.setdefault("id", name_no_ext)
-                
-                # Load the analysis JSON into the index using optimized method
-                message, success, indexed_doc_ids = azure_search.load_json_into_azure_search_optimized(
-                    index_name, [analysis_payload], wait_for_completion=True
-                )
-                
-                if not success:
-                    print(f"Warning: Failed to index {name_no_ext} for search: {message}")
-                    search_indexed = False
-                else:
-                    print(f"✅ Document indexing completed: {message}")
-                    search_indexed = True
-                    
-                    # Get final document count for logging
-                    final_count = azure_search.get_index_document_count(index_name)
-                    print(f"Index now contains {final_count} total documents")
-                    
-                    # Log the change in document count
-                    if final_count > current_count:
-                        print(f"📈 Added {final_count - current_count} new document(s) to index")
-                    elif final_count == current_count and current_count > 0:
-                        print(f"🔄 Document updated in existing index (count unchanged: {final_count})")
-                    else:
-                        print(f"ℹ️ Index document count: {final_count}")
-                    
-                    # Verify specific document was indexed
-                    if name_no_ext in indexed_doc_ids:
-                        print(f"✅ Document {name_no_ext} confirmed in search index")
-                    else:
-                        print(f"⚠️ Document {name_no_ext} may still be processing in background")
-                    
-                    print(f"Processing {filename}: Step 4 - Search indexing completed successfully")
-                        
-            except Exception as e:
-                print(f"Error: Search indexing failed for {name_no_ext}: {e}")
-                import traceback
-                traceback.print_exc()
-                search_indexed = False
-            
-            # Final index verification
-            final_index_count = azure_search.get_index_document_count("marketing_sentiment_details") if search_indexed else 0
-            
+                print(f"Warning: provisional dashboard update failed: {e}")
+
+            jobs.append(({"job_id": job_id, "call_id": name_no_ext, "file": filename}, store_stage))
             results.append({
                 "file": filename,
-                "transcription_blob": f"{azure_storage.TRANSCRIPTION_FOLDER}/{name_no_ext}.txt",
-                "revised_arabic_blob": f"{azure_storage.REVISED_ARABIC_FOLDER}/{name_no_ext}.txt",
-                "revised_english_blob": f"{azure_storage.REVISED_ENGLISH_FOLDER}/{name_no_ext}.txt",
-                "analysis_blob": f"{azure_storage.LLM_ANALYSIS_FOLDER}/persona/{name_no_ext}.json",
-                "search_indexed": search_indexed,
-                "index_document_count": final_index_count,
                 "call_id": name_no_ext,
+                "job_id": job_id,
+                "status": "queued",
+                "audio_blob": stored["path"],
+                "size_bytes": stored["size"],
+                "sha256": stored["sha256"],
+                "format": stored["format"],
+                "format_warning": format_warning,
+                "dedup": False,
             })
-            
-            status_msg = "successfully" if search_indexed else "with indexing issues"
-            print(f"Processing {filename}: All steps completed {status_msg} (Index count: {final_index_count})")
-            
         except Exception as e:
             # Log error but continue with other files
             error_msg = f"Error processing {uf.filename}: {str(e)}"
@@ -1093,54 +448,43 @@ def upload_complete_pipeline() -> Dict[str, Any]:
                 "error": error_msg,
                 "search_indexed": False,
             })
-    
-    # Update dashboard summary and invalidate cache after processing all files
-    try:
-        print("Updating dashboard summary and invalidating cache after file processing...")
-        
-        # Invalidate all caches immediately when files are processed
-        _invalidate_cache()
-        
-        # Calculate fresh dashboard summary
-        dashboard_data = calculate_dashboard_summary()
-        # Persist to Mongo for instant reads
+
+    new_calls = [r["call_id"] for r in results if r.get("call_id") and not r.get("dedup")]
+    # One manifest save for the whole request, before any worker process can pick up the jobs
+    call_manifest.flush()
+    for payload, store_stage in jobs:
         try:
-            mongo_ok = mongo_upsert_dashboard_summary(dashboard_data)
-            print(f"Mongo upsert dashboard summary: {mongo_ok}")
+            upload_worker.submit(payload, completed={"store": store_stage})
         except Exception as e:
-            print(f"Warning: Mongo upsert failed: {e}")
-        # Persist to Blob as secondary store
-        save_dashboard_summary_to_blob(dashboard_data)
-        
-        print("Dashboard summary updated and cache invalidated successfully")
-    except Exception as e:
-        print(f"Error updating dashboard summary: {e}")
-    
-    # Final index status summary
-    try:
-        final_index_count = azure_search.get_index_document_count("marketing_sentiment_details")
-        successfully_indexed = sum(1 for r in results if r.get("search_indexed", False))
-        total_processed = len(results)
-        
-        print(f"\n=== UPLOAD SUMMARY ===")
-        print(f"Files processed: {total_processed}")
-        print(f"Successfully indexed: {successfully_indexed}")
-        print(f"Final index document count: {final_index_count}")
-        print(f"Index status: {'✅ Healthy' if final_index_count > 0 else '❌ Empty or Issues'}")
-        
-        return {
-            "status": "ok", 
-            "processed": results,
-            "summary": {
-                "total_processed": total_processed,
-                "successfully_indexed": successfully_indexed,
-                "final_index_count": final_index_count,
-                "index_healthy": final_index_count > 0
-            }
-        }
-    except Exception as e:
-        print(f"Error generating upload summary: {e}")
-        return {"status": "ok", "processed": results}
+            print(f"Error enqueueing job for {payload['file']}: {e}")
+            for r in results:
+                if r.get("job_id") == payload["job_id"]:
+                    r["status"] = "failed"
+                    r["error"] = f"Could not enqueue job: {e}"
+    if new_calls:
+        change_detector.notify_change("upload", on_change=lambda: _invalidate_call_cache(new_calls))
+
+    return jsonify({
+        "status": "accepted",
+        "jobs": [r["job_id"] for r in results if r.get("job_id") and not r.get("dedup") and r.get("status") != "failed"],
+        "deduplicated": sum(1 for r in results if r.get("dedup")),
+        "processed": results,
+    }), 202
+
+
+@app.route('/jobs', methods=['GET'])
+def upload_pipeline_status():
+    """Upload pipeline status: job queue depth plus workers, queue depth and counters per stage."""
+    return jsonify({"status": "ok", "pipeline": upload_worker.status()})
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id: str):
+    """Status of an upload job: overall status plus status and timings per stage."""
+    job = upload_job_store.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"Job '{job_id}' not found"}), 404
+    return jsonify({"status": "ok", "job": job})
 
 
 @app.route('/upload', methods=['POST', 'OPTIONS'])
@@ -1149,99 +493,195 @@ def upload_and_process() -> Dict[str, Any]:
     return upload_complete_pipeline()
 
 
+# Background dependency probes; Blob and Mongo gate readiness, the AI services only degrade it
+health_monitor.register("blob", azure_storage.ping)
+health_monitor.register("mongo", mongo_gateway.ping)
+health_monitor.register("search", azure_search.ping, critical=False)
+health_monitor.register("openai", azure_oai.ping, critical=False)
+health_monitor.register("speech", azure_speech_batch.ping, critical=False)
+health_monitor.start()
+
+
 @app.route('/health', methods=['GET'])
+@app.route('/health/live', methods=['GET'])
 def health() -> Dict[str, Any]:
-    try:
-        azure_storage.ensure_container_exists(azure_storage.DEFAULT_CONTAINER)
-        return {"status": "ok"}
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+    """Liveness: the process is up and serving requests (no dependency calls)."""
+    return health_monitor.liveness()
+
+
+@app.route('/health/ready', methods=['GET'])
+def health_ready():
+    """Readiness: last background probe results per dependency with latency and timestamp.
+    Returns 503 while a critical dependency (Blob, Mongo) is failing or not yet probed.
+    """
+    readiness = health_monitor.readiness()
+    return jsonify(readiness), (200 if readiness["ready"] else 503)
+
+
+def _calls_etag(cache_key: str) -> str:
+    """A /calls page only changes with the manifest contents. The fingerprint is the manifest
+    blob's ETag, shared by every worker (every job and delete saves the manifest)."""
+    return _make_etag("calls", cache_key, call_manifest.fingerprint())
+
+
+def _calls_response(entries: List[Dict[str, Any]], total: int, next_cursor: str | None = None, snapshot_version: int | None = None, etag: str | None = None):
+    """Return a /calls page as JSON with paging metadata in headers:
+    X-Total-Count (matching calls), X-Next-Cursor (absent on the last page) and X-Snapshot-Version.
+    """
+    response = _with_etag(jsonify(entries), etag)
+    response.headers["X-Total-Count"] = str(total)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if snapshot_version is not None:
+        response.headers["X-Snapshot-Version"] = str(snapshot_version)
+    return response
 
 
 @app.route('/calls', methods=['GET'])
-def list_calls() -> List[Dict[str, Any]]:
+def list_calls():
+    """List calls newest-first, optionally filtered, searched and sorted server-side.
+    Query params: page, page_size, light, refresh; filters category, attitude, sentiment,
+    disposition, resolution_status, topic, professionalism (repeat or comma-separate values);
+    date_from / date_to (ISO date or timestamp); q (free-text); sort (uploaded_at, call_id,
+    sentiment_score, aht, talk_time, hold_time; prefix with '-' for descending) and order.
+    The total number of matching calls is returned in the X-Total-Count header.
+
+    Cursor paging: pass the X-Next-Cursor value of the previous response as ?cursor= to get
+    the next page of the same snapshot; uploads made after the first page do not shift rows.
+    X-Next-Cursor is only sent when more rows follow. A cursor is anchored by its upload-time
+    bound and last position, not by the manifest version it was issued at: when the manifest
+    changed in between (or another worker serves the next page), paging continues from the
+    same position at the current version, which X-Snapshot-Version reports. Calls deleted or
+    re-analysed meanwhile then drop out of (or move within) the remaining pages.
+    """
     try:
         # Query params for performance controls
         page = max(1, int(request.args.get('page', '1') or '1'))
         page_size = max(1, min(200, int(request.args.get('page_size', '100') or '100')))
         light = request.args.get('light', '0') in ('1', 'true', 'True')
         refresh = request.args.get('refresh', '0') in ('1', 'true', 'True')
-
-        cache_key = f"calls:page={page}:size={page_size}:light={int(light)}"
+        filters, options = parse_query_args(request.args)
+        filtered = not is_default_query(filters, options)
+        signature = query_signature(filters, options)
+        cursor_token = (request.args.get('cursor') or '').strip()
+        cursor = None
+        if cursor_token:
+            try:
+                cursor = decode_cursor(cursor_token)
+            except ValueError as e:
+                return jsonify({"status": "error", "message": str(e)}), 400
+            if cursor.get("q") != signature:
+                return jsonify({"status": "error", "message": "Cursor does not match the query parameters"}), 400
+
+        query_part = ""
+        if filtered:
+            query_part = ":q=" + json.dumps({"filters": filters, **options}, sort_keys=True)
+        if cursor_token:
+            query_part += f":cursor={cursor_token}"
+        cache_key = f"calls:page={page}:size={page_size}:light={int(light)}{query_part}"
         if not refresh:
-            # Check if blob storage has changed before using cache
-            blob_changed = _check_blob_changes()
+            # Throttled check for changes made by other workers or outside the API
+            blob_changed = change_detector.check()
+            # Conditional GET: answer before touching the cache or blob storage
+            not_modified = _not_modified(_calls_etag(cache_key))
+            if not_modified is not None:
+                return not_modified
             if not blob_changed:
                 # Use smart cache with long TTL (24 hours) - only invalidated on changes
                 cached = _cache_get(cache_key, ttl_seconds=86400)  # 24 hours
                 if cached is not None:
-                    return cached
-
-        # Ensure container exists
-        azure_storage.ensure_container_exists(azure_storage.DEFAULT_CONTAINER)
-
-        container = azure_storage.blob_service_client.get_container_client(azure_storage.DEFAULT_CONTAINER)
-
-        # Gather audio blobs from both the configured folder and anywhere in the container
-        audio_exts = (".mp3", ".wav", ".m4a", ".mp4")
-        audio_blobs = list(container.list_blobs(name_starts_with=f"{azure_storage.AUDIO_FOLDER}/"))
-        if not audio_blobs:
-            # Fallback: scan entire container for audio extensions
-            audio_blobs = [b for b in container.list_blobs() if any(b.name.lower().endswith(ext) for ext in audio_exts)]
-
-        # Build a minimal index first: (call_id, audio_name, uploaded_at, blob)
-        indexed: List[Dict[str, Any]] = []
-        seen_call_ids: set[str] = set()
-        for blob in audio_blobs:
-            audio_path = blob.name
-            audio_name = audio_path.split("/")[-1]
-            call_id = audio_name.rsplit(".", 1)[0]
-            if call_id in seen_call_ids:
-                continue
-            seen_call_ids.add(call_id)
-            created = getattr(blob, "creation_time", None) or getattr(blob, "last_modified", None)
-            indexed.append({
-                "call_id": call_id,
-                "audio_name": audio_name,
-                "uploaded_at": created.isoformat() if isinstance(created, datetime) else None,
-                "_blob": blob,
-            })
-
-        # newest first without loading analysis
-        indexed.sort(key=lambda x: x.get("uploaded_at") or "", reverse=True)
-
-        # Pagination window selection before any heavy I/O
+                    return _calls_response(cached["entries"], cached["total"], cached.get("next_cursor"), cached.get("snapshot_version"), etag=_calls_etag(cache_key))
+
+        # Page straight out of the persisted call manifest instead of listing the container
+        if refresh:
+            manifest_version = call_manifest.version
+            call_manifest.rebuild()
+            analysis_resolver.refresh(force=True)
+            if call_manifest.version != manifest_version:
+                change_detector.notify_change("refresh")
+                # Calls the rebuild discovered get their index fields in the background
+                _schedule_index_backfill()
         start = (page - 1) * page_size
-        end = start + page_size
-        window = indexed[start:end]
+        # A cursor pins the snapshot: the newest upload time when paging started. Its version is
+        # re-anchored to the current one (versions are per process, see the docstring)
+        snapshot_until = cursor.get("t") if cursor else call_manifest.latest_uploaded_at()
+        snapshot_version = call_manifest.version
+        last_position = None
+        if filtered:
+            # Indexed query on the Mongo calls collection (in-memory index while Mongo is unavailable);
+            # only the page window is loaded from blobs
+            if call_store.ready():
+                ranked, total = call_store.query(
+                    filters,
+                    **options,
+                    after=cursor["k"] if cursor else None,
+                    until=snapshot_until or None,
+                    skip=0 if cursor else start,
+                    limit=page_size + 1,
+                )
+                page_rows = ranked[:page_size]
+                has_more = len(ranked) > page_size
+            else:
+                ranked, total = call_index.sync(call_manifest).query(
+                    filters,
+                    **options,
+                    after=cursor["k"] if cursor else None,
+                    until=snapshot_until or None,
+                )
+                page_rows = ranked[:page_size] if cursor else ranked[start:start + page_size]
+                has_more = len(ranked) > (page_size if cursor else start + page_size)
+            window = [e for e in (call_manifest.get(cid) for cid, _ in page_rows) if e]
+            if page_rows and has_more:
+                last_id, last_value = page_rows[-1]
+                last_position = [last_value, last_id]
+        else:
+            total = call_manifest.count()
+            # One extra row tells whether a next page exists
+            if cursor:
+                window = call_manifest.page_before(cursor["k"], page_size + 1, until=snapshot_until or None)
+            else:
+                window = call_manifest.page(start, page_size + 1)
+            has_more = len(window) > page_size
+            window = window[:page_size]
+            if window and has_more:
+                last_position = [window[-1].get("uploaded_at") or "", window[-1]["call_id"]]
+        next_cursor = (
+            encode_cursor(snapshot_version, snapshot_until, last_position, signature)
+            if last_position is not None else None
+        )
+
+        # Load the window's analyses in parallel; order is preserved and slow blobs time out
+        fetched = [] if light else _fetch_analyses_concurrently([item["call_id"] for item in window])
+        failures: List[Dict[str, Any]] = []
+        stale_fields: List[str] = []
 
         entries: List[Dict[str, Any]] = []
-        for item in window:
+        for idx, item in enumerate(window):
             call_id = item["call_id"]
             audio_name = item["audio_name"]
             uploaded_at = item["uploaded_at"]
 
             parsed = None
-            first_analysis_path = None
-            category = None
-            attitude = None
+            first_analysis_path = item.get("analysis_path")
+            category = item.get("call_category")
+            attitude = item.get("agent_attitude")
 
+            fetch_error = None
             if not light:
-                # Prefer persona analysis folder
-                parsed, first_analysis_path = _persona_analysis_for_call(call_id)
-                if not parsed:
-                    # Fallback: any analysis folder
-                    parsed, first_analysis_path = _first_analysis_for_call(call_id)
-                category, attitude = _derive_category_and_attitude(parsed)
-                if (category is None or attitude is None) and not parsed:
-                    norm_id = call_id.replace(" ", "_")
-                    if norm_id != call_id:
-                        parsed, first_analysis_path = _persona_analysis_for_call(norm_id)
-                        if not parsed:
-                            parsed, first_analysis_path = _first_analysis_for_call(norm_id)
-                        c2, a2 = _derive_category_and_attitude(parsed)
-                        category = category or c2
-                        attitude = attitude or a2
+                parsed, fetched_path, fetch_error = fetched[idx]
+                if fetch_error:
+                    failures.append({"call_id": call_id, "error": fetch_error})
+                else:
+                    first_analysis_path = fetched_path
+                    category, attitude = _derive_category_and_attitude(parsed)
+                # Derived fields that disagree with the analysis are rewritten by the background
+                # backfill, so light listings and filters catch up without this read writing
+                if parsed and (
+                    not item.get("fields")
+                    or item.get("call_category") != category
+                    or item.get("agent_attitude") != attitude
+                ):
+                    stale_fields.append(call_id)
 
             entries.append({
                 "audio_name": audio_name,
@@ -1251,27 +691,77 @@ def list_calls() -> List[Dict[str, Any]]:
                 "call_category": category,
                 "agent_attitude": attitude,
                 "analysis_file": first_analysis_path,
+                **({"analysis_error": fetch_error} if fetch_error else {}),
             })
 
-        _cache_set(cache_key, entries)
-        return entries
+        if stale_fields:
+            _schedule_index_backfill(stale_fields)
+        etag = None
+        if failures:
+            # Serve the partial page but keep it out of the cache so the next request retries
+            print(f"/calls page {page}: {len(failures)} analysis fetch failure(s): {failures}")
+        else:
+            etag = _calls_etag(cache_key)
+            tags = [f"call:{e['call_id']}" for e in entries]
+            if not cursor:
+                tags.append(_OFFSET_PAGES_TAG)
+            _cache_set(cache_key, {
+                "entries": entries,
+                "total": total,
+                "next_cursor": next_cursor,
+                "snapshot_version": snapshot_version,
+            }, tags=tags)
+        return _calls_response(entries, total, next_cursor, snapshot_version, etag=etag)
     except Exception:
         # Fallback to simpler listing to avoid 500
         try:
             audios = azure_storage.list_audios()
-            return [{"audio_name": a, "call_id": a.rsplit(".", 1)[0], "uploaded_at": None, "analysis": None, "analysis_files": []} for a in audios]
+            return jsonify([{"audio_name": a, "call_id": a.rsplit(".", 1)[0], "uploaded_at": None, "analysis": None, "analysis_files": []} for a in audios])
         except Exception:
-            return []
+            return jsonify([])
+
+
+@app.route('/calls/facets', methods=['GET'])
+def call_facets():
+    """Return value -> call count for one filter field (?field=category|attitude|sentiment|
+    disposition|resolution_status|topic|professionalism|agent), honouring the other filters.
+    """
+    try:
+        filters, _options = parse_query_args(request.args)
+        field = (request.args.get("field") or "category").strip()
+        if field not in CATEGORICAL_FIELDS:
+            return jsonify({"status": "error", "message": f"field must be one of {', '.join(CATEGORICAL_FIELDS)}"}), 400
+        if call_store.ready():
+            counts = call_store.facets(field, filters)
+        else:
+            counts = call_index.sync(call_manifest).facets(field, filters)
+        return jsonify({"status": "ok", "field": field, "counts": counts})
+    except Exception as e:
+        print(f"Error in call_facets endpoint: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
 
 
 @app.route('/calls/<call_id>', methods=['GET'])
 def get_call(call_id: str) -> Dict[str, Any]:
+    # Validator from the blob ETags (HEAD requests) instead of downloading the blobs
+    manifest_entry = call_manifest.get(call_id) or {}
+    analysis_path = analysis_resolver.resolve(call_id)
+    analysis_etag = azure_storage.get_blob_etag(analysis_path) if analysis_path else None
+    etag = _make_etag(
+        "call",
+        call_id,
+        azure_storage.get_blob_etag(f"{call_id}.txt", azure_storage.TRANSCRIPTION_FOLDER),
+        analysis_etag,
+        manifest_entry.get("audio_path"),
+        int(time.time() // _SAS_ETAG_WINDOW_SECONDS),
+    )
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+
     transcript = azure_storage.read_transcription(f"{call_id}.txt")
-    # Prefer persona analysis
-    analysis, analysis_path = _persona_analysis_for_call(call_id)
-    if not analysis:
-        # Fallback to any analysis
-        analysis, analysis_path = _first_analysis_for_call(call_id)
+    # Persona analysis is preferred by the resolver; the ETag just read spares the cache a HEAD
+    analysis = analysis_cache.get(analysis_path, etag=analysis_etag) if analysis_path else None
     # SAS URL for audio streaming
     audio_sas = None
     try:
@@ -1280,14 +770,14 @@ def get_call(call_id: str) -> Dict[str, Any]:
             audio_sas = azure_storage.get_blob_sas_url_for_path(path)
     except Exception:
         audio_sas = None
-    structured = _extract_structured_fields(analysis)
-    return {
+    structured = _structured_fields(analysis, analysis_path)
+    return _with_etag(jsonify({
         "call_id": call_id,
         "audio_url": audio_sas,
         "transcript": transcript,
         "analysis": analysis,
         "insights": structured,
-    }
+    }), etag)
 
 
 def _delete_call_assets(call_id: str) -> Dict[str, Any]:
@@ -1298,6 +788,7 @@ def _delete_call_assets(call_id: str) -> Dict[str, Any]:
       - llmanalysis/default/<call_id>.json
       - llmanalysis/persona/<call_id>.json
       - Azure Search index document
+      - the call manifest entry
     Returns a dict with details of what was deleted.
     """
     deleted: Dict[str, Any] = {
@@ -1310,7 +801,8 @@ def _delete_call_assets(call_id: str) -> Dict[str, Any]:
 
     # Delete audio by resolving full path then deleting by path
     try:
-        audio_path = azure_storage.find_audio_blob_path_for_call_id(call_id)
+        manifest_entry = call_manifest.get(call_id) or {}
+        audio_path = manifest_entry.get("audio_path") or azure_storage.find_audio_blob_path_for_call_id(call_id)
         if audio_path:
             client = azure_storage.blob_service_client.get_blob_client(
                 container=azure_storage.DEFAULT_CONTAINER, blob=audio_path
@@ -1355,6 +847,16 @@ def _delete_call_assets(call_id: str) -> Dict[str, Any]:
         print(f"Error deleting call '{call_id}' from search index: {e}")
         pass
 
+    # Drop the call from the manifest and analysis map so listings stop returning it
+    analysis_resolver.forget(call_id)
+    for folder in ("default", "persona"):
+        analysis_cache.invalidate(f"{azure_storage.LLM_ANALYSIS_FOLDER}/{folder}/{call_id}.json")
+    try:
+        deleted["manifest"] = call_manifest.remove(call_id)
+    except Exception as e:
+        print(f"Error removing call '{call_id}' from call manifest: {e}")
+        deleted["manifest"] = False
+
     return deleted
 
 
@@ -1369,58 +871,18 @@ def delete_call(call_id: str) -> Dict[str, Any]:
         details = _delete_call_assets(call_id)
 
         # Force complete cache invalidation - clear all cached data
-        print("Invalidating all caches after deletion...")
-        _invalidate_cache()
-        
-        # Clear the blob signature cache to force blob change detection
-        _CACHE.pop("_blob_signature", None)
-        
-        # Force recalculation of dashboard summary (no cache usage)
-        print("Recalculating dashboard summary after deletion...")
-        dashboard_data = calculate_dashboard_summary()
-        
-        # Ensure MongoDB is updated before considering delete complete
-        mongo_success = False
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                mongo_success = mongo_upsert_dashboard_summary(dashboard_data)
-                if mongo_success:
-                    print(f"MongoDB dashboard update successful on attempt {attempt + 1}")
-                    break
-                else:
-                    print(f"MongoDB dashboard update failed on attempt {attempt + 1}")
-            except Exception as e:
-                print(f"MongoDB update error on attempt {attempt + 1}: {e}")
-            
-            if attempt < max_retries - 1:
-                import time
-                time.sleep(0.5)  # Brief pause before retry
-        
-        if not mongo_success:
-            print("WARNING: MongoDB dashboard update failed after all retries")
-            # Still continue but log the issue
-        
-        # Update blob storage cache as backup
-        try:
-            save_dashboard_summary_to_blob(dashboard_data)
-            print("Blob storage dashboard cache updated")
-        except Exception as e:
-            print(f"Blob storage update failed: {e}")
-
-        # Verify MongoDB has the updated data
-        try:
-            verification = mongo_get_dashboard_summary()
-            if verification:
-                verified_count = verification.get('total_calls', -1)
-                expected_count = dashboard_data.get('total_calls', -1)
-                print(f"MongoDB verification: expected {expected_count} calls, found {verified_count} calls")
-                if verified_count != expected_count:
-                    print("WARNING: MongoDB verification failed - counts don't match")
-            else:
-                print("WARNING: Could not verify MongoDB data after update")
-        except Exception as e:
-            print(f"MongoDB verification error: {e}")
+        print("Invalidating cached entries affected by the deletion...")
+        change_detector.notify_change("delete", on_change=lambda: _invalidate_call_cache([call_id]))
+        
+        # Retract the call's contribution from the dashboard aggregates (no blob reads)
+        print("Updating dashboard summary after deletion...")
+        dashboard_aggregates.retract(call_id)
+        dashboard_rollups.retract(call_id)
+        insights_job.mark_dirty(1)
+        # Publishing to Mongo and Blob happens in the background (debounced with other changes);
+        # the response reports the already-retracted incremental totals
+        dashboard_recompute.schedule()
+        dashboard_data = dashboard_aggregates.snapshot() or {}
 
         print(f"Call '{call_id}' deletion completed. New totals: {dashboard_data.get('total_calls', 0)} calls, {dashboard_data.get('calls_with_analysis', 0)} with analysis")
 
@@ -1431,7 +893,7 @@ def delete_call(call_id: str) -> Dict[str, Any]:
             "dashboard": {
                 "total_calls": dashboard_data.get("total_calls", 0),
                 "calls_with_analysis": dashboard_data.get("calls_with_analysis", 0),
-                "updated_at": dashboard_data.get("updated_at"),
+                "publish_pending": True,
             },
         }
     except Exception as e:
@@ -1445,49 +907,39 @@ def delete_call(call_id: str) -> Dict[str, Any]:
 @app.route('/dashboard/summary', methods=['GET'])
 def dashboard_summary() -> Dict[str, Any]:
     """Return dashboard summary strictly from MongoDB.
-    Always returns fresh data - no caching to ensure immediate updates after deletions.
+    Clients must revalidate on every request (ETag from the Mongo updated_at), so updates
+    after deletions are visible immediately while unchanged polls get a 304.
     """
     try:
         print("Dashboard summary requested - checking MongoDB for latest data...")
-        
+
+        # Conditional GET: only the updated_at stamp is read before answering 304
+        updated_at = mongo_get_dashboard_updated_at()
+        etag = _make_etag("dashboard", updated_at) if updated_at is not None else None
+        not_modified = _not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+
         # Always get fresh data from MongoDB
         mongo_doc = mongo_get_dashboard_summary()
         
         if mongo_doc is not None:
             print(f"Found dashboard data in MongoDB: {mongo_doc.get('total_calls', 0)} calls, updated at {mongo_doc.get('updated_at', 'unknown')}")
-            response = jsonify(mongo_doc)
-            # Force no caching to ensure immediate updates after deletions
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
-            return response
-
-        # Not found in Mongo: compute fresh data and persist
+            _remember_dashboard_summary(mongo_doc)
+            return _with_etag(jsonify(mongo_doc), _make_etag("dashboard", mongo_doc.get("updated_at")))
+
+        if not mongo_gateway.available():
+            # Mongo is down: serve the last known summary instead of recomputing everything
+            stale = _fallback_dashboard_summary()
+            if stale is not None:
+                return jsonify(stale)
+
+        # Not found in Mongo: compute fresh data and persist (concurrent requests share one run)
         print("No dashboard data in MongoDB - computing fresh summary...")
-        result = calculate_dashboard_summary()
-        
-        # Ensure MongoDB is updated before returning
-        try:
-            mongo_success = mongo_upsert_dashboard_summary(result)
-            if mongo_success:
-                print(f"Successfully stored fresh dashboard data in MongoDB: {result.get('total_calls', 0)} calls")
-            else:
-                print("Failed to store dashboard data in MongoDB")
-        except Exception as e:
-            print(f"Error storing dashboard data in MongoDB: {e}")
+        result = dashboard_recompute.run(full=True)
         
-        # Best-effort persist to blob as secondary store
-        try:
-            save_dashboard_summary_to_blob(result)
-        except Exception as e:
-            print(f"Error saving dashboard to blob: {e}")
-        
-        response = jsonify(result)
-        # Force no caching
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-        return response
+        updated_at = mongo_get_dashboard_updated_at()
+        return _with_etag(jsonify(result), _make_etag("dashboard", updated_at) if updated_at is not None else None)
         
     except Exception as e:
         print(f"Error in dashboard_summary endpoint: {e}")
@@ -1497,32 +949,131 @@ def dashboard_summary() -> Dict[str, Any]:
             "calls_with_analysis": 0
         }), 500
 
+@app.route('/dashboard/statistics', methods=['GET'])
+def dashboard_statistics():
+    """Return distribution statistics over all calls from the in-memory columnar table:
+    counts and means plus p50/p90/p99 of sentiment score, AHT, talk and hold time,
+    categorical histograms and cross-tabs (category x sentiment, topic x resolution,
+    professionalism x sentiment).
+    """
+    try:
+        change_detector.check()
+        etag = _make_etag("statistics", call_manifest.fingerprint())
+        not_modified = _not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+        return _with_etag(jsonify(_call_statistics()), etag)
+    except Exception as e:
+        print(f"Error in dashboard_statistics endpoint: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/dashboard/history', methods=['GET'])
+def dashboard_history():
+    """Return past dashboard summaries, newest first.
+    Query: limit (default 30, max 500) and fields (comma-separated, e.g. total_calls,avg_sentiment).
+    """
+    try:
+        limit = max(1, min(int(request.args.get("limit", 30)), 500))
+        fields = [f.strip() for f in (request.args.get("fields") or "").split(",") if f.strip()]
+        return jsonify({"status": "ok", "history": mongo_get_dashboard_history(limit, fields or None)})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        print(f"Error in dashboard_history endpoint: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+def _rollup_query_args() -> Dict[str, Any]:
+    """Shared date range and dimension filters (?category=a,b&agent=...) of the rollup endpoints."""
+    filters = {}
+    for dim in ROLLUP_DIMENSIONS:
+        values = [v.strip() for raw in request.args.getlist(dim) for v in raw.split(",") if v.strip()]
+        if values:
+            filters[dim] = values
+    return {
+        "date_from": request.args.get("from") or None,
+        "date_to": request.args.get("to") or None,
+        "filters": filters,
+    }
+
+
+def _ensure_rollups() -> None:
+    # First use after deployment: backfill the rollups with one full recompute
+    if not dashboard_rollups.is_ready():
+        dashboard_recompute.run(full=True)
+
+
+@app.route('/dashboard/timeseries', methods=['GET'])
+def dashboard_timeseries():
+    """Return call counts and averages per period from the precomputed rollups.
+    Query: grain=day|week|month, from/to (YYYY-MM-DD), group_by=category|topic|agent|disposition,
+    and filters on the same dimensions (comma-separated values).
+    """
+    try:
+        _ensure_rollups()
+        grain = request.args.get("grain", "day")
+        group_by = request.args.get("group_by") or None
+        args = _rollup_query_args()
+        series = dashboard_rollups.timeseries(grain=grain, group_by=group_by, **args)
+        return jsonify({"grain": grain, "group_by": group_by, **args, "series": series})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        print(f"Error in dashboard_timeseries endpoint: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/dashboard/breakdown', methods=['GET'])
+def dashboard_breakdown():
+    """Return call counts and averages per value of one dimension over a date range.
+    Query: by=category|topic|agent|disposition (default agent), from/to (YYYY-MM-DD),
+    grain=day|week|month (resolution of the date range, default day) and dimension filters.
+    """
+    try:
+        _ensure_rollups()
+        by = request.args.get("by", "agent")
+        grain = request.args.get("grain", "day")
+        args = _rollup_query_args()
+        rows = dashboard_rollups.breakdown(by, grain=grain, **args)
+        return jsonify({"by": by, "grain": grain, **args, "rows": rows})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        print(f"Error in dashboard_breakdown endpoint: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
 @app.route('/insights', methods=['GET'])
 def get_insights() -> Dict[str, Any]:
     """Return precomputed overall insights directly from MongoDB without regeneration."""
     try:
-        doc = mongo_get_dashboard_summary()
+        updated_at = mongo_get_dashboard_updated_at()
+        if updated_at is not None:
+            not_modified = _not_modified(_make_etag("insights", updated_at), cache_control="public, max-age=60")
+            if not_modified is not None:
+                return not_modified
+
+        doc = mongo_get_dashboard_summary(fields=["total_calls", "calls_with_analysis", "updated_at"])
+        if doc is None and not mongo_gateway.available():
+            # Mongo is down: answer from the last known summary
+            doc = _fallback_dashboard_summary()
         if doc is None:
             # Bootstrap by computing once, persisting, then returning
-            summary = calculate_dashboard_summary()
-            try:
-                mongo_upsert_dashboard_summary(summary)
-            except Exception:
-                pass
-            doc = summary
+            doc = dashboard_recompute.run(full=True)
         
         result = {
             "status": "ok",
             "comprehensive_insights": doc.get("overall_insights"),
+            "insights_generated_at": doc.get("insights_generated_at"),
+            "insights_stale": bool(doc.get("insights_stale")),
             "total_calls": doc.get("total_calls", 0),
             "summaries_found": doc.get("calls_with_analysis", 0),
         }
         
-        response = jsonify(result)
-        # Add caching headers for better performance
-        response.headers['Cache-Control'] = 'public, max-age=60'  # Cache for 1 minute
-        response.headers['ETag'] = f'"{doc.get("updated_at", "unknown")}"'
-        return response
+        # Cache for 1 minute, then revalidate against the Mongo updated_at
+        etag = _make_etag("insights", doc.get("updated_at")) if doc.get("updated_at") is not None else None
+        return _with_etag(jsonify(result), etag, cache_control="public, max-age=60")
         
     except Exception as e:
         result = {
@@ -1845,14 +1396,14 @@ def diagnose_mongo() -> Dict[str, Any]:
                 "collection": coll_name,
             }
 
-        # Try to fetch the latest summary
-        doc = coll.find_one({"_id": "dashboard_summary_latest"})
+        # Try to fetch the latest summary (without the bulky statistics)
+        projection = {"statistics": 0, **{k: 0 for k in _INSIGHT_FIELDS}}
+        doc = coll.find_one({"_id": _SUMMARY_ID}, projection)
         created = False
         if not doc:
             # Compute and upsert fresh summary
-            fresh = calculate_dashboard_summary()
-            mongo_upsert_dashboard_summary(fresh)
-            doc = coll.find_one({"_id": "dashboard_summary_latest"})
+            dashboard_recompute.run(full=True)
+            doc = coll.find_one({"_id": _SUMMARY_ID}, projection)
             created = True
 
         if not doc:
@@ -1893,7 +1444,7 @@ def diagnose_mongo() -> Dict[str, Any]:
             "mongo_uri": uri,
             "db": db_name,
             "collection": coll_name,
-            "document_id": doc.get("_id", "dashboard_summary_latest"),
+            "document_id": doc.get("_id", _SUMMARY_ID),
             "updated_at": str(doc.get("updated_at")),
             "summary_compact": compact,
         }
@@ -1913,13 +1464,10 @@ def refresh_dashboard_cache() -> Dict[str, Any]:
     try:
         print("Manually refreshing dashboard summary cache...")
         
-        # Calculate fresh dashboard summary
-        dashboard_data = calculate_dashboard_summary()
+        # Recalculate and publish to Mongo and blob storage
+        dashboard_data = dashboard_recompute.run(full=True)
         
-        # Save to blob storage
-        success = save_dashboard_summary_to_blob(dashboard_data)
-        
-        if success:
+        if dashboard_data is not None:
             return {
                 "status": "success",
                 "message": "Dashboard summary cache refreshed successfully",
@@ -1960,7 +1508,7 @@ def invalidate_cache_endpoint() -> Dict[str, Any]:
         print("Manually invalidating all caches...")
         
         # Invalidate all caches using smart versioning
-        _invalidate_cache()
+        change_detector.notify_change("manual invalidation")
         
         return {
             "status": "success",
@@ -1976,6 +1524,26 @@ def invalidate_cache_endpoint() -> Dict[str, Any]:
         }
 
 
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats() -> Dict[str, Any]:
+    """Report cache size, hit/miss/eviction counters, the manifest's unsaved backlog, change-detection and insights job status."""
+    return {
+        "status": "ok",
+        "cache": _CACHE.stats(),
+        "analysis_cache": analysis_cache.stats(),
+        "cache_version": _get_cache_version(),
+        "call_manifest": call_manifest.status(),
+        "change_detection": change_detector.status(),
+        "insights_job": insights_job.status(),
+        "insights_engine": insights_engine.status(),
+        "dashboard_recompute": dashboard_recompute.status(),
+        "call_store": call_store.status(),
+        "mongo": mongo_gateway.status(),
+        "upload_worker": upload_worker.status(),
+        "audio_registry": audio_registry.status(),
+    }
+
+
 @app.route('/force-refresh-all', methods=['POST', 'OPTIONS'])
 def force_refresh_all() -> Dict[str, Any]:
     """Force refresh all caches and data - use after uploads or deletions."""
@@ -1986,16 +1554,13 @@ def force_refresh_all() -> Dict[str, Any]:
     try:
         print("Force refreshing all caches and data...")
         
-        # Invalidate all caches using smart versioning
-        _invalidate_cache()
+        # Reconcile the call manifest with blob storage, then invalidate all caches
+        call_manifest.rebuild()
+        analysis_resolver.refresh(force=True)
+        change_detector.notify_change("force refresh")
         
-        # Calculate fresh dashboard summary
-        dashboard_data = calculate_dashboard_summary()
-        try:
-            mongo_upsert_dashboard_summary(dashboard_data)
-        except Exception:
-            pass
-        save_dashboard_summary_to_blob(dashboard_data)
+        # Recalculate and publish the dashboard summary
+        dashboard_data = dashboard_recompute.run(full=True)
         
         return {
             "status": "success",
@@ -2023,8 +1588,8 @@ def reindex_all_calls() -> Dict[str, Any]:
     try:
         print("Starting re-indexing of all existing calls...")
         
-        # Get all calls from the container
-        calls = list_calls()
+        # Get all calls from the manifest with their analyses
+        calls = _all_calls_with_analysis()
         if not calls:
             return {
                 "status": "no_calls",
@@ -2110,8 +1675,7 @@ def reindex_all_calls() -> Dict[str, Any]:
                 # Clear caches after successful reindexing
                 try:
                     clear_calls_cache()
-                    dashboard_data = calculate_dashboard_summary()
-                    save_dashboard_summary_to_blob(dashboard_data)
+                    dashboard_recompute.run(full=True)
                     print("Caches cleared after reindexing")
                 except Exception as e:
                     print(f"Warning: Could not clear caches after reindexing: {e}")
@@ -2198,7 +1762,7 @@ def create_revised_arabic_transcription():
                 # Get call analysis for context
                 call_analysis = None
                 try:
-                    call_analysis = azure_storage.read_llm_analysis("persona", f"{call_id}.json")
+                    call_analysis = analysis_cache.read_llm_analysis("persona", f"{call_id}.json")
                 except:
                     pass
                 
@@ -2296,7 +1860,7 @@ def create_revised_english_transcription():
                 # Get call analysis for context
                 call_analysis = None
                 try:
-                    call_analysis = azure_storage.read_llm_analysis("persona", f"{call_id}.json")
+                    call_analysis = analysis_cache.read_llm_analysis("persona", f"{call_id}.json")
                 except:
                     pass
                 
@@ -2419,6 +1983,20 @@ def get_revised_transcriptions(call_id: str):
     This endpoint is designed for the CallDetails page with three tabs.
     """
     try:
+        # Validator from the three blob ETags (HEAD requests) before downloading any text
+        blob_etags = [
+            azure_storage.get_blob_etag(f"{call_id}.txt", folder)
+            for folder in (
+                azure_storage.TRANSCRIPTION_FOLDER,
+                azure_storage.REVISED_ARABIC_FOLDER,
+                azure_storage.REVISED_ENGLISH_FOLDER,
+            )
+        ]
+        etag = _make_etag("transcriptions", call_id, blob_etags) if any(blob_etags) else None
+        not_modified = _not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+
         result = {
             "call_id": call_id,
             "transcriptions": {},
@@ -2459,7 +2037,7 @@ def get_revised_transcriptions(call_id: str):
             }, 404
         
         result["status"] = "success"
-        return result
+        return _with_etag(jsonify(result), etag)
         
     except Exception as e:
         return {
@@ -2468,5 +2046,10 @@ def get_revised_transcriptions(call_id: str):
         }, 500
 
 
+# One-time backfill of index fields for calls recorded before the fields existed
+_schedule_index_backfill()
+change_detector.start()
+
+
 if __name__ == "__main__":
     app.run(debug=True)
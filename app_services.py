@@ -0,0 +1,1001 @@
+"""
+App Services
+
+Service wiring shared by the API (app.py) and the standalone upload worker
+(upload_worker.py): the Mongo gateway and collections, the dashboard summary,
+aggregate, rollup and insights stores, the dashboard recompute coordinator, the
+shared response cache, the analysis fetch pools and the fields derived from an
+analysis. Importing this module starts no background threads; app.py starts the
+API's own (health probes, resolver listing, change detection, backfills).
+"""
+
+from typing import List, Dict, Any
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from services import azure_storage
+from call_manifest import call_manifest
+from call_table import call_table
+from cache_store import VersionedCache, create_backend
+from dashboard_aggregates import DashboardAggregates, build_summary, empty_contribution, merge_contribution
+from dashboard_rollups import DashboardRollups
+from dashboard_recompute import RecomputeCoordinator
+from insights_job import InsightsJob
+from insights_engine import InsightsEngine
+from analysis_resolver import analysis_resolver
+from analysis_cache import analysis_cache
+from pymongo import MongoClient
+from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
+from mongo_gateway import MongoGateway
+
+
+def _mongo_uri() -> str:
+    """Uses env var MONGO_URI; falls back to provided Cosmos Mongo connection string."""
+    return os.getenv("MONGO_URI") or (
+        "mongodb://elaraby:Nobq634p5m7vWAHj7OdMozizEilPLCmQbUhC9ZSiCyO7R8utvS3YuLOQp53eddGa3chb9Mrc8W9XACDbANN8og==@"
+        "elaraby.mongo.cosmos.azure.com:10255/?ssl=true&retrywrites=false&replicaSet=globaldb&maxIdleTimeMS=120000&appName=@elaraby@"
+    )
+
+
+# One long-lived client/pool behind a health monitor and circuit breaker
+mongo_gateway = MongoGateway(
+    _mongo_uri,
+    client_options={
+        "maxPoolSize": 10,  # Maximum number of connections in the pool
+        "minPoolSize": 2,   # Minimum number of connections in the pool
+        "maxIdleTimeMS": 30000,  # Close connections after 30 seconds of inactivity
+        "connectTimeoutMS": 10000,  # 10 second connection timeout
+        "serverSelectionTimeoutMS": 5000,  # 5 second server selection timeout
+        "socketTimeoutMS": 20000,  # 20 second socket timeout
+        "retryWrites": False,  # Disable retry writes for Cosmos DB
+        "retryReads": False,   # Disable retry reads for Cosmos DB
+    },
+)
+
+
+def _get_mongo_client() -> MongoClient | None:
+    """Return the shared Mongo client, or None right away while the circuit breaker is open."""
+    return mongo_gateway.client()
+
+
+def _get_dashboard_collection(client: MongoClient | None) -> Collection | None:
+    """Return the collection used to store dashboard summaries."""
+    if client is None:
+        return None
+    try:
+        db_name = os.getenv("MONGO_DB", "elaraby")
+        coll_name = os.getenv("MONGO_DASHBOARD_COLLECTION", "dashboard_summaries")
+        return client[db_name][coll_name]
+    except Exception as e:
+        print(f"Mongo get collection failed: {e}")
+        return None
+
+
+# Incremental dashboard counters live next to the summary document
+dashboard_aggregates = DashboardAggregates(lambda: _get_dashboard_collection(_get_mongo_client()))
+
+
+def _get_rollup_collection() -> Collection | None:
+    """Return the collection holding the time x category x agent rollups."""
+    client = _get_mongo_client()
+    if client is None:
+        return None
+    db_name = os.getenv("MONGO_DB", "elaraby")
+    return client[db_name][os.getenv("MONGO_ROLLUP_COLLECTION", "dashboard_rollups")]
+
+
+# Day/week/month rollups behind /dashboard/timeseries and /dashboard/breakdown
+dashboard_rollups = DashboardRollups(_get_rollup_collection)
+
+
+_SUMMARY_ID = "dashboard_summary_latest"
+# Insights live in their own document so counter reads and writes never move the report text
+_INSIGHTS_ID = "dashboard_insights_latest"
+# Written only by the background insights job (insights_stale also by summary publishes)
+_INSIGHT_FIELDS = ("overall_insights", "insights_generated_at", "insights_digest", "insights_summary_count", "insights_stale")
+# Kept on the latest summary but left out of the history snapshots
+_HISTORY_EXCLUDED_FIELDS = ("statistics",)
+_history_indexes_ready = False
+
+
+def _get_dashboard_history_collection(client: MongoClient | None) -> Collection | None:
+    """Return the append-only collection of past dashboard summaries."""
+    global _history_indexes_ready
+    if client is None:
+        return None
+    try:
+        db_name = os.getenv("MONGO_DB", "elaraby")
+        coll = client[db_name][os.getenv("MONGO_DASHBOARD_HISTORY_COLLECTION", "dashboard_history")]
+        if not _history_indexes_ready:
+            ttl_days = int(os.getenv("DASHBOARD_HISTORY_TTL_DAYS", "90"))
+            coll.create_index("created_at", expireAfterSeconds=ttl_days * 86400)
+            _history_indexes_ready = True
+        return coll
+    except Exception as e:
+        print(f"Mongo get history collection failed: {e}")
+        return None
+
+
+def mongo_upsert_dashboard_summary(summary: Dict[str, Any]) -> bool:
+    """Upsert the latest dashboard summary into Mongo for instant reads and append it to the history."""
+    try:
+        client = _get_mongo_client()
+        coll = _get_dashboard_collection(client)
+        if coll is None:
+            return False
+        now = datetime.utcnow()
+        doc = {k: v for k, v in (summary or {}).items() if k not in _INSIGHT_FIELDS and k != "_id"}
+        doc["updated_at"] = now
+        # $unset drops insight fields left on the summary document by older versions
+        coll.update_one(
+            {"_id": _SUMMARY_ID},
+            {"$set": doc, "$unset": {k: "" for k in _INSIGHT_FIELDS}},
+            upsert=True,
+        )
+        if "insights_stale" in (summary or {}):
+            coll.update_one({"_id": _INSIGHTS_ID}, {"$set": {"insights_stale": bool(summary["insights_stale"])}}, upsert=True)
+        try:
+            history = _get_dashboard_history_collection(client)
+            if history is not None:
+                snapshot = {k: v for k, v in doc.items() if k not in _HISTORY_EXCLUDED_FIELDS and k != "updated_at"}
+                history.insert_one({**snapshot, "created_at": now})
+        except Exception as e:
+            print(f"Mongo history insert failed: {e}")
+        return True
+    except PyMongoError as e:
+        mongo_gateway.record_error(e)
+        print(f"Mongo upsert error: {e}")
+        return False
+    except Exception as e:
+        print(f"Mongo upsert unexpected error: {e}")
+        return False
+
+
+def mongo_get_dashboard_updated_at() -> Any | None:
+    """Fetch only the newest updated_at of the summary and insights documents (for ETags)."""
+    try:
+        client = _get_mongo_client()
+        coll = _get_dashboard_collection(client)
+        if coll is None:
+            return None
+        docs = coll.find({"_id": {"$in": [_SUMMARY_ID, _INSIGHTS_ID]}}, {"updated_at": 1})
+        stamps = [d["updated_at"] for d in docs if d.get("updated_at") is not None]
+        return max(stamps) if stamps else None
+    except Exception as e:
+        print(f"Mongo get updated_at error: {e}")
+        return None
+
+
+def mongo_get_dashboard_insights() -> Dict[str, Any]:
+    """Fetch only the stored insights and their generation metadata."""
+    try:
+        coll = _get_dashboard_collection(_get_mongo_client())
+        if coll is None:
+            return {}
+        projection = {k: 1 for k in _INSIGHT_FIELDS + ("updated_at",)}
+        doc = coll.find_one({"_id": _INSIGHTS_ID}, projection)
+        if doc is None:
+            # Written by an older version: insights still on the summary document
+            doc = coll.find_one({"_id": _SUMMARY_ID}, {k: 1 for k in _INSIGHT_FIELDS}) or {}
+            doc.pop("updated_at", None)
+        doc.pop("_id", None)
+        return doc
+    except Exception as e:
+        print(f"Mongo get insights error: {e}")
+        return {}
+
+
+def mongo_store_dashboard_insights(insights: Any, meta: Dict[str, Any]) -> None:
+    """Persist insights produced by the background job (insights=None only clears the stale flag)."""
+    coll = _get_dashboard_collection(_get_mongo_client())
+    if coll is None:
+        raise RuntimeError("Mongo unavailable")
+    update: Dict[str, Any] = {"insights_stale": False, "updated_at": datetime.utcnow()}
+    if insights is not None or "generated_at" in meta:
+        update.update({
+            "overall_insights": insights,
+            "insights_generated_at": meta.get("generated_at"),
+            "insights_digest": meta.get("digest"),
+            "insights_summary_count": meta.get("summary_count"),
+        })
+    coll.update_one({"_id": _INSIGHTS_ID}, {"$set": update}, upsert=True)
+
+
+def mongo_get_dashboard_summary(fields: List[str] | None = None, include_insights: bool = True) -> Dict[str, Any] | None:
+    """Fetch the latest dashboard summary from Mongo if present.
+    fields projects the summary document to just those fields; include_insights adds the
+    insights document (and makes updated_at the newer of the two stamps).
+    """
+    try:
+        client = _get_mongo_client()
+        coll = _get_dashboard_collection(client)
+        if coll is None:
+            return None
+        projection = {k: 1 for k in fields} if fields else {k: 0 for k in _INSIGHT_FIELDS}
+        doc = coll.find_one({"_id": _SUMMARY_ID}, projection)
+        if not doc:
+            return None
+        # Remove internal fields
+        doc.pop("_id", None)
+        if include_insights:
+            insights = mongo_get_dashboard_insights()
+            stamps = [t for t in (doc.get("updated_at"), insights.pop("updated_at", None)) if t is not None]
+            doc.update(insights)
+            if stamps:
+                doc["updated_at"] = max(stamps)
+        return doc
+    except PyMongoError as e:
+        mongo_gateway.record_error(e)
+        print(f"Mongo get error: {e}")
+        return None
+    except Exception as e:
+        print(f"Mongo get unexpected error: {e}")
+        return None
+
+
+def mongo_get_dashboard_history(limit: int = 30, fields: List[str] | None = None) -> List[Dict[str, Any]]:
+    """Return the most recent dashboard history snapshots (newest first), optionally projected."""
+    history = _get_dashboard_history_collection(_get_mongo_client())
+    if history is None:
+        return []
+    projection: Dict[str, Any] = {"_id": 0}
+    if fields:
+        projection.update({k: 1 for k in fields})
+        projection["created_at"] = 1
+    return list(history.find({}, projection).sort("created_at", -1).limit(limit))
+
+
+# --------------------------
+# Smart event-driven cache system
+# --------------------------
+def _get_cache_collection() -> Collection | None:
+    """Return the collection holding shared cache entries (CACHE_BACKEND=mongo)."""
+    client = _get_mongo_client()
+    if client is None:
+        return None
+    db_name = os.getenv("MONGO_DB", "elaraby")
+    return client[db_name][os.getenv("MONGO_CACHE_COLLECTION", "api_cache")]
+
+
+def _get_cache_stamp_collection() -> Collection | None:
+    """Return the collection holding the cache version stamp shared by every worker."""
+    client = _get_mongo_client()
+    if client is None:
+        return None
+    db_name = os.getenv("MONGO_DB", "elaraby")
+    return client[db_name][os.getenv("MONGO_CACHE_STAMP_COLLECTION", "cache_stamps")]
+
+# Backend chosen by CACHE_BACKEND (memory | disk | mongo). The version stamp has a collection of
+# its own so an invalidation on any worker reaches every worker and node without touching the
+# dashboard summaries or being cleared along with the cache entries.
+_CACHE = VersionedCache(
+    create_backend(mongo_collection_getter=_get_cache_collection),
+    stamp_collection_getter=_get_cache_stamp_collection,
+)
+_CACHE_VERSION: str = "1.0"  # Global cache version
+_LAST_CHANGE_TIMESTAMP: float = 0  # Track when data last changed
+
+# Tag carried by offset-paged listings; their rows shift whenever a call is added or removed
+_OFFSET_PAGES_TAG = "calls:offset"
+
+def _get_cache_version() -> str:
+    """Get current cache version based on last change timestamp."""
+    return f"{_CACHE_VERSION}_{_LAST_CHANGE_TIMESTAMP}"
+
+def _get_last_change_timestamp() -> float:
+    """Time of this process's last cache invalidation (0 if none yet)."""
+    return _LAST_CHANGE_TIMESTAMP
+
+def _mark_changed() -> None:
+    global _LAST_CHANGE_TIMESTAMP
+    _LAST_CHANGE_TIMESTAMP = datetime.utcnow().timestamp()
+
+def _invalidate_cache() -> None:
+    """Invalidate all cached call listings (used when the scope of a change is unknown)."""
+    _mark_changed()
+    dropped = _CACHE.invalidate_namespace("calls")
+    print(f"Cache invalidated at {datetime.utcnow().isoformat()} ({dropped} entries dropped)")
+
+def _invalidate_call_cache(call_ids: List[str]) -> None:
+    """Invalidate only what a change to call_ids can affect: entries containing those calls
+    plus offset-paged listings (whose rows shift). Cursor pages of other calls stay cached.
+    """
+    _mark_changed()
+    dropped = _CACHE.invalidate_tags([_OFFSET_PAGES_TAG] + [f"call:{call_id}" for call_id in call_ids], namespace="calls")
+    print(f"Cache invalidated for {len(call_ids)} call(s) at {datetime.utcnow().isoformat()} ({dropped} entries dropped)")
+
+def _cache_get(key: str, ttl_seconds: int = 86400) -> Any | None:  # Default 24 hours
+    """Get cached data if present and younger than ttl_seconds."""
+    return _CACHE.get(key, ttl_seconds=ttl_seconds)
+
+
+# The columnar statistics table follows every per-call manifest change
+call_manifest.add_listener(call_table.on_manifest_change)
+# Analysis paths recorded by any process reach the resolver through the manifest
+call_manifest.add_listener(analysis_resolver.on_manifest_change)
+
+
+def _cache_set(key: str, value: Any, tags: List[str] | None = None) -> None:
+    """Set cached data; tags let later writes invalidate just the entries they affect."""
+    _CACHE.set(key, value, tags=tags or ())
+
+
+def save_dashboard_summary_to_blob(dashboard_data: Dict[str, Any]) -> bool:
+    """Save dashboard summary data to blob storage as JSON file."""
+    try:
+        # Add timestamp to the data
+        dashboard_data_with_timestamp = {
+            **dashboard_data,
+            "cached_at": datetime.utcnow().isoformat(),
+            "cache_version": "1.0"
+        }
+        
+        # Convert to JSON string
+        json_data = json.dumps(dashboard_data_with_timestamp, indent=2)
+        
+        # Upload to blob storage
+        azure_storage.upload_blob(
+            json_data.encode('utf-8'),
+            "dashboard_summary.json",
+            prefix="cache",
+        )
+        
+        print("Dashboard summary saved to blob storage successfully")
+        return True
+    except Exception as e:
+        print(f"Error saving dashboard summary to blob storage: {e}")
+        return False
+
+
+# Last known dashboard summary, served (flagged stale) while Mongo is unavailable
+_STALE_DASHBOARD: Dict[str, Any] = {"data": None, "loaded_at": 0.0, "refreshing": False}
+_STALE_DASHBOARD_LOCK = threading.Lock()
+
+
+def _remember_dashboard_summary(summary: Dict[str, Any] | None) -> None:
+    if summary:
+        with _STALE_DASHBOARD_LOCK:
+            _STALE_DASHBOARD["data"] = summary
+            _STALE_DASHBOARD["loaded_at"] = time.time()
+
+
+def _fallback_dashboard_summary() -> Dict[str, Any] | None:
+    """Stale-while-revalidate over the blob copy: return the last known summary immediately and
+    re-read the blob in the background once it is older than DASHBOARD_FALLBACK_MAX_AGE_SECONDS.
+    """
+    max_age = float(os.getenv("DASHBOARD_FALLBACK_MAX_AGE_SECONDS", "60"))
+    with _STALE_DASHBOARD_LOCK:
+        data = _STALE_DASHBOARD["data"]
+        expired = time.time() - _STALE_DASHBOARD["loaded_at"] > max_age
+        revalidate = data is not None and expired and not _STALE_DASHBOARD["refreshing"]
+        if revalidate:
+            _STALE_DASHBOARD["refreshing"] = True
+    if data is None:
+        # Nothing cached yet: this first read has to wait for the blob
+        data = load_dashboard_summary_from_blob()
+        _remember_dashboard_summary(data)
+    elif revalidate:
+        def _refresh() -> None:
+            try:
+                _remember_dashboard_summary(load_dashboard_summary_from_blob())
+            finally:
+                _STALE_DASHBOARD["refreshing"] = False
+        threading.Thread(target=_refresh, name="dashboard-fallback-refresh", daemon=True).start()
+    if data is None:
+        return None
+    return {**data, "stale": True, "source": "blob"}
+
+
+def load_dashboard_summary_from_blob() -> Dict[str, Any] | None:
+    """Load dashboard summary data from blob storage."""
+    try:
+        # Try to read from blob storage
+        json_content = azure_storage.read_blob(
+            "dashboard_summary.json",
+            prefix="cache",
+        )
+        
+        if json_content:
+            dashboard_data = json.loads(json_content)
+            print("Dashboard summary loaded from blob storage successfully")
+            return dashboard_data
+        else:
+            print("No dashboard summary found in blob storage")
+            return None
+            
+    except Exception as e:
+        print(f"Error loading dashboard summary from blob storage: {e}")
+        return None
+
+
+def _call_contribution(analysis: Any, analysis_file: str | None = None) -> Dict[str, Any]:
+    """Return one call's share of the dashboard counters and histograms (see dashboard_aggregates)."""
+    contribution = empty_contribution()
+    counters = contribution["counters"]
+    hist = contribution["histograms"]
+    counters["total_calls"] = 1
+
+    def _bump(dim: str, key: Any) -> None:
+        key = str(key).strip()
+        if key:
+            hist[dim][key] = hist[dim].get(key, 0) + 1
+
+    def _add(name: str, value: Any) -> None:
+        try:
+            counters[f"{name}_sum"] += float(value)
+            counters[f"{name}_count"] += 1
+        except Exception:
+            pass
+
+    a = analysis if isinstance(analysis, dict) else {}
+    if a.get("summary"):
+        contribution["summary"] = a["summary"]
+        counters["calls_with_analysis"] = 1
+
+    # sentiment numeric (1-5)
+    s = a.get("sentiment", {})
+    if isinstance(s, dict) and s.get("score") is not None:
+        _add("sentiment", s.get("score"))
+    # disposition counts
+    disp = a.get("disposition") or a.get("Disposition")
+    if isinstance(disp, dict) and disp.get("score"):
+        _bump("dispositions", disp.get("score"))
+    # resolved
+    resolved = a.get("resolved")
+    if isinstance(resolved, dict) and resolved.get("score") is True:
+        counters["resolved_count"] = 1
+
+    # structured insights
+    structured = _structured_fields(a, analysis_file)
+    for field, dim in (
+        ("customer_sentiment", "sentiment_labels"),
+        ("call_categorization", "categories"),
+        ("resolution_status", "resolution_status"),
+        ("main_subject", "subjects"),
+        ("main_topic", "topics"),
+        ("agent_professionalism", "agent_professionalism"),
+    ):
+        if structured.get(field):
+            _bump(dim, structured[field])
+    if structured.get("services"):
+        # split on comma or semicolon into multiple services
+        sv = structured["services"]
+        if isinstance(sv, str):
+            for p in sv.replace(";", ",").split(","):
+                _bump("services", p)
+        elif isinstance(sv, list):
+            for p in sv:
+                _bump("services", p)
+    # AHT and times
+    aht = structured.get("aht")
+    if isinstance(aht, dict) and aht.get("score") is not None:
+        _add("aht", aht.get("score"))
+    if structured.get("talk_time_seconds") is not None:
+        _add("talk", structured.get("talk_time_seconds"))
+    if structured.get("hold_time_seconds") is not None:
+        _add("hold", structured.get("hold_time_seconds"))
+    return contribution
+
+
+def _rollup_dimensions(analysis: Any, analysis_file: str | None = None) -> Dict[str, Any]:
+    """Return the category/topic/agent/disposition a call is rolled up under."""
+    a = analysis if isinstance(analysis, dict) else {}
+    structured = _structured_fields(a, analysis_file)
+
+    def _label(value: Any) -> str | None:
+        if value is None or isinstance(value, (dict, list)):
+            return None
+        return str(value).strip() or None
+
+    return {
+        "category": _label(structured.get("call_categorization")),
+        "topic": _label(structured.get("main_topic")),
+        "agent": _label(_get_ci(a, ["agent_name", "agent name"])),
+        "disposition": _label(_get_ci(a, ["disposition"])),
+    }
+
+
+def calculate_dashboard_summary() -> Dict[str, Any]:
+    """Calculate the dashboard summary over every call (full recompute).
+    Also resets the incremental aggregate and rollup stores so later uploads/deletes apply deltas to them.
+    """
+    calls = _all_calls_with_analysis()
+    contributions = {c["call_id"]: _call_contribution(c.get("analysis"), c.get("analysis_file")) for c in calls}
+    total = empty_contribution()
+    for contribution in contributions.values():
+        merge_contribution(total, contribution)
+    dashboard_aggregates.rebuild(contributions)
+    dashboard_rollups.rebuild({
+        c["call_id"]: {
+            "uploaded_at": c.get("uploaded_at"),
+            "dims": _rollup_dimensions(c.get("analysis"), c.get("analysis_file")),
+            "metrics": contributions[c["call_id"]]["counters"],
+        }
+        for c in calls
+    })
+
+    result = build_summary(total["counters"], total["histograms"])
+    result["statistics"] = _call_statistics()
+    # A full recompute always asks for fresh insights, generated in the background
+    return _attach_insights(result, force=True)
+
+
+def _record_call_contribution(call_id: str, analysis: Any = None, analysis_file: str | None = None) -> None:
+    """Apply a single call's (re)analysis to the incremental dashboard aggregates and rollups."""
+    contribution = _call_contribution(analysis, analysis_file)
+    dashboard_aggregates.apply(call_id, contribution)
+    dashboard_rollups.apply(
+        call_id,
+        (call_manifest.get(call_id) or {}).get("uploaded_at"),
+        _rollup_dimensions(analysis, analysis_file),
+        contribution["counters"],
+    )
+
+
+def incremental_dashboard_summary(changes: int = 1) -> Dict[str, Any]:
+    """Return the dashboard summary from the incremental aggregates.
+    Falls back to a full recompute when the aggregate store has not been built yet.
+    changes is the number of calls whose summary may have changed; it feeds the insights job.
+    """
+    result = dashboard_aggregates.snapshot()
+    if result is None:
+        return calculate_dashboard_summary()
+    result["statistics"] = _call_statistics()
+    return _attach_insights(result, changes=changes)
+
+
+def _call_statistics() -> Dict[str, Any]:
+    """Percentiles, histograms and cross-tabs computed vectorized over the columnar call table."""
+    try:
+        return call_table.sync(call_manifest).statistics()
+    except Exception as e:
+        print(f"Error computing call statistics: {e}")
+        return {}
+
+
+def _attach_insights(result: Dict[str, Any], changes: int = 0, force: bool = False) -> Dict[str, Any]:
+    """Schedule insight regeneration and attach the last generated insights with their age.
+    Counts are never held back by the LLM: insights_stale tells clients a newer version is pending.
+    """
+    insights_job.mark_dirty(changes, force=force)
+    stored = mongo_get_dashboard_insights()
+    result["overall_insights"] = stored.get("overall_insights")
+    result["insights_generated_at"] = stored.get("insights_generated_at")
+    result["insights_stale"] = insights_job.pending
+    return result
+
+
+def _ordered_insight_summaries() -> List[str]:
+    """Stored call summaries ordered by upload time, so insight batches stay stable as calls arrive."""
+    items = dashboard_aggregates.summary_items()
+
+    def _uploaded_at(call_id: str) -> str:
+        return (call_manifest.get(call_id) or {}).get("uploaded_at") or ""
+
+    return [items[cid] for cid in sorted(items, key=lambda cid: (_uploaded_at(cid), cid))]
+
+
+# Map-reduce over batches of summaries; batch digests are cached next to the dashboard
+insights_engine = InsightsEngine(lambda: _get_dashboard_collection(_get_mongo_client()))
+
+# Overall insights are generated off the request path, debounced and at most once per window
+insights_job = InsightsJob(
+    summaries_provider=_ordered_insight_summaries,
+    generator=insights_engine.generate,
+    store=mongo_store_dashboard_insights,
+    state_getter=mongo_get_dashboard_insights,
+)
+
+
+def _publish_dashboard_summary(summary: Dict[str, Any]) -> bool:
+    """Persist a dashboard summary to Mongo (with retries) and to Blob as secondary store."""
+    _remember_dashboard_summary(summary)
+    mongo_success = False
+    for attempt in range(3):
+        try:
+            mongo_success = mongo_upsert_dashboard_summary(summary)
+        except Exception as e:
+            print(f"MongoDB update error on attempt {attempt + 1}: {e}")
+        if mongo_success or not mongo_gateway.available():
+            # No point retrying while the circuit breaker is open
+            break
+        time.sleep(0.5)
+    if not mongo_success:
+        print("WARNING: MongoDB dashboard update failed after all retries")
+    try:
+        save_dashboard_summary_to_blob(summary)
+    except Exception as e:
+        print(f"Blob storage update failed: {e}")
+    return mongo_success
+
+
+# Every dashboard recompute goes through here: concurrent triggers share one run, bursts are
+# debounced into a trailing publish, and a Mongo lease keeps workers from duplicating the scan
+dashboard_recompute = RecomputeCoordinator(
+    compute=lambda full: calculate_dashboard_summary() if full else incremental_dashboard_summary(changes=0),
+    publish=_publish_dashboard_summary,
+    load=mongo_get_dashboard_summary,
+    lease_collection_getter=lambda: _get_dashboard_collection(_get_mongo_client()),
+)
+
+
+def _first_analysis_for_call(call_id: str) -> tuple[Any | None, str | None]:
+    """Return (analysis_obj, blob_path) for the first analysis JSON matching call_id under llmanalysis/**.
+    Resolved through the shared analysis map instead of listing the folder per call.
+    """
+    path = analysis_resolver.resolve(call_id)
+    if not path:
+        return (None, None)
+    return (analysis_cache.get(path), path)
+
+
+def _persona_analysis_for_call(call_id: str) -> tuple[Any | None, str | None]:
+    """Return (analysis_obj, blob_path) for persona folder specifically.
+    Space/underscore/hyphen/case aliases are handled by the analysis resolver's normalized map.
+    """
+    path = analysis_resolver.resolve(call_id, folder="persona")
+    if not path:
+        return (None, None)
+    return (analysis_cache.get(path), path)
+
+
+def _analysis_for_call(call_id: str) -> tuple[Any | None, str | None]:
+    """Return (analysis_obj, blob_path), preferring the persona analysis over any other folder."""
+    parsed, path = _persona_analysis_for_call(call_id)
+    if not parsed:
+        parsed, path = _first_analysis_for_call(call_id)
+    return parsed, path
+
+
+# --------------------------
+# Concurrent analysis fetch
+# --------------------------
+CALLS_FETCH_CONCURRENCY = max(1, int(os.getenv("CALLS_FETCH_CONCURRENCY", "16")))
+CALLS_FETCH_TIMEOUT_SECONDS = float(os.getenv("CALLS_FETCH_TIMEOUT_SECONDS", "10"))
+_analysis_fetch_pool = ThreadPoolExecutor(max_workers=CALLS_FETCH_CONCURRENCY, thread_name_prefix="analysis-fetch")
+# Full-corpus scans (dashboard recompute, re-index, index-field backfill) get their own small pool,
+# so they never queue thousands of fetches ahead of /calls pages
+CALLS_BULK_FETCH_CONCURRENCY = max(1, int(os.getenv("CALLS_BULK_FETCH_CONCURRENCY", "4")))
+CALLS_BULK_FETCH_TIMEOUT_SECONDS = float(os.getenv("CALLS_BULK_FETCH_TIMEOUT_SECONDS", "30"))
+_analysis_bulk_pool = ThreadPoolExecutor(max_workers=CALLS_BULK_FETCH_CONCURRENCY, thread_name_prefix="analysis-bulk")
+
+
+def _fetch_analyses_concurrently(
+    call_ids: List[str],
+    timeout: float = CALLS_FETCH_TIMEOUT_SECONDS,
+    pool: ThreadPoolExecutor = _analysis_fetch_pool,
+    max_in_flight: int = CALLS_FETCH_CONCURRENCY,
+) -> List[tuple[Any | None, str | None, str | None]]:
+    """Load analyses for call_ids on a bounded fetch pool, preserving input order.
+    At most max_in_flight fetches are submitted at a time, and each one gets its own timeout
+    (counted from its submission): a call that fails or times out is reported with an error
+    instead of stalling the batch. A timed-out fetch that is already running keeps its slot
+    until its blob read returns (bounded by the analysis cache's read timeout); if every slot
+    is held that way for a whole timeout, the remaining calls are reported as timed out.
+    Returns one (analysis_obj, blob_path, error) tuple per call.
+    """
+    results: List[tuple[Any | None, str | None, str | None]] = [(None, None, None)] * len(call_ids)
+    pending: Dict[Any, tuple[int, float]] = {}
+    abandoned: set = set()
+    next_index = 0
+    while next_index < len(call_ids) or pending:
+        abandoned = {fut for fut in abandoned if not fut.done()}
+        while next_index < len(call_ids) and len(pending) + len(abandoned) < max_in_flight:
+            fut = pool.submit(_analysis_for_call, call_ids[next_index])
+            pending[fut] = (next_index, time.monotonic() + timeout)
+            next_index += 1
+        if not pending:
+            done, _ = wait(list(abandoned), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                print(f"Analysis fetch pool is held by timed-out fetches; skipping {len(call_ids) - next_index} calls")
+                for idx in range(next_index, len(call_ids)):
+                    results[idx] = (None, None, "timeout")
+                break
+            continue
+        earliest = min(deadline for _idx, deadline in pending.values())
+        done, _ = wait(
+            list(pending) + list(abandoned),
+            timeout=max(0.0, earliest - time.monotonic()),
+            return_when=FIRST_COMPLETED,
+        )
+        now = time.monotonic()
+        for fut in list(pending):
+            idx, deadline = pending[fut]
+            cid = call_ids[idx]
+            if fut in done:
+                del pending[fut]
+                try:
+                    parsed, path = fut.result()
+                    results[idx] = (parsed, path, None)
+                except Exception as e:
+                    print(f"Analysis fetch for '{cid}' failed: {e}")
+                    results[idx] = (None, None, str(e))
+            elif now >= deadline:
+                del pending[fut]
+                if not fut.cancel():
+                    # Already running: a thread cannot be interrupted, so it keeps its slot
+                    abandoned.add(fut)
+                print(f"Analysis fetch for '{cid}' timed out after {timeout}s")
+                results[idx] = (None, None, "timeout")
+    return results
+
+
+def _fetch_analyses_bulk(call_ids: List[str]) -> List[tuple[Any | None, str | None, str | None]]:
+    """_fetch_analyses_concurrently for full-corpus scans, on the separate bulk pool."""
+    return _fetch_analyses_concurrently(
+        call_ids,
+        timeout=CALLS_BULK_FETCH_TIMEOUT_SECONDS,
+        pool=_analysis_bulk_pool,
+        max_in_flight=CALLS_BULK_FETCH_CONCURRENCY,
+    )
+
+
+def _all_calls_with_analysis() -> List[Dict[str, Any]]:
+    """Return every call in the manifest with its analysis attached (newest first)."""
+    calls: List[Dict[str, Any]] = []
+    items = call_manifest.all_entries()
+    fetched = _fetch_analyses_bulk([i["call_id"] for i in items])
+    for item, (parsed, path, _err) in zip(items, fetched):
+        calls.append({
+            "audio_name": item.get("audio_name"),
+            "call_id": item["call_id"],
+            "uploaded_at": item.get("uploaded_at"),
+            "analysis": parsed,
+            "analysis_file": path,
+        })
+    return calls
+
+
+def _get_ci(d: dict, keys: list[str]) -> Any:
+    if not isinstance(d, dict):
+        return None
+    lower_map = {k.lower(): k for k in d.keys()}
+    for k in keys:
+        real = lower_map.get(k.lower())
+        if real is None:
+            continue
+        val = d.get(real)
+        # unwrap dict with score if present
+        if isinstance(val, dict) and "score" in {x.lower() for x in val.keys()}:
+            # case-insensitive access to score
+            score_key = next((rk for rk in val.keys() if rk.lower() == "score"), None)
+            if score_key:
+                return val.get(score_key)
+        return val
+    return None
+
+
+def _derive_category_and_attitude(analysis: Any) -> tuple[str | None, str | None]:
+    if not isinstance(analysis, dict):
+        return None, None
+    # Prefer nested insights block if present
+    insights: dict | None = None
+    lower_map = {k.lower(): k for k in analysis.keys()}
+    for k in ["Call Generated Insights", "call_generated_insights", "generated_insights", "insights"]:
+        real = lower_map.get(k.lower())
+        if real is not None and isinstance(analysis.get(real), dict):
+            insights = analysis.get(real)  # type: ignore
+            break
+    if isinstance(insights, dict):
+        cat_from_insights = _get_ci(
+            insights,
+            [
+                "Call Categorization",
+                "call_categorization",
+                "Call Category",
+                "call_category",
+                "Main Subject",
+                "subject",
+                "Call Type",
+            ],
+        )  # type: ignore
+        att_from_insights = _get_ci(
+            insights,
+            [
+                "Agent Attitude",
+                "agent_attitude",
+                "Agent Behavior",
+                "agent_behavior",
+                "Agent Tone",
+                "agent_tone",
+                "Agents Professionalism",
+                "professionalism",
+            ],
+        )  # type: ignore
+        if cat_from_insights is not None or att_from_insights is not None:
+            return (
+                str(cat_from_insights) if cat_from_insights is not None else None,
+                str(att_from_insights) if att_from_insights is not None else None,
+            )
+    # candidates for category
+    category = _get_ci(
+        analysis,
+        [
+            "Call Categorization",
+            "call_categorization",
+            "category",
+            "call_category",
+            "Main Subject",
+            "subject",
+            "Call Type",
+        ],
+    )
+    # candidates for attitude
+    attitude = _get_ci(
+        analysis,
+        [
+            "Agent Attitude",
+            "agent_attitude",
+            "Agents Professionalism",
+            "professionalism",
+            "Agent Behavior",
+            "agent_behavior",
+            "Agent Tone",
+            "agent_tone",
+        ],
+    )
+    # fallbacks
+    if category is None:
+        # sometimes stored in disposition.score but that's really outcome; use if empty
+        category = _get_ci(analysis.get("disposition", {}) if isinstance(analysis, dict) else {}, ["score"]) or None
+    return (str(category) if category is not None else None, str(attitude) if attitude is not None else None)
+
+
+def _lower_key_map(d: dict) -> dict:
+    return {k.lower(): k for k in d.keys()} if isinstance(d, dict) else {}
+
+
+def _get_nested_block(analysis: dict, candidates: list[str]) -> dict | None:
+    if not isinstance(analysis, dict):
+        return None
+    lower_map = _lower_key_map(analysis)
+    for k in candidates:
+        real = lower_map.get(k.lower())
+        if real is not None and isinstance(analysis.get(real), dict):
+            return analysis.get(real)  # type: ignore
+    return None
+
+
+def _extract_structured_fields(analysis: Any) -> Dict[str, Any]:
+    """Extract fields for details view from the analysis JSON.
+    Returns a flat dict with normalized keys.
+    """
+    out: Dict[str, Any] = {
+        "customer_sentiment": None,
+        "call_categorization": None,
+        "resolution_status": None,
+        "main_subject": None,
+        "main_topic": None,
+        "services": None,
+        "call_outcome": None,
+        "agent_attitude": None,
+        "agent_professionalism": None,
+        "call_summary": None,
+        "fcr": None,
+        "aht": None,
+        "talk_time_seconds": None,
+        "hold_time_seconds": None,
+        "after_call_work_seconds": None,
+    }
+    if not isinstance(analysis, dict):
+        return out
+
+    # Insights block
+    insights = _get_nested_block(analysis, [
+        "Call Generated Insights", "call_generated_insights", "generated_insights", "insights",
+    ])
+    if isinstance(insights, dict):
+        out["customer_sentiment"] = _get_ci(insights, ["Customer Sentiment"])  # Positive/Neutral/Negative
+        out["call_categorization"] = _get_ci(insights, ["Call Categorization", "Call Category", "category"])  # Inquiry/Issue/etc
+        out["resolution_status"] = _get_ci(insights, ["Resolution Status"])  # resolved/escalated/pending
+        out["main_subject"] = _get_ci(insights, ["Main Subject", "subject"])  # text
+        out["main_topic"] = _get_ci(insights, ["Main Topic", "main_topic"])  # Installation and Setup Issues|Repair and Maintenance Concerns|etc
+        out["services"] = _get_ci(insights, ["Services"])  # text/list
+        out["call_outcome"] = _get_ci(insights, ["Call Outcome"])  # text
+        out["agent_attitude"] = _get_ci(insights, ["Agent Attitude"])  # text
+        out["agent_professionalism"] = _get_ci(insights, ["Agents Professionalism", "Agent Professionalism", "agent_professionalism", "professionalism"])  # text
+        out["call_summary"] = _get_ci(insights, ["Call Summary"]) or analysis.get("summary")
+
+    # Metrics block
+    metrics = _get_nested_block(analysis, [
+        "Customer Service Metrics", "customer_service_metrics", "metrics",
+    ])
+
+    # FCR
+    if isinstance(metrics, dict):
+        fcr = metrics.get(_lower_key_map(metrics).get("fcr"))
+        if fcr is None and "FCR" in analysis:
+            fcr = analysis.get("FCR")
+        out["fcr"] = fcr
+    else:
+        out["fcr"] = analysis.get("FCR")
+
+    # AHT
+    aht = None
+    if isinstance(metrics, dict):
+        aht = metrics.get(_lower_key_map(metrics).get("aht"))
+    if aht is None:
+        # Prefer top-level Average Handling Time (AHT)
+        aht = analysis.get("Average Handling Time (AHT)") or analysis.get("AHT")
+    out["aht"] = aht
+
+    # Talk/Hold/After-call seconds
+    # Try in metrics then top-level using common variants
+    def find_time(obj: dict, keys: list[str]):
+        if not isinstance(obj, dict):
+            return None
+        lm = _lower_key_map(obj)
+        for k in keys:
+            real = lm.get(k.lower())
+            if real is not None:
+                return obj.get(real)
+        return None
+
+    for src in [metrics, analysis]:
+        if out["talk_time_seconds"] is None:
+            out["talk_time_seconds"] = find_time(src or {}, ["talk_time_seconds", "Talk time", "talk time", "talk_time"])  # type: ignore
+        if out["hold_time_seconds"] is None:
+            out["hold_time_seconds"] = find_time(src or {}, ["hold_time_seconds", "Hold time", "hold time", "hold_time"])  # type: ignore
+        if out["after_call_work_seconds"] is None:
+            out["after_call_work_seconds"] = find_time(src or {}, ["after_call_work_seconds", "After call work", "after_call_work"])  # type: ignore
+
+    # Fallback: derive professionalism from attitude keywords if not present
+    if not out.get("agent_professionalism"):
+        att = str(out.get("agent_attitude") or "").lower()
+        if att:
+            if any(k in att for k in ["empathetic", "helpful", "attentive", "outstanding", "excellent", "very good", "highly"]):
+                out["agent_professionalism"] = "Highly Professional"
+            elif any(k in att for k in ["defensive", "rude", "angry", "poor", "unprofessional", "needs improvement", "improve"]):
+                out["agent_professionalism"] = "Needs Improvement"
+            else:
+                out["agent_professionalism"] = "Professional"
+
+    return out
+
+
+def _structured_fields(analysis: Any, blob_path: str | None = None) -> Dict[str, Any]:
+    """_extract_structured_fields, memoized on the analysis cache entry for blob_path."""
+    if not blob_path:
+        return _extract_structured_fields(analysis)
+    return analysis_cache.derived(blob_path, "structured", analysis, _extract_structured_fields)
+
+
+def _index_fields(analysis: Any, blob_path: str | None = None) -> Dict[str, Any]:
+    """Flatten the filterable/sortable fields of an analysis for the call manifest and index."""
+    structured = _structured_fields(analysis, blob_path)
+    if not isinstance(analysis, dict):
+        return {}
+
+    def _as_number(value: Any) -> float | None:
+        if isinstance(value, dict):
+            value = _get_ci(value, ["score"])
+        try:
+            return float(value) if value is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    services = structured.get("services")
+    if isinstance(services, list):
+        services = ", ".join(str(x) for x in services)
+    return {
+        "customer_sentiment": structured.get("customer_sentiment"),
+        "call_categorization": structured.get("call_categorization"),
+        "resolution_status": structured.get("resolution_status"),
+        "main_subject": structured.get("main_subject"),
+        "main_topic": structured.get("main_topic"),
+        "services": services,
+        "call_outcome": structured.get("call_outcome"),
+        "agent_professionalism": structured.get("agent_professionalism"),
+        "agent_name": _get_ci(analysis, ["agent_name", "agent name"]),
+        "disposition": _get_ci(analysis, ["disposition"]),
+        "resolved": _get_ci(analysis, ["resolved"]),
+        "sentiment_score": _as_number(analysis.get("sentiment")),
+        "aht_seconds": _as_number(structured.get("aht")),
+        "talk_time_seconds": _as_number(structured.get("talk_time_seconds")),
+        "hold_time_seconds": _as_number(structured.get("hold_time_seconds")),
+        "summary": analysis.get("summary"),
+    }
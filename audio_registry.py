@@ -0,0 +1,114 @@
+"""
+Audio Registry
+
+Content-hash registry for uploaded recordings: SHA-256 of the audio bytes ->
+call_id (and the job that processed it). Uploads are hashed while they stream
+to Blob storage; a recording already registered under a live call is linked to
+that call's transcript, analysis and revisions instead of being reprocessed.
+
+Mappings live in a Mongo collection shared by all workers. The call manifest
+(which records audio_sha256 per call) is the fallback while Mongo is
+unavailable, and the source of truth for whether a mapping is still valid: a
+deleted call, or a call whose audio was replaced under the same name, no
+longer matches.
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict
+
+LIVE_JOB_STATUSES = ("queued", "running", "retrying")
+
+
+class AudioRegistry:
+    def __init__(self, collection_getter: Callable[[], Any] | None, manifest):
+        """Create the registry over the Mongo collection returned by collection_getter and the call manifest."""
+        self.collection_getter = collection_getter
+        self.manifest = manifest
+        self.hits = 0
+        self.misses = 0
+
+    def _coll(self):
+        if self.collection_getter is None:
+            return None
+        try:
+            return self.collection_getter()
+        except Exception:
+            return None
+
+    def _live_entry(self, sha256: str, call_id: str | None) -> Dict[str, Any] | None:
+        if not call_id:
+            return None
+        entry = self.manifest.get(call_id)
+        if entry is None or entry.get("audio_sha256") != sha256:
+            return None
+        return entry
+
+    def lookup(self, sha256: str) -> Dict[str, Any] | None:
+        """Return {"call_id", "job_id", "entry"} for a live call with this audio, else None."""
+        doc = None
+        scan = True
+        coll = self._coll()
+        if coll is not None:
+            try:
+                doc = coll.find_one({"_id": sha256})
+                scan = doc is not None
+            except Exception as e:
+                print(f"Audio registry lookup failed: {e}")
+        entry = self._live_entry(sha256, (doc or {}).get("call_id"))
+        if entry is None and scan:
+            # Mongo unavailable or stale mapping: fall back to the manifest
+            doc = None
+            for candidate in self.manifest.all_entries():
+                if candidate.get("audio_sha256") == sha256:
+                    entry = candidate
+                    break
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return {"call_id": entry["call_id"], "job_id": (doc or {}).get("job_id") or entry.get("job_id"), "entry": entry}
+
+    def live_match(
+        self,
+        sha256: str,
+        job_getter: Callable[[str], Dict[str, Any] | None],
+        stale_seconds: float,
+    ) -> Dict[str, Any] | None:
+        """lookup() restricted to calls whose results exist or are being produced.
+
+        A call that is not analysed yet only matches while its job (from job_getter) is queued,
+        running or retrying and its record was updated within stale_seconds; a failed or
+        abandoned call is reprocessed instead.
+        """
+        match = self.lookup(sha256)
+        if match is None:
+            return None
+        if match["entry"].get("has_analysis"):
+            return match
+        job = job_getter(match["job_id"]) if match.get("job_id") else None
+        if job is None or job.get("status") not in LIVE_JOB_STATUSES:
+            return None
+        try:
+            updated_at = datetime.fromisoformat(str(job.get("updated_at") or job.get("created_at")))
+        except ValueError:
+            return None
+        if (datetime.now(timezone.utc) - updated_at).total_seconds() > stale_seconds:
+            return None
+        return match
+
+    def register(self, sha256: str, call_id: str, job_id: str | None = None) -> None:
+        """Map the audio hash to the call that processes it."""
+        coll = self._coll()
+        if coll is None:
+            return
+        try:
+            coll.update_one(
+                {"_id": sha256},
+                {"$set": {"call_id": call_id, "job_id": job_id, "registered_at": datetime.now(timezone.utc).isoformat()}},
+                upsert=True,
+            )
+        except Exception as e:
+            print(f"Audio registry write failed for '{call_id}': {e}")
+
+    def status(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses}
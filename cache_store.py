@@ -0,0 +1,743 @@
+"""
+Cache Store
+
+Response cache with pluggable backends:
+
+- CacheStore: bounded in-process LRU/TTL store (per worker)
+- DiskCacheStore: JSON files in a local directory shared by the workers of one node
+- MongoCacheStore: documents in a Mongo collection shared by every node
+
+Entries expire after a TTL and can be invalidated individually, by namespace
+(the key prefix before the first ':') or by tag (e.g. a call_id the cached page
+contains), so one deletion does not wipe unrelated entries. Hit/miss/eviction
+counters are kept for the stats endpoint.
+
+VersionedCache wraps a backend with a single version stamp stored in Mongo:
+every invalidation increments it and records the invalidated scope, and workers
+compare their last seen version at most every few seconds so one invalidation
+reaches every worker and node.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+def _approx_size(value: Any) -> int:
+    """Approximate memory footprint of a cached value via its JSON encoding."""
+    try:
+        return len(json.dumps(value, default=str))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+def namespace_of(key: str) -> str:
+    return key.split(":", 1)[0]
+
+
+class CacheBackend(ABC):
+    """Interface shared by the cache backends."""
+
+    # True when every worker reads and writes the same entries
+    shared = False
+
+    @abstractmethod
+    def get(self, key: str, ttl_seconds: float | None = None) -> Any | None:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any, tags: Iterable[str] = (), ttl_seconds: float | None = None) -> None:
+        ...
+
+    @abstractmethod
+    def invalidate(self, key: str) -> int:
+        ...
+
+    @abstractmethod
+    def invalidate_tag(self, tag: str) -> int:
+        ...
+
+    @abstractmethod
+    def invalidate_namespace(self, namespace: str) -> int:
+        ...
+
+    @abstractmethod
+    def clear(self) -> int:
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+
+class CacheStore(CacheBackend):
+    def __init__(self, max_bytes: int | None = None, default_ttl_seconds: float | None = None):
+        """Create an empty cache bounded to max_bytes (env CACHE_MAX_BYTES, default 64 MB)."""
+        if max_bytes is None:
+            max_bytes = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        if default_ttl_seconds is None:
+            default_ttl_seconds = float(os.getenv("CACHE_DEFAULT_TTL_SECONDS", "86400"))
+        self.max_bytes = max_bytes
+        self.default_ttl_seconds = default_ttl_seconds
+        self._lock = threading.RLock()
+        # key -> {"data", "ts", "expires", "size", "tags"}; order is LRU -> MRU
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._tags: Dict[str, set] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    # ------------------------------------------------------------------
+    # Core operations
+    # ------------------------------------------------------------------
+
+    def get(self, key: str, ttl_seconds: float | None = None) -> Any | None:
+        """Return the cached value, or None on a miss or when the entry is older than ttl_seconds."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            now = time.time()
+            expired = now >= entry["expires"]
+            if ttl_seconds is not None and (now - entry["ts"]) > ttl_seconds:
+                expired = True
+            if expired:
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["data"]
+
+    def set(self, key: str, value: Any, tags: Iterable[str] = (), ttl_seconds: float | None = None) -> None:
+        """Store value under key, evicting least recently used entries beyond max_bytes."""
+        size = _approx_size(value)
+        if size > self.max_bytes:
+            # Larger than the whole cache; caching it would only flush everything else
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            now = time.time()
+            tag_set = set(tags or ())
+            self._entries[key] = {
+                "data": value,
+                "ts": now,
+                "expires": now + (ttl_seconds if ttl_seconds is not None else self.default_ttl_seconds),
+                "size": size,
+                "tags": tag_set,
+            }
+            self._bytes += size
+            for tag in tag_set:
+                self._tags.setdefault(tag, set()).add(key)
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry["size"]
+        for tag in entry["tags"]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    self._tags.pop(tag, None)
+
+    # ------------------------------------------------------------------
+    # Invalidation
+    # ------------------------------------------------------------------
+
+    def invalidate(self, key: str) -> int:
+        with self._lock:
+            if key not in self._entries:
+                return 0
+            self._drop(key)
+            self.invalidations += 1
+            return 1
+
+    def invalidate_tag(self, tag: str) -> int:
+        """Drop every entry carrying tag."""
+        with self._lock:
+            keys = list(self._tags.get(tag, ()))
+            for key in keys:
+                self._drop(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def invalidate_namespace(self, namespace: str) -> int:
+        """Drop every entry whose key starts with '<namespace>:'."""
+        with self._lock:
+            keys = [k for k in self._entries if namespace_of(k) == namespace]
+            for key in keys:
+                self._drop(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+            self.invalidations += count
+            return count
+
+    # ------------------------------------------------------------------
+    # Introspection
+    # ------------------------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            namespaces: Dict[str, Dict[str, int]] = {}
+            for key, entry in self._entries.items():
+                ns = namespaces.setdefault(namespace_of(key), {"entries": 0, "bytes": 0})
+                ns["entries"] += 1
+                ns["bytes"] += entry["size"]
+            lookups = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "namespaces": namespaces,
+            }
+
+
+class DiskCacheStore(CacheBackend):
+    """Cache entries stored as JSON files in a directory shared by workers on the same node.
+
+    Tag and namespace membership is recorded as marker files under _index/ (one directory
+    per tag or namespace), so an invalidation only touches the entries it affects. The total
+    size is tracked in memory; the directory is only listed to evict once it exceeds max_bytes
+    and, to count other workers' writes, at most every rescan_seconds.
+    """
+
+    shared = True
+    INDEX_DIR = "_index"
+
+    def __init__(
+        self,
+        directory: str | None = None,
+        max_bytes: int | None = None,
+        default_ttl_seconds: float | None = None,
+        rescan_seconds: float | None = None,
+    ):
+        self.directory = directory or os.getenv("CACHE_DISK_DIR", "/tmp/report-api-cache")
+        os.makedirs(self.directory, exist_ok=True)
+        if max_bytes is None:
+            max_bytes = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        if default_ttl_seconds is None:
+            default_ttl_seconds = float(os.getenv("CACHE_DEFAULT_TTL_SECONDS", "86400"))
+        if rescan_seconds is None:
+            rescan_seconds = float(os.getenv("CACHE_DISK_RESCAN_SECONDS", "60"))
+        self.max_bytes = max_bytes
+        self.default_ttl_seconds = default_ttl_seconds
+        self.rescan_seconds = rescan_seconds
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._last_scan = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.scans = 0
+        self._evict()
+
+    @staticmethod
+    def _hash(value: str) -> str:
+        return hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, self._hash(key) + ".json")
+
+    def _index_path(self, kind: str, value: str) -> str:
+        return os.path.join(self.directory, self.INDEX_DIR, kind, self._hash(value))
+
+    def _read(self, path: str) -> Dict[str, Any] | None:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    def _remove(self, path: str) -> bool:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            self._bytes = max(0, self._bytes - size)
+        return True
+
+    def _files(self) -> List[str]:
+        try:
+            return [os.path.join(self.directory, n) for n in os.listdir(self.directory) if n.endswith(".json")]
+        except FileNotFoundError:
+            return []
+
+    def get(self, key: str, ttl_seconds: float | None = None) -> Any | None:
+        path = self._path(key)
+        entry = self._read(path)
+        now = time.time()
+        if not entry or entry.get("key") != key:
+            self.misses += 1
+            return None
+        if now >= entry.get("expires", 0) or (ttl_seconds is not None and (now - entry.get("ts", 0)) > ttl_seconds):
+            self._remove(path)
+            self.misses += 1
+            return None
+        try:
+            # mtime doubles as the LRU clock
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return entry.get("data")
+
+    def set(self, key: str, value: Any, tags: Iterable[str] = (), ttl_seconds: float | None = None) -> None:
+        now = time.time()
+        entry = {
+            "key": key,
+            "namespace": namespace_of(key),
+            "tags": sorted(set(tags or ())),
+            "ts": now,
+            "expires": now + (ttl_seconds if ttl_seconds is not None else self.default_ttl_seconds),
+            "data": value,
+        }
+        try:
+            body = json.dumps(entry, default=str).encode("utf-8")
+        except Exception as e:
+            print(f"Disk cache: cannot serialize {key}: {e}")
+            return
+        if len(body) > self.max_bytes:
+            return
+        path = self._path(key)
+        try:
+            previous = os.path.getsize(path)
+        except OSError:
+            previous = 0
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(body)
+        # Atomic rename so concurrent readers never see a partial file
+        os.replace(tmp, path)
+        name = os.path.basename(path)[:-len(".json")]
+        for kind, value in [("ns", entry["namespace"])] + [("tag", tag) for tag in entry["tags"]]:
+            index = self._index_path(kind, value)
+            os.makedirs(index, exist_ok=True)
+            open(os.path.join(index, name), "a").close()
+        with self._lock:
+            self._bytes += len(body) - previous
+            rescan = self._bytes > self.max_bytes or (now - self._last_scan) >= self.rescan_seconds
+        if rescan:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Measure the directory, evict least recently used entries beyond max_bytes and drop
+        index markers left behind by evicted or expired entries."""
+        files = []
+        total = 0
+        for path in self._files():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        live = {os.path.basename(path)[:-len(".json")] for _, _, path in files}
+        if total > self.max_bytes:
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                total -= size
+                live.discard(os.path.basename(path)[:-len(".json")])
+                self.evictions += 1
+        for root, _dirs, names in os.walk(os.path.join(self.directory, self.INDEX_DIR)):
+            for name in names:
+                if name not in live:
+                    try:
+                        os.remove(os.path.join(root, name))
+                    except OSError:
+                        pass
+        with self._lock:
+            self._bytes = total
+            self._last_scan = time.time()
+            self.scans += 1
+
+    def _invalidate_index(self, kind: str, value: str) -> int:
+        index = self._index_path(kind, value)
+        try:
+            names = os.listdir(index)
+        except FileNotFoundError:
+            return 0
+        dropped = 0
+        for name in names:
+            # A marker can outlive a rewrite of its entry with other tags; dropping that
+            # entry as well only costs a cache miss
+            if self._remove(os.path.join(self.directory, name + ".json")):
+                dropped += 1
+            try:
+                os.remove(os.path.join(index, name))
+            except FileNotFoundError:
+                pass
+        self.invalidations += dropped
+        return dropped
+
+    def invalidate(self, key: str) -> int:
+        dropped = 1 if self._remove(self._path(key)) else 0
+        self.invalidations += dropped
+        return dropped
+
+    def invalidate_tag(self, tag: str) -> int:
+        return self._invalidate_index("tag", tag)
+
+    def invalidate_namespace(self, namespace: str) -> int:
+        return self._invalidate_index("ns", namespace)
+
+    def clear(self) -> int:
+        dropped = sum(1 for path in self._files() if self._remove(path))
+        shutil.rmtree(os.path.join(self.directory, self.INDEX_DIR), ignore_errors=True)
+        self.invalidations += dropped
+        return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "disk",
+            "directory": self.directory,
+            "entries": len(self._files()),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "scans": self.scans,
+        }
+
+
+class MongoCacheStore(CacheBackend):
+    """Cache entries stored as documents in a Mongo collection shared by every node.
+
+    Values are stored JSON-encoded so arbitrary dict keys survive Mongo's field name rules.
+    Every entry carries a datetime "expires_at" with a TTL index on it (created on first use),
+    so Mongo deletes expired entries and the collection stays bounded by the entries written
+    within one TTL; reads also treat an expired entry as a miss before Mongo removes it.
+    """
+
+    shared = True
+
+    def __init__(self, collection_getter: Callable[[], Any], default_ttl_seconds: float | None = None):
+        if default_ttl_seconds is None:
+            default_ttl_seconds = float(os.getenv("CACHE_DEFAULT_TTL_SECONDS", "86400"))
+        self.collection_getter = collection_getter
+        self.default_ttl_seconds = default_ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+        self._indexes_ready = False
+
+    def _coll(self):
+        try:
+            coll = self.collection_getter()
+        except Exception:
+            return None
+        if coll is not None and not self._indexes_ready:
+            try:
+                # expireAfterSeconds=0: each document expires at its own expires_at
+                coll.create_index("expires_at", expireAfterSeconds=0)
+                coll.create_index("tags")
+                coll.create_index("namespace")
+                self._indexes_ready = True
+            except Exception as e:
+                print(f"Mongo cache index creation failed: {e}")
+        return coll
+
+    def get(self, key: str, ttl_seconds: float | None = None) -> Any | None:
+        coll = self._coll()
+        if coll is None:
+            self.misses += 1
+            return None
+        try:
+            doc = coll.find_one({"_id": key}, {"payload": 1, "ts": 1, "expires_at": 1})
+        except Exception as e:
+            self.errors += 1
+            print(f"Mongo cache get error: {e}")
+            return None
+        now = time.time()
+        expires_at = (doc or {}).get("expires_at")
+        expired = not isinstance(expires_at, datetime) or datetime.utcnow() >= expires_at
+        if not doc or expired or (ttl_seconds is not None and (now - doc.get("ts", 0)) > ttl_seconds):
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            return json.loads(doc.get("payload") or "null")
+        except Exception:
+            return None
+
+    def set(self, key: str, value: Any, tags: Iterable[str] = (), ttl_seconds: float | None = None) -> None:
+        coll = self._coll()
+        if coll is None:
+            return
+        ttl = ttl_seconds if ttl_seconds is not None else self.default_ttl_seconds
+        try:
+            coll.replace_one(
+                {"_id": key},
+                {
+                    "_id": key,
+                    "namespace": namespace_of(key),
+                    "tags": sorted(set(tags or ())),
+                    "ts": time.time(),
+                    # Naive UTC, like the datetimes pymongo returns
+                    "expires_at": datetime.utcnow() + timedelta(seconds=ttl),
+                    "payload": json.dumps(value, default=str),
+                },
+                upsert=True,
+            )
+        except Exception as e:
+            self.errors += 1
+            print(f"Mongo cache set error: {e}")
+
+    def _delete(self, query: Dict[str, Any]) -> int:
+        coll = self._coll()
+        if coll is None:
+            return 0
+        try:
+            dropped = coll.delete_many(query).deleted_count
+        except Exception as e:
+            self.errors += 1
+            print(f"Mongo cache delete error: {e}")
+            return 0
+        self.invalidations += dropped
+        return dropped
+
+    def invalidate(self, key: str) -> int:
+        return self._delete({"_id": key})
+
+    def invalidate_tag(self, tag: str) -> int:
+        return self._delete({"tags": tag})
+
+    def invalidate_namespace(self, namespace: str) -> int:
+        return self._delete({"namespace": namespace})
+
+    def clear(self) -> int:
+        return self._delete({})
+
+    def stats(self) -> Dict[str, Any]:
+        coll = self._coll()
+        entries = None
+        if coll is not None:
+            try:
+                entries = coll.estimated_document_count()
+            except Exception:
+                entries = None
+        lookups = self.hits + self.misses
+        return {
+            "backend": "mongo",
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else None,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
+
+
+def create_backend(kind: str | None = None, mongo_collection_getter: Callable[[], Any] | None = None) -> CacheBackend:
+    """Build the backend selected by CACHE_BACKEND (memory | disk | mongo)."""
+    kind = (kind or os.getenv("CACHE_BACKEND", "memory")).strip().lower()
+    if kind == "disk":
+        return DiskCacheStore()
+    if kind == "mongo" and mongo_collection_getter is not None:
+        return MongoCacheStore(mongo_collection_getter)
+    return CacheStore()
+
+
+class VersionedCache:
+    """A cache backend kept coherent across workers through a version stamp in Mongo.
+
+    The stamp document holds a monotonically increasing "version" and the most recent
+    invalidation events. Each invalidation is applied locally and published with a single
+    atomic $inc/$push. Before serving a read, a worker compares its last seen version with
+    the stamp (at most every CACHE_VERSION_CHECK_SECONDS) and replays the events it missed
+    on its own backend; if it fell too far behind it drops the affected namespaces.
+    """
+
+    STAMP_ID = "cache_version"
+    MAX_EVENTS = 100
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        stamp_collection_getter: Callable[[], Any] | None = None,
+        check_seconds: float | None = None,
+    ):
+        if check_seconds is None:
+            check_seconds = float(os.getenv("CACHE_VERSION_CHECK_SECONDS", "2"))
+        self.backend = backend
+        self.stamp_collection_getter = stamp_collection_getter
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._known_version: int | None = None
+        self._last_check = 0.0
+        self.remote_invalidations = 0
+
+    # ------------------------------------------------------------------
+    # Version stamp
+    # ------------------------------------------------------------------
+
+    def _stamp_coll(self):
+        if self.stamp_collection_getter is None:
+            return None
+        try:
+            return self.stamp_collection_getter()
+        except Exception:
+            return None
+
+    @property
+    def version(self) -> int:
+        """Last version stamp seen by this worker (0 when no shared stamp is available)."""
+        return self._known_version or 0
+
+    def sync(self, force: bool = False) -> bool:
+        """Apply invalidations published by other workers. Returns True if any were applied."""
+        now = time.time()
+        if not force and (now - self._last_check) < self.check_seconds:
+            return False
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._last_check = now
+            coll = self._stamp_coll()
+            if coll is None:
+                return False
+            try:
+                doc = coll.find_one({"_id": self.STAMP_ID}, {"version": 1, "events": {"$slice": -self.MAX_EVENTS}}) or {}
+            except Exception as e:
+                print(f"Cache version check failed: {e}")
+                return False
+            remote = int(doc.get("version") or 0)
+            if self._known_version is None:
+                self._known_version = remote
+                return False
+            missed = remote - self._known_version
+            if missed <= 0:
+                return False
+            if not self.backend.shared:
+                events = doc.get("events") or []
+                if missed <= len(events):
+                    for event in events[-missed:]:
+                        self._apply(event)
+                else:
+                    # Too far behind to replay; drop everything that could be stale
+                    for ns in {e.get("namespace") for e in events if e.get("namespace")} or {"calls"}:
+                        self.backend.invalidate_namespace(ns)
+            self._known_version = remote
+            self.remote_invalidations += missed
+            return True
+        finally:
+            self._lock.release()
+
+    def _apply(self, event: Dict[str, Any]) -> None:
+        if event.get("namespace") and not event.get("tags"):
+            self.backend.invalidate_namespace(event["namespace"])
+        for tag in event.get("tags") or []:
+            self.backend.invalidate_tag(tag)
+        for key in event.get("keys") or []:
+            self.backend.invalidate(key)
+
+    def _publish(self, event: Dict[str, Any]) -> None:
+        coll = self._stamp_coll()
+        if coll is None:
+            # No shared stamp: keep a local counter so version-derived validators still change
+            self._known_version = (self._known_version or 0) + 1
+            return
+        try:
+            from pymongo import ReturnDocument
+            doc = coll.find_one_and_update(
+                {"_id": self.STAMP_ID},
+                {
+                    "$inc": {"version": 1},
+                    "$push": {"events": {"$each": [dict(event, ts=time.time())], "$slice": -self.MAX_EVENTS}},
+                },
+                projection={"version": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            remote = int((doc or {}).get("version") or 0)
+            # Only skip ahead when nobody else published in between; otherwise sync() replays
+            if self._known_version is None or remote == self._known_version + 1:
+                self._known_version = remote
+        except Exception as e:
+            print(f"Cache version publish failed: {e}")
+            self._known_version = (self._known_version or 0) + 1
+
+    # ------------------------------------------------------------------
+    # Cache operations
+    # ------------------------------------------------------------------
+
+    def get(self, key: str, ttl_seconds: float | None = None) -> Any | None:
+        self.sync()
+        return self.backend.get(key, ttl_seconds=ttl_seconds)
+
+    def set(self, key: str, value: Any, tags: Iterable[str] = (), ttl_seconds: float | None = None) -> None:
+        self.backend.set(key, value, tags=tags, ttl_seconds=ttl_seconds)
+
+    def invalidate(self, key: str) -> int:
+        dropped = self.backend.invalidate(key)
+        self._publish({"keys": [key]})
+        return dropped
+
+    def invalidate_tags(self, tags: List[str], namespace: str | None = None) -> int:
+        dropped = sum(self.backend.invalidate_tag(tag) for tag in tags)
+        self._publish({"tags": list(tags), "namespace": namespace})
+        return dropped
+
+    def invalidate_tag(self, tag: str) -> int:
+        return self.invalidate_tags([tag])
+
+    def invalidate_namespace(self, namespace: str) -> int:
+        dropped = self.backend.invalidate_namespace(namespace)
+        self._publish({"namespace": namespace})
+        return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.backend.stats(),
+            "shared": self.backend.shared,
+            "version": self.version,
+            "version_check_seconds": self.check_seconds,
+            "remote_invalidations": self.remote_invalidations,
+            "coherent": self._stamp_coll() is not None,
+        }
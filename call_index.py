@@ -0,0 +1,333 @@
+"""
+Call Index
+
+In-memory columnar index over the structured fields stored in the call manifest.
+Categorical fields get small posting lists (value -> set of row ids) so filters on
+category, attitude, sentiment, disposition, etc. are set intersections; dates,
+free-text search and sorting are evaluated on the columns of the surviving rows.
+The index is kept current per call through the manifest's change listener (like
+the call table); it is only rebuilt after the manifest was reloaded wholesale, and
+deleted rows are recycled.
+"""
+
+import base64
+import hashlib
+import json
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Query parameter name -> manifest field holding the categorical value
+CATEGORICAL_FIELDS = {
+    "category": "call_category",
+    "attitude": "agent_attitude",
+    "sentiment": "customer_sentiment",
+    "disposition": "disposition",
+    "resolution_status": "resolution_status",
+    "topic": "main_topic",
+    "professionalism": "agent_professionalism",
+    "agent": "agent_name",
+}
+
+# Sort parameter name -> column
+SORT_FIELDS = {
+    "uploaded_at": "uploaded_at",
+    "call_id": "call_id",
+    "sentiment_score": "sentiment_score",
+    "aht": "aht_seconds",
+    "talk_time": "talk_time_seconds",
+    "hold_time": "hold_time_seconds",
+}
+
+TEXT_FIELDS = ("call_id", "main_subject", "main_topic", "services", "call_outcome", "summary", "call_category", "agent_attitude")
+
+
+def _norm(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(value).strip().lower()
+    return text or None
+
+
+def _num(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class CallIndex:
+    def __init__(self):
+        """Initialize an empty index; rows are (re)built from the manifest on first use."""
+        self._lock = threading.RLock()
+        self._reset()
+        self._stale = True
+        # Incremented on every manifest event so sync() can detect changes racing a rebuild
+        self._events = 0
+
+    def _reset(self) -> None:
+        # Row -> call_id (None for a recycled row)
+        self.call_ids: List[str | None] = []
+        self.columns: Dict[str, List[Any]] = {name: [] for name in set(SORT_FIELDS.values())}
+        self.postings: Dict[str, Dict[str, set]] = {param: {} for param in CATEGORICAL_FIELDS}
+        self.text: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        # Row -> the posting keys it was filed under, so an update can unfile it
+        self._keys: List[Dict[str, str]] = []
+
+    # ------------------------------------------------------------------
+    # Row maintenance
+    # ------------------------------------------------------------------
+
+    def _unfile(self, row: int) -> None:
+        for param, key in self._keys[row].items():
+            posting = self.postings[param].get(key)
+            if posting is not None:
+                posting.discard(row)
+                if not posting:
+                    del self.postings[param][key]
+        self._keys[row] = {}
+
+    def _set_row(self, entry: Dict[str, Any]) -> None:
+        call_id = entry["call_id"]
+        row = self._rows.get(call_id)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+            else:
+                row = len(self.call_ids)
+                self.call_ids.append(None)
+                for values in self.columns.values():
+                    values.append(None)
+                self.text.append("")
+                self._keys.append({})
+            self._rows[call_id] = row
+        else:
+            self._unfile(row)
+        fields = dict(entry.get("fields") or {})
+        # Derived category/attitude live at the top level of the manifest entry
+        fields.setdefault("call_category", entry.get("call_category"))
+        fields.setdefault("agent_attitude", entry.get("agent_attitude"))
+        self.call_ids[row] = call_id
+        self.columns["uploaded_at"][row] = entry.get("uploaded_at") or ""
+        self.columns["call_id"][row] = call_id
+        for col in ("sentiment_score", "aht_seconds", "talk_time_seconds", "hold_time_seconds"):
+            self.columns[col][row] = _num(fields.get(col))
+        for param, field in CATEGORICAL_FIELDS.items():
+            key = _norm(fields.get(field))
+            if key is not None:
+                self.postings[param].setdefault(key, set()).add(row)
+                self._keys[row][param] = key
+        self.text[row] = " ".join(str(fields.get(f) or entry.get(f) or "") for f in TEXT_FIELDS).lower()
+
+    def _clear_row(self, call_id: str) -> None:
+        row = self._rows.pop(call_id, None)
+        if row is None:
+            return
+        self._unfile(row)
+        self.call_ids[row] = None
+        for values in self.columns.values():
+            values[row] = None
+        self.text[row] = ""
+        self._free.append(row)
+
+    def on_manifest_change(self, call_id: str | None, entry: Dict[str, Any] | None) -> None:
+        """Manifest listener: update one row, drop it (entry None), or rebuild lazily (call_id None)."""
+        with self._lock:
+            self._events += 1
+            if call_id is None:
+                self._stale = True
+            elif self._stale:
+                return
+            elif entry is None:
+                self._clear_row(call_id)
+            else:
+                self._set_row(entry)
+
+    def sync(self, manifest) -> "CallIndex":
+        """Rebuild from the manifest if a bulk reload invalidated the index."""
+        for _ in range(3):
+            if not self._stale:
+                return self
+            # Snapshot outside our lock: the manifest notifies listeners while holding its own
+            seen = self._events
+            entries = manifest.all_entries()
+            with self._lock:
+                if self._events != seen:
+                    continue
+                self._reset()
+                for entry in entries:
+                    self._set_row(entry)
+                self._stale = False
+        return self
+
+    def values(self, param: str) -> Dict[str, int]:
+        """Return value -> row count for a categorical parameter (useful for filter pickers)."""
+        with self._lock:
+            return {k: len(v) for k, v in self.postings.get(param, {}).items()}
+
+    def facets(self, param: str, filters: Dict[str, Iterable[str]] | None = None) -> Dict[str, int]:
+        """Return value -> call count for param among the calls matching the other filters
+        (same semantics as CallStore.facets)."""
+        others = {k: v for k, v in (filters or {}).items() if k != param}
+        if not others:
+            return self.values(param)
+        with self._lock:
+            rows = self._filter_rows(others)
+            if not rows:
+                return {}
+            return {k: n for k, v in self.postings.get(param, {}).items() if (n := len(v & rows))}
+
+    def _filter_rows(self, filters: Dict[str, Iterable[str]]) -> set | None:
+        """Rows matching every categorical filter (None: no filter given)."""
+        rows: set | None = None
+        for param, wanted in filters.items():
+            posting = self.postings.get(param, {})
+            matched: set = set()
+            for value in wanted:
+                key = _norm(value)
+                if key is not None:
+                    matched |= posting.get(key, set())
+            rows = matched if rows is None else rows & matched
+            if not rows:
+                return set()
+        return rows
+
+    def query(
+        self,
+        filters: Dict[str, Iterable[str]] | None = None,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        text: str | None = None,
+        sort: str = "uploaded_at",
+        descending: bool = True,
+        after: List[Any] | None = None,
+        until: str | None = None,
+    ) -> Tuple[List[Tuple[str, Any]], int]:
+        """Return ([(call_id, sort_value), ...], total) for calls matching every filter.
+
+        filters maps a CATEGORICAL_FIELDS parameter to accepted values (OR within a
+        field, AND across fields). Dates compare against the ISO uploaded_at column;
+        date_to is inclusive of the whole day when given as YYYY-MM-DD.
+        after is a cursor position [sort_value, call_id]: only rows strictly after it in
+        the requested order are returned. until excludes calls uploaded after the
+        snapshot timestamp. total counts every match in the snapshot, ignoring after.
+        """
+        with self._lock:
+            rows = self._filter_rows(filters or {})
+            if rows is not None and not rows:
+                return [], 0
+            candidates = list(self._rows.values()) if rows is None else rows
+
+            uploaded = self.columns.get("uploaded_at", [])
+            # A date-only upper bound (YYYY-MM-DD) covers that whole day
+            to_len = 10 if date_to and len(date_to) == 10 else None
+            needle = _norm(text)
+            selected: List[int] = []
+            for row in candidates:
+                ts = uploaded[row]
+                if until and ts > until:
+                    continue
+                if date_from and ts < date_from:
+                    continue
+                if date_to and ts[:to_len] > date_to:
+                    continue
+                if needle and needle not in self.text[row]:
+                    continue
+                selected.append(row)
+
+            total = len(selected)
+            column = self.columns.get(SORT_FIELDS.get(sort, "uploaded_at"), uploaded)
+            if after is not None:
+                selected = [r for r in selected if self._is_after(column, r, after, descending)]
+            # Rows without a value always sort last; call_id breaks ties deterministically
+            present = [r for r in selected if column[r] is not None]
+            missing = [r for r in selected if column[r] is None]
+            present.sort(key=lambda r: (column[r], self.call_ids[r]), reverse=descending)
+            missing.sort(key=lambda r: self.call_ids[r], reverse=descending)
+            return [(self.call_ids[r], column[r]) for r in present + missing], total
+
+    def _is_after(self, column: List[Any], row: int, after: List[Any], descending: bool) -> bool:
+        """True when row sorts strictly after the cursor position in the requested order."""
+        value, call_id = column[row], self.call_ids[row]
+        cursor_value, cursor_id = after[0], after[1]
+        # Present values come before missing ones regardless of direction
+        if (value is None) != (cursor_value is None):
+            return value is None
+        mine = (call_id,) if value is None else (value, call_id)
+        theirs = (cursor_id,) if cursor_value is None else (cursor_value, cursor_id)
+        try:
+            return mine < theirs if descending else mine > theirs
+        except TypeError:
+            return False
+
+
+def parse_query_args(args) -> Tuple[Dict[str, List[str]], Dict[str, Any]]:
+    """Split request args into (categorical filters, other query options).
+
+    Categorical values may be repeated (?sentiment=Negative&sentiment=Neutral) or
+    comma-separated (?sentiment=Negative,Neutral).
+    """
+    filters: Dict[str, List[str]] = {}
+    for param in CATEGORICAL_FIELDS:
+        raw = args.getlist(param) if hasattr(args, "getlist") else [args.get(param)]
+        values = [v.strip() for item in raw if item for v in str(item).split(",") if v.strip()]
+        if values:
+            filters[param] = values
+    sort = (args.get("sort") or "uploaded_at").strip()
+    if sort.startswith("-"):
+        sort, order = sort[1:], "desc"
+    else:
+        order = (args.get("order") or ("desc" if sort == "uploaded_at" else "asc")).strip().lower()
+    options = {
+        "date_from": (args.get("date_from") or "").strip() or None,
+        "date_to": (args.get("date_to") or "").strip() or None,
+        "text": (args.get("q") or "").strip() or None,
+        "sort": sort if sort in SORT_FIELDS else "uploaded_at",
+        "descending": order != "asc",
+    }
+    return filters, options
+
+
+def query_signature(filters: Dict[str, List[str]], options: Dict[str, Any]) -> str:
+    """Short stable hash of a query so a cursor cannot be replayed against a different one."""
+    raw = json.dumps({"filters": filters, **options}, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def encode_cursor(version: int, until: str, position: List[Any], signature: str) -> str:
+    """Encode an opaque cursor: snapshot version/timestamp, last sort key and query signature.
+    The timestamp and sort key anchor the next page; the version records where it was issued.
+    """
+    raw = json.dumps({"v": version, "t": until, "k": position, "q": signature}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Dict[str, Any]:
+    """Decode a cursor produced by encode_cursor. Raises ValueError when it is malformed."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(data, dict) or not isinstance(data.get("k"), list) or len(data["k"]) != 2:
+        raise ValueError("Invalid cursor: missing sort key")
+    if not isinstance(data.get("v"), int) or not isinstance(data.get("t"), (str, type(None))):
+        raise ValueError("Invalid cursor: missing snapshot")
+    return data
+
+
+def is_default_query(filters: Dict[str, List[str]], options: Dict[str, Any]) -> bool:
+    """True when no filter/search/non-default sort was requested (plain manifest paging applies)."""
+    return (
+        not filters
+        and not options.get("date_from")
+        and not options.get("date_to")
+        and not options.get("text")
+        and options.get("sort") == "uploaded_at"
+        and options.get("descending", True)
+    )
+
+
+# Global instance
+call_index = CallIndex()
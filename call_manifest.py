@@ -0,0 +1,458 @@
+"""
+Call Manifest
+
+This module keeps a persisted manifest of every call (call_id -> audio path,
+upload time, which derived assets exist and the derived category/attitude) so
+listing endpoints can serve a page as a slice of an already-sorted index instead
+of listing the whole blob container on every request.
+
+The manifest is stored as a single JSON blob under the cache folder and is kept
+up to date by the upload and delete paths. Every process (API workers, upload
+workers) holds its own copy, so saves are conditional on the blob's ETag: when
+another process saved first, the blob is reloaded, this process's pending
+changes are re-applied on top and the save is retried. Pending changes are
+coalesced per call, so they stay bounded by the number of calls while saves
+fail, and failed saves back off before the next attempt.
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+from azure.storage.blob import ContentSettings
+
+from services import azure_storage
+
+MANIFEST_PREFIX = "cache"
+MANIFEST_BLOB_NAME = "call_manifest.json"
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".m4a", ".mp4")
+SAVE_ATTEMPTS = 5
+# Delay before retrying a save that failed (doubling per failure, up to the max)
+SAVE_RETRY_SECONDS = float(os.getenv("CALL_MANIFEST_SAVE_RETRY_SECONDS", "2"))
+SAVE_RETRY_MAX_SECONDS = float(os.getenv("CALL_MANIFEST_SAVE_RETRY_MAX_SECONDS", "300"))
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _sort_key(entry: Dict[str, Any]) -> tuple:
+    return (entry.get("uploaded_at") or "", entry.get("call_id") or "")
+
+
+def _new_entry(call_id: str) -> Dict[str, Any]:
+    return {
+        "call_id": call_id,
+        "audio_name": None,
+        "audio_path": None,
+        "uploaded_at": _now_iso(),
+        "has_transcript": False,
+        "has_analysis": False,
+        "analysis_path": None,
+        "has_revised_arabic": False,
+        "has_revised_english": False,
+        "call_category": None,
+        "agent_attitude": None,
+    }
+
+
+class CallManifest:
+    def __init__(self):
+        """Initialize an empty manifest; contents are loaded lazily on first use."""
+        self._lock = threading.RLock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # Ascending (uploaded_at, call_id) keys; newest-first pages are read from the tail
+        self._order: List[tuple] = []
+        self._loaded = False
+        self._dirty = False
+        # Changes not yet saved, one per call: (replace, fields) for upserts (replace: the call was
+        # removed first), (False, None) for removals; re-applied on top of another process's save
+        # when ours is rejected
+        self._pending: Dict[str, tuple] = {}
+        self._save_failures = 0
+        self._last_save_error: str | None = None
+        self._retry_at = 0.0
+        # ETag of the manifest blob as last loaded/saved by this process
+        self._etag: str | None = None
+        self.version = 0
+        # Called with (call_id, entry) on upsert, (call_id, None) on remove and (None, None)
+        # when the entries were replaced wholesale (load / rebuild)
+        self._listeners: List[Callable[[str | None, Dict[str, Any] | None], None]] = []
+
+    def add_listener(self, listener: Callable[[str | None, Dict[str, Any] | None], None]) -> None:
+        """Register a callback kept in sync with per-call changes (e.g. in-memory tables)."""
+        self._listeners.append(listener)
+
+    def _notify(self, call_id: str | None, entry: Dict[str, Any] | None) -> None:
+        for listener in self._listeners:
+            try:
+                listener(call_id, entry)
+            except Exception as e:
+                print(f"Call manifest listener failed: {e}")
+
+    # ------------------------------------------------------------------
+    # Loading / persistence
+    # ------------------------------------------------------------------
+
+    def ensure_loaded(self) -> "CallManifest":
+        """Load the manifest from blob storage, rebuilding it from the container if missing."""
+        if self._loaded:
+            return self
+        with self._lock:
+            if self._loaded:
+                return self
+            if self._load_from_blob():
+                print(f"Call manifest loaded with {len(self._entries)} calls")
+            else:
+                print("No call manifest found in blob storage - rebuilding from container listing")
+                self.rebuild()
+        return self
+
+    def _blob_client(self):
+        return azure_storage.get_blob_client(MANIFEST_BLOB_NAME, MANIFEST_PREFIX)
+
+    def _load_from_blob(self) -> bool:
+        """Replace in-memory entries with the persisted manifest. Returns False if none exists."""
+        try:
+            downloader = self._blob_client().download_blob()
+            data = json.loads(downloader.readall().decode("utf-8"))
+            etag = downloader.properties.etag
+        except Exception as e:
+            if "BlobNotFound" not in str(e):
+                print(f"Error loading call manifest: {e}")
+            return False
+        if not isinstance(data, dict) or not isinstance(data.get("calls"), dict):
+            return False
+        calls = data["calls"]
+        for call_id, (replace, fields) in self._pending.items():
+            if fields is None:
+                calls.pop(call_id, None)
+            else:
+                base = _new_entry(call_id) if replace else (calls.get(call_id) or _new_entry(call_id))
+                calls[call_id] = {**base, **fields, "call_id": call_id}
+        self._replace_entries(calls)
+        # Never move backwards so version-keyed consumers always see a change
+        self.version = max(self.version + 1, int(data.get("version") or 0))
+        self._etag = etag
+        self._loaded = True
+        self._dirty = bool(self._pending)
+        return True
+
+    def remote_etag(self) -> str | None:
+        """Return the current ETag of the persisted manifest (one HEAD request)."""
+        try:
+            return self._blob_client().get_blob_properties().etag
+        except Exception:
+            return None
+
+    def fingerprint(self) -> str:
+        """Identify the manifest contents consistently across workers (blob ETag, plus the
+        local version while unsaved changes are pending)."""
+        self.ensure_loaded()
+        if self._dirty or not self._etag:
+            return f"{self._etag}+{self.version}"
+        return self._etag
+
+    def reload_if_changed(self) -> bool:
+        """Reload the manifest if another process rewrote it since we last loaded/saved it."""
+        if not self._loaded:
+            self.ensure_loaded()
+            return False
+        etag = self.remote_etag()
+        if etag is None or etag == self._etag:
+            return False
+        with self._lock:
+            # Pending local changes are re-applied on top of the reloaded manifest
+            return self._load_from_blob()
+
+    def _record_pending(self, call_id: str, fields: Dict[str, Any] | None) -> None:
+        """Coalesce a change into the call's pending change (fields None: removal)."""
+        if fields is None:
+            self._pending[call_id] = (False, None)
+            return
+        replace, previous = self._pending.get(call_id, (False, {}))
+        if previous is None:
+            # Removed and re-created before a save: the replayed entry must not keep old fields
+            self._pending[call_id] = (True, dict(fields))
+        else:
+            self._pending[call_id] = (replace, {**previous, **fields})
+
+    def _replace_entries(self, calls: Dict[str, Dict[str, Any]]) -> None:
+        previous = self._entries
+        self._entries = {cid: dict(entry, call_id=cid) for cid, entry in calls.items()}
+        self._order = sorted(_sort_key(e) for e in self._entries.values())
+        if not self._loaded:
+            self._notify(None, None)
+            return
+        # Listeners only see the calls that actually changed
+        for cid, entry in self._entries.items():
+            if previous.get(cid) != entry:
+                self._notify(cid, entry)
+        for cid in previous.keys() - self._entries.keys():
+            self._notify(cid, None)
+
+    def save(self) -> bool:
+        """Persist the manifest to blob storage, unless another process saved since our load.
+
+        On a conflict the blob is reloaded, pending changes are re-applied and the save retried.
+        After a failed save, further saves are skipped until the retry delay has passed (the
+        changes stay pending and go out with the next save).
+        """
+        with self._lock:
+            if time.time() < self._retry_at:
+                return False
+            for _ in range(SAVE_ATTEMPTS):
+                payload = {
+                    "version": self.version,
+                    "saved_at": _now_iso(),
+                    "calls": self._entries,
+                }
+                if self._etag:
+                    condition = {"etag": self._etag, "match_condition": MatchConditions.IfNotModified}
+                else:
+                    condition = {"match_condition": MatchConditions.IfMissing}
+                try:
+                    response = self._blob_client().upload_blob(
+                        json.dumps(payload).encode("utf-8"),
+                        overwrite=True,
+                        content_settings=ContentSettings(content_type="application/json"),
+                        **condition,
+                    )
+                except (ResourceModifiedError, ResourceExistsError):
+                    print("Call manifest changed by another process - merging pending changes and retrying")
+                    if not self._load_from_blob():
+                        return self._save_failed("reload after a conflicting save failed")
+                    continue
+                except Exception as e:
+                    return self._save_failed(str(e))
+                self._etag = response.get("etag") or self.remote_etag()
+                self._pending = {}
+                self._dirty = False
+                self._save_failures = 0
+                self._retry_at = 0.0
+                return True
+            return self._save_failed("too many concurrent writers")
+
+    def _save_failed(self, error: str) -> bool:
+        self._save_failures += 1
+        self._last_save_error = error
+        delay = min(SAVE_RETRY_MAX_SECONDS, SAVE_RETRY_SECONDS * 2 ** (self._save_failures - 1))
+        self._retry_at = time.time() + delay
+        print(f"Error saving call manifest ({len(self._pending)} pending change(s), retrying in {delay:.0f}s): {error}")
+        return False
+
+    def flush(self) -> bool:
+        """Persist pending changes made with persist=False."""
+        if not self._dirty:
+            return True
+        return self.save()
+
+    def rebuild(self) -> int:
+        """Rebuild the manifest with one listing per folder (used on bootstrap and forced refresh).
+
+        Fields recorded by the write paths (derived category/attitude, index fields, ...) are
+        preserved; for new entries they are filled the first time their analysis is loaded.
+        """
+        with self._lock:
+            if not self._loaded:
+                # Start from the persisted entries (if any) so their recorded fields survive
+                self._load_from_blob()
+            container = azure_storage.blob_service_client.get_container_client(azure_storage.DEFAULT_CONTAINER)
+
+            audio_blobs = list(container.list_blobs(name_starts_with=f"{azure_storage.AUDIO_FOLDER}/"))
+            if not audio_blobs:
+                # Fallback: scan entire container for audio extensions
+                audio_blobs = [b for b in container.list_blobs() if b.name.lower().endswith(AUDIO_EXTENSIONS)]
+
+            def _ids_under(prefix: str, ext: str) -> set:
+                ids = set()
+                for b in container.list_blobs(name_starts_with=f"{prefix}/"):
+                    if b.name.endswith(ext):
+                        ids.add(b.name.split("/")[-1].rsplit(".", 1)[0])
+                return ids
+
+            transcripts = _ids_under(azure_storage.TRANSCRIPTION_FOLDER, ".txt")
+            revised_ar = _ids_under(azure_storage.REVISED_ARABIC_FOLDER, ".txt")
+            revised_en = _ids_under(azure_storage.REVISED_ENGLISH_FOLDER, ".txt")
+            persona_prefix = f"{azure_storage.LLM_ANALYSIS_FOLDER}/persona/"
+            analyses: Dict[str, str] = {}
+            for b in container.list_blobs(name_starts_with=f"{azure_storage.LLM_ANALYSIS_FOLDER}/"):
+                if not b.name.endswith(".json"):
+                    continue
+                cid = b.name.split("/")[-1].rsplit(".", 1)[0]
+                # Prefer the persona copy when both exist
+                if cid not in analyses or b.name.startswith(persona_prefix):
+                    analyses[cid] = b.name
+
+            previous = self._entries
+            calls: Dict[str, Dict[str, Any]] = {}
+            for blob in audio_blobs:
+                audio_name = blob.name.split("/")[-1]
+                call_id = audio_name.rsplit(".", 1)[0]
+                if call_id in calls:
+                    continue
+                # Start from the existing entry so fields recorded by the write paths survive
+                entry = dict(previous.get(call_id) or {})
+                uploaded_at = entry.get("uploaded_at")
+                if not uploaded_at:
+                    # Only calls without a recorded upload time take the blob's; a recorded one is kept
+                    # so a reconcile does not rewrite entries (and move cursors) on every run
+                    created = getattr(blob, "creation_time", None) or getattr(blob, "last_modified", None)
+                    uploaded_at = created.isoformat() if isinstance(created, datetime) else None
+                entry.update({
+                    "call_id": call_id,
+                    "audio_name": audio_name,
+                    "audio_path": blob.name,
+                    "uploaded_at": uploaded_at,
+                    "has_transcript": call_id in transcripts,
+                    "has_analysis": call_id in analyses,
+                    "analysis_path": analyses.get(call_id),
+                    "has_revised_arabic": call_id in revised_ar,
+                    "has_revised_english": call_id in revised_en,
+                })
+                entry.setdefault("call_category", None)
+                entry.setdefault("agent_attitude", None)
+                calls[call_id] = entry
+
+            if self._loaded and calls == previous:
+                # Nothing changed in storage; keep the version so caches stay valid
+                return len(calls)
+            # Record the differences as pending changes so a conflicting save merges them
+            for cid, entry in calls.items():
+                if previous.get(cid) != entry:
+                    self._record_pending(cid, entry)
+            for cid in previous.keys() - calls.keys():
+                self._record_pending(cid, None)
+            self._dirty = True
+            self._replace_entries(calls)
+            self.version += 1
+            self._loaded = True
+            print(f"Call manifest rebuilt with {len(calls)} calls")
+            self.save()
+            return len(calls)
+
+    # ------------------------------------------------------------------
+    # Mutations (called by the upload / delete paths)
+    # ------------------------------------------------------------------
+
+    def upsert(self, call_id: str, persist: bool = True, **fields: Any) -> Dict[str, Any]:
+        """Create or update the entry for call_id with the given fields."""
+        self.ensure_loaded()
+        with self._lock:
+            existing = self._entries.get(call_id)
+            if existing is not None:
+                old_key = _sort_key(existing)
+                entry = dict(existing)
+            else:
+                old_key = None
+                entry = _new_entry(call_id)
+            entry.update(fields)
+            entry["call_id"] = call_id
+            new_key = _sort_key(entry)
+            if old_key != new_key:
+                if old_key is not None:
+                    self._remove_key(old_key)
+                bisect.insort(self._order, new_key)
+            self._entries[call_id] = entry
+            self._record_pending(call_id, fields)
+            self.version += 1
+            self._dirty = True
+            self._notify(call_id, entry)
+            if persist:
+                self.save()
+            return dict(entry)
+
+    def remove(self, call_id: str, persist: bool = True) -> bool:
+        """Drop call_id from the manifest. Returns True if it was present."""
+        self.ensure_loaded()
+        with self._lock:
+            entry = self._entries.pop(call_id, None)
+            if entry is None:
+                return False
+            self._remove_key(_sort_key(entry))
+            self._record_pending(call_id, None)
+            self.version += 1
+            self._dirty = True
+            self._notify(call_id, None)
+            if persist:
+                self.save()
+            return True
+
+    def _remove_key(self, key: tuple) -> None:
+        idx = bisect.bisect_left(self._order, key)
+        if idx < len(self._order) and self._order[idx] == key:
+            del self._order[idx]
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def get(self, call_id: str) -> Optional[Dict[str, Any]]:
+        self.ensure_loaded()
+        entry = self._entries.get(call_id)
+        return dict(entry) if entry else None
+
+    def count(self) -> int:
+        self.ensure_loaded()
+        return len(self._entries)
+
+    def page(self, start: int, size: int) -> List[Dict[str, Any]]:
+        """Return entries [start, start+size) in newest-first order; costs O(size)."""
+        self.ensure_loaded()
+        with self._lock:
+            n = len(self._order)
+            hi = n - start
+            lo = max(0, hi - size)
+            if hi <= 0:
+                return []
+            keys = self._order[lo:hi]
+            return [dict(self._entries[cid]) for _, cid in reversed(keys) if cid in self._entries]
+
+    def latest_uploaded_at(self) -> str:
+        """Return the newest uploaded_at in the manifest ("" when empty)."""
+        self.ensure_loaded()
+        with self._lock:
+            return self._order[-1][0] if self._order else ""
+
+    def page_before(self, key: tuple | None, size: int, until: str | None = None) -> List[Dict[str, Any]]:
+        """Return up to size entries older than key = (uploaded_at, call_id), newest first.
+
+        until bounds the view to calls uploaded at or before that timestamp so a cursor
+        keeps paging through the same snapshot while new uploads arrive. Costs O(log N + size).
+        """
+        self.ensure_loaded()
+        with self._lock:
+            hi = len(self._order)
+            if key is not None:
+                hi = bisect.bisect_left(self._order, tuple(key))
+            if until:
+                # "\uffff" sorts after any call_id sharing the same timestamp
+                hi = min(hi, bisect.bisect_right(self._order, (until, "\uffff")))
+            lo = max(0, hi - size)
+            keys = self._order[lo:hi]
+            return [dict(self._entries[cid]) for _, cid in reversed(keys) if cid in self._entries]
+
+    def status(self) -> Dict[str, Any]:
+        """Unsaved backlog and save health of this process's copy."""
+        return {
+            "version": self.version,
+            "calls": len(self._entries),
+            "pending_changes": len(self._pending),
+            "save_failures": self._save_failures,
+            "last_save_error": self._last_save_error,
+            "retry_at": self._retry_at or None,
+        }
+
+    def all_entries(self) -> List[Dict[str, Any]]:
+        """Return every entry in newest-first order."""
+        return self.page(0, self.count())
+
+
+# Global instance
+call_manifest = CallManifest()
@@ -0,0 +1,313 @@
+"""
+Call Store
+
+Mongo `calls` collection with one document per call: call_id, audio path,
+upload time, pipeline status and the normalized structured fields. It mirrors
+the call manifest through the manifest's change listener, so every write path
+that records a call (upload, analysis, delete, rebuild) also writes here.
+Listener events are queued and written in bulk by a background thread, keeping
+Mongo round trips off the request path and out of the manifest lock. A full
+reconcile with the manifest (at startup, or after a failed write) also runs on
+that thread; until it has succeeded, queries fall back to the in-memory index.
+
+Filtered /calls pages are indexed queries on this collection (filters, date
+range, sort, keyset cursor) and facet counts are aggregation pipelines. The
+filter fields are stored lower-cased under their query parameter names, matching
+the case-insensitive semantics of the in-memory CallIndex, which stays the
+fallback while Mongo is unavailable.
+"""
+
+import queue
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Tuple
+
+from call_index import CATEGORICAL_FIELDS, SORT_FIELDS, TEXT_FIELDS
+
+NUMERIC_FIELDS = ("sentiment_score", "aht_seconds", "talk_time_seconds", "hold_time_seconds")
+
+
+def _norm(value: Any) -> str | None:
+    if isinstance(value, dict):
+        value = value.get("score")
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    text = str(value).strip().lower()
+    return text or None
+
+
+def _num(value: Any) -> float | None:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def pipeline_status(entry: Dict[str, Any]) -> str:
+    if entry.get("search_indexed"):
+        return "indexed"
+    if entry.get("has_analysis"):
+        return "analyzed"
+    if entry.get("has_transcript"):
+        return "transcribed"
+    return "uploaded"
+
+
+def call_document(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the calls-collection document for a manifest entry."""
+    fields = dict(entry.get("fields") or {})
+    fields.setdefault("call_category", entry.get("call_category"))
+    fields.setdefault("agent_attitude", entry.get("agent_attitude"))
+    doc: Dict[str, Any] = {
+        "_id": entry["call_id"],
+        "call_id": entry["call_id"],
+        "audio_name": entry.get("audio_name"),
+        "audio_path": entry.get("audio_path"),
+        "uploaded_at": entry.get("uploaded_at") or "",
+        "status": pipeline_status(entry),
+        "analysis_path": entry.get("analysis_path"),
+        "fields": fields,
+        "search_text": " ".join(str(fields.get(f) or entry.get(f) or "") for f in TEXT_FIELDS).lower(),
+    }
+    for param, field in CATEGORICAL_FIELDS.items():
+        doc[param] = _norm(fields.get(field))
+    for field in NUMERIC_FIELDS:
+        doc[field] = _num(fields.get(field))
+    return doc
+
+
+class CallStore:
+    def __init__(self, collection_getter, manifest, retry_seconds: float = 30.0):
+        """Create the store over the collection returned by collection_getter (None when unavailable),
+        mirroring manifest."""
+        self.collection_getter = collection_getter
+        self.manifest = manifest
+        self.retry_seconds = retry_seconds
+        self._queue: "queue.Queue[Tuple[str | None, Dict[str, Any] | None]]" = queue.Queue()
+        self._indexes_ready = False
+        # False until a full reconcile with the manifest succeeded; queries fall back until then
+        self._synced = False
+        self._resync = True
+        self.reconciles = 0
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self.writes = 0
+        self.last_error: str | None = None
+
+    def _coll(self):
+        try:
+            coll = self.collection_getter()
+        except Exception as e:
+            self.last_error = str(e)
+            return None
+        if coll is not None and not self._indexes_ready:
+            try:
+                coll.create_index([("uploaded_at", -1), ("call_id", -1)])
+                coll.create_index([("category", 1), ("uploaded_at", -1)])
+                coll.create_index([("agent", 1), ("uploaded_at", -1)])
+                self._indexes_ready = True
+            except Exception as e:
+                print(f"Call store: index creation failed: {e}")
+        return coll
+
+    # ------------------------------------------------------------------
+    # Writes (manifest listener -> queue -> bulk writer)
+    # ------------------------------------------------------------------
+
+    def on_manifest_change(self, call_id: str | None, entry: Dict[str, Any] | None) -> None:
+        """Manifest listener: queue an upsert, a delete (entry None) or a full reconcile (call_id None)."""
+        if call_id is None:
+            self._resync = True
+        self._queue.put((call_id, dict(entry) if entry else None))
+        self._start()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                if self._resync:
+                    # First thing the writer does is the initial reconcile
+                    self._queue.put((None, None))
+                self._thread = threading.Thread(target=self._writer, name="call-store-writer", daemon=True)
+                self._thread.start()
+
+    def _writer(self) -> None:
+        from pymongo import DeleteOne, ReplaceOne
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.retry_seconds)]
+            except queue.Empty:
+                # Idle: retry a reconcile that failed earlier
+                if self._resync:
+                    self._reconcile()
+                continue
+            while len(batch) < 500:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # Last event per call wins; a reconcile supersedes everything before it
+            ops: Dict[str, Any] = {}
+            for call_id, entry in batch:
+                if call_id is None:
+                    ops.clear()
+                    continue
+                ops[call_id] = ReplaceOne({"_id": call_id}, call_document(entry), upsert=True) if entry else DeleteOne({"_id": call_id})
+            try:
+                if ops:
+                    coll = self._coll()
+                    if coll is None:
+                        raise RuntimeError("Mongo unavailable")
+                    coll.bulk_write(list(ops.values()), ordered=False)
+                    self.writes += len(ops)
+            except Exception as e:
+                # Dropped writes are repaired by a full reconcile
+                self._resync = True
+                self.last_error = str(e)
+                print(f"Call store write failed: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if self._resync:
+                self._reconcile()
+
+    def _reconcile(self) -> bool:
+        """Replace the collection's contents with the manifest's (writer thread only)."""
+        coll = self._coll()
+        if coll is None:
+            return False
+        try:
+            from pymongo import ReplaceOne
+            # Events arriving from here on are applied after this snapshot
+            self._resync = False
+            entries = self.manifest.all_entries()
+            ids = [e["call_id"] for e in entries]
+            for i in range(0, len(entries), 500):
+                coll.bulk_write(
+                    [ReplaceOne({"_id": e["call_id"]}, call_document(e), upsert=True) for e in entries[i:i + 500]],
+                    ordered=False,
+                )
+            coll.delete_many({"_id": {"$nin": ids}})
+            self._synced = True
+            self.reconciles += 1
+            return True
+        except Exception as e:
+            self._resync = True
+            self.last_error = str(e)
+            print(f"Call store reconcile failed: {e}")
+            return False
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until queued writes reached Mongo (maintenance/diagnostics; not for request paths)."""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks:
+            if time.time() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def ready(self) -> bool:
+        """True when the collection mirrors the manifest and can serve queries (never blocks)."""
+        self._start()
+        return self._synced and not self._resync
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _match(
+        self,
+        filters: Dict[str, Iterable[str]] | None,
+        date_from: str | None,
+        date_to: str | None,
+        text: str | None,
+        until: str | None,
+    ) -> Dict[str, Any]:
+        match: Dict[str, Any] = {}
+        for param, wanted in (filters or {}).items():
+            values = [v for v in (_norm(x) for x in wanted) if v is not None]
+            match[param] = {"$in": values}
+        uploaded: Dict[str, Any] = {}
+        if date_from:
+            uploaded["$gte"] = date_from
+        upper = [until] if until else []
+        if date_to:
+            # A date-only upper bound (YYYY-MM-DD) covers that whole day
+            upper.append(date_to + "\uffff" if len(date_to) == 10 else date_to)
+        if upper:
+            uploaded["$lte"] = min(upper)
+        if uploaded:
+            match["uploaded_at"] = uploaded
+        needle = _norm(text)
+        if needle:
+            match["search_text"] = {"$regex": re.escape(needle)}
+        return match
+
+    def query(
+        self,
+        filters: Dict[str, Iterable[str]] | None = None,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        text: str | None = None,
+        sort: str = "uploaded_at",
+        descending: bool = True,
+        after: List[Any] | None = None,
+        until: str | None = None,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> Tuple[List[Tuple[str, Any]], int]:
+        """Return ([(call_id, sort_value), ...] for one page, total) with CallIndex.query semantics.
+
+        Rows without a sort value come last in either direction; call_id breaks ties.
+        limit is the page size plus one when the caller needs to know whether more follow.
+        """
+        coll = self._coll()
+        if coll is None:
+            raise RuntimeError("Mongo unavailable")
+        column = SORT_FIELDS.get(sort, "uploaded_at")
+        base = self._match(filters, date_from, date_to, text, until)
+        total = coll.count_documents(base)
+        direction = -1 if descending else 1
+        cmp = "$lt" if descending else "$gt"
+        present: Dict[str, Any] = {**base, column: {**base.get(column, {}), "$ne": None}}
+        missing: Dict[str, Any] = {"$and": [base, {column: None}]}
+        if after is not None:
+            value, call_id = after[0], after[1]
+            if value is None:
+                present = None
+                missing = {"$and": [missing, {"call_id": {cmp: call_id}}]}
+            else:
+                present = {"$and": [present, {"$or": [{column: {cmp: value}}, {column: value, "call_id": {cmp: call_id}}]}]}
+        rows: List[Tuple[str, Any]] = []
+        projection = {"call_id": 1, column: 1}
+        if present is not None:
+            n_present = coll.count_documents(present) if skip else None
+            cursor = coll.find(present, projection).sort([(column, direction), ("call_id", direction)])
+            if skip:
+                cursor = cursor.skip(skip)
+            rows = [(d["call_id"], d.get(column)) for d in cursor.limit(limit)]
+            skip = max(0, skip - n_present) if n_present is not None else 0
+        if len(rows) < limit:
+            cursor = coll.find(missing, projection).sort("call_id", direction)
+            if skip:
+                cursor = cursor.skip(skip)
+            rows += [(d["call_id"], None) for d in cursor.limit(limit - len(rows))]
+        return rows, total
+
+    def facets(self, param: str, filters: Dict[str, Iterable[str]] | None = None) -> Dict[str, int]:
+        """Return value -> call count for one filter field (aggregation pipeline)."""
+        coll = self._coll()
+        if coll is None:
+            raise RuntimeError("Mongo unavailable")
+        match = self._match({k: v for k, v in (filters or {}).items() if k != param}, None, None, None, None)
+        pipeline = [{"$match": {**match, param: {"$ne": None}}}, {"$group": {"_id": f"${param}", "count": {"$sum": 1}}}]
+        return {d["_id"]: d["count"] for d in coll.aggregate(pipeline)}
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "synced": self._synced and not self._resync,
+            "reconciles": self.reconciles,
+            "queued": self._queue.qsize(),
+            "writes": self.writes,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,264 @@
+"""
+Call Table
+
+Columnar, in-memory table of the structured fields of every call (one row per
+call) used for dashboard statistics. Numeric fields (sentiment score, AHT, talk
+and hold time) are float64 columns with NaN for missing values; categorical
+fields are int32 code columns over a per-field vocabulary (-1 for missing), and
+the multi-valued services field is kept as (row, code) pairs. Counts, means,
+percentiles and cross-tabs are then a handful of vectorized NumPy operations
+over the live rows.
+
+The table is filled from the index fields stored in the call manifest (no blob
+reads) and kept current per call through the manifest's change listener;
+deleted rows are recycled.
+"""
+
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+NUMERIC_COLUMNS = {
+    "sentiment_score": "sentiment_score",
+    "aht_seconds": "aht_seconds",
+    "talk_seconds": "talk_time_seconds",
+    "hold_seconds": "hold_time_seconds",
+}
+
+CATEGORICAL_COLUMNS = {
+    "sentiment_label": "customer_sentiment",
+    "category": "call_categorization",
+    "resolution_status": "resolution_status",
+    "subject": "main_subject",
+    "topic": "main_topic",
+    "professionalism": "agent_professionalism",
+    "disposition": "disposition",
+}
+
+CROSS_TABS = (
+    ("category", "sentiment_label"),
+    ("topic", "resolution_status"),
+    ("professionalism", "sentiment_label"),
+)
+
+PERCENTILES = (50, 90, 99)
+
+
+def _as_float(value: Any) -> float:
+    try:
+        return float(value) if value is not None else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _label(value: Any) -> Optional[str]:
+    if isinstance(value, dict):
+        value = value.get("score")
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+def _services(value: Any) -> List[str]:
+    if isinstance(value, list):
+        parts = [str(p).strip() for p in value]
+    elif isinstance(value, str):
+        parts = [p.strip() for p in value.replace(";", ",").split(",")]
+    else:
+        parts = []
+    return [p for p in parts if p]
+
+
+def _resolved(value: Any) -> bool:
+    if isinstance(value, dict):
+        value = value.get("score")
+    return value is True or (isinstance(value, str) and value.strip().lower() in ("true", "yes"))
+
+
+class CallTable:
+    def __init__(self, capacity: int = 1024):
+        """Create an empty table; rows are (re)built from the manifest on first use."""
+        self._lock = threading.RLock()
+        self._reset(capacity)
+        self._stale = True
+        # Incremented on every manifest event so sync() can detect changes racing a rebuild
+        self._events = 0
+
+    def _reset(self, capacity: int) -> None:
+        self._capacity = 0
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._size = 0
+        self._vocab: Dict[str, List[str]] = {name: [] for name in CATEGORICAL_COLUMNS}
+        self._codes: Dict[str, Dict[str, int]] = {name: {} for name in CATEGORICAL_COLUMNS}
+        self._service_vocab: List[str] = []
+        self._service_codes: Dict[str, int] = {}
+        self._services: Dict[int, List[int]] = {}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        def _grow(arr: Optional[np.ndarray], fill: Any, dtype) -> np.ndarray:
+            new = np.full(capacity, fill, dtype=dtype)
+            if arr is not None:
+                new[: len(arr)] = arr
+            return new
+
+        first = self._capacity == 0
+        self.alive = _grow(None if first else self.alive, False, bool)
+        self.resolved = _grow(None if first else self.resolved, False, bool)
+        self.has_summary = _grow(None if first else self.has_summary, False, bool)
+        self.numeric = {
+            name: _grow(None if first else self.numeric[name], np.nan, np.float64) for name in NUMERIC_COLUMNS
+        }
+        self.categorical = {
+            name: _grow(None if first else self.categorical[name], -1, np.int32) for name in CATEGORICAL_COLUMNS
+        }
+        self._capacity = capacity
+
+    # ------------------------------------------------------------------
+    # Row maintenance
+    # ------------------------------------------------------------------
+
+    def _code(self, column: str, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        codes = self._codes[column]
+        if value not in codes:
+            codes[value] = len(self._vocab[column])
+            self._vocab[column].append(value)
+        return codes[value]
+
+    def _service_code(self, value: str) -> int:
+        if value not in self._service_codes:
+            self._service_codes[value] = len(self._service_vocab)
+            self._service_vocab.append(value)
+        return self._service_codes[value]
+
+    def _set_row(self, call_id: str, entry: Dict[str, Any]) -> None:
+        row = self._rows.get(call_id)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+            else:
+                if self._size >= self._capacity:
+                    self._allocate(self._capacity * 2)
+                row = self._size
+                self._size += 1
+            self._rows[call_id] = row
+        fields = entry.get("fields") or {}
+        self.alive[row] = True
+        self.resolved[row] = _resolved(fields.get("resolved"))
+        self.has_summary[row] = bool(fields.get("summary"))
+        for name, field in NUMERIC_COLUMNS.items():
+            self.numeric[name][row] = _as_float(fields.get(field))
+        for name, field in CATEGORICAL_COLUMNS.items():
+            self.categorical[name][row] = self._code(name, _label(fields.get(field)))
+        services = [self._service_code(s) for s in _services(fields.get("services"))]
+        if services:
+            self._services[row] = services
+        else:
+            self._services.pop(row, None)
+
+    def _clear_row(self, call_id: str) -> None:
+        row = self._rows.pop(call_id, None)
+        if row is None:
+            return
+        self.alive[row] = False
+        self.resolved[row] = False
+        self.has_summary[row] = False
+        for name in NUMERIC_COLUMNS:
+            self.numeric[name][row] = np.nan
+        for name in CATEGORICAL_COLUMNS:
+            self.categorical[name][row] = -1
+        self._services.pop(row, None)
+        self._free.append(row)
+
+    def on_manifest_change(self, call_id: str | None, entry: Dict[str, Any] | None) -> None:
+        """Manifest listener: update one row, drop it (entry None), or rebuild lazily (call_id None)."""
+        with self._lock:
+            self._events += 1
+            if call_id is None:
+                self._stale = True
+            elif self._stale:
+                return
+            elif entry is None:
+                self._clear_row(call_id)
+            else:
+                self._set_row(call_id, entry)
+
+    def sync(self, manifest) -> "CallTable":
+        """Rebuild from the manifest if a bulk reload invalidated the table."""
+        for _ in range(3):
+            if not self._stale:
+                return self
+            # Snapshot outside our lock: the manifest notifies listeners while holding its own
+            seen = self._events
+            entries = manifest.all_entries()
+            with self._lock:
+                if self._events != seen:
+                    continue
+                self._reset(max(1024, len(entries)))
+                for entry in entries:
+                    self._set_row(entry["call_id"], entry)
+                self._stale = False
+        return self
+
+    # ------------------------------------------------------------------
+    # Statistics
+    # ------------------------------------------------------------------
+
+    def statistics(self) -> Dict[str, Any]:
+        """Counts, means, percentiles, histograms and cross-tabs over the live rows."""
+        with self._lock:
+            n = self._size
+            alive = self.alive[:n]
+            total = int(alive.sum())
+            result: Dict[str, Any] = {
+                "total_calls": total,
+                "calls_with_summary": int(self.has_summary[:n][alive].sum()),
+                "resolved_rate": float(self.resolved[:n][alive].sum()) / total if total else None,
+                "numeric": {},
+                "histograms": {},
+                "cross_tabs": {},
+            }
+            for name in NUMERIC_COLUMNS:
+                values = self.numeric[name][:n][alive]
+                values = values[~np.isnan(values)]
+                stats: Dict[str, Any] = {"count": int(values.size)}
+                if values.size:
+                    stats["mean"] = float(values.mean())
+                    stats["min"] = float(values.min())
+                    stats["max"] = float(values.max())
+                    for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+                        stats[f"p{p}"] = float(v)
+                result["numeric"][name] = stats
+
+            live_codes = {name: self.categorical[name][:n][alive] for name in CATEGORICAL_COLUMNS}
+            for name, codes in live_codes.items():
+                vocab = self._vocab[name]
+                counts = np.bincount(codes[codes >= 0], minlength=len(vocab))
+                result["histograms"][name] = {vocab[i]: int(c) for i, c in enumerate(counts) if c}
+
+            service_codes = [c for row, codes in self._services.items() if row < n and self.alive[row] for c in codes]
+            counts = np.bincount(np.asarray(service_codes, dtype=np.int64), minlength=len(self._service_vocab))
+            result["histograms"]["services"] = {self._service_vocab[i]: int(c) for i, c in enumerate(counts) if c}
+
+            for rows_name, cols_name in CROSS_TABS:
+                r, c = live_codes[rows_name], live_codes[cols_name]
+                mask = (r >= 0) & (c >= 0)
+                width = len(self._vocab[cols_name])
+                height = len(self._vocab[rows_name])
+                table: Dict[str, Dict[str, int]] = {}
+                if width and height:
+                    flat = r[mask].astype(np.int64) * width + c[mask]
+                    grid = np.bincount(flat, minlength=height * width).reshape(height, width)
+                    for i, j in zip(*np.nonzero(grid)):
+                        table.setdefault(self._vocab[rows_name][i], {})[self._vocab[cols_name][j]] = int(grid[i, j])
+                result["cross_tabs"][f"{rows_name}_by_{cols_name}"] = table
+            return result
+
+
+# Global instance
+call_table = CallTable()
@@ -0,0 +1,176 @@
+"""
+Change Detector
+
+Decides whether cached call listings are still valid without listing blob storage
+on every request. A cache hit costs a timestamp comparison; at most once per
+poll interval the detector compares the call manifest's ETag (one HEAD request)
+to pick up writes made by other workers. Reconciling the manifest with the
+container (to pick up blobs written outside the API) lists every blob, so it
+runs on a background thread started by start(), never on a request. Every
+worker runs the loop, but each interval only the one holding a lease document
+in Mongo reconciles; the others see its result through the manifest ETag.
+Write paths call notify_change() so their own changes invalidate immediately.
+"""
+
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict
+
+LEASE_ID = "change_reconcile_lease"
+
+
+class ChangeDetector:
+    def __init__(
+        self,
+        manifest,
+        on_change: Callable[[], None],
+        min_poll_seconds: float | None = None,
+        reconcile_seconds: float | None = None,
+        on_reconcile: Callable[[], None] | None = None,
+        lease_collection_getter: Callable[[], Any] | None = None,
+    ):
+        """Create a detector over a CallManifest; on_change is invoked whenever a change is seen,
+        on_reconcile after a background reconcile changed the manifest. The reconcile lease is
+        kept in the collection returned by lease_collection_getter (none: every worker reconciles)."""
+        if min_poll_seconds is None:
+            min_poll_seconds = float(os.getenv("CHANGE_DETECTION_MIN_POLL_SECONDS", "15"))
+        if reconcile_seconds is None:
+            # 0 disables the periodic container reconcile
+            reconcile_seconds = float(os.getenv("CHANGE_DETECTION_RECONCILE_SECONDS", "900"))
+        self.manifest = manifest
+        self.on_change = on_change
+        self.min_poll_seconds = min_poll_seconds
+        self.reconcile_seconds = reconcile_seconds
+        self.on_reconcile = on_reconcile
+        self.lease_collection_getter = lease_collection_getter
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._last_poll = 0.0
+        self._last_reconcile = 0.0
+        self._last_change = 0.0
+        self._last_reason: str | None = None
+        self.polls = 0
+        self.reconciles = 0
+        self.reconciles_skipped = 0
+        self.changes_detected = 0
+
+    def start(self) -> None:
+        """Start the background reconcile loop (idempotent; no-op when reconcile_seconds is 0)."""
+        with self._lock:
+            if self._thread is not None or self.reconcile_seconds <= 0:
+                return
+            self._thread = threading.Thread(target=self._reconcile_loop, name="change-reconcile", daemon=True)
+            self._thread.start()
+
+    def _reconcile_loop(self) -> None:
+        while True:
+            time.sleep(self.reconcile_seconds)
+            if self._acquire_lease():
+                self.reconcile()
+            else:
+                self.reconciles_skipped += 1
+
+    def _acquire_lease(self) -> bool:
+        """Claim this interval's reconcile; False when another worker holds the lease.
+
+        The lease is not released after the run: it expires one interval later, so the
+        other workers skip the interval instead of repeating the container listing.
+        """
+        if self.lease_collection_getter is None:
+            return True
+        from pymongo.errors import DuplicateKeyError
+        try:
+            coll = self.lease_collection_getter()
+            if coll is None:
+                # No Mongo: single-worker semantics
+                return True
+            now = datetime.utcnow()
+            # Expire a little early so the holder's next wake-up finds the lease free
+            expires_at = now + timedelta(seconds=self.reconcile_seconds * 0.9)
+            coll.find_one_and_update(
+                {"_id": LEASE_ID, "$or": [{"expires_at": {"$lt": now}}, {"owner": self.owner}]},
+                {"$set": {"owner": self.owner, "started_at": now, "expires_at": expires_at}},
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            # The lease document exists and another worker holds it
+            return False
+        except Exception as e:
+            print(f"Change reconcile lease unavailable, reconciling locally: {e}")
+            return True
+
+    def reconcile(self) -> bool:
+        """Rebuild the manifest from the container; return True if it changed."""
+        try:
+            version = self.manifest.version
+            self.manifest.rebuild()
+            self._last_reconcile = time.time()
+            self.reconciles += 1
+            if self.manifest.version == version:
+                return False
+            self._record("reconcile")
+            if self.on_reconcile is not None:
+                self.on_reconcile()
+            return True
+        except Exception as e:
+            print(f"Error reconciling the call manifest: {e}")
+            return False
+
+    def check(self) -> bool:
+        """Return True if a change was detected (and caches invalidated) by this call.
+
+        Calls within min_poll_seconds of the previous poll return False immediately.
+        """
+        now = time.time()
+        if now - self._last_poll < self.min_poll_seconds:
+            return False
+        # Only one request pays for the poll; concurrent ones keep serving the cache
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._last_poll = time.time()
+            self.polls += 1
+            changed = self.manifest.reload_if_changed()
+            if changed:
+                self._record("manifest etag")
+            return changed
+        except Exception as e:
+            print(f"Error checking for storage changes: {e}")
+            return False
+        finally:
+            self._lock.release()
+
+    def notify_change(self, reason: str = "write", on_change: Callable[[], None] | None = None) -> None:
+        """Explicit invalidation from a write path (upload, delete, manual refresh).
+
+        on_change overrides the default handler when the writer knows the narrower scope
+        of its change (e.g. a single deleted call).
+        """
+        self._record(reason, on_change)
+
+    def _record(self, reason: str, on_change: Callable[[], None] | None = None) -> None:
+        self._last_change = time.time()
+        self._last_reason = reason
+        self.changes_detected += 1
+        print(f"Change detected ({reason}); invalidating caches")
+        (on_change or self.on_change)()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "min_poll_seconds": self.min_poll_seconds,
+            "reconcile_seconds": self.reconcile_seconds,
+            "polls": self.polls,
+            "reconciles": self.reconciles,
+            "reconciles_skipped": self.reconciles_skipped,
+            "last_reconcile": self._last_reconcile or None,
+            "changes_detected": self.changes_detected,
+            "last_poll": self._last_poll or None,
+            "last_change": self._last_change or None,
+            "last_change_reason": self._last_reason,
+        }
@@ -0,0 +1,242 @@
+"""
+Dashboard Aggregates
+
+Incrementally maintained dashboard counters stored in Mongo. Every call
+contributes a small set of counters (totals, sums and counts behind the
+averages) and histogram increments (sentiment labels, dispositions, categories,
+topics, ...). The contribution is kept in a per-call document so that
+re-analysing a call applies only the difference and deleting it retracts exactly
+what it added, each with a single $inc on the aggregate document instead of a
+full recompute over every analysis blob.
+
+Histogram keys are escaped because Mongo field names cannot contain '.' or
+start with '$'.
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+
+AGGREGATE_ID = "dashboard_aggregates"
+CONTRIBUTION_KIND = "call_contribution"
+
+COUNTERS = (
+    "total_calls",
+    "calls_with_analysis",
+    "sentiment_sum",
+    "sentiment_count",
+    "resolved_count",
+    "aht_sum",
+    "aht_count",
+    "talk_sum",
+    "talk_count",
+    "hold_sum",
+    "hold_count",
+)
+
+HISTOGRAMS = (
+    "sentiment_labels",
+    "dispositions",
+    "categories",
+    "resolution_status",
+    "subjects",
+    "topics",
+    "services",
+    "agent_professionalism",
+)
+
+
+def escape_key(key: str) -> str:
+    return str(key).replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+
+def unescape_key(key: str) -> str:
+    return key.replace("%24", "$").replace("%2E", ".").replace("%25", "%")
+
+
+def empty_contribution() -> Dict[str, Any]:
+    return {
+        "counters": {name: 0 for name in COUNTERS},
+        "histograms": {dim: {} for dim in HISTOGRAMS},
+        "summary": None,
+    }
+
+
+def merge_contribution(total: Dict[str, Any], contribution: Dict[str, Any], sign: int = 1) -> Dict[str, Any]:
+    """Add (sign=1) or subtract (sign=-1) contribution into total in place and return it."""
+    for name, value in (contribution.get("counters") or {}).items():
+        total["counters"][name] = total["counters"].get(name, 0) + sign * value
+    for dim, values in (contribution.get("histograms") or {}).items():
+        hist = total["histograms"].setdefault(dim, {})
+        for key, count in values.items():
+            hist[key] = hist.get(key, 0) + sign * count
+    return total
+
+
+def build_summary(counters: Dict[str, Any], histograms: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Turn aggregate counters/histograms into the dashboard summary shape (without insights)."""
+
+    def _avg(sum_name: str, count_name: str) -> float | None:
+        count = counters.get(count_name) or 0
+        return (counters.get(sum_name) or 0) / count if count > 0 else None
+
+    total = int(counters.get("total_calls") or 0)
+    summary: Dict[str, Any] = {
+        "total_calls": total,
+        "calls_with_analysis": int(counters.get("calls_with_analysis") or 0),
+        "avg_sentiment": _avg("sentiment_sum", "sentiment_count"),
+    }
+    for dim in HISTOGRAMS:
+        # Retractions leave zero counts behind; hide them
+        summary[dim] = {k: int(v) for k, v in (histograms.get(dim) or {}).items() if v and v > 0}
+    summary["resolved_rate"] = (counters.get("resolved_count") or 0) / total if total else None
+    summary["avg_aht_seconds"] = _avg("aht_sum", "aht_count")
+    summary["avg_talk_seconds"] = _avg("talk_sum", "talk_count")
+    summary["avg_hold_seconds"] = _avg("hold_sum", "hold_count")
+    return summary
+
+
+def _escaped(contribution: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "counters": dict(contribution.get("counters") or {}),
+        "histograms": {
+            dim: {escape_key(k): v for k, v in values.items()}
+            for dim, values in (contribution.get("histograms") or {}).items()
+        },
+        "summary": contribution.get("summary"),
+    }
+
+
+def _inc_document(delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten an (escaped) contribution delta into a $inc document, skipping zeros."""
+    inc: Dict[str, Any] = {}
+    for name, value in delta["counters"].items():
+        if value:
+            inc[f"counters.{name}"] = value
+    for dim, values in delta["histograms"].items():
+        for key, count in values.items():
+            if count:
+                inc[f"histograms.{dim}.{key}"] = count
+    return inc
+
+
+class DashboardAggregates:
+    def __init__(self, collection_getter: Callable[[], Any]):
+        """Create a store over the Mongo collection returned by collection_getter (None when unavailable)."""
+        self.collection_getter = collection_getter
+
+    def _coll(self):
+        try:
+            return self.collection_getter()
+        except Exception as e:
+            print(f"Dashboard aggregates: Mongo unavailable: {e}")
+            return None
+
+    @staticmethod
+    def _contribution_id(call_id: str) -> str:
+        return f"contribution:{call_id}"
+
+    def apply(self, call_id: str, contribution: Dict[str, Any]) -> bool:
+        """Record call_id's contribution, adding only the difference from its previous one.
+
+        The aggregate document is never created here: until rebuild() has run, snapshot()
+        returns None and callers fall back to a full recompute.
+        """
+        coll = self._coll()
+        if coll is None:
+            return False
+        new = _escaped(contribution)
+        try:
+            from pymongo import ReturnDocument
+            # Atomic swap: each transition of a call's contribution is counted exactly once
+            previous = coll.find_one_and_replace(
+                {"_id": self._contribution_id(call_id)},
+                {"_id": self._contribution_id(call_id), "kind": CONTRIBUTION_KIND, "call_id": call_id, **new},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE,
+            )
+            delta = merge_contribution(
+                merge_contribution(empty_contribution(), new),
+                previous or empty_contribution(),
+                sign=-1,
+            )
+            inc = _inc_document(delta)
+            if inc:
+                coll.update_one({"_id": AGGREGATE_ID}, {"$inc": inc})
+            return True
+        except Exception as e:
+            print(f"Dashboard aggregates apply failed for '{call_id}': {e}")
+            return False
+
+    def retract(self, call_id: str) -> bool:
+        """Subtract call_id's recorded contribution (O(1): one delete and one $inc)."""
+        coll = self._coll()
+        if coll is None:
+            return False
+        try:
+            previous = coll.find_one_and_delete({"_id": self._contribution_id(call_id)})
+            if not previous:
+                return True
+            inc = _inc_document(merge_contribution(empty_contribution(), previous, sign=-1))
+            if inc:
+                coll.update_one({"_id": AGGREGATE_ID}, {"$inc": inc})
+            return True
+        except Exception as e:
+            print(f"Dashboard aggregates retract failed for '{call_id}': {e}")
+            return False
+
+    def rebuild(self, contributions: Dict[str, Dict[str, Any]]) -> bool:
+        """Replace every stored contribution and the aggregate document (full recompute)."""
+        coll = self._coll()
+        if coll is None:
+            return False
+        try:
+            total = empty_contribution()
+            docs = []
+            for call_id, contribution in contributions.items():
+                merge_contribution(total, contribution)
+                docs.append({"_id": self._contribution_id(call_id), "kind": CONTRIBUTION_KIND, "call_id": call_id, **_escaped(contribution)})
+            coll.delete_many({"kind": CONTRIBUTION_KIND})
+            if docs:
+                coll.insert_many(docs, ordered=False)
+            escaped = _escaped(total)
+            coll.replace_one(
+                {"_id": AGGREGATE_ID},
+                {"_id": AGGREGATE_ID, "counters": escaped["counters"], "histograms": escaped["histograms"]},
+                upsert=True,
+            )
+            return True
+        except Exception as e:
+            print(f"Dashboard aggregates rebuild failed: {e}")
+            return False
+
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        """Return the current dashboard summary (without insights), or None if not initialized."""
+        coll = self._coll()
+        if coll is None:
+            return None
+        try:
+            doc = coll.find_one({"_id": AGGREGATE_ID})
+        except Exception as e:
+            print(f"Dashboard aggregates read failed: {e}")
+            return None
+        if not doc:
+            return None
+        histograms = {
+            dim: {unescape_key(k): v for k, v in (values or {}).items()}
+            for dim, values in (doc.get("histograms") or {}).items()
+        }
+        return build_summary(doc.get("counters") or {}, histograms)
+
+    def summary_items(self) -> Dict[str, str]:
+        """Return call_id -> stored summary (input for the overall insights) without blob reads."""
+        coll = self._coll()
+        if coll is None:
+            return {}
+        try:
+            cursor = coll.find({"kind": CONTRIBUTION_KIND, "summary": {"$ne": None}}, {"call_id": 1, "summary": 1})
+            return {d["call_id"]: d["summary"] for d in cursor if d.get("summary")}
+        except Exception as e:
+            print(f"Dashboard aggregates summaries read failed: {e}")
+            return {}
+
+    def summaries(self) -> List[str]:
+        return list(self.summary_items().values())
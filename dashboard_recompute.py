@@ -0,0 +1,234 @@
+"""
+Dashboard Recompute Coordinator
+
+Single entry point for recomputing and publishing the dashboard summary.
+
+- Single flight: callers that trigger while a computation is in flight wait for
+  it; everyone who arrived during that run is then served by one follow-up run,
+  so no caller gets a result that predates its change.
+- Debounce: schedule() records a change and arms a trailing timer, so a burst
+  (e.g. a 20-file upload) publishes once after the burst, bounded by a maximum
+  delay.
+- Across workers: a computation holds a lease document in Mongo. A worker that
+  finds the lease taken waits for it; when the finished run started after this
+  worker's trigger, it returns the published summary instead of recomputing.
+
+A full recompute (every analysis blob) is requested with full=True; a follow-up
+run is full when any of the requests it covers was.
+"""
+
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict
+
+LEASE_ID = "dashboard_recompute_lease"
+
+
+class RecomputeCoordinator:
+    def __init__(
+        self,
+        compute: Callable[[bool], Dict[str, Any]],
+        publish: Callable[[Dict[str, Any]], Any],
+        load: Callable[[], Dict[str, Any] | None],
+        lease_collection_getter: Callable[[], Any] | None = None,
+        debounce_seconds: float | None = None,
+        max_delay_seconds: float | None = None,
+        lease_seconds: float | None = None,
+    ):
+        """Create the coordinator.
+
+        compute(full) returns a fresh summary, publish(summary) persists it and load()
+        returns the last published summary (used when another worker computed it).
+        """
+        if debounce_seconds is None:
+            debounce_seconds = float(os.getenv("DASHBOARD_DEBOUNCE_SECONDS", "5"))
+        if max_delay_seconds is None:
+            max_delay_seconds = float(os.getenv("DASHBOARD_MAX_DELAY_SECONDS", "30"))
+        if lease_seconds is None:
+            # Upper bound on one recompute; an expired lease is taken over (crashed worker)
+            lease_seconds = float(os.getenv("DASHBOARD_LEASE_SECONDS", "600"))
+        self.compute = compute
+        self.publish = publish
+        self.load = load
+        self.lease_collection_getter = lease_collection_getter
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._cond = threading.Condition()
+        self._requested = 0
+        self._completed = 0
+        self._running = False
+        self._pending_full = False
+        self._result: Dict[str, Any] | None = None
+        self._error: Exception | None = None
+        self._timer: threading.Timer | None = None
+        self._first_pending: float | None = None
+        self.runs = 0
+        self.joined = 0
+        self.remote_results = 0
+        self.last_run: float | None = None
+        self.last_duration: float | None = None
+
+    # ------------------------------------------------------------------
+    # Triggers
+    # ------------------------------------------------------------------
+
+    def run(self, full: bool = False) -> Dict[str, Any] | None:
+        """Recompute and publish now (or join the run in flight) and return the summary."""
+        with self._cond:
+            self._requested += 1
+            seq = self._requested
+            self._pending_full = self._pending_full or full
+            while self._running and self._completed < seq:
+                self._cond.wait()
+            if self._completed >= seq:
+                self.joined += 1
+                if self._error is not None:
+                    raise self._error
+                return self._result
+            # Leader: this run covers every request made so far
+            self._running = True
+            covers = self._requested
+            full = self._pending_full
+            self._pending_full = False
+            self._first_pending = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        result, error = None, None
+        started = time.time()
+        try:
+            result = self._run_with_lease(full)
+        except Exception as e:
+            error = e
+        finally:
+            with self._cond:
+                self._running = False
+                self._completed = covers
+                self._result, self._error = result, error
+                self.runs += 1
+                self.last_run = started
+                self.last_duration = time.time() - started
+                self._cond.notify_all()
+        if error is not None:
+            raise error
+        return result
+
+    def schedule(self, full: bool = False) -> None:
+        """Record a change and publish once after the burst of changes settles."""
+        with self._cond:
+            self._requested += 1
+            self._pending_full = self._pending_full or full
+            now = time.time()
+            if self._first_pending is None:
+                self._first_pending = now
+            delay = min(self.debounce_seconds, max(0.0, self._first_pending + self.max_delay_seconds - now))
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(delay, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush(self) -> None:
+        with self._cond:
+            self._timer = None
+            if self._completed >= self._requested:
+                # Already covered by a run that started after the last change
+                return
+        try:
+            self.run()
+        except Exception as e:
+            print(f"Scheduled dashboard recompute failed: {e}")
+
+    # ------------------------------------------------------------------
+    # Cross-worker lease
+    # ------------------------------------------------------------------
+
+    def _coll(self):
+        if self.lease_collection_getter is None:
+            return None
+        try:
+            return self.lease_collection_getter()
+        except Exception:
+            return None
+
+    def _acquire(self, coll, now: datetime) -> bool:
+        from pymongo.errors import DuplicateKeyError
+        try:
+            coll.find_one_and_update(
+                {"_id": LEASE_ID, "$or": [{"expires_at": {"$lt": now}}, {"owner": self.owner}]},
+                {"$set": {"owner": self.owner, "started_at": now, "expires_at": now + timedelta(seconds=self.lease_seconds)}},
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            # The lease document exists and another worker holds it
+            return False
+
+    def _release(self, coll, started_at: datetime) -> None:
+        try:
+            coll.update_one(
+                {"_id": LEASE_ID, "owner": self.owner},
+                {"$set": {"expires_at": datetime.utcnow(), "last_started_at": started_at}},
+            )
+        except Exception as e:
+            print(f"Dashboard recompute lease release failed: {e}")
+
+    def _run_with_lease(self, full: bool) -> Dict[str, Any] | None:
+        coll = self._coll()
+        if coll is None:
+            # No Mongo: single-worker semantics
+            return self._compute_and_publish(full)
+        requested_at = datetime.utcnow()
+        deadline = time.time() + self.lease_seconds
+        while True:
+            now = datetime.utcnow()
+            try:
+                acquired = self._acquire(coll, now)
+            except Exception as e:
+                print(f"Dashboard recompute lease unavailable, computing locally: {e}")
+                return self._compute_and_publish(full)
+            if acquired:
+                try:
+                    return self._compute_and_publish(full)
+                finally:
+                    self._release(coll, now)
+            if time.time() > deadline:
+                print("Dashboard recompute lease wait timed out, computing locally")
+                return self._compute_and_publish(full)
+            time.sleep(0.5)
+            try:
+                lease = coll.find_one({"_id": LEASE_ID}) or {}
+            except Exception:
+                lease = {}
+            released = lease.get("expires_at") is None or lease["expires_at"] <= datetime.utcnow()
+            last_started = lease.get("last_started_at")
+            if released and last_started is not None and last_started >= requested_at and not full:
+                # Another worker finished a run that started after our change
+                self.remote_results += 1
+                return self.load()
+
+    def _compute_and_publish(self, full: bool) -> Dict[str, Any]:
+        summary = self.compute(full)
+        self.publish(summary)
+        return summary
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "owner": self.owner,
+            "running": self._running,
+            "scheduled": self._timer is not None,
+            "pending_full": self._pending_full,
+            "runs": self.runs,
+            "joined": self.joined,
+            "remote_results": self.remote_results,
+            "last_run": self.last_run,
+            "last_duration": self.last_duration,
+            "debounce_seconds": self.debounce_seconds,
+            "max_delay_seconds": self.max_delay_seconds,
+        }
@@ -0,0 +1,273 @@
+"""
+Dashboard Rollups
+
+Precomputed rollups for time-range and per-agent analytics, kept in their own
+Mongo collection. Each rollup row is keyed by time grain (day / week / month) and
+period x category x topic x agent x disposition and holds the call count plus
+the metric sums/counts behind the averages. A call contributes to exactly one
+row per grain; its row keys and metrics are recorded in a member document so
+re-analysing or deleting the call moves or retracts its contribution with a few
+$inc updates. Time-series and breakdown queries then aggregate a few hundred
+rollup rows instead of reading analysis blobs.
+"""
+
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+GRAINS = ("day", "week", "month")
+DIMENSIONS = ("category", "topic", "agent", "disposition")
+METRICS = (
+    "total_calls",
+    "calls_with_analysis",
+    "sentiment_sum",
+    "sentiment_count",
+    "resolved_count",
+    "aht_sum",
+    "aht_count",
+    "talk_sum",
+    "talk_count",
+    "hold_sum",
+    "hold_count",
+)
+# Query metric name -> (sum field, count field); count-only metrics use total_calls
+AVERAGES = {
+    "sentiment": ("sentiment_sum", "sentiment_count"),
+    "aht": ("aht_sum", "aht_count"),
+    "talk": ("talk_sum", "talk_count"),
+    "hold": ("hold_sum", "hold_count"),
+    "resolved_rate": ("resolved_count", "total_calls"),
+}
+ROW_KIND = "rollup"
+MEMBER_KIND = "rollup_member"
+META_ID = "rollup_meta"
+
+
+def period_key(timestamp: str | datetime | None, grain: str) -> Optional[str]:
+    """Return the period a timestamp falls in: YYYY-MM-DD, YYYY-Www (ISO week) or YYYY-MM."""
+    if timestamp is None:
+        return None
+    if isinstance(timestamp, str):
+        try:
+            timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if grain == "day":
+        return timestamp.strftime("%Y-%m-%d")
+    if grain == "week":
+        year, week, _ = timestamp.isocalendar()
+        return f"{year}-W{week:02d}"
+    if grain == "month":
+        return timestamp.strftime("%Y-%m")
+    raise ValueError(f"Unknown grain: {grain}")
+
+
+def _row_id(grain: str, period: str, dims: Dict[str, Any]) -> str:
+    raw = json.dumps([grain, period] + [dims.get(d) for d in DIMENSIONS], default=str)
+    return "rollup:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _summarize(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn summed metrics into count + averages."""
+    out: Dict[str, Any] = {"calls": int(row.get("total_calls") or 0)}
+    for name, (sum_field, count_field) in AVERAGES.items():
+        count = row.get(count_field) or 0
+        out[f"avg_{name}" if name != "resolved_rate" else name] = (row.get(sum_field) or 0) / count if count else None
+    return out
+
+
+class DashboardRollups:
+    def __init__(self, collection_getter: Callable[[], Any]):
+        """Create a store over the rollup collection returned by collection_getter (None when unavailable)."""
+        self.collection_getter = collection_getter
+        self._indexes_ready = False
+        self._ready = False
+
+    def _coll(self):
+        try:
+            coll = self.collection_getter()
+        except Exception as e:
+            print(f"Dashboard rollups: Mongo unavailable: {e}")
+            return None
+        if coll is not None and not self._indexes_ready:
+            try:
+                coll.create_index([("kind", 1), ("grain", 1), ("period", 1)])
+                coll.create_index([("kind", 1), ("grain", 1), ("agent", 1), ("period", 1)])
+                coll.create_index([("kind", 1), ("grain", 1), ("category", 1), ("period", 1)])
+                self._indexes_ready = True
+            except Exception as e:
+                print(f"Dashboard rollups: index creation failed: {e}")
+        return coll
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _rows_for(uploaded_at: str | None, dims: Dict[str, Any]) -> List[Dict[str, Any]]:
+        rows = []
+        for grain in GRAINS:
+            period = period_key(uploaded_at, grain)
+            if period is None:
+                continue
+            rows.append({"_id": _row_id(grain, period, dims), "grain": grain, "period": period, **{d: dims.get(d) for d in DIMENSIONS}})
+        return rows
+
+    def _inc_rows(self, coll, rows: List[Dict[str, Any]], metrics: Dict[str, Any], sign: int) -> None:
+        inc = {name: sign * value for name, value in metrics.items() if name in METRICS and value}
+        if not inc:
+            return
+        for row in rows:
+            coll.update_one(
+                {"_id": row["_id"]},
+                {"$inc": inc, "$setOnInsert": {"kind": ROW_KIND, **{k: v for k, v in row.items() if k != "_id"}}},
+                upsert=True,
+            )
+
+    def apply(self, call_id: str, uploaded_at: str | None, dims: Dict[str, Any], metrics: Dict[str, Any]) -> bool:
+        """Record (or move) call_id's contribution to its rollup rows."""
+        coll = self._coll()
+        if coll is None:
+            return False
+        rows = self._rows_for(uploaded_at, dims)
+        member = {
+            "_id": f"{MEMBER_KIND}:{call_id}",
+            "kind": MEMBER_KIND,
+            "call_id": call_id,
+            "rows": rows,
+            "metrics": {k: v for k, v in metrics.items() if k in METRICS},
+        }
+        try:
+            from pymongo import ReturnDocument
+            previous = coll.find_one_and_replace(
+                {"_id": member["_id"]}, member, upsert=True, return_document=ReturnDocument.BEFORE
+            )
+            if previous and previous.get("rows") == rows and previous.get("metrics") == member["metrics"]:
+                return True
+            if previous:
+                self._inc_rows(coll, previous.get("rows") or [], previous.get("metrics") or {}, -1)
+            self._inc_rows(coll, rows, member["metrics"], 1)
+            return True
+        except Exception as e:
+            print(f"Dashboard rollups apply failed for '{call_id}': {e}")
+            return False
+
+    def retract(self, call_id: str) -> bool:
+        """Remove call_id's contribution from its rollup rows."""
+        coll = self._coll()
+        if coll is None:
+            return False
+        try:
+            previous = coll.find_one_and_delete({"_id": f"{MEMBER_KIND}:{call_id}"})
+            if previous:
+                self._inc_rows(coll, previous.get("rows") or [], previous.get("metrics") or {}, -1)
+            return True
+        except Exception as e:
+            print(f"Dashboard rollups retract failed for '{call_id}': {e}")
+            return False
+
+    def rebuild(self, members: Dict[str, Dict[str, Any]]) -> bool:
+        """Replace every rollup row and member from {call_id: {"uploaded_at", "dims", "metrics"}}."""
+        coll = self._coll()
+        if coll is None:
+            return False
+        try:
+            rows: Dict[str, Dict[str, Any]] = {}
+            member_docs = []
+            for call_id, m in members.items():
+                call_rows = self._rows_for(m.get("uploaded_at"), m.get("dims") or {})
+                metrics = {k: v for k, v in (m.get("metrics") or {}).items() if k in METRICS}
+                member_docs.append({"_id": f"{MEMBER_KIND}:{call_id}", "kind": MEMBER_KIND, "call_id": call_id, "rows": call_rows, "metrics": metrics})
+                for row in call_rows:
+                    target = rows.setdefault(row["_id"], {**row, "kind": ROW_KIND})
+                    for name, value in metrics.items():
+                        target[name] = target.get(name, 0) + value
+            coll.delete_many({"kind": {"$in": [ROW_KIND, MEMBER_KIND]}})
+            if member_docs:
+                coll.insert_many(member_docs, ordered=False)
+            if rows:
+                coll.insert_many(list(rows.values()), ordered=False)
+            coll.replace_one({"_id": META_ID}, {"_id": META_ID, "calls": len(member_docs)}, upsert=True)
+            self._ready = True
+            return True
+        except Exception as e:
+            print(f"Dashboard rollups rebuild failed: {e}")
+            return False
+
+    def is_ready(self) -> bool:
+        """True once rebuild() has backfilled the rollups (until then queries would miss older calls)."""
+        if self._ready:
+            return True
+        coll = self._coll()
+        if coll is None:
+            return False
+        try:
+            self._ready = coll.find_one({"_id": META_ID}, {"_id": 1}) is not None
+        except Exception as e:
+            print(f"Dashboard rollups read failed: {e}")
+        return self._ready
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _match(self, grain: str, date_from: str | None, date_to: str | None, filters: Dict[str, List[str]]) -> Dict[str, Any]:
+        match: Dict[str, Any] = {"kind": ROW_KIND, "grain": grain, "total_calls": {"$gt": 0}}
+        period: Dict[str, Any] = {}
+        if date_from:
+            period["$gte"] = period_key(date_from, grain) or date_from
+        if date_to:
+            period["$lte"] = period_key(date_to, grain) or date_to
+        if period:
+            match["period"] = period
+        for dim, values in (filters or {}).items():
+            if dim in DIMENSIONS and values:
+                match[dim] = {"$in": values}
+        return match
+
+    def _aggregate(self, match: Dict[str, Any], group_keys: List[str]) -> List[Dict[str, Any]]:
+        coll = self._coll()
+        if coll is None:
+            raise RuntimeError("Mongo unavailable")
+        group: Dict[str, Any] = {"_id": {k: f"${k}" for k in group_keys}}
+        for name in METRICS:
+            group[name] = {"$sum": f"${name}"}
+        out = []
+        for doc in coll.aggregate([{"$match": match}, {"$group": group}]):
+            key = doc.pop("_id") or {}
+            out.append({**key, **_summarize(doc)})
+        return out
+
+    def timeseries(
+        self,
+        grain: str = "day",
+        date_from: str | None = None,
+        date_to: str | None = None,
+        filters: Dict[str, List[str]] | None = None,
+        group_by: str | None = None,
+    ) -> List[Dict[str, Any]]:
+        """Per-period counts and averages, optionally split by one dimension."""
+        if grain not in GRAINS:
+            raise ValueError(f"grain must be one of {', '.join(GRAINS)}")
+        if group_by is not None and group_by not in DIMENSIONS:
+            raise ValueError(f"group_by must be one of {', '.join(DIMENSIONS)}")
+        keys = ["period"] + ([group_by] if group_by else [])
+        rows = self._aggregate(self._match(grain, date_from, date_to, filters or {}), keys)
+        return sorted(rows, key=lambda r: (r["period"], str(r.get(group_by) if group_by else "")))
+
+    def breakdown(
+        self,
+        by: str,
+        grain: str = "day",
+        date_from: str | None = None,
+        date_to: str | None = None,
+        filters: Dict[str, List[str]] | None = None,
+    ) -> List[Dict[str, Any]]:
+        """Counts and averages per value of one dimension over the date range (largest first)."""
+        if by not in DIMENSIONS:
+            raise ValueError(f"by must be one of {', '.join(DIMENSIONS)}")
+        if grain not in GRAINS:
+            raise ValueError(f"grain must be one of {', '.join(GRAINS)}")
+        rows = self._aggregate(self._match(grain, date_from, date_to, filters or {}), [by])
+        return sorted(rows, key=lambda r: r["calls"], reverse=True)
@@ -0,0 +1,125 @@
+"""
+Health Monitor
+
+Background dependency probes for the readiness endpoint. Each registered probe
+(Blob, Mongo, Search, OpenAI, Speech) is a cheap call that raises on failure;
+a daemon thread runs all of them concurrently every interval and records the
+outcome, latency and timestamp. Liveness and readiness requests only read the
+recorded results, so load-balancer traffic never reaches the backends.
+
+Readiness requires every critical probe to have succeeded recently; failing
+non-critical probes only mark the service as degraded.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict
+
+
+class HealthMonitor:
+    def __init__(self, interval_seconds: float | None = None, timeout_seconds: float | None = None):
+        """Create the monitor; probes run every interval_seconds once start() is called."""
+        if interval_seconds is None:
+            interval_seconds = float(os.getenv("HEALTH_PROBE_INTERVAL_SECONDS", "30"))
+        if timeout_seconds is None:
+            timeout_seconds = float(os.getenv("HEALTH_PROBE_TIMEOUT_SECONDS", "10"))
+        self.interval_seconds = interval_seconds
+        self.timeout_seconds = timeout_seconds
+        self.started_at = time.time()
+        self._probes: Dict[str, Dict[str, Any]] = {}
+        self._results: Dict[str, Dict[str, Any]] = {}
+        # A probe still hanging from an earlier round is not submitted again
+        self._inflight: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._pool: ThreadPoolExecutor | None = None
+
+    def register(self, name: str, probe: Callable[[], Any], critical: bool = True) -> None:
+        """Add a probe; it must raise when the dependency is unavailable."""
+        self._probes[name] = {"probe": probe, "critical": critical}
+
+    def start(self) -> None:
+        """Start the background probe loop (idempotent)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._pool = ThreadPoolExecutor(max_workers=max(1, len(self._probes)), thread_name_prefix="health-probe")
+            self._thread = threading.Thread(target=self._loop, name="health-monitor", daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Health probe loop error: {e}")
+            time.sleep(self.interval_seconds)
+
+    def _timed(self, probe: Callable[[], Any]) -> float:
+        started = time.perf_counter()
+        probe()
+        return (time.perf_counter() - started) * 1000.0
+
+    def run_once(self) -> None:
+        """Run every probe concurrently and record the results."""
+        futures = {}
+        for name, p in self._probes.items():
+            previous = self._inflight.get(name)
+            if previous is None or previous.done():
+                self._inflight[name] = self._pool.submit(self._timed, p["probe"])
+            futures[name] = self._inflight[name]
+        deadline = time.time() + self.timeout_seconds
+        for name, future in futures.items():
+            result: Dict[str, Any] = {"checked_at": datetime.now(timezone.utc).isoformat(), "critical": self._probes[name]["critical"]}
+            try:
+                result["latency_ms"] = round(future.result(timeout=max(0.0, deadline - time.time())), 1)
+                result["status"] = "ok"
+            except FutureTimeout:
+                result["status"] = "timeout"
+                result["latency_ms"] = None
+            except Exception as e:
+                result["status"] = "error"
+                result["latency_ms"] = None
+                result["error"] = str(e)[:300]
+            result["_at"] = time.time()
+            with self._lock:
+                self._results[name] = result
+
+    def liveness(self) -> Dict[str, Any]:
+        return {"status": "ok", "uptime_seconds": round(time.time() - self.started_at, 1)}
+
+    def readiness(self) -> Dict[str, Any]:
+        """Last probe results; ready when every critical probe succeeded within the last 3 intervals."""
+        now = time.time()
+        max_age = 3 * self.interval_seconds + self.timeout_seconds
+        checks: Dict[str, Any] = {}
+        ready, degraded = True, False
+        with self._lock:
+            results = dict(self._results)
+        for name, probe in self._probes.items():
+            result = results.get(name)
+            if result is None:
+                check = {"status": "pending", "critical": probe["critical"]}
+            else:
+                check = {k: v for k, v in result.items() if k != "_at"}
+                if now - result["_at"] > max_age:
+                    check["status"] = "stale"
+            checks[name] = check
+            if check["status"] != "ok":
+                if probe["critical"]:
+                    ready = False
+                else:
+                    degraded = True
+        return {
+            "status": "ready" if ready and not degraded else ("degraded" if ready else "not_ready"),
+            "ready": ready,
+            "checks": checks,
+            "interval_seconds": self.interval_seconds,
+        }
+
+
+# Global instance
+health_monitor = HealthMonitor()
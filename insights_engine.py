@@ -0,0 +1,176 @@
+"""
+Insights Engine
+
+Map-reduce generation of the overall insights report so it scales past the
+model's context window. Call summaries (ordered by upload time) are split into
+batches, each batch is condensed into a digest, and the digests are reduced into
+the final report; when there are more digests than fit in one request they are
+merged hierarchically first.
+
+Batch boundaries are content-defined: a summary closes its batch when its hash
+falls on a boundary (about one in batch_size summaries), with a hard cap on
+batch length. Adding or removing one call therefore changes only the batch it
+belongs to. Digests are cached by a hash of their inputs, in memory and in
+Mongo, so a refresh after one new call costs one map request plus the reduce.
+Map requests run concurrently under a limit.
+"""
+
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+from services import azure_oai
+
+# Bump when the batch/merge prompts change so cached digests are not reused
+DIGEST_VERSION = "1"
+DIGEST_KIND = "insight_digest"
+
+
+def _hash(parts: List[str], stage: str) -> str:
+    h = hashlib.sha1(f"{DIGEST_VERSION}:{stage}".encode("utf-8"))
+    for part in parts:
+        h.update(b"\0")
+        h.update(str(part).encode("utf-8"))
+    return h.hexdigest()
+
+
+def split_batches(summaries: List[str], batch_size: int) -> List[List[str]]:
+    """Split summaries into content-defined batches averaging batch_size (at most 2x)."""
+    batches: List[List[str]] = []
+    current: List[str] = []
+    for summary in summaries:
+        current.append(summary)
+        boundary = int(hashlib.sha1(str(summary).encode("utf-8")).hexdigest()[:8], 16) % batch_size == 0
+        if boundary or len(current) >= 2 * batch_size:
+            batches.append(current)
+            current = []
+    if current:
+        batches.append(current)
+    return batches
+
+
+class InsightsEngine:
+    def __init__(
+        self,
+        collection_getter: Callable[[], Any] | None = None,
+        batch_size: int | None = None,
+        max_concurrency: int | None = None,
+        reduce_fan_in: int | None = None,
+    ):
+        """Create the engine; collection_getter returns the Mongo collection for persisted digests."""
+        if batch_size is None:
+            batch_size = int(os.getenv("INSIGHTS_BATCH_SIZE", "50"))
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("INSIGHTS_MAP_CONCURRENCY", "4"))
+        if reduce_fan_in is None:
+            # Maximum number of digests sent in one reduce request
+            reduce_fan_in = int(os.getenv("INSIGHTS_REDUCE_FAN_IN", "20"))
+        self.collection_getter = collection_getter
+        self.batch_size = max(2, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.reduce_fan_in = max(2, reduce_fan_in)
+        self._lock = threading.Lock()
+        self._digests: Dict[str, str] = {}
+        self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="insights-map")
+        self.digest_hits = 0
+        self.digest_misses = 0
+
+    # ------------------------------------------------------------------
+    # Digest cache (memory in front of Mongo)
+    # ------------------------------------------------------------------
+
+    def _coll(self):
+        if self.collection_getter is None:
+            return None
+        try:
+            return self.collection_getter()
+        except Exception:
+            return None
+
+    def _load_digests(self, keys: List[str]) -> None:
+        missing = [k for k in keys if k not in self._digests]
+        coll = self._coll()
+        if not missing or coll is None:
+            return
+        try:
+            docs = list(coll.find({"_id": {"$in": [f"{DIGEST_KIND}:{k}" for k in missing]}}, {"digest": 1}))
+            with self._lock:
+                for doc in docs:
+                    self._digests[doc["_id"].split(":", 1)[1]] = doc.get("digest")
+        except Exception as e:
+            print(f"Insights digest lookup failed: {e}")
+
+    def _save_digest(self, key: str, digest: str) -> None:
+        with self._lock:
+            self._digests[key] = digest
+        coll = self._coll()
+        if coll is None:
+            return
+        try:
+            coll.replace_one(
+                {"_id": f"{DIGEST_KIND}:{key}"},
+                {"_id": f"{DIGEST_KIND}:{key}", "kind": DIGEST_KIND, "digest": digest},
+                upsert=True,
+            )
+        except Exception as e:
+            print(f"Insights digest save failed: {e}")
+
+    def _prune(self, used: set) -> None:
+        """Drop digests no longer referenced by the current batches."""
+        with self._lock:
+            for key in [k for k in self._digests if k not in used]:
+                self._digests.pop(key, None)
+        coll = self._coll()
+        if coll is None:
+            return
+        try:
+            coll.delete_many({"kind": DIGEST_KIND, "_id": {"$nin": [f"{DIGEST_KIND}:{k}" for k in used]}})
+        except Exception as e:
+            print(f"Insights digest prune failed: {e}")
+
+    def _digest_all(self, groups: List[List[str]], stage: str, fn: Callable[[List[str]], str], used: set) -> List[str]:
+        """Return one digest per group, computing only uncached ones (concurrently)."""
+        keys = [_hash(group, stage) for group in groups]
+        used.update(keys)
+        self._load_digests(keys)
+        todo = {k: g for k, g in zip(keys, groups) if not self._digests.get(k)}
+        self.digest_hits += len(keys) - len(todo)
+        self.digest_misses += len(todo)
+        futures = {k: self._pool.submit(fn, g) for k, g in todo.items()}
+        for key, fut in futures.items():
+            self._save_digest(key, fut.result())
+        return [self._digests[k] for k in keys]
+
+    # ------------------------------------------------------------------
+    # Map / reduce
+    # ------------------------------------------------------------------
+
+    def generate(self, summaries: List[str]) -> str | None:
+        """Return the insights report for summaries ordered by upload time."""
+        if not summaries:
+            return None
+        if len(summaries) <= self.batch_size:
+            # Small corpus: one request, as before
+            return azure_oai.get_insights(summaries)
+        used: set = set()
+        digests = self._digest_all(split_batches(summaries, self.batch_size), "map", azure_oai.summarize_insight_batch, used)
+        level = 0
+        while len(digests) > self.reduce_fan_in:
+            level += 1
+            groups = [digests[i:i + self.reduce_fan_in] for i in range(0, len(digests), self.reduce_fan_in)]
+            digests = self._digest_all(groups, f"merge{level}", azure_oai.merge_insight_digests, used)
+        report = azure_oai.get_insights_from_digests(digests)
+        self._prune(used)
+        return report
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "batch_size": self.batch_size,
+            "max_concurrency": self.max_concurrency,
+            "reduce_fan_in": self.reduce_fan_in,
+            "cached_digests": len(self._digests),
+            "digest_hits": self.digest_hits,
+            "digest_misses": self.digest_misses,
+        }
@@ -0,0 +1,187 @@
+"""
+Insights Job
+
+Background, debounced regeneration of the dashboard's overall insights. Write
+paths only record that the set of call summaries changed; a timer fires after
+the debounce delay and regenerates the insights when enough summaries changed
+(relative to the count used last time), when the stored insights are older than
+the maximum age, or when a full refresh asked for it. The LLM runs at most once
+per minimum interval, and a digest of the summaries is stored with the insights
+so a worker skips generation when another one already produced them for the
+same set of summaries. Until then the dashboard keeps serving the previous
+insights, flagged as stale.
+"""
+
+import hashlib
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+
+def summaries_digest(summaries: List[str]) -> str:
+    """Order-independent digest of a set of call summaries."""
+    h = hashlib.sha1()
+    for s in sorted(str(x) for x in summaries):
+        h.update(s.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _timestamp(value: Any) -> float | None:
+    if isinstance(value, datetime):
+        # Mongo returns naive datetimes in UTC
+        return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return None
+
+
+class InsightsJob:
+    def __init__(
+        self,
+        summaries_provider: Callable[[], List[str]],
+        generator: Callable[[List[str]], Any],
+        store: Callable[[Any, Dict[str, Any]], None],
+        state_getter: Callable[[], Dict[str, Any] | None],
+        debounce_seconds: float | None = None,
+        min_interval_seconds: float | None = None,
+        change_threshold: float | None = None,
+        max_age_seconds: float | None = None,
+    ):
+        """Create the job.
+
+        summaries_provider returns the current call summaries, generator turns them into
+        insights, store(insights, meta) persists them (insights is None when only the stale
+        flag needs clearing) and state_getter returns the persisted insights_generated_at,
+        insights_digest and insights_summary_count.
+        """
+        if debounce_seconds is None:
+            debounce_seconds = float(os.getenv("INSIGHTS_DEBOUNCE_SECONDS", "30"))
+        if min_interval_seconds is None:
+            min_interval_seconds = float(os.getenv("INSIGHTS_MIN_INTERVAL_SECONDS", "300"))
+        if change_threshold is None:
+            # Fraction of the previously summarized calls that must change to regenerate
+            change_threshold = float(os.getenv("INSIGHTS_CHANGE_THRESHOLD", "0.05"))
+        if max_age_seconds is None:
+            max_age_seconds = float(os.getenv("INSIGHTS_MAX_AGE_SECONDS", "3600"))
+        self.summaries_provider = summaries_provider
+        self.generator = generator
+        self.store = store
+        self.state_getter = state_getter
+        self.debounce_seconds = debounce_seconds
+        self.min_interval_seconds = min_interval_seconds
+        self.change_threshold = change_threshold
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._timer: threading.Timer | None = None
+        self._running = False
+        self._pending = 0
+        self._forced = False
+        self.runs = 0
+        self.generations = 0
+        self.last_run: float | None = None
+        self.last_error: str | None = None
+
+    def mark_dirty(self, changes: int = 1, force: bool = False) -> None:
+        """Record changed summaries and (re)arm the debounce timer."""
+        if changes <= 0 and not force:
+            return
+        with self._lock:
+            self._pending += max(0, changes)
+            self._forced = self._forced or force
+            self._schedule(self.debounce_seconds)
+
+    @property
+    def pending(self) -> bool:
+        return self._pending > 0 or self._forced
+
+    def _schedule(self, delay: float) -> None:
+        # Caller holds the lock
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(max(0.0, delay), self._run)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _run(self) -> None:
+        with self._lock:
+            if self._running:
+                self._schedule(self.debounce_seconds)
+                return
+            self._running = True
+            self._timer = None
+            pending, forced = self._pending, self._forced
+        consumed = False
+        try:
+            self.runs += 1
+            self.last_run = time.time()
+            state = self.state_getter() or {}
+            now = time.time()
+            last_at = _timestamp(state.get("insights_generated_at"))
+            if last_at is not None and (now - last_at) < self.min_interval_seconds:
+                with self._lock:
+                    self._schedule(self.min_interval_seconds - (now - last_at))
+                return
+
+            summaries = self.summaries_provider()
+            digest = summaries_digest(summaries)
+            if digest == state.get("insights_digest"):
+                # Already generated for exactly these summaries (possibly by another worker)
+                self.store(None, {"digest": digest})
+                consumed = True
+                return
+
+            last_count = int(state.get("insights_summary_count") or 0)
+            needed = max(1, math.ceil(self.change_threshold * last_count))
+            too_old = last_at is None or (now - last_at) >= self.max_age_seconds
+            if not (forced or too_old or pending >= needed):
+                # Not enough change yet; make sure the age limit still applies
+                with self._lock:
+                    self._schedule(self.max_age_seconds - (now - last_at))
+                return
+
+            insights = self.generator(summaries) if summaries else None
+            self.store(insights, {
+                "generated_at": datetime.utcnow(),
+                "digest": digest,
+                "summary_count": len(summaries),
+            })
+            self.generations += 1
+            self.last_error = None
+            consumed = True
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Insights job failed: {e}")
+            with self._lock:
+                self._schedule(self.min_interval_seconds)
+        finally:
+            with self._lock:
+                if consumed:
+                    # Keep changes recorded while this run was in progress
+                    self._pending = max(0, self._pending - pending)
+                    self._forced = self._forced and not forced
+                self._running = False
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "pending_changes": self._pending,
+            "forced": self._forced,
+            "scheduled": self._timer is not None,
+            "running": self._running,
+            "runs": self.runs,
+            "generations": self.generations,
+            "last_run": self.last_run,
+            "last_error": self.last_error,
+            "debounce_seconds": self.debounce_seconds,
+            "min_interval_seconds": self.min_interval_seconds,
+            "change_threshold": self.change_threshold,
+            "max_age_seconds": self.max_age_seconds,
+        }
@@ -0,0 +1,202 @@
+"""
+Mongo Gateway
+
+Shared access to the Mongo (Cosmos) client: one long-lived client and pool,
+a background health monitor and a circuit breaker.
+
+- The client is created once and reused; requests no longer pay a ping round
+  trip before every operation.
+- A daemon thread pings the server every interval. Consecutive failures (from
+  the monitor, from operations seen by the command listener, from the driver's
+  own server heartbeats, or server-selection timeouts reported by callers via
+  record_error(), which never reach the command listener) open the circuit; while it is open client() returns None immediately, so callers take
+  their fallback paths instead of waiting for connect/server-selection timeouts.
+- After the reset timeout the next monitor ping is the half-open trial: success
+  closes the circuit, failure keeps it open.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from pymongo import MongoClient, monitoring
+from pymongo.errors import ServerSelectionTimeoutError
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class _FailureListener(monitoring.CommandListener):
+    """Feeds operation outcomes into the breaker (network/client errors only)."""
+
+    def __init__(self, gateway: "MongoGateway"):
+        self.gateway = gateway
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.gateway.record_success()
+
+    def failed(self, event):
+        failure = event.failure or {}
+        # Server replies carry an error code (duplicate key, etc.); connection problems do not
+        if "code" not in failure:
+            self.gateway.record_failure(failure.get("errmsg") or str(failure))
+
+
+class _HeartbeatListener(monitoring.ServerHeartbeatListener):
+    """Feeds failed driver heartbeats into the breaker; an unreachable server fails these even
+    when no command is sent (operations then stop at server selection)."""
+
+    def __init__(self, gateway: "MongoGateway"):
+        self.gateway = gateway
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        # Recovery is confirmed by the monitor's half-open ping, not by heartbeats
+        pass
+
+    def failed(self, event):
+        self.gateway.record_failure(f"heartbeat to {event.connection_id}: {event.reply}")
+
+
+class MongoGateway:
+    def __init__(
+        self,
+        uri_getter: Callable[[], str],
+        client_options: Dict[str, Any] | None = None,
+        failure_threshold: int | None = None,
+        reset_seconds: float | None = None,
+        interval_seconds: float | None = None,
+    ):
+        """Create the gateway; the client is built lazily and the monitor starts with it."""
+        if failure_threshold is None:
+            failure_threshold = int(os.getenv("MONGO_BREAKER_FAILURES", "3"))
+        if reset_seconds is None:
+            reset_seconds = float(os.getenv("MONGO_BREAKER_RESET_SECONDS", "30"))
+        if interval_seconds is None:
+            interval_seconds = float(os.getenv("MONGO_HEALTH_INTERVAL_SECONDS", "10"))
+        self.uri_getter = uri_getter
+        self.client_options = client_options or {}
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.interval_seconds = interval_seconds
+        self._lock = threading.Lock()
+        self._client: MongoClient | None = None
+        self._monitor: threading.Thread | None = None
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.last_error: str | None = None
+        self.last_ping_ms: float | None = None
+        self.last_check: float | None = None
+        self.rejected = 0
+
+    # ------------------------------------------------------------------
+    # Breaker
+    # ------------------------------------------------------------------
+
+    def record_success(self) -> None:
+        if self.state == CLOSED and self.failures == 0:
+            return
+        with self._lock:
+            if self.state != CLOSED:
+                print("Mongo circuit closed")
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self, error: Any) -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)[:300]
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = time.time()
+                print(f"Mongo circuit opened after {self.failures} failure(s): {self.last_error}")
+
+    def record_error(self, error: Exception) -> None:
+        """Report an operation error caught by a caller. Only server-selection timeouts are
+        recorded: other failures already reached the breaker through the command listener."""
+        if isinstance(error, ServerSelectionTimeoutError):
+            self.record_failure(error)
+
+    def available(self) -> bool:
+        """True unless the circuit is open (callers should use their fallback)."""
+        return self.state != OPEN
+
+    # ------------------------------------------------------------------
+    # Client and monitor
+    # ------------------------------------------------------------------
+
+    def _ensure_client(self) -> MongoClient | None:
+        if self._client is not None:
+            return self._client
+        with self._lock:
+            if self._client is None:
+                try:
+                    # MongoClient connects in the background; construction does not block
+                    self._client = MongoClient(self.uri_getter(), event_listeners=[_FailureListener(self), _HeartbeatListener(self)], **self.client_options)
+                except Exception as e:
+                    self.last_error = str(e)
+                    print(f"Mongo client init failed: {e}")
+                    return None
+            if self._monitor is None:
+                self._monitor = threading.Thread(target=self._monitor_loop, name="mongo-monitor", daemon=True)
+                self._monitor.start()
+        return self._client
+
+    def client(self) -> MongoClient | None:
+        """Return the shared client, or None immediately while the circuit is open."""
+        if self.state == OPEN:
+            self.rejected += 1
+            self._ensure_client()
+            return None
+        return self._ensure_client()
+
+    def ping(self) -> float:
+        """Ping the server and return the latency in ms (raises on failure; updates the breaker)."""
+        client = self._ensure_client()
+        if client is None:
+            raise RuntimeError(self.last_error or "Mongo client unavailable")
+        started = time.perf_counter()
+        try:
+            client.admin.command("ping")
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.last_ping_ms = round((time.perf_counter() - started) * 1000.0, 1)
+        self.record_success()
+        return self.last_ping_ms
+
+    def _monitor_loop(self) -> None:
+        while True:
+            time.sleep(self.interval_seconds)
+            if self.state == OPEN:
+                if time.time() - (self.opened_at or 0) < self.reset_seconds:
+                    continue
+                with self._lock:
+                    self.state = HALF_OPEN
+            self.last_check = time.time()
+            try:
+                self.ping()
+            except Exception:
+                pass
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "opened_at": self.opened_at,
+            "rejected": self.rejected,
+            "last_error": self.last_error,
+            "last_ping_ms": self.last_ping_ms,
+            "last_check": self.last_check,
+            "failure_threshold": self.failure_threshold,
+            "reset_seconds": self.reset_seconds,
+        }
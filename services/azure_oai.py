@@ -35,6 +35,10 @@ def get_oai_client():
         )
     return _client
 
+def ping():
+    """Cheap reachability check for health probes: lists models, no tokens spent (raises on failure)."""
+    get_oai_client().models.list()
+
 def build_o1_prompt(prompt_file, transcript):
     
     if prompt_file is None:
@@ -214,9 +218,7 @@ def chat_with_oai(messages, deployment=AZURE_OPENAI_DEPLOYMENT_NAME):
         if content:
             yield content
 
-def get_insights(summaries):
-
-    system_prompt = """
+INSIGHTS_SYSTEM_PROMPT = """
     you will be provided with different call summaries, your task is to analyze all the summaries, and return key insights.
 
     What are the main topics? Issues? Insights and recommendations
@@ -227,28 +229,54 @@ def get_insights(summaries):
     Deliverable: A single, continuous text report meeting the above requirements.
 
     """
+
+INSIGHTS_BATCH_PROMPT = """
+    you will be provided with a batch of call summaries, in the order the calls were received. Condense them into a digest that a later step will merge with digests of other batches.
+
+    List the topics, issues and complaints raised, each with how many of the calls in this batch mention it and a short anonymized example.
+    Describe the overall customer sentiment, resolution outcomes and any trend across the batch.
+    Note effective agent behaviors and common agent deficiencies.
+    Be factual and compact; do not write recommendations.
+    """
+
+INSIGHTS_MERGE_PROMPT = """
+    you will be provided with digests, each condensing a batch of call summaries. Merge them into a single digest with the same structure:
+    topics, issues and complaints with their combined call counts and a short example, overall sentiment and resolution outcomes, trends across batches, and agent behaviors.
+    Be factual and compact; do not write recommendations.
+    """
+
+
+def _insights_completion(system_prompt, items, label, max_tokens=5000):
+    """Run one insights-style completion with each item sent as a separate user message."""
     oai_client = get_oai_client()
-    
-    messages = [
-        {
-            "role": "system",
-            "content": system_prompt
-        }
-    ] + [
-        {
-            "role": "user",
-            "content": f"call: {call} \n\n"
-        } for call in summaries
+    messages = [{"role": "system", "content": system_prompt}] + [
+        {"role": "user", "content": f"{label}: {item} \n\n"} for item in items
     ]
-      
-
     completion = oai_client.chat.completions.create(
         messages=messages,
-        model=AZURE_OPENAI_DEPLOYMENT_NAME,   
+        model=AZURE_OPENAI_DEPLOYMENT_NAME,
         temperature=0.2,
         top_p=1,
-        max_tokens=5000,
+        max_tokens=max_tokens,
         stop=None,
-    )  
-
+    )
     return completion.choices[0].message.content
+
+
+def get_insights(summaries):
+    return _insights_completion(INSIGHTS_SYSTEM_PROMPT, summaries, "call")
+
+
+def summarize_insight_batch(summaries):
+    """Map step: condense one batch of call summaries into a digest."""
+    return _insights_completion(INSIGHTS_BATCH_PROMPT, summaries, "call", max_tokens=1500)
+
+
+def merge_insight_digests(digests):
+    """Intermediate reduce step: merge several batch digests into one digest."""
+    return _insights_completion(INSIGHTS_MERGE_PROMPT, digests, "digest", max_tokens=2000)
+
+
+def get_insights_from_digests(digests):
+    """Final reduce step: write the insights report from batch digests."""
+    return _insights_completion(INSIGHTS_SYSTEM_PROMPT, digests, "digest of call summaries")
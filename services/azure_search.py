@@ -505,6 +505,10 @@ def index_exists(index_name):
     except Exception as e:
         return False
 
+def ping(index_name: str = "marketing_sentiment_details") -> None:
+    """Cheap reachability check for health probes (raises on failure)."""
+    get_search_client(index_name).get_document_count()
+
 def get_index_document_count(index_name: str) -> int:
     """
     Get the current number of documents in an Azure Search index.
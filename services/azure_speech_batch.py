@@ -23,6 +23,18 @@ def _get_speech_base_url() -> str:
     return f"https://{region}.api.cognitive.microsoft.com"
 
 
+def ping(timeout: float = 10) -> None:
+    """Cheap reachability check for health probes: lists one base model (raises on failure)."""
+    key = os.getenv("AZURE_SPEECH_KEY") or SPEECH_KEY_DEFAULT
+    resp = requests.get(
+        f"{_get_speech_base_url()}/speechtotext/v3.2/models/base",
+        headers={"Ocp-Apim-Subscription-Key": key},
+        params={"top": 1},
+        timeout=timeout,
+    )
+    resp.raise_for_status()
+
+
 def _ticks_to_timestamp(ticks: float) -> str:
     # Speech service uses 100-nanosecond ticks
     total_ms = int(round(float(ticks) / 10000.0))
@@ -53,6 +53,11 @@ def ensure_container_exists(container_name: str = DEFAULT_CONTAINER):
             raise e
 
 
+def ping(container_name: str = DEFAULT_CONTAINER) -> None:
+    """Cheap reachability check for health probes (raises on failure)."""
+    blob_service_client.get_container_client(container_name).get_container_properties()
+
+
 def get_blob_client(blob_name: str, prefix: str = "", container_name: str = DEFAULT_CONTAINER):
     """
     Return the BlobClient for a given blob name and prefix within a container.
@@ -61,6 +66,114 @@ def get_blob_client(blob_name: str, prefix: str = "", container_name: str = DEFA
     return blob_service_client.get_blob_client(container=container_name, blob=path)
 
 
+# Leading bytes of the audio formats accepted by the pipeline
+AUDIO_SIGNATURES = (
+    (b"RIFF", "wav"),
+    (b"ID3", "mp3"),
+    (b"\xff\xfb", "mp3"),
+    (b"\xff\xf3", "mp3"),
+    (b"\xff\xf2", "mp3"),
+    (b"OggS", "ogg"),
+    (b"\xff\xf1", "aac"),
+    (b"\xff\xf9", "aac"),
+)
+
+
+def sniff_audio_format(header: bytes) -> str | None:
+    """
+    Detect the audio container from the first bytes of a file (None when unknown).
+    """
+    for signature, fmt in AUDIO_SIGNATURES:
+        if header.startswith(signature):
+            return fmt
+    # MP4/M4A: 4-byte box size followed by 'ftyp'
+    if header[4:8] == b"ftyp":
+        return "m4a" if header[8:11] == b"M4A" else "mp4"
+    return None
+
+
+def upload_stream_to_blob(stream, blob_name: str, prefix: str = "", container_name: str = DEFAULT_CONTAINER,
+                          block_size: int | None = None, max_in_flight: int | None = None,
+                          commit: bool = True) -> Dict[str, Any]:
+    """
+    Upload a file-like stream as staged blocks without reading it whole.
+    The bytes are hashed (SHA-256) and the format header sniffed while they pass through;
+    at most max_in_flight blocks of block_size bytes are held in memory at once.
+    With commit=False the blocks stay uncommitted: the blob (and any existing content under
+    that name) is unchanged until commit_staged_blob() is called; uncommitted blocks that are
+    never committed are discarded by the service.
+    Returns {"path", "size", "sha256", "format", "blocks", "block_ids", "committed"}.
+    """
+    import hashlib
+    import uuid
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    if block_size is None:
+        block_size = int(os.getenv("UPLOAD_BLOCK_SIZE_MB", "4")) * 1024 * 1024
+    if max_in_flight is None:
+        max_in_flight = int(os.getenv("UPLOAD_BLOCKS_IN_FLIGHT", "2"))
+    max_in_flight = max(1, max_in_flight)
+    ensure_container_exists(container_name)
+    client = get_blob_client(blob_name, prefix, container_name)
+    # Block ids unique to this upload, so concurrent uploads to the same name never mix blocks
+    upload_id = uuid.uuid4().hex[:25]
+    digest = hashlib.sha256()
+    header = b""
+    size = 0
+    block_ids = []
+    pending = set()
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="blob-block") as pool:
+        while True:
+            chunk = stream.read(block_size)
+            if not chunk:
+                break
+            if len(header) < 16:
+                header += chunk[:16 - len(header)]
+            digest.update(chunk)
+            size += len(chunk)
+            block_id = f"{upload_id}{len(block_ids):07d}"
+            block_ids.append(block_id)
+            # Backpressure: wait for a staged block before reading the next one
+            while len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            pending.add(pool.submit(client.stage_block, block_id=block_id, data=chunk, timeout=900))
+        for future in pending:
+            future.result()
+
+    staged = {
+        "path": f"{prefix}/{blob_name}" if prefix else blob_name,
+        "container": container_name,
+        "size": size,
+        "sha256": digest.hexdigest(),
+        "format": sniff_audio_format(header),
+        "blocks": len(block_ids),
+        "block_ids": block_ids,
+        "committed": False,
+    }
+    if commit:
+        commit_staged_blob(staged)
+    return staged
+
+
+def commit_staged_blob(staged: Dict[str, Any]) -> None:
+    """
+    Commit the blocks staged by upload_stream_to_blob(commit=False), replacing the blob's content.
+    """
+    client = blob_service_client.get_blob_client(container=staged["container"], blob=staged["path"])
+    content_type, _ = mimetypes.guess_type(staged["path"])
+    if content_type is None and staged.get("format"):
+        content_type, _ = mimetypes.guess_type(f"file.{staged['format']}")
+    content_settings = ContentSettings(content_type=content_type or "application/octet-stream")
+    client.commit_block_list(
+        [BlobBlock(block_id=block_id) for block_id in staged["block_ids"]],
+        content_settings=content_settings,
+        timeout=900,
+    )
+    staged["committed"] = True
+
+
 def list_blobs(prefix: str = "", container_name: str = DEFAULT_CONTAINER):
     """
     List blobs within a container, optionally filtered by a prefix.
@@ -188,6 +301,34 @@ def read_blob(blob_name: str, prefix: str = ""):
         return None
 
 
+def read_blob_with_etag(blob_name: str, prefix: str = "", timeout: float | None = None) -> tuple[str | None, str | None]:
+    """
+    Read blob content as text (UTF-8) together with the ETag of the version read.
+    timeout bounds each network read on the client side (seconds).
+    Returns (None, None) if the blob cannot be read.
+    """
+    try:
+        options = {"read_timeout": timeout, "connection_timeout": timeout} if timeout else {}
+        download_stream = get_blob_client(blob_name, prefix).download_blob(**options)
+        return download_stream.readall().decode("utf-8"), download_stream.properties.etag
+    except Exception as e:
+        path = f"{prefix}/{blob_name}" if prefix else blob_name
+        print(f"Error reading blob: container='{DEFAULT_CONTAINER}', path='{path}': {e}")
+        return None, None
+
+
+def get_blob_etag(blob_name: str, prefix: str = "", timeout: float | None = None) -> str | None:
+    """
+    Return the blob's ETag (one HEAD request), or None if it does not exist.
+    timeout bounds the request on the client side (seconds).
+    """
+    try:
+        options = {"read_timeout": timeout, "connection_timeout": timeout} if timeout else {}
+        return get_blob_client(blob_name, prefix).get_blob_properties(**options).etag
+    except Exception:
+        return None
+
+
 def delete_blob(blob_name: str, prefix: str = ""):
     """
     Delete a blob from the container/prefix.
@@ -593,6 +734,26 @@ def send_message_to_queue(message: str, queue_name: str = STORAGE_QUEUE_NAME):
     response = queue_client.send_message(message)
     return f"Sent message to queue '{queue_name}' with message id: {response.id}"
 
+def receive_messages_from_queue(max_messages: int = 1, visibility_timeout: int = 300, queue_name: str = STORAGE_QUEUE_NAME):
+    """
+    Receive up to max_messages messages, hidden from other consumers for visibility_timeout seconds.
+    """
+    queue_client = _create_queue_client(queue_name)
+    return list(queue_client.receive_messages(messages_per_page=max_messages, max_messages=max_messages, visibility_timeout=visibility_timeout))
+
+def delete_message_from_queue(message, queue_name: str = STORAGE_QUEUE_NAME):
+    """
+    Delete a received message (acknowledge it).
+    """
+    _create_queue_client(queue_name).delete_message(message)
+
+def release_message_to_queue(message, queue_name: str = STORAGE_QUEUE_NAME, visibility_timeout: int = 0):
+    """
+    Make a received message visible again after visibility_timeout seconds (0: immediately,
+    leaving it for another consumer). Returns the updated message (it carries a new pop receipt).
+    """
+    return _create_queue_client(queue_name).update_message(message, visibility_timeout=visibility_timeout)
+
 def validate_audio_file_format(blob_name: str, prefix: str = "") -> tuple[bool, str]:
     """
     Validate audio file format and provide recommendations for Azure Speech services.
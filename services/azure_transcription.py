@@ -55,9 +55,36 @@ def parse_speakers_with_gpt4(transcribed_text: str) -> str:
         print(f"Error cleaning transcription with 4o: {e}")
         return transcribed_text
 
+TRANSCRIPTION_ERROR_PREFIXES = (
+    "Error:",
+    "Audio validation failed:",
+    "All Azure Speech transcription methods failed",
+    "Critical transcription error",
+)
+
+def is_transcription_error(text: str) -> bool:
+    """
+    True when a transcription result is one of the error messages returned below.
+    """
+    return (text or "").startswith(TRANSCRIPTION_ERROR_PREFIXES)
+
 def transcribe_audio(audio_path: str):
+    """
+    Transcribe audio using Azure Speech services, then structure the speakers with GPT-4.
+    """
+    transcription = speech_to_text(audio_path)
+    if is_transcription_error(transcription):
+        return transcription
+    # Parse speakers with GPT-4 for better conversation structure
+    parsed_conversation = parse_speakers_with_gpt4(transcription)
+    if parsed_conversation and len(parsed_conversation.strip()) > 0:
+        return parsed_conversation
+    return transcription
+
+def speech_to_text(audio_path: str):
     """
     Transcribe audio using Azure Speech services with improved error handling and validation.
+    Returns the raw transcription (no speaker parsing) or an error message.
     """
     try:
         # Step 1: Validate audio file
@@ -75,10 +102,6 @@ def transcribe_audio(audio_path: str):
             transcription = azure_speech_batch.transcribe_with_speech_batch(sas_url)
             if transcription and len(transcription.strip()) > 0:
                 print(f"Speech Batch successful for {audio_path}")
-                # Parse speakers with GPT-4 for better conversation structure
-                parsed_conversation = parse_speakers_with_gpt4(transcription)
-                if parsed_conversation and len(parsed_conversation.strip()) > 0:
-                    return parsed_conversation
                 return transcription
         except Exception as e:
             print(f"Speech Batch failed for {audio_path}: {e}")
@@ -89,10 +112,6 @@ def transcribe_audio(audio_path: str):
             transcription = azure_speech.transcribe_with_speech_sdk(local_file)
             if transcription and len(transcription.strip()) > 0:
                 print(f"Speech SDK successful for {audio_path}")
-                # Parse speakers with GPT-4 for better conversation structure
-                parsed_conversation = parse_speakers_with_gpt4(transcription)
-                if parsed_conversation and len(parsed_conversation.strip()) > 0:
-                    return parsed_conversation
                 return transcription
         except Exception as e:
             print(f"Speech SDK failed for {audio_path}: {e}")
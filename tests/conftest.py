@@ -0,0 +1,131 @@
+"""
+Shared test setup.
+
+The modules under test import the Azure SDK, OpenAI, python-dotenv and pymongo at module
+level. When those packages are not installed, minimal stand-ins are registered
+so the modules import; tests replace the clients they talk to with fakes.
+"""
+
+import importlib
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def _importable(name: str) -> bool:
+    try:
+        importlib.import_module(name)
+        return True
+    except Exception:
+        return False
+
+
+def _module(name: str) -> types.ModuleType:
+    module = sys.modules.get(name)
+    if module is None:
+        module = types.ModuleType(name)
+        sys.modules[name] = module
+        parent, _, child = name.rpartition(".")
+        if parent:
+            setattr(_module(parent), child, module)
+    return module
+
+
+def _install_dotenv() -> None:
+    _module("dotenv").load_dotenv = lambda *args, **kwargs: None
+
+
+def _install_azure() -> None:
+    class _BlobServiceClient:
+        @staticmethod
+        def from_connection_string(connection_string):
+            return _BlobServiceClient()
+
+        def get_container_client(self, name):
+            raise RuntimeError("no blob storage in tests")
+
+    class MatchConditions:
+        IfNotModified = "IfNotModified"
+        IfMissing = "IfMissing"
+
+    class ResourceModifiedError(Exception):
+        pass
+
+    class ResourceExistsError(Exception):
+        pass
+
+    identity = _module("azure.identity")
+    identity.DefaultAzureCredential = object
+    identity.get_bearer_token_provider = lambda credential, scope: None
+    blob = _module("azure.storage.blob")
+    blob.BlobServiceClient = _BlobServiceClient
+    blob.ContentSettings = lambda content_type=None, **kwargs: types.SimpleNamespace(content_type=content_type)
+    blob.BlobBlock = lambda block_id: block_id
+    blob.generate_blob_sas = None
+    blob.BlobSasPermissions = None
+    _module("azure.storage.queue").QueueClient = object
+    _module("azure.core").MatchConditions = MatchConditions
+    exceptions = _module("azure.core.exceptions")
+    exceptions.ResourceModifiedError = ResourceModifiedError
+    exceptions.ResourceExistsError = ResourceExistsError
+
+
+def _install_pymongo() -> None:
+    class PyMongoError(Exception):
+        pass
+
+    class ConnectionFailure(PyMongoError):
+        pass
+
+    class AutoReconnect(ConnectionFailure):
+        pass
+
+    class ServerSelectionTimeoutError(AutoReconnect):
+        pass
+
+    class DuplicateKeyError(PyMongoError):
+        pass
+
+    class _Listener:
+        pass
+
+    errors = _module("pymongo.errors")
+    errors.PyMongoError = PyMongoError
+    errors.ConnectionFailure = ConnectionFailure
+    errors.AutoReconnect = AutoReconnect
+    errors.ServerSelectionTimeoutError = ServerSelectionTimeoutError
+    errors.DuplicateKeyError = DuplicateKeyError
+    monitoring = _module("pymongo.monitoring")
+    monitoring.CommandListener = type("CommandListener", (_Listener,), {})
+    monitoring.ServerHeartbeatListener = type("ServerHeartbeatListener", (_Listener,), {})
+    class ReplaceOne:
+        def __init__(self, filter, replacement, upsert=False):
+            self._filter, self._doc, self._upsert = filter, replacement, upsert
+
+    class DeleteOne:
+        def __init__(self, filter):
+            self._filter = filter
+
+    pymongo = _module("pymongo")
+    pymongo.MongoClient = object
+    pymongo.ReplaceOne = ReplaceOne
+    pymongo.DeleteOne = DeleteOne
+    pymongo.ReturnDocument = types.SimpleNamespace(BEFORE=False, AFTER=True)
+
+
+def _install_openai() -> None:
+    _module("openai").AzureOpenAI = object
+
+
+if not _importable("dotenv"):
+    _install_dotenv()
+if not (_importable("azure.storage.blob") and _importable("azure.storage.queue") and _importable("azure.identity")):
+    _install_azure()
+if not _importable("pymongo"):
+    _install_pymongo()
+if not _importable("openai"):
+    _install_openai()
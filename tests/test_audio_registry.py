@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone
+
+from audio_registry import AudioRegistry
+
+SHA = "ab" * 32
+STALE_SECONDS = 600
+
+
+class FakeManifest:
+    def __init__(self, *entries):
+        self.entries = {e["call_id"]: e for e in entries}
+
+    def get(self, call_id):
+        entry = self.entries.get(call_id)
+        return dict(entry) if entry else None
+
+    def all_entries(self):
+        return [dict(e) for e in self.entries.values()]
+
+
+class FakeCollection:
+    def __init__(self, docs=None, fail=False):
+        self.docs = dict(docs or {})
+        self.fail = fail
+
+    def find_one(self, query):
+        if self.fail:
+            raise RuntimeError("mongo down")
+        return self.docs.get(query["_id"])
+
+    def update_one(self, query, update, upsert=False):
+        self.docs.setdefault(query["_id"], {"_id": query["_id"]}).update(update["$set"])
+
+
+def _ago(seconds):
+    return (datetime.now(timezone.utc) - timedelta(seconds=seconds)).isoformat()
+
+
+def _registry(entry, job_id="job-1", fail=False):
+    coll = FakeCollection({SHA: {"_id": SHA, "call_id": entry["call_id"], "job_id": job_id}}, fail=fail)
+    return AudioRegistry(lambda: coll, FakeManifest(entry))
+
+
+def _jobs(job=None):
+    """job_getter that knows at most the record of job-1."""
+    return {"job-1": job}.get
+
+
+def test_analysed_call_matches_without_a_job():
+    registry = _registry({"call_id": "a", "audio_sha256": SHA, "has_analysis": True})
+    match = registry.live_match(SHA, _jobs(), STALE_SECONDS)
+    assert match["call_id"] == "a"
+    assert registry.status() == {"hits": 1, "misses": 0}
+
+
+def test_call_in_progress_matches_while_its_job_is_fresh():
+    registry = _registry({"call_id": "a", "audio_sha256": SHA})
+    for status in ("queued", "running", "retrying"):
+        jobs = _jobs({"status": status, "updated_at": _ago(30)})
+        assert registry.live_match(SHA, jobs, STALE_SECONDS)["job_id"] == "job-1"
+
+
+def test_stale_or_finished_jobs_do_not_match():
+    registry = _registry({"call_id": "a", "audio_sha256": SHA})
+    assert registry.live_match(SHA, _jobs({"status": "running", "updated_at": _ago(3600)}), STALE_SECONDS) is None
+    assert registry.live_match(SHA, _jobs({"status": "failed", "updated_at": _ago(5)}), STALE_SECONDS) is None
+    assert registry.live_match(SHA, _jobs(), STALE_SECONDS) is None
+    # created_at stands in for a record that was never updated
+    assert registry.live_match(SHA, _jobs({"status": "queued", "created_at": _ago(5)}), STALE_SECONDS) is not None
+
+
+def test_replaced_audio_does_not_match():
+    registry = _registry({"call_id": "a", "audio_sha256": "cd" * 32, "has_analysis": True})
+    assert registry.live_match(SHA, _jobs(), STALE_SECONDS) is None
+    assert registry.status()["misses"] == 1
+
+
+def test_falls_back_to_the_manifest_while_mongo_is_down():
+    registry = _registry({"call_id": "a", "audio_sha256": SHA, "has_analysis": True}, fail=True)
+    assert registry.live_match(SHA, _jobs(), STALE_SECONDS)["call_id"] == "a"
+
+
+def test_register_maps_the_hash_to_the_call():
+    coll = FakeCollection()
+    registry = AudioRegistry(lambda: coll, FakeManifest({"call_id": "a", "audio_sha256": SHA, "has_analysis": True}))
+    registry.register(SHA, "a", "job-1")
+    assert coll.docs[SHA]["call_id"] == "a"
+    assert registry.lookup(SHA)["job_id"] == "job-1"
@@ -0,0 +1,161 @@
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from cache_store import CacheBackend, CacheStore, DiskCacheStore, MongoCacheStore
+
+
+def _value(size: int) -> str:
+    # JSON encoding adds the two quotes
+    return "x" * (size - 2)
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        CacheBackend()
+
+
+def test_lru_evicts_least_recently_used_beyond_max_bytes():
+    cache = CacheStore(max_bytes=300)
+    for key in ("calls:a", "calls:b", "calls:c"):
+        cache.set(key, _value(100))
+    # Reading "a" makes "b" the least recently used entry
+    assert cache.get("calls:a") is not None
+    cache.set("calls:d", _value(100))
+
+    assert cache.get("calls:b") is None
+    assert cache.get("calls:a") is not None
+    assert cache.get("calls:d") is not None
+    stats = cache.stats()
+    assert stats["bytes"] == 300
+    assert stats["entries"] == 3
+    assert stats["evictions"] == 1
+
+
+def test_replacing_an_entry_updates_the_byte_count():
+    cache = CacheStore(max_bytes=1000)
+    cache.set("calls:a", _value(100))
+    cache.set("calls:a", _value(40))
+    assert cache.stats()["bytes"] == 40
+
+
+def test_value_larger_than_cache_is_not_stored():
+    cache = CacheStore(max_bytes=100)
+    cache.set("calls:small", _value(50))
+    cache.set("calls:huge", _value(500))
+    assert cache.get("calls:huge") is None
+    assert cache.get("calls:small") is not None
+    assert cache.stats()["evictions"] == 0
+
+
+def test_ttl_expiry():
+    cache = CacheStore(max_bytes=1000)
+    cache.set("calls:a", 1, ttl_seconds=-1)
+    assert cache.get("calls:a") is None
+    cache.set("calls:b", 2)
+    assert cache.get("calls:b", ttl_seconds=-1) is None
+    assert cache.stats()["expirations"] == 2
+
+
+def test_tag_and_namespace_invalidation():
+    cache = CacheStore(max_bytes=10_000)
+    cache.set("calls:page1", [1], tags=["call:a", "call:b"])
+    cache.set("calls:page2", [2], tags=["call:c"])
+    cache.set("dashboard:summary", {"n": 3})
+
+    assert cache.invalidate_tag("call:b") == 1
+    assert cache.get("calls:page1") is None
+    assert cache.get("calls:page2") == [2]
+
+    assert cache.invalidate_namespace("calls") == 1
+    assert cache.get("dashboard:summary") == {"n": 3}
+    assert cache.stats()["bytes"] == len(json.dumps({"n": 3}))
+
+
+def test_disk_store_tag_invalidation_and_size(tmp_path):
+    cache = DiskCacheStore(directory=str(tmp_path), max_bytes=100_000, rescan_seconds=3600)
+    cache.set("calls:page1", [1], tags=["call:a"])
+    cache.set("calls:page2", [2], tags=["call:b"])
+    cache.set("dashboard:summary", {"n": 3})
+    size = cache.stats()["bytes"]
+    assert size > 0
+
+    assert cache.invalidate_tag("call:a") == 1
+    assert cache.get("calls:page1") is None
+    assert cache.get("calls:page2") == [2]
+    assert cache.stats()["bytes"] < size
+
+    assert cache.invalidate_namespace("calls") == 1
+    assert cache.get("dashboard:summary") == {"n": 3}
+    assert cache.clear() == 1
+    assert cache.stats()["bytes"] == 0
+
+
+def test_disk_store_evicts_beyond_max_bytes(tmp_path):
+    cache = DiskCacheStore(directory=str(tmp_path), max_bytes=1000, rescan_seconds=3600)
+    for i in range(10):
+        cache.set(f"calls:{i}", _value(200))
+    stats = cache.stats()
+    assert stats["bytes"] <= 1000
+    assert stats["evictions"] > 0
+    assert cache.get("calls:9") is not None
+
+
+def test_disk_store_sees_entries_written_by_another_worker(tmp_path):
+    first = DiskCacheStore(directory=str(tmp_path), rescan_seconds=3600)
+    second = DiskCacheStore(directory=str(tmp_path), rescan_seconds=3600)
+    first.set("calls:page1", [1], tags=["call:a"])
+    assert second.get("calls:page1") == [1]
+    assert second.invalidate_tag("call:a") == 1
+    assert first.get("calls:page1") is None
+
+
+class FakeCacheCollection:
+    """Mongo collection stand-in that records the indexes created on it."""
+
+    def __init__(self):
+        self.docs = {}
+        self.indexes = []
+
+    def create_index(self, key, **options):
+        self.indexes.append((key, options))
+
+    def find_one(self, query, projection=None):
+        return self.docs.get(query["_id"])
+
+    def replace_one(self, query, doc, upsert=False):
+        self.docs[query["_id"]] = dict(doc)
+
+    def delete_many(self, query):
+        if not query:
+            dropped = list(self.docs)
+        elif "_id" in query:
+            dropped = [query["_id"]] if query["_id"] in self.docs else []
+        else:
+            (field, value), = query.items()
+            dropped = [k for k, d in self.docs.items() if d[field] == value or value in d[field]]
+        for key in dropped:
+            del self.docs[key]
+        return SimpleNamespace(deleted_count=len(dropped))
+
+
+def test_mongo_store_writes_expiry_dates_for_its_ttl_index():
+    coll = FakeCacheCollection()
+    cache = MongoCacheStore(lambda: coll, default_ttl_seconds=60)
+    cache.set("calls:page1", [1], tags=["call:a"])
+    cache.set("calls:page2", [2])
+
+    assert ("expires_at", {"expireAfterSeconds": 0}) in coll.indexes
+    assert len([key for key, _ in coll.indexes if key == "expires_at"]) == 1
+    expires_at = coll.docs["calls:page1"]["expires_at"]
+    assert isinstance(expires_at, datetime)
+    assert timedelta(seconds=50) < expires_at - datetime.utcnow() <= timedelta(seconds=60)
+    assert cache.get("calls:page1") == [1]
+
+    # Expired entries are misses even before Mongo's TTL monitor removes them
+    coll.docs["calls:page2"]["expires_at"] = datetime.utcnow() - timedelta(seconds=1)
+    assert cache.get("calls:page2") is None
+    assert cache.invalidate_tag("call:a") == 1
+    assert cache.get("calls:page1") is None
@@ -0,0 +1,131 @@
+import pytest
+
+from call_index import CallIndex, decode_cursor, encode_cursor, is_default_query, parse_query_args, query_signature
+
+
+class MultiArgs(dict):
+    """request.args stand-in: every key maps to a list of values."""
+
+    def get(self, key, default=None):
+        values = super().get(key)
+        return values[0] if values else default
+
+    def getlist(self, key):
+        return super().get(key, [])
+
+
+class FakeManifest:
+    def __init__(self, *entries):
+        self.entries = {e["call_id"]: e for e in entries}
+        self.reads = 0
+
+    def all_entries(self):
+        self.reads += 1
+        return sorted(self.entries.values(), key=lambda e: (e["uploaded_at"], e["call_id"]), reverse=True)
+
+
+def _entry(call_id, uploaded_at, category=None, sentiment=None, score=None, **fields):
+    return {
+        "call_id": call_id,
+        "uploaded_at": uploaded_at,
+        "call_category": category,
+        "fields": {"customer_sentiment": sentiment, "sentiment_score": score, **fields},
+    }
+
+
+def _index():
+    manifest = FakeManifest(
+        _entry("a", "2024-01-01T09:00:00", "Billing", "Negative", 2, summary="refund for a double charge"),
+        _entry("b", "2024-01-02T09:00:00", "billing", "Positive", 9),
+        _entry("c", "2024-01-03T09:00:00", "Support", "Negative", None),
+        _entry("d", "2024-01-04T09:00:00", "Support", "Neutral", 5),
+    )
+    return CallIndex().sync(manifest), manifest
+
+
+def _ids(result):
+    return [call_id for call_id, _ in result[0]]
+
+
+def test_filters_are_case_insensitive_and_combine():
+    index, _ = _index()
+    assert _ids(index.query({"category": ["BILLING"]})) == ["b", "a"]
+    assert _ids(index.query({"category": ["billing", "support"], "sentiment": ["negative"]})) == ["c", "a"]
+    assert index.query({"category": ["sales"]}) == ([], 0)
+
+
+def test_dates_text_and_sorting():
+    index, _ = _index()
+    assert _ids(index.query(date_from="2024-01-02", date_to="2024-01-03")) == ["c", "b"]
+    assert _ids(index.query(text="double charge")) == ["a"]
+    # Missing values sort last in either direction
+    assert _ids(index.query(sort="sentiment_score", descending=False)) == ["a", "d", "b", "c"]
+    assert _ids(index.query(sort="sentiment_score")) == ["b", "d", "a", "c"]
+
+
+def test_after_and_until_page_through_a_snapshot():
+    index, _ = _index()
+    rows, total = index.query(after=["2024-01-03T09:00:00", "c"])
+    assert [cid for cid, _ in rows] == ["b", "a"]
+    assert total == 4
+    rows, total = index.query(until="2024-01-02T09:00:00")
+    assert [cid for cid, _ in rows] == ["b", "a"] and total == 2
+
+
+def test_manifest_changes_update_single_rows_without_a_rebuild():
+    index, manifest = _index()
+    index.on_manifest_change("a", _entry("a", "2024-01-01T09:00:00", "Support", "Positive", 7))
+    index.on_manifest_change("b", None)
+    index.on_manifest_change("e", _entry("e", "2024-01-05T09:00:00", "Sales"))
+
+    assert index.sync(manifest) is index
+    assert manifest.reads == 1
+    assert _ids(index.query({"category": ["billing"]})) == []
+    assert _ids(index.query({"category": ["support"]})) == ["d", "c", "a"]
+    assert index.values("category") == {"support": 3, "sales": 1}
+    assert _ids(index.query()) == ["e", "d", "c", "a"]
+
+
+def test_deleted_rows_are_recycled():
+    index, _ = _index()
+    index.on_manifest_change("a", None)
+    index.on_manifest_change("e", _entry("e", "2024-01-05T09:00:00", "Sales"))
+    assert len(index.call_ids) == 4
+    assert _ids(index.query({"category": ["sales"]})) == ["e"]
+
+
+def test_bulk_reload_rebuilds_on_next_sync():
+    index, manifest = _index()
+    manifest.entries = {"z": _entry("z", "2024-02-01T09:00:00", "Sales")}
+    index.on_manifest_change(None, None)
+    # Per-call events before the rebuild are covered by it
+    index.on_manifest_change("y", _entry("y", "2024-02-02T09:00:00", "Sales"))
+    assert _ids(index.sync(manifest).query()) == ["z"]
+    assert manifest.reads == 2
+
+
+def test_facets_honour_the_other_filters():
+    index, _ = _index()
+    assert index.facets("category") == {"billing": 2, "support": 2}
+    assert index.facets("category", {"sentiment": ["negative"]}) == {"billing": 1, "support": 1}
+    assert index.facets("sentiment", {"category": ["support"], "sentiment": ["positive"]}) == {"negative": 1, "neutral": 1}
+    assert index.facets("category", {"sentiment": ["angry"]}) == {}
+
+
+def test_cursor_round_trip_and_validation():
+    token = encode_cursor(7, "2024-01-04T09:00:00", ["2024-01-03T09:00:00", "c"], "sig")
+    cursor = decode_cursor(token)
+    assert cursor == {"v": 7, "t": "2024-01-04T09:00:00", "k": ["2024-01-03T09:00:00", "c"], "q": "sig"}
+    for bad in ("not-a-cursor", encode_cursor("7", "t", ["x", "c"], "sig"), encode_cursor(7, "t", ["x"], "sig")):
+        with pytest.raises(ValueError):
+            decode_cursor(bad)
+
+
+def test_query_args_build_a_stable_signature():
+    args = MultiArgs({"sentiment": ["Negative,Neutral"], "sort": ["-aht"], "q": [" refund "]})
+    filters, options = parse_query_args(args)
+    assert filters == {"sentiment": ["Negative", "Neutral"]}
+    assert options["sort"] == "aht" and options["descending"] and options["text"] == "refund"
+    assert not is_default_query(filters, options)
+    assert query_signature(filters, options) == query_signature(dict(filters), dict(options))
+    assert is_default_query(*parse_query_args(MultiArgs({})))
@@ -0,0 +1,250 @@
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+
+import call_manifest as call_manifest_module
+from call_manifest import CallManifest
+from services import azure_storage
+
+
+class FakeBlob:
+    """Manifest blob with ETag-conditional uploads."""
+
+    def __init__(self):
+        self.data = None
+        self.etag = None
+        self.uploads = 0
+        self.fail = False
+
+    def download_blob(self):
+        if self.data is None:
+            raise Exception("BlobNotFound")
+        data, etag = self.data, self.etag
+        return SimpleNamespace(readall=lambda: data, properties=SimpleNamespace(etag=etag))
+
+    def upload_blob(self, data, overwrite=False, content_settings=None, etag=None, match_condition=None):
+        if self.fail:
+            raise ConnectionError("storage unavailable")
+        if match_condition == MatchConditions.IfNotModified and etag != self.etag:
+            raise ResourceModifiedError("etag mismatch")
+        if match_condition == MatchConditions.IfMissing and self.data is not None:
+            raise ResourceExistsError("blob exists")
+        self.uploads += 1
+        self.data = data
+        self.etag = f'"{self.uploads}"'
+        return {"etag": self.etag}
+
+    def get_blob_properties(self):
+        return SimpleNamespace(etag=self.etag)
+
+    def calls(self):
+        return json.loads(self.data.decode("utf-8"))["calls"]
+
+
+class FakeContainer:
+    def __init__(self, names):
+        self.names = list(names)
+
+    def list_blobs(self, name_starts_with=None):
+        created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        return [
+            SimpleNamespace(name=name, creation_time=created.replace(minute=i))
+            for i, name in enumerate(self.names)
+            if name_starts_with is None or name.startswith(name_starts_with)
+        ]
+
+
+@pytest.fixture
+def blob(monkeypatch):
+    blob = FakeBlob()
+    monkeypatch.setattr(call_manifest_module.azure_storage, "get_blob_client", lambda name, prefix="": blob)
+    return blob
+
+
+@pytest.fixture
+def container(monkeypatch):
+    container = FakeContainer([])
+    monkeypatch.setattr(
+        azure_storage, "blob_service_client", SimpleNamespace(get_container_client=lambda name: container)
+    )
+    return container
+
+
+def _seed(blob, calls):
+    blob.upload_blob(json.dumps({"version": 1, "calls": calls}).encode("utf-8"), overwrite=True)
+
+
+def _entry(call_id, uploaded_at, **fields):
+    return {"call_id": call_id, "uploaded_at": uploaded_at, "audio_name": f"{call_id}.mp3", **fields}
+
+
+def test_upsert_keeps_newest_first_order(blob):
+    _seed(blob, {})
+    manifest = CallManifest()
+    manifest.upsert("b", uploaded_at="2024-01-02")
+    manifest.upsert("a", uploaded_at="2024-01-01")
+    manifest.upsert("c", uploaded_at="2024-01-03")
+    assert [e["call_id"] for e in manifest.all_entries()] == ["c", "b", "a"]
+
+    # Moving an entry in time re-sorts it
+    manifest.upsert("a", uploaded_at="2024-01-04")
+    assert [e["call_id"] for e in manifest.page(0, 2)] == ["a", "c"]
+    assert manifest.latest_uploaded_at() == "2024-01-04"
+
+
+def test_upsert_without_persist_saves_on_flush(blob):
+    _seed(blob, {})
+    manifest = CallManifest()
+    manifest.upsert("a", persist=False, uploaded_at="2024-01-01")
+    assert blob.calls() == {}
+    assert manifest.flush()
+    assert blob.calls()["a"]["uploaded_at"] == "2024-01-01"
+
+
+def test_page_before_follows_cursor_and_snapshot(blob):
+    _seed(blob, {cid: _entry(cid, f"2024-01-0{i}") for i, cid in enumerate(["a", "b", "c", "d", "e"], start=1)})
+    manifest = CallManifest()
+    first = manifest.page_before(None, 2)
+    assert [e["call_id"] for e in first] == ["e", "d"]
+    cursor = (first[-1]["uploaded_at"], first[-1]["call_id"])
+    assert [e["call_id"] for e in manifest.page_before(cursor, 2)] == ["c", "b"]
+
+    # Uploads after the snapshot do not shift the pages being read
+    manifest.upsert("f", uploaded_at="2024-01-09")
+    assert [e["call_id"] for e in manifest.page_before(None, 2, until="2024-01-05")] == ["e", "d"]
+
+
+def test_conflicting_save_merges_pending_changes(blob):
+    _seed(blob, {"a": _entry("a", "2024-01-01")})
+    ours = CallManifest()
+    theirs = CallManifest()
+    ours.ensure_loaded()
+    theirs.ensure_loaded()
+
+    theirs.upsert("b", uploaded_at="2024-01-02")
+    ours.upsert("a", has_analysis=True)
+
+    calls = blob.calls()
+    assert set(calls) == {"a", "b"}
+    assert calls["a"]["has_analysis"] is True
+    assert ours.get("b") is not None
+
+
+def test_replayed_upsert_only_overwrites_its_own_fields(blob):
+    _seed(blob, {})
+    api = CallManifest()
+    worker = CallManifest()
+    api.ensure_loaded()
+    worker.ensure_loaded()
+
+    api.upsert("a", audio_name="a.mp3", uploaded_at="2024-01-01")
+    # The worker never saw "a"; its stage update must not reset the API's fields
+    worker.upsert("a", has_transcript=True)
+
+    entry = blob.calls()["a"]
+    assert entry["audio_name"] == "a.mp3"
+    assert entry["has_transcript"] is True
+
+
+def test_rebuild_preserves_recorded_fields_and_drops_missing_calls(blob, container):
+    _seed(blob, {
+        "a": _entry("a", "2024-01-01", call_category="billing", fields={"topic": "x"}),
+        "gone": _entry("gone", "2024-01-02"),
+    })
+    container.names = ["audios/a.mp3", "audios/b.wav", "transcriptions/a.txt", "llmanalysis/persona/a.json"]
+    manifest = CallManifest()
+    manifest.ensure_loaded()
+    version = manifest.version
+
+    assert manifest.rebuild() == 2
+    a = manifest.get("a")
+    assert a["call_category"] == "billing"
+    assert a["fields"] == {"topic": "x"}
+    assert a["has_transcript"] and a["has_analysis"]
+    assert a["analysis_path"] == "llmanalysis/persona/a.json"
+    assert manifest.get("b")["has_analysis"] is False
+    assert manifest.get("gone") is None
+    assert manifest.version > version
+    assert set(blob.calls()) == {"a", "b"}
+
+
+def test_rebuild_without_changes_keeps_version(blob, container):
+    _seed(blob, {})
+    container.names = ["audios/a.mp3"]
+    manifest = CallManifest()
+    manifest.rebuild()
+    version, uploads = manifest.version, blob.uploads
+    manifest.rebuild()
+    assert manifest.version == version
+    assert blob.uploads == uploads
+
+
+def test_listeners_see_per_call_changes(blob):
+    _seed(blob, {})
+    manifest = CallManifest()
+    events = []
+    manifest.add_listener(lambda call_id, entry: events.append((call_id, entry is not None)))
+    manifest.ensure_loaded()
+    manifest.upsert("a", uploaded_at="2024-01-01")
+    manifest.remove("a")
+    assert events == [(None, False), ("a", True), ("a", False)]
+
+
+def test_rebuild_keeps_recorded_upload_times(blob, container):
+    _seed(blob, {"a": _entry("a", "2023-06-01T10:00:00+00:00")})
+    container.names = ["audios/a.mp3", "audios/b.mp3"]
+    manifest = CallManifest()
+    manifest.rebuild()
+    assert manifest.get("a")["uploaded_at"] == "2023-06-01T10:00:00+00:00"
+    # A call without one takes the blob's creation time
+    assert manifest.get("b")["uploaded_at"] == "2024-01-01T00:01:00+00:00"
+
+    version, uploads = manifest.version, blob.uploads
+    manifest.rebuild()
+    assert (manifest.version, blob.uploads) == (version, uploads)
+
+
+def test_failed_saves_coalesce_pending_changes_and_back_off(blob, monkeypatch):
+    _seed(blob, {})
+    manifest = CallManifest()
+    manifest.ensure_loaded()
+    blob.fail = True
+    for i in range(50):
+        manifest.upsert("a", persist=False, has_transcript=True, attempt=i)
+        manifest.upsert("b", persist=False, uploaded_at="2024-01-02")
+    assert manifest.status()["pending_changes"] == 2
+    assert not manifest.flush()
+    status = manifest.status()
+    assert status["save_failures"] == 1
+    assert "storage unavailable" in status["last_save_error"]
+
+    # Within the retry delay a flush does not touch storage
+    blob.fail = False
+    assert not manifest.flush()
+    assert blob.calls() == {}
+
+    monkeypatch.setattr(manifest, "_retry_at", 0.0)
+    assert manifest.flush()
+    assert blob.calls()["a"]["attempt"] == 49
+    assert manifest.status()["pending_changes"] == 0
+
+
+def test_removed_then_recreated_call_replays_without_old_fields(blob):
+    _seed(blob, {"a": _entry("a", "2024-01-01", call_category="billing")})
+    ours = CallManifest()
+    theirs = CallManifest()
+    ours.ensure_loaded()
+    theirs.ensure_loaded()
+
+    theirs.upsert("b", uploaded_at="2024-01-02")
+    ours.remove("a", persist=False)
+    ours.upsert("a", uploaded_at="2024-01-03")
+
+    calls = blob.calls()
+    assert set(calls) == {"a", "b"}
+    assert calls["a"]["uploaded_at"] == "2024-01-03"
+    assert calls["a"].get("call_category") is None
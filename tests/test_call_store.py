@@ -0,0 +1,199 @@
+import re
+import time
+
+from call_index import CallIndex
+from call_store import CallStore, call_document
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction=1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, order in reversed(keys):
+            self.docs.sort(key=lambda d: d.get(field), reverse=order < 0)
+        return self
+
+    def skip(self, n):
+        self.docs = self.docs[n:]
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    def __iter__(self):
+        return iter(self.docs)
+
+
+def _compare(value, op, arg):
+    if op == "$in":
+        return value in arg
+    if op == "$nin":
+        return value not in arg
+    if op == "$ne":
+        return value != arg
+    if op == "$regex":
+        return value is not None and re.search(arg, value) is not None
+    if value is None:
+        return False
+    return {"$lt": value < arg, "$gt": value > arg, "$lte": value <= arg, "$gte": value >= arg}[op]
+
+
+def _matches(doc, query):
+    for key, cond in query.items():
+        if key == "$and":
+            ok = all(_matches(doc, q) for q in cond)
+        elif key == "$or":
+            ok = any(_matches(doc, q) for q in cond)
+        elif isinstance(cond, dict):
+            ok = all(_compare(doc.get(key), op, arg) for op, arg in cond.items())
+        else:
+            ok = doc.get(key) == cond
+        if not ok:
+            return False
+    return True
+
+
+class FakeCallsCollection:
+    """The subset of a Mongo collection CallStore uses, evaluated in memory."""
+
+    def __init__(self):
+        self.docs = {}
+
+    def create_index(self, keys, **options):
+        pass
+
+    def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            call_id = op._filter["_id"]
+            if getattr(op, "_doc", None) is not None:
+                self.docs[call_id] = dict(op._doc)
+            else:
+                self.docs.pop(call_id, None)
+
+    def delete_many(self, query):
+        for call_id in [k for k, d in self.docs.items() if _matches(d, query)]:
+            del self.docs[call_id]
+
+    def count_documents(self, query):
+        return sum(1 for d in self.docs.values() if _matches(d, query))
+
+    def find(self, query, projection=None):
+        return FakeCursor([d for d in self.docs.values() if _matches(d, query)])
+
+    def aggregate(self, pipeline):
+        match, group = pipeline[0]["$match"], pipeline[1]["$group"]
+        field = group["_id"].lstrip("$")
+        counts = {}
+        for doc in self.docs.values():
+            if _matches(doc, match):
+                counts[doc[field]] = counts.get(doc[field], 0) + 1
+        return [{"_id": value, "count": n} for value, n in counts.items()]
+
+
+class FakeManifest:
+    def __init__(self, *entries):
+        self.entries = {e["call_id"]: e for e in entries}
+
+    def all_entries(self):
+        return list(self.entries.values())
+
+
+def _entry(call_id, uploaded_at, category=None, sentiment=None, score=None, **fields):
+    return {
+        "call_id": call_id,
+        "uploaded_at": uploaded_at,
+        "call_category": category,
+        "fields": {"customer_sentiment": sentiment, "sentiment_score": score, **fields},
+    }
+
+
+ENTRIES = (
+    _entry("a", "2024-01-01T09:00:00", "Billing", "Negative", 2, summary="refund for a double charge"),
+    _entry("b", "2024-01-02T09:00:00", "billing", "Positive", 9),
+    _entry("c", "2024-01-03T09:00:00", "Support", "Negative", None),
+    _entry("d", "2024-01-04T09:00:00", "Support", "Neutral", 5),
+)
+
+
+def _store(*entries):
+    coll, manifest = FakeCallsCollection(), FakeManifest(*entries)
+    store = CallStore(lambda: coll, manifest, retry_seconds=0.05)
+    store.ready()
+    assert store.flush()
+    return store, coll, manifest
+
+
+def _ids(result):
+    return [call_id for call_id, _ in result[0]]
+
+
+def test_call_document_normalizes_filter_fields():
+    doc = call_document(_entry("a", "2024-01-01", "Billing ", {"score": "Negative"}, "4", summary="Refund"))
+    assert doc["_id"] == "a" and doc["status"] == "uploaded"
+    assert doc["category"] == "billing"
+    assert doc["sentiment"] == "negative"
+    assert doc["sentiment_score"] == 4.0
+    assert "refund" in doc["search_text"]
+
+
+def test_starts_with_a_reconcile_and_mirrors_manifest_events():
+    store, coll, _ = _store(*ENTRIES)
+    assert set(coll.docs) == {"a", "b", "c", "d"}
+    assert store.status()["synced"]
+
+    store.on_manifest_change("a", {**ENTRIES[0], "has_analysis": True})
+    store.on_manifest_change("b", None)
+    assert store.flush()
+    assert set(coll.docs) == {"a", "c", "d"}
+    assert coll.docs["a"]["status"] == "analyzed"
+
+
+def test_queries_match_the_in_memory_index():
+    store, _, manifest = _store(*ENTRIES)
+    index = CallIndex().sync(manifest)
+    cases = [
+        {"filters": {"category": ["BILLING"]}},
+        {"filters": {"category": ["billing", "support"], "sentiment": ["negative"]}},
+        {"date_from": "2024-01-02", "date_to": "2024-01-03"},
+        {"text": "double charge"},
+        {"sort": "sentiment_score", "descending": False},
+        {"sort": "sentiment_score"},
+        {"after": ["2024-01-03T09:00:00", "c"]},
+        {"sort": "sentiment_score", "after": [5.0, "d"]},
+        {"until": "2024-01-02T09:00:00"},
+    ]
+    for kwargs in cases:
+        assert store.query(**kwargs) == index.query(**kwargs), kwargs
+
+
+def test_skip_pages_through_rows_without_a_sort_value():
+    store, _, _ = _store(*ENTRIES)
+    assert _ids(store.query(sort="sentiment_score", skip=2, limit=2)) == ["a", "c"]
+    assert _ids(store.query(sort="sentiment_score", skip=3, limit=2)) == ["c"]
+
+
+def test_facets_honour_the_other_filters():
+    store, _, _ = _store(*ENTRIES)
+    assert store.facets("category") == {"billing": 2, "support": 2}
+    assert store.facets("category", {"sentiment": ["negative"]}) == {"billing": 1, "support": 1}
+    assert store.facets("sentiment", {"category": ["support"], "sentiment": ["positive"]}) == {"negative": 1, "neutral": 1}
+
+
+def test_failed_write_is_repaired_by_a_reconcile():
+    coll, manifest = FakeCallsCollection(), FakeManifest(*ENTRIES)
+    available = {"up": False}
+    store = CallStore(lambda: coll if available["up"] else None, manifest, retry_seconds=0.05)
+    store.on_manifest_change("a", ENTRIES[0])
+    assert store.flush()
+    assert not store.ready()
+
+    # The idle writer retries the reconcile
+    available["up"] = True
+    deadline = time.time() + 5
+    while not store.ready() and time.time() < deadline:
+        time.sleep(0.01)
+    assert store.ready()
+    assert set(coll.docs) == {"a", "b", "c", "d"}
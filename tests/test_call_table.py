@@ -0,0 +1,100 @@
+import pytest
+
+from call_table import CallTable
+
+
+class FakeManifest:
+    def __init__(self, *entries):
+        self.entries = {e["call_id"]: e for e in entries}
+        self.reads = 0
+
+    def all_entries(self):
+        self.reads += 1
+        return list(self.entries.values())
+
+
+def _entry(call_id, category=None, sentiment=None, score=None, aht=None, **fields):
+    return {
+        "call_id": call_id,
+        "fields": {
+            "call_categorization": category,
+            "customer_sentiment": sentiment,
+            "sentiment_score": score,
+            "aht_seconds": aht,
+            **fields,
+        },
+    }
+
+
+def _table():
+    manifest = FakeManifest(
+        _entry("a", "Billing", {"score": "Negative"}, 2, 300, resolved="yes", summary="refund", services="card; loan"),
+        _entry("b", "Billing", "Positive", 8, "120", resolved={"score": True}, services=["card"]),
+        _entry("c", "Support", "Negative", None, "n/a"),
+    )
+    table = CallTable(capacity=2)
+    table.on_manifest_change(None, None)
+    return table.sync(manifest), manifest
+
+
+def test_statistics_over_the_manifest_fields():
+    table, _ = _table()
+    stats = table.statistics()
+    assert stats["total_calls"] == 3
+    assert stats["calls_with_summary"] == 1
+    assert stats["resolved_rate"] == pytest.approx(2 / 3)
+    score = stats["numeric"]["sentiment_score"]
+    assert (score["count"], score["mean"], score["min"], score["max"], score["p50"]) == (2, 5, 2, 8, 5)
+    # Unparseable values count as missing
+    assert stats["numeric"]["aht_seconds"]["count"] == 2
+    assert stats["histograms"]["category"] == {"Billing": 2, "Support": 1}
+    assert stats["histograms"]["sentiment_label"] == {"Negative": 2, "Positive": 1}
+    assert stats["histograms"]["services"] == {"card": 2, "loan": 1}
+    assert stats["cross_tabs"]["category_by_sentiment_label"] == {
+        "Billing": {"Negative": 1, "Positive": 1},
+        "Support": {"Negative": 1},
+    }
+
+
+def test_manifest_changes_update_rows_in_place():
+    table, manifest = _table()
+    table.on_manifest_change("a", _entry("a", "Support", "Positive", 6))
+    table.on_manifest_change("b", None)
+    assert table.sync(manifest) is table
+    assert manifest.reads == 1
+
+    stats = table.statistics()
+    assert stats["total_calls"] == 2
+    assert stats["histograms"]["category"] == {"Support": 2}
+    assert stats["histograms"]["services"] == {}
+    assert stats["numeric"]["sentiment_score"]["mean"] == 6
+
+
+def test_deleted_rows_are_recycled_and_the_table_grows():
+    table, _ = _table()
+    table.on_manifest_change("a", None)
+    table.on_manifest_change("d", _entry("d", "Sales"))
+    assert table._size == 3
+    for i in range(10):
+        table.on_manifest_change(f"new{i}", _entry(f"new{i}", "Sales", score=i))
+    stats = table.statistics()
+    assert stats["total_calls"] == 13
+    assert stats["histograms"]["category"]["Sales"] == 11
+    assert stats["numeric"]["sentiment_score"]["count"] == 11
+
+
+def test_bulk_reload_rebuilds_on_next_sync():
+    table, manifest = _table()
+    manifest.entries = {"z": _entry("z", "Sales")}
+    table.on_manifest_change(None, None)
+    # Per-call events before the rebuild are covered by it
+    table.on_manifest_change("y", _entry("y", "Sales"))
+    assert table.sync(manifest).statistics()["total_calls"] == 1
+    assert manifest.reads == 2
+
+
+def test_empty_table():
+    stats = CallTable().statistics()
+    assert stats["total_calls"] == 0
+    assert stats["resolved_rate"] is None
+    assert stats["numeric"]["sentiment_score"] == {"count": 0}
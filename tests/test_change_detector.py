@@ -0,0 +1,62 @@
+from datetime import datetime
+
+from pymongo.errors import DuplicateKeyError
+
+from change_detector import ChangeDetector
+
+
+class FakeManifest:
+    def __init__(self):
+        self.version = 1
+        self.rebuilds = 0
+
+    def rebuild(self):
+        self.rebuilds += 1
+        self.version += 1
+
+
+class FakeLeaseCollection:
+    """Upserting find_one_and_update over the single lease document."""
+
+    def __init__(self):
+        self.doc = None
+
+    def find_one_and_update(self, query, update, upsert=False):
+        if self.doc is not None:
+            held = self.doc["expires_at"] >= query["$or"][0]["expires_at"]["$lt"]
+            if held and self.doc["owner"] != query["$or"][1]["owner"]:
+                raise DuplicateKeyError("E11000 duplicate key")
+        self.doc = {"_id": query["_id"], **update["$set"]}
+
+
+def _detector(manifest, coll):
+    return ChangeDetector(manifest, on_change=lambda: None, min_poll_seconds=0, reconcile_seconds=60,
+                          lease_collection_getter=lambda: coll)
+
+
+def test_only_the_lease_holder_reconciles_each_interval():
+    manifest, coll = FakeManifest(), FakeLeaseCollection()
+    first, second = _detector(manifest, coll), _detector(manifest, coll)
+
+    assert first._acquire_lease()
+    assert not second._acquire_lease()
+    # The holder keeps its lease across intervals
+    assert first._acquire_lease()
+
+    coll.doc["expires_at"] = datetime(2000, 1, 1)
+    assert second._acquire_lease()
+    assert coll.doc["owner"] == second.owner
+
+
+def test_reconciles_locally_without_a_lease_collection():
+    def down():
+        raise RuntimeError("mongo down")
+
+    manifest = FakeManifest()
+    detector = _detector(manifest, None)
+    assert detector._acquire_lease()
+    detector.lease_collection_getter = down
+    assert detector._acquire_lease()
+    assert detector.reconcile()
+    assert manifest.rebuilds == 1
+    assert detector.status()["reconciles"] == 1
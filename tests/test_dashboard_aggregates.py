@@ -0,0 +1,120 @@
+import copy
+
+from dashboard_aggregates import AGGREGATE_ID, DashboardAggregates, build_summary, escape_key, unescape_key
+
+
+class FakeCollection:
+    """Mongo collection stand-in for the aggregate and contribution documents."""
+
+    def __init__(self):
+        self.docs = {}
+
+    def find_one_and_replace(self, query, doc, upsert=False, return_document=None):
+        previous = self.docs.get(query["_id"])
+        self.docs[query["_id"]] = copy.deepcopy(doc)
+        return previous
+
+    def find_one_and_delete(self, query):
+        return self.docs.pop(query["_id"], None)
+
+    def update_one(self, query, update, upsert=False):
+        doc = self.docs.get(query["_id"])
+        if doc is None:
+            return
+        for path, value in update["$inc"].items():
+            target = doc
+            *parents, leaf = path.split(".")
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[leaf] = target.get(leaf, 0) + value
+
+    def delete_many(self, query):
+        for key in [k for k, d in self.docs.items() if d.get("kind") == query["kind"]]:
+            del self.docs[key]
+
+    def insert_many(self, docs, ordered=True):
+        for doc in docs:
+            self.docs[doc["_id"]] = copy.deepcopy(doc)
+
+    def replace_one(self, query, doc, upsert=False):
+        self.docs[query["_id"]] = copy.deepcopy(doc)
+
+    def find_one(self, query):
+        return copy.deepcopy(self.docs.get(query["_id"]))
+
+    def find(self, query, projection=None):
+        return [d for d in self.docs.values() if d.get("kind") == query["kind"] and d.get("summary") is not None]
+
+
+def _contribution(category, sentiment=None, resolved=False, summary=None):
+    counters = {"total_calls": 1, "calls_with_analysis": 1, "resolved_count": int(resolved)}
+    if sentiment is not None:
+        counters.update(sentiment_sum=sentiment, sentiment_count=1)
+    return {"counters": counters, "histograms": {"categories": {category: 1}}, "summary": summary}
+
+
+def _aggregates():
+    coll = FakeCollection()
+    aggregates = DashboardAggregates(lambda: coll)
+    aggregates.rebuild({
+        "a": _contribution("billing", 2, summary="refund"),
+        "b": _contribution("support", 8, resolved=True, summary="password reset"),
+    })
+    return aggregates, coll
+
+
+def test_snapshot_is_none_until_rebuilt():
+    coll = FakeCollection()
+    aggregates = DashboardAggregates(lambda: coll)
+    assert aggregates.apply("a", _contribution("billing"))
+    assert aggregates.snapshot() is None
+    assert AGGREGATE_ID not in coll.docs
+
+
+def test_rebuild_matches_a_full_summary():
+    aggregates, _ = _aggregates()
+    summary = aggregates.snapshot()
+    assert summary["total_calls"] == 2
+    assert summary["avg_sentiment"] == 5
+    assert summary["resolved_rate"] == 0.5
+    assert summary["categories"] == {"billing": 1, "support": 1}
+    assert aggregates.summary_items() == {"a": "refund", "b": "password reset"}
+
+
+def test_reanalysis_applies_only_the_difference():
+    aggregates, _ = _aggregates()
+    assert aggregates.apply("a", _contribution("support", 4, resolved=True))
+    summary = aggregates.snapshot()
+    assert summary["total_calls"] == 2
+    assert summary["avg_sentiment"] == 6
+    assert summary["resolved_rate"] == 1
+    # The emptied bucket is hidden rather than reported as zero
+    assert summary["categories"] == {"support": 2}
+
+    # Applying the same contribution again changes nothing
+    assert aggregates.apply("a", _contribution("support", 4, resolved=True))
+    assert aggregates.snapshot() == summary
+
+
+def test_new_and_deleted_calls_adjust_the_totals():
+    aggregates, _ = _aggregates()
+    aggregates.apply("c", _contribution("sales.emea", 5))
+    assert aggregates.snapshot()["categories"]["sales.emea"] == 1
+    assert aggregates.retract("b")
+    assert aggregates.retract("missing")
+    summary = aggregates.snapshot()
+    assert summary["total_calls"] == 2
+    assert summary["categories"] == {"billing": 1, "sales.emea": 1}
+    assert summary["resolved_rate"] == 0
+
+
+def test_keys_are_escaped_for_mongo_field_names():
+    for key in ("a.b", "$x", "100%", "%2E"):
+        assert "." not in escape_key(key) and not escape_key(key).startswith("$")
+        assert unescape_key(escape_key(key)) == key
+
+
+def test_build_summary_without_calls():
+    summary = build_summary({}, {})
+    assert summary["total_calls"] == 0
+    assert summary["avg_sentiment"] is None and summary["resolved_rate"] is None
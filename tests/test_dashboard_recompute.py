@@ -0,0 +1,136 @@
+import threading
+import time
+from datetime import datetime
+
+from pymongo.errors import DuplicateKeyError
+
+from dashboard_recompute import LEASE_ID, RecomputeCoordinator
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class FakeLeaseCollection:
+    """Lease document shared by the coordinators of several workers."""
+
+    def __init__(self):
+        self.docs = {}
+        self._lock = threading.Lock()
+
+    def find_one_and_update(self, query, update, upsert=False):
+        with self._lock:
+            doc = self.docs.get(query["_id"])
+            if doc is not None:
+                expired, owner = query["$or"]
+                if not (doc["expires_at"] < expired["expires_at"]["$lt"] or doc["owner"] == owner["owner"]):
+                    raise DuplicateKeyError("E11000 duplicate key")
+            self.docs[query["_id"]] = {**(doc or {"_id": query["_id"]}), **update["$set"]}
+
+    def update_one(self, query, update):
+        with self._lock:
+            doc = self.docs.get(query["_id"])
+            if doc is not None and doc["owner"] == query["owner"]:
+                doc.update(update["$set"])
+
+    def find_one(self, query):
+        with self._lock:
+            doc = self.docs.get(query["_id"])
+            return dict(doc) if doc else None
+
+
+def _coordinator(compute, published=None, coll=None, **kwargs):
+    published = published if published is not None else []
+    return RecomputeCoordinator(
+        compute=compute,
+        publish=published.append,
+        load=lambda: published[-1] if published else None,
+        lease_collection_getter=(lambda: coll) if coll is not None else None,
+        **kwargs,
+    )
+
+
+def test_callers_during_a_run_share_one_follow_up_run():
+    started = threading.Event()
+    release = threading.Event()
+    runs = []
+
+    def compute(full):
+        runs.append(full)
+        if len(runs) == 1:
+            started.set()
+            release.wait(5)
+        return {"run": len(runs)}
+
+    coordinator = _coordinator(compute)
+    results = []
+    first = threading.Thread(target=lambda: results.append(coordinator.run()))
+    first.start()
+    assert started.wait(5)
+    # Both arrive while the first run is in flight: neither may get its result
+    followers = [threading.Thread(target=lambda full=full: results.append(coordinator.run(full=full))) for full in (False, True)]
+    for t in followers:
+        t.start()
+    assert _wait_for(lambda: coordinator._requested == 3)
+    release.set()
+    for t in [first] + followers:
+        t.join(5)
+
+    assert runs == [False, True]
+    assert sorted(r["run"] for r in results) == [1, 2, 2]
+    assert coordinator.status()["joined"] == 1
+
+
+def test_schedule_debounces_a_burst_into_one_run():
+    runs = []
+    coordinator = _coordinator(lambda full: runs.append(full) or {}, debounce_seconds=0.05, max_delay_seconds=5)
+    for _ in range(20):
+        coordinator.schedule()
+    coordinator.schedule(full=True)
+    assert _wait_for(lambda: runs)
+    time.sleep(0.2)
+    assert runs == [True]
+
+
+def test_schedule_is_bounded_by_the_maximum_delay():
+    runs = []
+    coordinator = _coordinator(lambda full: runs.append(full) or {}, debounce_seconds=0.2, max_delay_seconds=0.3)
+    deadline = time.time() + 0.6
+    while time.time() < deadline and not runs:
+        coordinator.schedule()
+        time.sleep(0.05)
+    assert runs
+
+
+def test_worker_waiting_on_the_lease_reuses_the_published_summary():
+    coll = FakeLeaseCollection()
+    published = []
+    # Another worker's run is in progress and started after our change
+    coll.docs[LEASE_ID] = {"_id": LEASE_ID, "owner": "other", "expires_at": datetime(2100, 1, 1)}
+    computed = []
+    coordinator = _coordinator(lambda full: computed.append(full) or {"by": "us"}, published, coll, lease_seconds=5)
+
+    def other_worker_finishes():
+        time.sleep(0.1)
+        published.append({"by": "other"})
+        coll.docs[LEASE_ID].update(expires_at=datetime.utcnow(), last_started_at=datetime.utcnow())
+
+    threading.Thread(target=other_worker_finishes).start()
+    assert coordinator.run() == {"by": "other"}
+    assert computed == []
+    assert coordinator.status()["remote_results"] == 1
+
+
+def test_lease_is_taken_and_released_around_a_run():
+    coll = FakeLeaseCollection()
+    coordinator = _coordinator(lambda full: {"ok": True}, coll=coll)
+    assert coordinator.run() == {"ok": True}
+    lease = coll.docs[LEASE_ID]
+    assert lease["owner"] == coordinator.owner
+    assert lease["expires_at"] <= datetime.utcnow()
+    assert lease["last_started_at"] is not None
@@ -0,0 +1,139 @@
+import copy
+
+import pytest
+
+from dashboard_rollups import DashboardRollups, period_key
+
+
+def _matches(doc, query):
+    for key, cond in query.items():
+        value = doc.get(key)
+        if not isinstance(cond, dict):
+            if value != cond:
+                return False
+            continue
+        for op, arg in cond.items():
+            ok = {
+                "$in": lambda: value in arg,
+                "$gt": lambda: value is not None and value > arg,
+                "$gte": lambda: value is not None and value >= arg,
+                "$lte": lambda: value is not None and value <= arg,
+            }[op]()
+            if not ok:
+                return False
+    return True
+
+
+class FakeCollection:
+    """Mongo collection stand-in for rollup rows and member documents."""
+
+    def __init__(self):
+        self.docs = {}
+
+    def create_index(self, keys, **options):
+        pass
+
+    def find_one_and_replace(self, query, doc, upsert=False, return_document=None):
+        previous = self.docs.get(query["_id"])
+        self.docs[query["_id"]] = copy.deepcopy(doc)
+        return previous
+
+    def find_one_and_delete(self, query):
+        return self.docs.pop(query["_id"], None)
+
+    def update_one(self, query, update, upsert=False):
+        doc = self.docs.get(query["_id"])
+        if doc is None:
+            doc = self.docs[query["_id"]] = {"_id": query["_id"], **update.get("$setOnInsert", {})}
+        for name, value in update["$inc"].items():
+            doc[name] = doc.get(name, 0) + value
+
+    def delete_many(self, query):
+        for key in [k for k, d in self.docs.items() if _matches(d, query)]:
+            del self.docs[key]
+
+    def insert_many(self, docs, ordered=True):
+        for doc in docs:
+            self.docs[doc["_id"]] = copy.deepcopy(doc)
+
+    def replace_one(self, query, doc, upsert=False):
+        self.docs[query["_id"]] = copy.deepcopy(doc)
+
+    def find_one(self, query, projection=None):
+        return self.docs.get(query["_id"])
+
+    def aggregate(self, pipeline):
+        match, group = pipeline[0]["$match"], pipeline[1]["$group"]
+        groups = {}
+        for doc in self.docs.values():
+            if not _matches(doc, match):
+                continue
+            key = {name: doc.get(ref.lstrip("$")) for name, ref in group["_id"].items()}
+            out = groups.setdefault(tuple(sorted(key.items(), key=str)), {"_id": key})
+            for name, spec in group.items():
+                if name != "_id":
+                    out[name] = out.get(name, 0) + (doc.get(spec["$sum"].lstrip("$")) or 0)
+        return list(groups.values())
+
+
+def _member(uploaded_at, category, agent, sentiment=None):
+    metrics = {"total_calls": 1, "calls_with_analysis": 1}
+    if sentiment is not None:
+        metrics.update(sentiment_sum=sentiment, sentiment_count=1)
+    return {"uploaded_at": uploaded_at, "dims": {"category": category, "agent": agent}, "metrics": metrics}
+
+
+def _rollups():
+    coll = FakeCollection()
+    rollups = DashboardRollups(lambda: coll)
+    rollups.rebuild({
+        "a": _member("2024-01-01T09:00:00", "billing", "sara", 2),
+        "b": _member("2024-01-01T15:00:00", "support", "omar", 8),
+        "c": _member("2024-01-09T10:00:00", "billing", "omar", 5),
+    })
+    return rollups, coll
+
+
+def test_period_keys():
+    assert period_key("2024-01-01T09:00:00Z", "day") == "2024-01-01"
+    assert period_key("2024-01-01T09:00:00", "week") == "2024-W01"
+    assert period_key("2024-01-01T09:00:00", "month") == "2024-01"
+    assert period_key("not a date", "day") is None
+
+
+def test_ready_after_rebuild_only():
+    coll = FakeCollection()
+    assert not DashboardRollups(lambda: coll).is_ready()
+    rollups, coll = _rollups()
+    # Another worker sees the rebuild through the meta document
+    assert DashboardRollups(lambda: coll).is_ready()
+
+
+def test_timeseries_and_breakdown():
+    rollups, _ = _rollups()
+    days = rollups.timeseries("day")
+    assert [(r["period"], r["calls"], r["avg_sentiment"]) for r in days] == [("2024-01-01", 2, 5), ("2024-01-09", 1, 5)]
+    weeks = rollups.timeseries("week", group_by="agent")
+    assert [(r["period"], r["agent"], r["calls"]) for r in weeks] == [("2024-W01", "omar", 1), ("2024-W01", "sara", 1), ("2024-W02", "omar", 1)]
+    assert [(r["category"], r["calls"]) for r in rollups.breakdown("category", grain="month")] == [("billing", 2), ("support", 1)]
+    filtered = rollups.timeseries("day", date_from="2024-01-02", filters={"agent": ["omar"]})
+    assert [(r["period"], r["calls"]) for r in filtered] == [("2024-01-09", 1)]
+
+
+def test_reanalysis_moves_the_call_and_delete_retracts_it():
+    rollups, _ = _rollups()
+    assert rollups.apply("a", "2024-01-09T11:00:00", {"category": "support", "agent": "sara"}, {"total_calls": 1})
+    days = rollups.timeseries("day")
+    assert [(r["period"], r["calls"]) for r in days] == [("2024-01-01", 1), ("2024-01-09", 2)]
+    assert rollups.retract("b")
+    # Emptied rows drop out of the results
+    assert [r["period"] for r in rollups.timeseries("day")] == ["2024-01-09"]
+    assert {r["category"]: r["calls"] for r in rollups.breakdown("category")} == {"billing": 1, "support": 1}
+
+
+def test_invalid_grain_or_dimension_is_rejected():
+    rollups, _ = _rollups()
+    with pytest.raises(ValueError):
+        rollups.timeseries("year")
+    with pytest.raises(ValueError):
+        rollups.breakdown("customer")
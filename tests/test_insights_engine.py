@@ -0,0 +1,104 @@
+import pytest
+
+import insights_engine
+from insights_engine import InsightsEngine, split_batches
+
+
+class FakeDigestCollection:
+    def __init__(self):
+        self.docs = {}
+
+    def find(self, query, projection=None):
+        return [self.docs[i] for i in query["_id"]["$in"] if i in self.docs]
+
+    def replace_one(self, query, doc, upsert=False):
+        self.docs[query["_id"]] = dict(doc)
+
+    def delete_many(self, query):
+        for key in [k for k in self.docs if k not in query["_id"]["$nin"]]:
+            del self.docs[key]
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """Record the requests sent to the model; digests echo their inputs."""
+    calls = {"single": 0, "map": [], "merge": [], "reduce": []}
+
+    def single(summaries):
+        calls["single"] += 1
+        return "report"
+
+    def summarize(batch):
+        calls["map"].append(list(batch))
+        return "map(" + ",".join(batch) + ")"
+
+    def merge(digests):
+        calls["merge"].append(list(digests))
+        return "merge(" + ",".join(digests) + ")"
+
+    def reduce(digests):
+        calls["reduce"].append(list(digests))
+        return "report of " + str(len(digests))
+
+    monkeypatch.setattr(insights_engine.azure_oai, "get_insights", single)
+    monkeypatch.setattr(insights_engine.azure_oai, "summarize_insight_batch", summarize)
+    monkeypatch.setattr(insights_engine.azure_oai, "merge_insight_digests", merge)
+    monkeypatch.setattr(insights_engine.azure_oai, "get_insights_from_digests", reduce)
+    return calls
+
+
+def _summaries(n, start=0):
+    return [f"call {i}: customer asked about billing" for i in range(start, start + n)]
+
+
+def test_batches_are_content_defined_and_capped():
+    summaries = _summaries(200)
+    batches = split_batches(summaries, 5)
+    assert [s for b in batches for s in b] == summaries
+    assert max(len(b) for b in batches) <= 10
+
+    # Inserting one summary only changes the batch it lands in
+    changed = split_batches(summaries[:100] + ["new call"] + summaries[100:], 5)
+    assert len([b for b in changed if b not in batches]) == 1
+
+
+def test_small_corpus_uses_a_single_request(llm):
+    engine = InsightsEngine(batch_size=50)
+    assert engine.generate(_summaries(10)) == "report"
+    assert engine.generate([]) is None
+    assert llm["single"] == 1 and llm["map"] == []
+
+
+def test_one_new_call_costs_one_map_request(llm):
+    engine = InsightsEngine(batch_size=5, reduce_fan_in=1000)
+    engine.generate(_summaries(100))
+    first = len(llm["map"])
+    assert first == len(split_batches(_summaries(100), 5))
+
+    engine.generate(_summaries(101))
+    assert len(llm["map"]) == first + 1
+    assert len(llm["reduce"]) == 2
+    assert engine.status()["digest_hits"] == len(split_batches(_summaries(101), 5)) - 1
+
+
+def test_digests_are_merged_hierarchically_past_the_fan_in(llm):
+    engine = InsightsEngine(batch_size=2, reduce_fan_in=3)
+    engine.generate(_summaries(60))
+    assert llm["merge"]
+    assert all(len(group) <= 3 for group in llm["merge"])
+    assert len(llm["reduce"][-1]) <= 3
+
+
+def test_persisted_digests_are_shared_and_pruned(llm):
+    coll = FakeDigestCollection()
+    InsightsEngine(lambda: coll, batch_size=5).generate(_summaries(100))
+    maps = len(llm["map"])
+    stored = set(coll.docs)
+
+    # A second worker (empty memory) reuses every stored digest
+    InsightsEngine(lambda: coll, batch_size=5).generate(_summaries(100))
+    assert len(llm["map"]) == maps
+
+    # Digests of batches no longer in the corpus are dropped
+    InsightsEngine(lambda: coll, batch_size=5).generate(_summaries(50))
+    assert len(coll.docs) == len(split_batches(_summaries(50), 5)) < len(stored)
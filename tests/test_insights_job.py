@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+
+from insights_job import InsightsJob, summaries_digest
+
+
+class Harness:
+    """Summaries, persisted state and generator calls of one InsightsJob."""
+
+    def __init__(self, summaries, state=None, fail=False):
+        self.summaries = list(summaries)
+        self.state = dict(state or {})
+        self.generated = []
+        self.stored = []
+        self.fail = fail
+        # Long debounce: the tests run the job synchronously instead of waiting on timers
+        self.job = InsightsJob(
+            summaries_provider=lambda: list(self.summaries),
+            generator=self._generate,
+            store=self._store,
+            state_getter=lambda: dict(self.state),
+            debounce_seconds=3600,
+            min_interval_seconds=300,
+            change_threshold=0.05,
+            max_age_seconds=3600,
+        )
+
+    def _generate(self, summaries):
+        if self.fail:
+            raise RuntimeError("openai timeout")
+        self.generated.append(len(summaries))
+        return {"insights": f"{len(summaries)} calls"}
+
+    def _store(self, insights, meta):
+        self.stored.append(insights)
+        if "generated_at" in meta:
+            self.state.update(
+                insights_generated_at=meta["generated_at"],
+                insights_digest=meta["digest"],
+                insights_summary_count=meta["summary_count"],
+            )
+
+    def run(self):
+        """Fire the armed timer now, then cancel whatever the run re-armed."""
+        self._cancel()
+        self.job._run()
+        self._cancel()
+
+    def _cancel(self):
+        if self.job._timer is not None:
+            self.job._timer.cancel()
+
+
+def _generated(harness, minutes_ago, count):
+    harness.state.update(
+        insights_generated_at=datetime.utcnow() - timedelta(minutes=minutes_ago),
+        insights_digest="previous",
+        insights_summary_count=count,
+    )
+
+
+def test_digest_ignores_order():
+    assert summaries_digest(["a", "b"]) == summaries_digest(["b", "a"])
+    assert summaries_digest(["a", "b"]) != summaries_digest(["a", "c"])
+
+
+def test_first_run_generates_and_records_its_digest():
+    harness = Harness(["refund", "password reset"])
+    harness.job.mark_dirty()
+    harness.run()
+    assert harness.generated == [2]
+    assert harness.state["insights_digest"] == summaries_digest(["refund", "password reset"])
+    assert not harness.job.pending
+
+
+def test_waits_for_enough_changed_summaries():
+    harness = Harness([f"call {i}" for i in range(100)])
+    _generated(harness, minutes_ago=10, count=100)
+    harness.job.mark_dirty(changes=2)
+    harness.run()
+    assert harness.generated == []
+    assert harness.job.pending
+
+    harness.job.mark_dirty(changes=3)
+    harness.run()
+    assert harness.generated == [100]
+    assert not harness.job.pending
+
+
+def test_runs_at_most_once_per_minimum_interval():
+    harness = Harness(["refund"])
+    _generated(harness, minutes_ago=1, count=1)
+    harness.job.mark_dirty(force=True)
+    harness.run()
+    assert harness.generated == []
+    assert harness.job.pending
+
+
+def test_forced_or_old_insights_are_regenerated():
+    harness = Harness([f"call {i}" for i in range(100)])
+    _generated(harness, minutes_ago=10, count=100)
+    harness.job.mark_dirty(force=True)
+    harness.run()
+    assert harness.generated == [100]
+
+    harness = Harness([f"call {i}" for i in range(100)])
+    _generated(harness, minutes_ago=120, count=100)
+    harness.job.mark_dirty(changes=1)
+    harness.run()
+    assert harness.generated == [100]
+
+
+def test_skips_summaries_another_worker_already_covered():
+    harness = Harness(["refund"])
+    _generated(harness, minutes_ago=10, count=1)
+    harness.state["insights_digest"] = summaries_digest(["refund"])
+    harness.job.mark_dirty(force=True)
+    harness.run()
+    assert harness.generated == []
+    # Only the stale flag is cleared
+    assert harness.stored == [None]
+    assert not harness.job.pending
+
+
+def test_failed_generation_keeps_the_changes_pending():
+    harness = Harness(["refund"], fail=True)
+    harness.job.mark_dirty()
+    harness.run()
+    assert harness.job.pending
+    assert "openai timeout" in harness.job.status()["last_error"]
@@ -0,0 +1,115 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import PyMongoError, ServerSelectionTimeoutError
+
+import mongo_gateway
+from mongo_gateway import CLOSED, HALF_OPEN, OPEN, MongoGateway
+
+
+class FakeClient:
+    """MongoClient stand-in whose ping fails while `down` is set."""
+
+    down = False
+
+    def __init__(self, uri, event_listeners=(), **options):
+        self.listeners = list(event_listeners)
+        self.admin = SimpleNamespace(command=self._command)
+
+    def _command(self, name):
+        if FakeClient.down:
+            raise ServerSelectionTimeoutError("no servers available")
+        return {"ok": 1}
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    FakeClient.down = False
+    monkeypatch.setattr(mongo_gateway, "MongoClient", FakeClient)
+    return FakeClient
+
+
+def _gateway(**kwargs):
+    options = {"failure_threshold": 3, "reset_seconds": 60, "interval_seconds": 3600, **kwargs}
+    return MongoGateway(lambda: "mongodb://test", **options)
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_opens_after_consecutive_failures(fake_client):
+    gateway = _gateway()
+    gateway.record_failure("timeout")
+    gateway.record_failure("timeout")
+    assert gateway.state == CLOSED
+    assert gateway.client() is not None
+
+    gateway.record_failure("timeout")
+    assert gateway.state == OPEN
+    assert not gateway.available()
+    assert gateway.client() is None
+    assert gateway.status()["rejected"] == 1
+
+
+def test_success_resets_the_failure_count(fake_client):
+    gateway = _gateway()
+    gateway.record_failure("timeout")
+    gateway.record_failure("timeout")
+    gateway.record_success()
+    gateway.record_failure("timeout")
+    assert gateway.state == CLOSED
+    assert gateway.failures == 1
+
+
+def test_half_open_trial_closes_or_reopens(fake_client):
+    gateway = _gateway(failure_threshold=1, reset_seconds=0.05, interval_seconds=0.01)
+    fake_client.down = True
+    gateway.client()
+    with pytest.raises(ServerSelectionTimeoutError):
+        gateway.ping()
+    assert gateway.state == OPEN
+    opened_at = gateway.opened_at
+
+    # The monitor's half-open ping fails: the circuit opens again
+    assert _wait_for(lambda: gateway.opened_at != opened_at)
+    assert gateway.state in (OPEN, HALF_OPEN)
+
+    fake_client.down = False
+    assert _wait_for(lambda: gateway.state == CLOSED)
+    assert gateway.client() is not None
+
+
+def test_heartbeat_failures_open_the_circuit(fake_client):
+    gateway = _gateway()
+    client = gateway.client()
+    heartbeat = next(l for l in client.listeners if isinstance(l, mongo_gateway._HeartbeatListener))
+    event = SimpleNamespace(connection_id=("db", 27017), reply=ConnectionError("refused"))
+    for _ in range(3):
+        heartbeat.failed(event)
+    assert gateway.state == OPEN
+    assert "refused" in gateway.status()["last_error"]
+
+
+def test_command_listener_ignores_server_errors(fake_client):
+    gateway = _gateway(failure_threshold=1)
+    client = gateway.client()
+    command = next(l for l in client.listeners if isinstance(l, mongo_gateway._FailureListener))
+    command.failed(SimpleNamespace(failure={"code": 11000, "errmsg": "duplicate key"}))
+    assert gateway.state == CLOSED
+    command.failed(SimpleNamespace(failure={"errmsg": "connection reset"}))
+    assert gateway.state == OPEN
+
+
+def test_record_error_only_counts_server_selection_timeouts(fake_client):
+    gateway = _gateway(failure_threshold=1)
+    gateway.record_error(PyMongoError("write conflict"))
+    assert gateway.state == CLOSED
+    gateway.record_error(ServerSelectionTimeoutError("no servers available"))
+    assert gateway.state == OPEN
@@ -0,0 +1,211 @@
+import json
+import threading
+import time
+
+from upload_jobs import JobStore, MemoryJobQueue, PermanentJobError, UploadWorker
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _worker(stages, **kwargs):
+    completed = []
+    worker = UploadWorker(
+        MemoryJobQueue(),
+        JobStore(),
+        stages=stages,
+        on_complete=lambda ctx: completed.append(ctx["job_id"]),
+        threads=1,
+        retry_delay_seconds=0.01,
+        **kwargs,
+    )
+    worker.start()
+    return worker, completed
+
+
+def _finished(completed, job_id):
+    # on_complete runs last, after the record and counters were updated
+    return lambda: job_id in completed
+
+
+def test_job_passes_through_every_stage_in_order():
+    seen = []
+
+    def stage(name):
+        def run(ctx):
+            seen.append(name)
+            ctx.setdefault("trail", []).append(name)
+        return (name, run, 1)
+
+    worker, completed = _worker([stage("transcribe"), stage("analyze"), stage("index")])
+    job = worker.submit({"call_id": "a", "file": "a.mp3"}, completed={"store": {"blob": "audios/a.mp3"}})
+    assert job["status"] == "queued"
+    assert list(job["stages"]) == ["store", "transcribe", "analyze", "index"]
+
+    assert _wait_for(_finished(completed, job["job_id"]))
+    record = worker.store.get(job["job_id"])
+    assert record["status"] == "completed"
+    assert seen == ["transcribe", "analyze", "index"]
+    assert all(record["stages"][name]["status"] == "completed" for name in record["stages"])
+    assert "duration_ms" in record["stages"]["analyze"]
+    assert completed == [job["job_id"]]
+    assert worker.status()["completed"] == 1
+    assert worker.in_flight == 0
+
+
+def test_failed_stage_is_retried_and_resumes_after_completed_stages():
+    calls = {"transcribe": 0, "analyze": 0}
+
+    def transcribe(ctx):
+        calls["transcribe"] += 1
+
+    def analyze(ctx):
+        calls["analyze"] += 1
+        if calls["analyze"] == 1:
+            raise RuntimeError("openai timeout")
+
+    worker, completed = _worker([("transcribe", transcribe, 1), ("analyze", analyze, 1)], max_attempts=3)
+    job_id = worker.submit({"call_id": "a", "file": "a.mp3"})["job_id"]
+
+    assert _wait_for(_finished(completed, job_id))
+    record = worker.store.get(job_id)
+    assert record["status"] == "completed"
+    assert record["attempt"] == 2
+    # The redelivered job skipped the stage it had already completed
+    assert calls == {"transcribe": 1, "analyze": 2}
+    assert worker.status()["retried"] == 1
+
+
+def test_job_fails_after_max_attempts():
+    def analyze(ctx):
+        raise RuntimeError("still broken")
+
+    worker, completed = _worker([("analyze", analyze, 1)], max_attempts=2)
+    job_id = worker.submit({"call_id": "a", "file": "a.mp3"})["job_id"]
+
+    assert _wait_for(_finished(completed, job_id))
+    record = worker.store.get(job_id)
+    assert record["status"] == "failed"
+    assert record["attempt"] == 2
+    assert record["stages"]["analyze"]["error"] == "still broken"
+    assert completed == [job_id]
+
+
+def test_permanent_error_fails_without_retry():
+    def transcribe(ctx):
+        raise PermanentJobError("Audio validation failed: empty file")
+
+    worker, completed = _worker([("transcribe", transcribe, 1)], max_attempts=5)
+    job_id = worker.submit({"call_id": "a", "file": "a.mp3"})["job_id"]
+
+    assert _wait_for(_finished(completed, job_id))
+    assert worker.store.get(job_id)["status"] == "failed"
+    assert worker.status()["retried"] == 0
+
+
+def test_intake_stops_at_max_in_flight():
+    release = threading.Event()
+    running = []
+
+    def slow(ctx):
+        running.append(ctx["job_id"])
+        release.wait(5)
+
+    worker, completed = _worker([("transcribe", slow, 4)], max_in_flight=2)
+    job_ids = [worker.submit({"call_id": str(i), "file": f"{i}.mp3"})["job_id"] for i in range(4)]
+
+    assert _wait_for(lambda: len(running) == 2)
+    time.sleep(0.2)
+    assert worker.in_flight == 2
+    assert worker.job_queue.depth() == 2
+    release.set()
+    assert all(_wait_for(_finished(completed, job_id)) for job_id in job_ids)
+
+
+def test_job_store_records_stage_transitions():
+    store = JobStore()
+    store.create("job-1", ["transcribe"], call_id="a")
+    assert store.get("job-1")["stages"]["transcribe"]["status"] == "pending"
+    store.update_stage("job-1", "transcribe", status="running")
+    store.update_stage("job-1", "transcribe", status="completed", duration_ms=5)
+    record = store.get("job-1")
+    assert record["stages"]["transcribe"] == {"status": "completed", "duration_ms": 5}
+    assert record["updated_at"] >= record["created_at"]
+
+
+class FakeJobCollection:
+    """Mongo collection stand-in shared by the stores of two processes."""
+
+    def __init__(self):
+        self.docs = {}
+
+    def update_one(self, query, update, upsert=False):
+        doc = self.docs.setdefault(query["_id"], {"_id": query["_id"]})
+        for key, value in update["$set"].items():
+            target = doc
+            *parents, leaf = key.split(".")
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[leaf] = value
+
+    def find_one(self, query):
+        doc = self.docs.get(query["_id"])
+        return json.loads(json.dumps(doc)) if doc else None
+
+
+def test_job_store_reads_progress_made_by_another_process():
+    coll = FakeJobCollection()
+    api = JobStore(lambda: coll)
+    worker = JobStore(lambda: coll)
+    api.create("job-1", ["transcribe"], call_id="a")
+
+    worker.claim("job-1")
+    worker.update("job-1", status="running")
+    worker.update_stage("job-1", "transcribe", status="running")
+    # The API's own copy still says "queued"; the shared record wins
+    record = api.get("job-1")
+    assert record["status"] == "running"
+    assert record["stages"]["transcribe"]["status"] == "running"
+    assert worker.get("job-1")["status"] == "running"
+
+
+def test_job_store_falls_back_to_memory_while_mongo_is_down():
+    def down():
+        raise RuntimeError("mongo down")
+
+    store = JobStore(down)
+    store.create("job-1", ["transcribe"])
+    assert store.get("job-1")["status"] == "queued"
+
+
+def test_malformed_job_message_is_dead_lettered_and_frees_its_slot():
+    dropped = []
+
+    class RecordingQueue(MemoryJobQueue):
+        def dead_letter(self, delivery, reason):
+            dropped.append(reason)
+            super().dead_letter(delivery, reason)
+
+    completed = []
+    worker = UploadWorker(
+        RecordingQueue(),
+        JobStore(),
+        stages=[("transcribe", lambda ctx: None, 1)],
+        on_complete=lambda ctx: completed.append(ctx["job_id"]),
+        threads=1,
+        max_in_flight=1,
+    )
+    worker.start()
+    worker.job_queue.put({"call_id": "no-job-id"})
+    job_id = worker.submit({"call_id": "a", "file": "a.mp3"})["job_id"]
+
+    assert _wait_for(_finished(completed, job_id))
+    assert len(dropped) == 1 and "job_id" in dropped[0]
+    assert worker.status()["rejected"] == 1
+    assert worker.in_flight == 0
@@ -7,7 +7,9 @@ structure, formatting, and agent/customer dialogue flow.
 """
 
 from services import azure_oai, azure_storage
-from typing import Optional, Tuple
+from analysis_cache import analysis_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
 import re
 
 
@@ -281,6 +283,29 @@ Start directly with the improved conversation without any introduction:"""
             print(f"Error creating basic English version: {e}")
             return original_transcription
     
+    def _revise_and_save(
+        self,
+        call_id: str,
+        language: str,
+        create: Callable[[str, Optional[dict]], str],
+        upload: Callable[[str, str], object],
+        original_transcription: str,
+        call_analysis: Optional[dict],
+        needed: bool,
+    ) -> bool:
+        """Create and store one revised version; returns True when it exists afterwards."""
+        if not needed:
+            return True
+        print(f"Creating revised {language} transcription for {call_id}...")
+        revised = create(original_transcription, call_analysis)
+        try:
+            upload(call_id, revised)
+            print(f"✅ {language} revision saved for {call_id}")
+            return True
+        except Exception as e:
+            print(f"Error saving {language} revision for {call_id}: {e}")
+            return False
+    
     def process_single_transcription(self, call_id: str, force_regenerate: bool = False) -> Tuple[bool, bool, str]:
         """
         Process a single transcription to create both Arabic and English revised versions.
@@ -308,38 +333,25 @@ Start directly with the improved conversation without any introduction:"""
             # Try to get call analysis for context
             call_analysis = None
             try:
-                call_analysis = azure_storage.read_llm_analysis("persona", f"{call_id}.json")
+                call_analysis = analysis_cache.read_llm_analysis("persona", f"{call_id}.json")
             except:
                 pass  # Analysis not available, continue without it
             
-            arabic_success = False
-            english_success = False
-            
-            # Create revised Arabic transcription
-            if force_regenerate or not arabic_exists:
-                print(f"Creating revised Arabic transcription for {call_id}...")
-                revised_arabic = self.create_revised_arabic_transcription(original_transcription, call_analysis)
-                try:
-                    azure_storage.upload_revised_arabic_transcription_to_blob(call_id, revised_arabic)
-                    arabic_success = True
-                    print(f"✅ Arabic revision saved for {call_id}")
-                except Exception as e:
-                    print(f"Error saving Arabic revision for {call_id}: {e}")
-            else:
-                arabic_success = True
-            
-            # Create revised English transcription
-            if force_regenerate or not english_exists:
-                print(f"Creating revised English transcription for {call_id}...")
-                revised_english = self.create_revised_english_transcription(original_transcription, call_analysis)
-                try:
-                    azure_storage.upload_revised_english_transcription_to_blob(call_id, revised_english)
-                    english_success = True
-                    print(f"✅ English revision saved for {call_id}")
-                except Exception as e:
-                    print(f"Error saving English revision for {call_id}: {e}")
-            else:
-                english_success = True
+            # Both revisions depend only on the original transcript and the analysis, so the
+            # two LLM calls run concurrently; wall time is roughly the slower of the two
+            with ThreadPoolExecutor(max_workers=2, thread_name_prefix="revision") as pool:
+                arabic_future = pool.submit(
+                    self._revise_and_save, call_id, "Arabic", self.create_revised_arabic_transcription,
+                    azure_storage.upload_revised_arabic_transcription_to_blob,
+                    original_transcription, call_analysis, force_regenerate or not arabic_exists,
+                )
+                english_future = pool.submit(
+                    self._revise_and_save, call_id, "English", self.create_revised_english_transcription,
+                    azure_storage.upload_revised_english_transcription_to_blob,
+                    original_transcription, call_analysis, force_regenerate or not english_exists,
+                )
+                arabic_success = arabic_future.result()
+                english_success = english_future.result()
             
             if arabic_success and english_success:
                 return True, True, f"Successfully processed revisions for {call_id}"
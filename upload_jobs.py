@@ -0,0 +1,561 @@
+"""
+Upload Jobs
+
+Asynchronous processing of uploaded calls. The upload endpoint stores the audio
+and submits one job per file; worker threads (in the API process or in a
+separate worker process, see upload_worker.py) take jobs from a queue and pass
+them through the pipeline stages, recording per-stage status and timings.
+
+- JobStore keeps job records in memory and in Mongo, so /jobs/<id> can be
+  answered by any worker. Reads go to Mongo first; the in-memory copy is only
+  authoritative for jobs running in this process (or without Mongo).
+- The queue is the Storage `integration-queue` (UPLOAD_JOB_QUEUE=storage) or an
+  in-process queue (UPLOAD_JOB_QUEUE=memory, the default and the local
+  stand-in). Messages on the storage queue that are not upload jobs are released
+  untouched for their own consumers; a job message that cannot be started is
+  moved to the `<queue>-poison` queue.
+- Each stage has its own queue and worker pool, so many jobs are in flight at
+  once (Speech polling for one call while another is analyzed). A worker only
+  takes a job from the queue when the pipeline has room for it, and keeps the
+  job's queue message invisible while it runs.
+- A failed stage sends the job back to the queue with a growing delay, up to a
+  maximum number of deliveries; a redelivered job skips stages already recorded
+  as completed, so every stage reloads its inputs from Blob storage when they
+  are not in the job context.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+from services import azure_storage
+
+JOB_MESSAGE_TYPE = "upload_job"
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+class JobStore:
+    def __init__(self, collection_getter: Callable[[], Any] | None = None, max_entries: int = 5000):
+        """Create the store; collection_getter returns the Mongo collection for job records."""
+        self.collection_getter = collection_getter
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        # Jobs running in this process: their in-memory record is the newest one
+        self._claimed: set = set()
+
+    def _coll(self):
+        if self.collection_getter is None:
+            return None
+        try:
+            return self.collection_getter()
+        except Exception:
+            return None
+
+    def _persist(self, job_id: str, update: Dict[str, Any]) -> None:
+        # updated_at doubles as the heartbeat of a running job (refreshed by the lease renewer)
+        update = {**update, "updated_at": _now_iso()}
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id]["updated_at"] = update["updated_at"]
+        coll = self._coll()
+        if coll is None:
+            return
+        try:
+            coll.update_one({"_id": job_id}, {"$set": update}, upsert=True)
+        except Exception as e:
+            print(f"Job store write failed for '{job_id}': {e}")
+
+    def create(self, job_id: str, stages: List[str], **fields: Any) -> Dict[str, Any]:
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "created_at": _now_iso(),
+            "stages": {name: {"status": "pending"} for name in stages},
+            **fields,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            if len(self._jobs) > self.max_entries:
+                # Oldest records stay available from Mongo
+                for old in list(self._jobs)[: len(self._jobs) - self.max_entries]:
+                    self._jobs.pop(old, None)
+        self._persist(job_id, {k: v for k, v in job.items()})
+        return job
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        with self._lock:
+            job = self._jobs.setdefault(job_id, {"job_id": job_id, "stages": {}})
+            job.update(fields)
+        self._persist(job_id, fields)
+
+    def update_stage(self, job_id: str, stage: str, **fields: Any) -> None:
+        with self._lock:
+            job = self._jobs.setdefault(job_id, {"job_id": job_id, "stages": {}})
+            job.setdefault("stages", {}).setdefault(stage, {}).update(fields)
+        self._persist(job_id, {f"stages.{stage}.{k}": v for k, v in fields.items()})
+
+    def touch(self, job_id: str) -> None:
+        """Refresh updated_at of a job that is still being worked on."""
+        self._persist(job_id, {})
+
+    def claim(self, job_id: str) -> None:
+        """Mark a job as running in this process (get() answers it from memory)."""
+        with self._lock:
+            self._claimed.add(job_id)
+
+    def unclaim(self, job_id: str) -> None:
+        with self._lock:
+            self._claimed.discard(job_id)
+
+    def _local(self, job_id: str) -> Dict[str, Any] | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return json.loads(json.dumps(job, default=str))
+
+    def get(self, job_id: str) -> Dict[str, Any] | None:
+        """Return the job record: from memory for jobs this process runs, else from Mongo.
+
+        Another process (e.g. upload_worker.py) may be running a job this process created, so
+        its in-memory copy is only a fallback while Mongo is unavailable.
+        """
+        with self._lock:
+            claimed = job_id in self._claimed
+        coll = None if claimed else self._coll()
+        if coll is None:
+            return self._local(job_id)
+        try:
+            doc = coll.find_one({"_id": job_id})
+        except Exception as e:
+            print(f"Job store read failed for '{job_id}': {e}")
+            return self._local(job_id)
+        if not doc:
+            return self._local(job_id)
+        doc.pop("_id", None)
+        return doc
+
+
+class JobDelivery:
+    """A job taken from a queue: its payload, delivery attempt and the queue's message handle."""
+
+    def __init__(self, message: Any, payload: Dict[str, Any], attempt: int):
+        self.message = message
+        self.payload = payload
+        self.attempt = attempt
+
+
+class PermanentJobError(Exception):
+    """A stage failure that retrying cannot fix (e.g. invalid audio); the job fails at once."""
+
+
+class MemoryJobQueue:
+    """In-process queue (local stand-in for the storage queue)."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._queue: "queue.Queue[Tuple[Dict[str, Any], int]]" = queue.Queue()
+
+    def put(self, payload: Dict[str, Any], attempt: int = 1) -> None:
+        self._queue.put((payload, attempt))
+
+    def get(self, timeout: float = 1.0) -> JobDelivery | None:
+        try:
+            payload, attempt = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return JobDelivery(None, payload, attempt)
+
+    def ack(self, delivery: JobDelivery) -> None:
+        self._queue.task_done()
+
+    def release(self, delivery: JobDelivery, delay_seconds: float) -> None:
+        """Deliver the job again after delay_seconds."""
+        self._queue.task_done()
+        timer = threading.Timer(delay_seconds, self.put, args=(delivery.payload, delivery.attempt + 1))
+        timer.daemon = True
+        timer.start()
+
+    def extend(self, delivery: JobDelivery) -> None:
+        pass
+
+    def dead_letter(self, delivery: JobDelivery, reason: str) -> None:
+        """Drop a job that cannot be started (there is no poison queue in memory)."""
+        self._queue.task_done()
+        print(f"Upload worker: dropped job message {delivery.payload!r}: {reason}")
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+
+class StorageJobQueue:
+    """Jobs on the Azure Storage integration-queue, shared by every API and worker process.
+
+    A received job stays invisible to other consumers for visibility_seconds; the worker
+    extends that while the job runs, so only a crashed worker's jobs are redelivered.
+    """
+
+    name = "storage"
+
+    def __init__(self, queue_name: str = azure_storage.STORAGE_QUEUE_NAME, visibility_seconds: int | None = None):
+        if visibility_seconds is None:
+            visibility_seconds = int(os.getenv("UPLOAD_JOB_VISIBILITY_SECONDS", "300"))
+        self.queue_name = queue_name
+        self.visibility_seconds = visibility_seconds
+
+    def put(self, payload: Dict[str, Any]) -> None:
+        azure_storage.send_message_to_queue(json.dumps({"type": JOB_MESSAGE_TYPE, **payload}), queue_name=self.queue_name)
+
+    def get(self, timeout: float = 1.0) -> JobDelivery | None:
+        messages = azure_storage.receive_messages_from_queue(1, self.visibility_seconds, queue_name=self.queue_name)
+        if not messages:
+            time.sleep(timeout)
+            return None
+        message = messages[0]
+        try:
+            payload = json.loads(message.content)
+        except (TypeError, ValueError):
+            payload = None
+        if not isinstance(payload, dict) or payload.get("type") != JOB_MESSAGE_TYPE:
+            # Someone else's message (e.g. persona analysis notifications)
+            azure_storage.release_message_to_queue(message, queue_name=self.queue_name)
+            time.sleep(timeout)
+            return None
+        return JobDelivery(message, payload, int(getattr(message, "dequeue_count", None) or 1))
+
+    def ack(self, delivery: JobDelivery) -> None:
+        azure_storage.delete_message_from_queue(delivery.message, queue_name=self.queue_name)
+
+    def release(self, delivery: JobDelivery, delay_seconds: float) -> None:
+        """Make the job visible again after delay_seconds (the queue counts the next delivery)."""
+        delivery.message = azure_storage.release_message_to_queue(
+            delivery.message, queue_name=self.queue_name, visibility_timeout=int(delay_seconds)
+        )
+
+    def extend(self, delivery: JobDelivery) -> None:
+        """Push the message's visibility timeout out again (the pop receipt changes each time)."""
+        delivery.message = azure_storage.release_message_to_queue(
+            delivery.message, queue_name=self.queue_name, visibility_timeout=self.visibility_seconds
+        )
+
+    def dead_letter(self, delivery: JobDelivery, reason: str) -> None:
+        """Move a job that cannot be started to the <queue>-poison queue for inspection."""
+        body = json.dumps({"payload": delivery.payload, "reason": reason, "attempt": delivery.attempt, "failed_at": _now_iso()}, default=str)
+        azure_storage.send_message_to_queue(body, queue_name=f"{self.queue_name}-poison")
+        azure_storage.delete_message_from_queue(delivery.message, queue_name=self.queue_name)
+
+    def depth(self) -> int | None:
+        try:
+            return azure_storage.get_queue_client(self.queue_name).get_queue_properties().approximate_message_count
+        except Exception:
+            return None
+
+
+def create_job_queue(kind: str | None = None):
+    """Return the job queue selected by UPLOAD_JOB_QUEUE (memory | storage)."""
+    kind = (kind or os.getenv("UPLOAD_JOB_QUEUE", "memory")).strip().lower()
+    if kind == "storage":
+        return StorageJobQueue()
+    return MemoryJobQueue()
+
+
+class _Stage:
+    """One pipeline stage: an input queue drained by its own worker threads."""
+
+    def __init__(self, name: str, fn: Callable[[Dict[str, Any]], None], workers: int):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue: "queue.Queue[Tuple[JobDelivery, Dict[str, Any], Dict[str, Any]]]" = queue.Queue()
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_ms = 0.0
+
+    def status(self) -> Dict[str, Any]:
+        done = self.completed + self.failed
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue.qsize(),
+            "active": self.active,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_ms": round(self.total_ms / done) if done else None,
+        }
+
+
+class UploadWorker:
+    def __init__(
+        self,
+        job_queue,
+        store: JobStore,
+        stages: List[Tuple[str, Callable[[Dict[str, Any]], None], int]],
+        on_start: Callable[[Dict[str, Any]], None] | None = None,
+        on_complete: Callable[[Dict[str, Any]], None] | None = None,
+        threads: int | None = None,
+        max_in_flight: int | None = None,
+        max_attempts: int | None = None,
+        retry_delay_seconds: float | None = None,
+    ):
+        """Run jobs through stages, a list of (name, fn(context), default_workers) in pipeline order.
+
+        Every stage has its own queue and worker pool (UPLOAD_<NAME>_WORKERS overrides the
+        default), so different jobs overlap in different stages. A job is only taken from the
+        job queue while fewer than max_in_flight jobs are in the pipeline (default: one per
+        stage worker), so jobs wait on the shared queue, not in this process. The context
+        starts as the submitted payload (job_id, call_id, file, ...); stages may add values
+        for later stages. on_start(context) runs when a job is taken, on_complete(context)
+        after it finished or failed for good. A failed stage sends the job back to the queue
+        (after retry_delay_seconds x attempt) until max_attempts deliveries; PermanentJobError
+        fails it at once. threads is the number of intake threads (0 leaves this process idle,
+        e.g. an API next to upload_worker.py processes).
+        """
+        if threads is None:
+            threads = int(os.getenv("UPLOAD_WORKER_THREADS", "1"))
+        if max_attempts is None:
+            max_attempts = int(os.getenv("UPLOAD_JOB_MAX_ATTEMPTS", "3"))
+        if retry_delay_seconds is None:
+            retry_delay_seconds = float(os.getenv("UPLOAD_JOB_RETRY_DELAY_SECONDS", "60"))
+        self.job_queue = job_queue
+        self.store = store
+        self.stages = [
+            _Stage(name, fn, int(os.getenv(f"UPLOAD_{name.upper()}_WORKERS", str(workers))))
+            for name, fn, workers in stages
+        ]
+        if max_in_flight is None:
+            max_in_flight = int(os.getenv("UPLOAD_MAX_IN_FLIGHT", str(sum(stage.workers for stage in self.stages))))
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay_seconds = retry_delay_seconds
+        self.on_start = on_start
+        self.on_complete = on_complete
+        self.threads = max(0, threads)
+        self._started = False
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(self.max_in_flight)
+        self._deliveries: Dict[str, JobDelivery] = {}
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.rejected = 0
+
+    @property
+    def stage_names(self) -> List[str]:
+        return [stage.name for stage in self.stages]
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._deliveries)
+
+    def submit(self, payload: Dict[str, Any], completed: Dict[str, Dict[str, Any]] | None = None) -> Dict[str, Any]:
+        """Record a job and enqueue it; returns the job record.
+
+        completed maps stages already done by the caller (e.g. storing the audio) to their records.
+        """
+        completed = completed or {}
+        job_id = payload.setdefault("job_id", new_job_id())
+        job = self.store.create(job_id, [*completed, *self.stage_names], call_id=payload.get("call_id"), file=payload.get("file"))
+        for name, record in completed.items():
+            self.store.update_stage(job_id, name, status="completed", **record)
+        self.job_queue.put(payload)
+        return self.store.get(job_id) or job
+
+    def start(self) -> None:
+        """Start the intake threads, every stage pool and the lease renewer (idempotent; no-op without intake threads)."""
+        with self._lock:
+            if self._started or self.threads == 0:
+                return
+            self._started = True
+            for index, stage in enumerate(self.stages):
+                for i in range(stage.workers):
+                    threading.Thread(target=self._stage_loop, args=(index,), name=f"upload-{stage.name}-{i}", daemon=True).start()
+            for i in range(self.threads):
+                threading.Thread(target=self._intake_loop, name=f"upload-intake-{i}", daemon=True).start()
+            threading.Thread(target=self._renew_loop, name="upload-lease-renewer", daemon=True).start()
+
+    def run_forever(self) -> None:
+        """Start the pipeline and block (standalone worker process)."""
+        self.start()
+        while True:
+            time.sleep(3600)
+
+    def _intake_loop(self) -> None:
+        while True:
+            # Only take a job when the pipeline has room for it
+            self._slots.acquire()
+            try:
+                delivery = self.job_queue.get(timeout=1.0)
+            except Exception as e:
+                print(f"Upload worker: queue receive failed: {e}")
+                delivery = None
+                time.sleep(5)
+            if delivery is None:
+                self._slots.release()
+                continue
+            try:
+                self._begin(delivery)
+            except Exception as e:
+                self._reject(delivery, e)
+
+    def _reject(self, delivery: JobDelivery, error: Exception) -> None:
+        """A job that could not be started (malformed message, job store down): free its slot
+        and dead-letter the message instead of retrying it forever."""
+        job_id = delivery.payload.get("job_id") if isinstance(delivery.payload, dict) else None
+        print(f"Upload worker: could not start job {job_id}: {error!r}")
+        with self._lock:
+            if job_id is not None and self._deliveries.get(job_id) is delivery:
+                self._deliveries.pop(job_id, None)
+            self.rejected += 1
+        if job_id is not None:
+            self.store.unclaim(job_id)
+            try:
+                self.store.update(job_id, status="failed", finished_at=_now_iso(), error=f"Could not start: {error}")
+            except Exception as e:
+                print(f"Upload job {job_id}: recording the failure failed: {e}")
+        try:
+            self.job_queue.dead_letter(delivery, repr(error))
+        except Exception as e:
+            # Left on the queue: redelivered when its visibility timeout lapses
+            print(f"Upload worker: dead-lettering job {job_id} failed: {e}")
+        self._slots.release()
+
+    def _begin(self, delivery: JobDelivery) -> None:
+        context = dict(delivery.payload)
+        job_id = context["job_id"]
+        # A redelivered job resumes after the stages it already completed
+        previous = (self.store.get(job_id) or {}).get("stages") or {}
+        with self._lock:
+            self._deliveries[job_id] = delivery
+        self.store.claim(job_id)
+        self.store.update(job_id, status="running", attempt=delivery.attempt, started_at=_now_iso())
+        if self.on_start is not None:
+            try:
+                self.on_start(context)
+            except Exception as e:
+                print(f"Upload job {job_id}: start hook failed: {e}")
+        self._advance(0, delivery, context, previous)
+
+    def _renew_loop(self) -> None:
+        """Keep in-flight jobs invisible on the queue and their records' heartbeat fresh."""
+        interval = max(1.0, getattr(self.job_queue, "visibility_seconds", 90) / 3.0)
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                deliveries = list(self._deliveries.items())
+            for job_id, delivery in deliveries:
+                try:
+                    self.job_queue.extend(delivery)
+                except Exception as e:
+                    print(f"Upload job {job_id}: lease renewal failed: {e}")
+                self.store.touch(job_id)
+
+    def _advance(self, index: int, delivery: JobDelivery, context: Dict[str, Any], previous: Dict[str, Any]) -> None:
+        """Hand the job to the next stage it still needs, or finish it."""
+        while index < len(self.stages) and (previous.get(self.stages[index].name) or {}).get("status") == "completed":
+            index += 1
+        if index == len(self.stages):
+            self._finish(delivery, context, True)
+        else:
+            self.stages[index].queue.put((delivery, context, previous))
+
+    def _stage_loop(self, index: int) -> None:
+        stage = self.stages[index]
+        while True:
+            delivery, context, previous = stage.queue.get()
+            job_id = context["job_id"]
+            started = time.time()
+            with self._lock:
+                stage.active += 1
+            self.store.update_stage(job_id, stage.name, status="running", started_at=_now_iso())
+            permanent = False
+            try:
+                stage.fn(context)
+                ok, error = True, None
+            except PermanentJobError as e:
+                print(f"Upload job {job_id}: stage '{stage.name}' failed permanently: {e}")
+                ok, error, permanent = False, str(e), True
+            except Exception as e:
+                print(f"Upload job {job_id}: stage '{stage.name}' failed: {e}")
+                ok, error = False, str(e)
+            duration_ms = round((time.time() - started) * 1000.0)
+            with self._lock:
+                stage.active -= 1
+                stage.total_ms += duration_ms
+                if ok:
+                    stage.completed += 1
+                else:
+                    stage.failed += 1
+            record: Dict[str, Any] = {"status": "completed" if ok else "failed", "finished_at": _now_iso(), "duration_ms": duration_ms}
+            if error is not None:
+                record["error"] = error
+            self.store.update_stage(job_id, stage.name, **record)
+            if ok:
+                self._advance(index + 1, delivery, context, previous)
+            elif permanent or delivery.attempt >= self.max_attempts:
+                self._finish(delivery, context, False)
+            else:
+                self._retry(delivery, context)
+
+    def _retry(self, delivery: JobDelivery, context: Dict[str, Any]) -> None:
+        job_id = context["job_id"]
+        delay = self.retry_delay_seconds * delivery.attempt
+        self.store.update(job_id, status="retrying", retry_at=time.time() + delay)
+        with self._lock:
+            self._deliveries.pop(job_id, None)
+            self.retried += 1
+        self.store.unclaim(job_id)
+        try:
+            self.job_queue.release(delivery, delay)
+        except Exception as e:
+            # The message becomes visible again when its visibility timeout lapses
+            print(f"Upload job {job_id}: release for retry failed: {e}")
+        self._slots.release()
+
+    def _finish(self, delivery: JobDelivery, context: Dict[str, Any], ok: bool) -> None:
+        job_id = context["job_id"]
+        self.store.update(job_id, status="completed" if ok else "failed", finished_at=_now_iso(), result=context.get("result"))
+        with self._lock:
+            self._deliveries.pop(job_id, None)
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+        self.store.unclaim(job_id)
+        if self.on_complete is not None:
+            try:
+                self.on_complete(context)
+            except Exception as e:
+                print(f"Upload job {job_id}: completion hook failed: {e}")
+        try:
+            self.job_queue.ack(delivery)
+        except Exception as e:
+            print(f"Upload worker: ack failed: {e}")
+        self._slots.release()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "queue": self.job_queue.name,
+            "queue_depth": self.job_queue.depth(),
+            "running": self._started,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "rejected": self.rejected,
+            "stages": {stage.name: stage.status() for stage in self.stages},
+        }
@@ -0,0 +1,357 @@
+"""
+Upload Pipeline
+
+The stages every uploaded call goes through (Transcribe → Diarize → Analyze →
+Index → Revise) and the job store and worker running them. The API submits jobs
+here and upload_worker.py runs them in a separate process; importing this module
+starts no threads (UploadWorker.start() does).
+"""
+
+import json
+import os
+from typing import Dict, Any
+from services import azure_storage, azure_transcription, azure_oai, azure_search
+from transcription_revision_service import revision_service
+from call_manifest import call_manifest
+from analysis_resolver import analysis_resolver
+from analysis_cache import analysis_cache, parse_json_maybe as _parse_json_maybe
+from upload_jobs import JobStore, PermanentJobError, UploadWorker, create_job_queue
+from pymongo.collection import Collection
+from app_services import (
+    _derive_category_and_attitude,
+    _get_mongo_client,
+    _index_fields,
+    _invalidate_call_cache,
+    _record_call_contribution,
+    dashboard_recompute,
+    insights_job,
+)
+
+
+SYSTEM_PROMPT_DEFAULT = (
+    """You are a data analysis assistant. You will be provided with a transcript of a call-center conversation between a Customer and an Agent (the transcript may include timestamps in `HH:MM:SS`, `MM:SS`, or plain seconds). Your job is to analyze the call and **return one single valid JSON object only** (no surrounding text, no explanation, no extra JSON objects, no comments).
+
+**Output schema (MUST be returned exactly — do not add, remove, rename, or omit any top-level keys or any nested keys shown below):**
+
+```json
+{
+  "customer_name": "<customer full name in English string not in Arabic or null if not present>",
+  "Agent_name":"<Agent full name in English string not in Arabic or null if not present>",
+  "summary": "<one paragraph consisting of exactly four sentences>",
+  "sentiment": {
+    "score": <integer 1-5>,
+    "explanation": "<why this score was chosen>"
+  },
+  "main_issues": ["<issue1>", "<issue2>", "..."],
+  "resolution": "<what the agent did or promised>",
+  "additional_notes": "<optional extra notes>",
+  "Average Handling Time (AHT)": {
+    "score": <integer seconds>,
+    "explanation": "<how you computed it; list components>"
+  },
+  "resolved": {
+    "score": <true|false>,
+    "explanation": "<why resolved is true/false>"
+  },
+  "disposition": {
+    "score": "<one of: Resolved, Escalated, Pending, Wrong Number, Other>",
+    "explanation": "<short explanation>"
+  },
+  "agent_professionalism": "<one of: Highly Professional, Professional, Needs Improvement>",
+  "Call Generated Insights": {
+    "Customer Sentiment": "<Positive|Neutral|Negative>",
+    "Call Categorization": "<Inquiry|Product/Service|Complaint|Other>",
+    "Resolution Status": "<resolved|escalated|pending|other>",
+    "Main Subject": "<short subject>",
+    "Main Topic": "<Installation and Setup Issues|Repair and Maintenance Concerns|Warranty and Replacement Queries|Product Availability and Purchase Inquiries|Customer Service and Communication Issues>",
+    "Services": "<service(s) involved>",
+    "Call Outcome": "<short outcome in one sentence>",
+    "Agent Attitude": "<1–3 concise adjectives (dynamic per call) describing the agent's demeanor, e.g. Empathetic; Efficient and Professional; Rushed and Curt>",
+    "summary": "<one paragraph consisting of exactly four sentences>",
+  },
+  "Customer Service Metrics": {
+    "FCR": {
+      "score": <true|false>,
+      "explanation": "<did this call resolve the case on first contact?>"
+    },
+    "Talk time": <integer seconds (never being 0 seconds)>,
+    "Hold time": <integer seconds (never being 0 seconds)>
+  }
+}
+````
+
+**Mandatory parsing & calculation rules (follow exactly):**
+Don't change any key names or structure. You must return all keys shown above.
+
+1. **Timestamps:** Parse timestamps in `HH:MM:SS`, `MM:SS`, or plain seconds; convert all to integer seconds before calculations. If timestamps are relative offsets, assume they are measured from call start — state this in any explanation that relies on it.
+
+2. **Talk time (`Customer Service Metrics -> "Talk time"`):**
+
+   * If utterances include start and end timestamps, compute each utterance duration as `end - start` and sum durations for Agent + Customer utterances.
+   * If only start timestamps or offsets are available, infer utterance duration conservatively (document assumptions in the relevant `"explanation"` field).
+   * Output MUST be an integer number of seconds (never 0).
+
+3. **Hold time (`Customer Service Metrics -> "Hold time"`):**
+  Never being 0 and should being calculated as:
+   * Primary detection method (preferred): Detect explicit agent "please wait" utterances in the transcript text (Arabic and English). For Arabic transcripts, detect common agent waiting phrases or words and variants such as (but not limited to):
+     "لحظة", "لحظات", "انتظر", "استنى", "استنّي", "خلي حضرتك", "هنرجع لك بعد شوي", "اسيبك على الانتظار", "معايا لحظة", "خلي حضرتك معايا لحظة", "معاك لحظة", "من فضلك انتظر", "هاخد منك لحظة", and obvious morphological variants or common colloquial spellings.
+     When an agent utterance contains such a phrase or one word and indicates an intended hold, treat the hold start as that utterance's timestamp. Treat the hold end as the timestamp when the agent next resumes speaking (i.e., next agent utterance start time) or explicitly announces the end of hold. Compute hold duration as hold_end_timestamp - hold_start_timestamp in integer seconds.
+     If the agent issues a "please wait" phrase and there is no later agent timestamp in the transcript to mark resumption, you must not output 0 for Hold time. Instead:
+
+     * If a later customer utterance exists, conservatively treat the earlier of (a) the next customer utterance start time or (b) a minimum conservative default hold duration of 5 seconds after the "please wait" timestamp — whichever yields the larger hold duration — and document this choice in the "explanation" field.
+     * If the transcript has no subsequent timestamps at all, estimate a conservative default hold duration of 5 seconds, and explain the assumption.
+* When the Agent says words such as "لحظات", "طيب لحظات", or "لحظة", you must detect and calculate the hold time until the Agent returns and resumes the conversation with the Customer. (Make sure to search across all Agent speech segments for these keywords.) so the hold time shouldn't never calculated as 0 
+   * If explicit markers are absent, infer hold from silence gaps between consecutive utterances where `gap >= 3 seconds` (gap = next_utterance_start − previous_utterance_end). Sum these inferred hold durations.
+   * Output MUST be an integer number of seconds (never 0).
+ * if you detects one second or more time hold you should write it in the json in the Hold time field that number of seconds and if you detect speaking time less than the total audio time so we have a hold time that was not calculated 
+   * Prefer Arabic "please wait" detection and explicit markers over inferred silence. Always compute hold durations from timestamps and output as integer seconds (never 0). If exact timestamps are insufficient, estimate conservatively and explain assumptions concisely.
+   * Important: Prefer Arabic "please wait" detection and explicit markers over silence inference. Always compute hold durations from timestamps and output integer seconds. Never output 0 for hold time if a "please wait" utterance is present — if timestamps are missing or incomplete for the hold, estimate conservatively and explain assumptions in the relevant "explanation" fields.
+Output MUST be an integer number of seconds (never 0).
+   Example application: For the agent utterance Agent: طبعا من خلالها لحظات معايا بعد اذنك واكد مع حضرتك الطلب. — if that utterance has timestamp 00:02:10, and the agent's next utterance resumes at 00:02:45, treat hold start=130s and hold end=165s and add 35 seconds to Hold time.
+
+4. **AHT (Average Handling Time):**
+
+   * `AHT (score)` must be an integer seconds equal to `Talk time + Hold time`.
+   * Include component breakdown (e.g., `"talk_time: Xs, hold_time: Ys"`).
+
+5. **Estimations & Transparency:**
+
+   * **Never output 0** for any time metric. If exact computation is impossible, provide your best estimate and include the estimation method and assumptions inside the corresponding `"explanation"` field (one or two concise sentences).
+   * Keep explanations short and precise.
+
+6. **FCR / resolved / disposition:**
+
+   * `resolved.score` is boolean; `FCR.score` is boolean. Explain reasoning briefly in their `"explanation"` fields.
+   * `disposition.score` must be one of the allowed strings listed in the schema.
+7.Name extraction:
+
+* Detect and extract the customer’s full name in English if it appears in the transcript (introductions, agent confirmations, account details, voicemail tags, or other explicit mentions). Fill the top-level "name" field with the extracted full name string. If no clear customer name is present, set "name" to null.
+8. Summary & Call Summary:
+The "summary" field must be exactly one paragraph containing four sentences. Each sentence should be complete and concise; do not include lists, line breaks, or extra JSON objects inside this string.
+9. Agent professionalism assessment:
+
+Set "agent_professionalism" to one of exactly: "Highly Professional", "Professional", or "Needs Improvement". Base this on agent behavior (tone, helpfulness, adherence to procedure, politeness, clarity). Include brief justification where appropriate in related explanation fields (e.g., "Average Handling Time (AHT)" explanation or "additional_notes").
+
+10. Agent attitude (dynamic):
+
+For "Call Generated Insights" -> "Agent Attitude" select 1 to 3 concise adjectives or short phrases that best describe the agent's demeanor in this specific call (e.g., "Empathetic", "Efficient and Professional", "Rushed and Curt"). Do not use a fixed small set of static categories — choose descriptors dynamically based on the transcript evidence.
+
+**Formatting & behavior rules:**
+
+* Return **one and only one** valid JSON object and nothing else.
+* Do not include any non-JSON text, logs, or metadata.
+* All durations must be integers (seconds). All explanation strings should be concise (1–2 sentences).
+* If the transcript lacks timestamps entirely, produce best-effort estimates for Talk time, Hold time, and AHT, explain assumptions in the relevant `"explanation"` fields, and still return non-zero integers for time fields.
+* Do not change the schema: the JSON returned must include exactly the keys and nested keys listed above (you may change values, but not keys or structure).
+* Don't change any key names or structure. You must return all keys shown in the required Json.
+
+**Example behavior (do not output this example in your response):**
+
+* If the transcript includes explicit utterance start/end times, compute talk and hold precisely.
+* If the transcript contains `[hold] 00:01:23 - 00:01:41`, add 18 seconds to Hold time.
+* If gaps of 5–12 seconds exist and no hold markers are present, treat gaps ≥ 3 seconds as inferred hold.
+
+You are responsible for correctly calculating and returning Talk time and Hold time (in seconds) and for producing the exact JSON structure above every time. If any part of the transcript is ambiguous, estimate conservatively, document the assumption in the appropriate `"explanation"` fields, and continue — but do not modify the JSON schema.
+Don't change any key names or structure. You must return all keys shown above.
+
+
+
+"""
+)
+
+
+def _get_jobs_collection() -> Collection | None:
+    """Return the collection holding upload job records (status per stage)."""
+    client = _get_mongo_client()
+    if client is None:
+        return None
+    db_name = os.getenv("MONGO_DB", "elaraby")
+    return client[db_name][os.getenv("MONGO_JOBS_COLLECTION", "upload_jobs")]
+
+
+
+def _load_transcript(ctx: Dict[str, Any]) -> str:
+    """Transcript from an earlier stage of this job, or from Blob storage on redelivery."""
+    transcript = ctx.get("transcript")
+    if transcript is None:
+        transcript = azure_storage.read_transcription(f"{ctx['call_id']}.txt")
+        if transcript is None:
+            raise RuntimeError(f"No transcription stored for {ctx['call_id']}")
+        ctx["transcript"] = transcript
+    return transcript
+
+
+def _load_analysis(ctx: Dict[str, Any]) -> Any:
+    """Analysis from an earlier stage of this job, or from Blob storage on redelivery."""
+    if "analysis" not in ctx:
+        content = azure_storage.read_blob(f"persona/{ctx['call_id']}.json", prefix=azure_storage.LLM_ANALYSIS_FOLDER)
+        if content is None:
+            raise RuntimeError(f"No analysis stored for {ctx['call_id']}")
+        ctx["analysis"] = _parse_json_maybe(content)
+    return ctx["analysis"]
+
+
+def _stage_transcribe(ctx: Dict[str, Any]) -> None:
+    """Transcribe the stored audio with Azure Speech and save the raw transcript."""
+    filename, name_no_ext = ctx["file"], ctx["call_id"]
+    print(f"Processing {filename}: Transcribing with Azure Speech...")
+    transcript = azure_transcription.speech_to_text(filename)
+    if transcript.startswith("Audio validation failed:"):
+        # Retrying cannot fix the audio itself
+        raise PermanentJobError(f"Transcription failed: {transcript}")
+    if azure_transcription.is_transcription_error(transcript):
+        raise RuntimeError(f"Transcription failed: {transcript}")
+    azure_storage.upload_transcription_to_blob(name_no_ext, transcript)
+    call_manifest.upsert(name_no_ext, persist=False, has_transcript=True)
+    ctx["transcript"] = transcript
+
+
+def _stage_diarize(ctx: Dict[str, Any]) -> None:
+    """Structure the transcript by speaker with GPT-4 and replace the stored transcript."""
+    filename, name_no_ext = ctx["file"], ctx["call_id"]
+    print(f"Processing {filename}: Parsing speakers with GPT-4...")
+    transcript = _load_transcript(ctx)
+    parsed = azure_transcription.parse_speakers_with_gpt4(transcript)
+    if parsed and parsed.strip() and parsed != transcript:
+        azure_storage.upload_transcription_to_blob(name_no_ext, parsed)
+        ctx["transcript"] = parsed
+
+
+def _stage_analyze(ctx: Dict[str, Any]) -> None:
+    """Analyze the transcript with GenAI using the static system prompt and store the result."""
+    filename, name_no_ext = ctx["file"], ctx["call_id"]
+    print(f"Processing {filename}: Analyzing with GenAI...")
+    analysis_raw = azure_oai.call_llm(SYSTEM_PROMPT_DEFAULT, _load_transcript(ctx))
+    analysis_json = _parse_json_maybe(analysis_raw)
+
+    # Save analysis to both default and persona folders for compatibility
+    for folder in ("default", "persona"):
+        azure_storage.upload_blob(
+            json.dumps(analysis_json),
+            f"{folder}/{name_no_ext}.json",
+            prefix=azure_storage.LLM_ANALYSIS_FOLDER,
+        )
+        analysis_resolver.register(f"{azure_storage.LLM_ANALYSIS_FOLDER}/{folder}/{name_no_ext}.json")
+        analysis_cache.invalidate(f"{azure_storage.LLM_ANALYSIS_FOLDER}/{folder}/{name_no_ext}.json")
+    category, attitude = _derive_category_and_attitude(analysis_json)
+    call_manifest.upsert(
+        name_no_ext,
+        persist=False,
+        has_analysis=True,
+        analysis_path=f"{azure_storage.LLM_ANALYSIS_FOLDER}/persona/{name_no_ext}.json",
+        call_category=category,
+        agent_attitude=attitude,
+        fields=_index_fields(analysis_json),
+    )
+    _record_call_contribution(
+        name_no_ext, analysis_json, f"{azure_storage.LLM_ANALYSIS_FOLDER}/persona/{name_no_ext}.json"
+    )
+    ctx["analysis"] = analysis_json
+
+
+def _stage_revise(ctx: Dict[str, Any]) -> None:
+    """Generate the revised Arabic and English transcriptions (failures do not fail the job)."""
+    filename, name_no_ext = ctx["file"], ctx["call_id"]
+    print(f"Processing {filename}: Generating revised transcriptions...")
+    try:
+        arabic_success, english_success, revision_message = revision_service.process_single_transcription(
+            name_no_ext, force_regenerate=False
+        )
+        call_manifest.upsert(
+            name_no_ext,
+            persist=False,
+            has_revised_arabic=arabic_success,
+            has_revised_english=english_success,
+        )
+        if not (arabic_success or english_success):
+            print(f"⚠️ Both revised transcriptions failed for {filename}: {revision_message}")
+        revisions = {"arabic": arabic_success, "english": english_success}
+    except Exception as e:
+        print(f"Warning: Error generating revised transcriptions for {filename}: {e}")
+        revisions = {"arabic": False, "english": False, "error": str(e)}
+    if ctx.get("result") is not None:
+        ctx["result"]["revisions"] = revisions
+
+
+def _stage_index(ctx: Dict[str, Any]) -> None:
+    """Upsert the analysis into the Azure AI Search index used by chat."""
+    filename, name_no_ext = ctx["file"], ctx["call_id"]
+    analysis_json = _load_analysis(ctx)
+    print(f"Processing {filename}: Indexing for search...")
+    index_name = "marketing_sentiment_details"
+    search_indexed, error = False, None
+    try:
+        if not azure_search.index_exists(index_name):
+            print(f"Index '{index_name}' doesn't exist. Creating with sample document...")
+            create_message, create_success = azure_search.create_or_update_index(index_name, analysis_json)
+            if not create_success:
+                raise Exception(f"Index creation failed: {create_message}")
+
+        analysis_payload = dict(analysis_json) if isinstance(analysis_json, dict) else {"raw": analysis_json}
+        analysis_payload.setdefault("call_id", name_no_ext)
+        analysis_payload.setdefault("id", name_no_ext)
+        message, success, indexed_doc_ids = azure_search.load_json_into_azure_search_optimized(
+            index_name, [analysis_payload], wait_for_completion=True
+        )
+        if success:
+            search_indexed = True
+            if name_no_ext not in indexed_doc_ids:
+                print(f"⚠️ Document {name_no_ext} may still be processing in background")
+        else:
+            error = f"Failed to index {name_no_ext} for search: {message}"
+    except Exception as e:
+        error = f"Search indexing failed for {name_no_ext}: {e}"
+
+    call_manifest.upsert(name_no_ext, persist=False, search_indexed=search_indexed)
+    ctx["result"] = {
+        "file": filename,
+        "transcription_blob": f"{azure_storage.TRANSCRIPTION_FOLDER}/{name_no_ext}.txt",
+        "revised_arabic_blob": f"{azure_storage.REVISED_ARABIC_FOLDER}/{name_no_ext}.txt",
+        "revised_english_blob": f"{azure_storage.REVISED_ENGLISH_FOLDER}/{name_no_ext}.txt",
+        "analysis_blob": f"{azure_storage.LLM_ANALYSIS_FOLDER}/persona/{name_no_ext}.json",
+        "search_indexed": search_indexed,
+        "call_id": name_no_ext,
+    }
+    if error:
+        raise RuntimeError(error)
+    print(f"Processing {filename}: Search indexing completed successfully")
+
+
+def _start_upload(ctx: Dict[str, Any]) -> None:
+    """Before a job's stages run: pick up manifest changes saved by other processes."""
+    call_manifest.reload_if_changed()
+
+
+def _finalize_upload(ctx: Dict[str, Any]) -> None:
+    """After a job (successful or not): persist the call's manifest changes, invalidate its cache
+    entries and refresh the dashboard."""
+    call_id = ctx["call_id"]
+    # Stages update the manifest in memory only; one conditional save per job (merged with
+    # whatever other processes saved meanwhile)
+    call_manifest.flush()
+    # Bumps the shared cache version stamp, so every API process drops the affected entries
+    _invalidate_call_cache([call_id])
+    # Counters were updated as the call was analysed; insights regenerate in the background
+    insights_job.mark_dirty(1)
+    dashboard_recompute.schedule()
+
+
+# Upload jobs: the endpoint stores the audio and enqueues one job per file; per-stage worker
+# pools run the rest (started by app.py unless UPLOAD_WORKER_THREADS=0, or by upload_worker.py
+# processes sharing the storage queue with UPLOAD_JOB_QUEUE=storage)
+upload_job_store = JobStore(_get_jobs_collection)
+upload_worker = UploadWorker(
+    create_job_queue(),
+    upload_job_store,
+    # (name, stage, default workers); Speech batch jobs mostly wait on polling, so they get the most
+    stages=[
+        ("transcribe", _stage_transcribe, 4),
+        ("diarize", _stage_diarize, 2),
+        ("analyze", _stage_analyze, 2),
+        # Revisions run after indexing, so search availability does not wait for them
+        ("index", _stage_index, 2),
+        ("revise", _stage_revise, 2),
+    ],
+    on_start=_start_upload,
+    on_complete=_finalize_upload,
+)
@@ -0,0 +1,19 @@
+"""
+Upload Worker
+
+Standalone process running upload jobs from the storage queue, so the API
+processes only store audio and enqueue jobs. Run with UPLOAD_JOB_QUEUE=storage
+here and on the API (set UPLOAD_WORKER_THREADS=0 on the API to keep its workers
+idle):
+
+    UPLOAD_JOB_QUEUE=storage python upload_worker.py
+
+Only the upload pipeline is loaded: the Flask app and the API's background
+threads (health probes, resolver listing, change detection) are not started.
+"""
+
+from upload_pipeline import upload_worker
+
+if __name__ == "__main__":
+    print(f"Upload worker started (queue: {upload_worker.job_queue.name}, stages: {', '.join(upload_worker.stage_names)})")
+    upload_worker.run_forever()